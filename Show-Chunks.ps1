@@ -2,7 +2,7 @@
 Show-Chunks.ps1
 
 Petit utilitaire pour afficher les chunks indexés (Chroma) depuis PowerShell.
-S'appuie sur app\inspect_chunks.py et le venv local s'il existe.
+S'appuie sur app\inspect_chunks.py (python -m app.inspect_chunks) et le venv local s'il existe.
 
 Exemples:
   .\Show-Chunks.ps1
@@ -18,17 +18,21 @@ param(
   [int]$Offset = 0,
   [switch]$GroupByFile,
   [string]$SourceFilter,
-  [string]$ExportCsv
+  [string]$JsonPathFilter,
+  [string]$ExportCsv,
+  [string]$ExportJsonl
 )
 
 Set-StrictMode -Version Latest
 $ErrorActionPreference = 'Stop'
 
 $venvPy = Join-Path $ProjectRoot 'env\Scripts\python.exe'
-$argsList = @('app/inspect_chunks.py', '--persist-dir', $PersistDir, '--collection', $Collection, '--limit', $Limit, '--offset', $Offset)
+$argsList = @('-m', 'app.inspect_chunks', '--persist-dir', $PersistDir, '--collection', $Collection, '--limit', $Limit, '--offset', $Offset)
 if ($GroupByFile) { $argsList += '--group-by-file' }
 if ($SourceFilter) { $argsList += @('--source-filter', $SourceFilter) }
+if ($JsonPathFilter) { $argsList += @('--json-path-filter', $JsonPathFilter) }
 if ($ExportCsv) { $argsList += @('--export-csv', $ExportCsv) }
+if ($ExportJsonl) { $argsList += @('--export-jsonl', $ExportJsonl) }
 
 Set-Location $ProjectRoot
 if (Test-Path $venvPy) {
@@ -8,6 +8,7 @@ du projet (app/loader.py, app/indexer.py).
 Exemples:
   .\Rebuild-Vectorstore.ps1
   .\Rebuild-Vectorstore.ps1 -DataDir .\data -PersistDir .\vectorstore
+  .\Rebuild-Vectorstore.ps1 -ProfileRun -ProfileDump .\build.prof
 #>
 
 [CmdletBinding()]
@@ -22,7 +23,10 @@ param(
   [bool]$UseGpuIndex = $true,
   [switch]$AutoStartOllama,
   [string]$OllamaExe = "C:\\Users\\franc\\AppData\\Local\\Programs\\Ollama\\ollama.exe",
-  [string]$ChunksExport = ''
+  [string]$ChunksExport = '',
+  # Profil par fichier / étape (temps, CPU, mémoire), voir app/profiling.py
+  [switch]$ProfileRun,
+  [string]$ProfileDump = ''
 )
 
 Set-StrictMode -Version Latest
@@ -121,6 +125,8 @@ $argsList = @(
   '--embedding-num-gpu', $embeddingNumGpuLiteral,
   '--export-chunks', $ChunksExport
 )
+if ($ProfileRun) { $argsList += '--profile' }
+if ($ProfileDump) { $argsList += @('--profile-dump', $ProfileDump) }
 
 Set-Location $ProjectRoot
 if (Test-Path $venvPython) {
@@ -0,0 +1,209 @@
+"""
+Questions/réponses par lot sur l'index (audits).
+
+Lit une liste de questions (fichier texte: une question par ligne, ou JSONL
+avec un champ "question" et un "id" optionnel) et écrit une réponse par ligne
+en JSONL, avec sources et temps d'exécution.
+
+La recherche de la question N+1 s'exécute pendant la génération de la
+question N (pipeline à deux étages). Le fichier de sortie est écrit au fil de
+l'eau: relancer la même commande reprend après la dernière réponse écrite.
+
+Exemples:
+  python -m app.batch_ask --questions audit.txt --output reponses.jsonl
+  python -m app.batch_ask --questions audit.jsonl --output reponses.jsonl --top-k 6 --prefetch 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Set
+
+
+def question_id(question: str) -> str:
+    """Identifiant stable d'une question (utilisé pour la reprise)."""
+    return hashlib.sha1(question.strip().encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path: Path) -> List[Dict[str, str]]:
+    """Lit les questions depuis un fichier texte ou JSONL.
+
+    Les lignes vides et les commentaires (#) sont ignorés.
+    """
+    items: List[Dict[str, str]] = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    obj = json.loads(line)
+                except Exception:
+                    continue
+                q = str(obj.get("question") or "").strip()
+                if not q:
+                    continue
+                items.append({"id": str(obj.get("id") or question_id(q)), "question": q})
+            else:
+                items.append({"id": question_id(line), "question": line})
+    return items
+
+
+def read_done_ids(path: Path) -> Set[str]:
+    """Identifiants déjà traités dans un fichier de sortie existant.
+
+    Une dernière ligne tronquée (interruption pendant l'écriture) est ignorée.
+    """
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if rec.get("id") and not rec.get("error"):
+                done.add(str(rec["id"]))
+    return done
+
+
+def _append_record(f, rec: dict) -> None:
+    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Questions/réponses par lot (JSONL)")
+    ap.add_argument("--questions", required=True, help="Fichier de questions (texte ou JSONL)")
+    ap.add_argument("--output", required=True, help="Fichier JSONL de sortie (repris s'il existe)")
+    ap.add_argument("--persist-dir", default="vectorstore", help="Dossier de persistance Chroma")
+    ap.add_argument("--llm-model", default="mistral")
+    ap.add_argument("--embedding-model", default="nomic-embed-text")
+    ap.add_argument("--base-url", default="http://127.0.0.1:11434")
+    ap.add_argument("--top-k", type=int, default=4)
+    ap.add_argument("--num-ctx", type=int, default=2048)
+    ap.add_argument("--max-tokens", type=int, default=256)
+    ap.add_argument("--cpu-only", action="store_true", help="Génération sans GPU")
+    ap.add_argument("--no-strict", action="store_true", help="Ne pas restreindre la réponse au contexte")
+    ap.add_argument("--no-expand", action="store_true", help="Pas d'expansion d'abréviations dans la requête")
+    ap.add_argument("--prefetch", type=int, default=1, help="Nombre de recherches anticipées")
+    args = ap.parse_args()
+
+    from app.indexer import build_or_load_partitioned_index
+    from app.llm_scheduler import PRIORITY_BATCH
+    from app.metrics import Timings, append_metrics, recording
+    from app.rag_engine import generate_answer, retrieve_nodes, sources_from_nodes
+
+    questions = read_questions(Path(args.questions))
+    out_path = Path(args.output)
+    done = read_done_ids(out_path)
+    todo = [q for q in questions if q["id"] not in done]
+    print(f"Questions: {len(questions)} | déjà traitées: {len(questions) - len(todo)} | à traiter: {len(todo)}")
+    if not todo:
+        return 0
+
+    index = build_or_load_partitioned_index(
+        data_documents=[],
+        persist_dir=args.persist_dir,
+        llm_name=args.llm_model,
+        embedding_name=args.embedding_model,
+        ollama_base_url=args.base_url,
+        llm_num_ctx=args.num_ctx,
+    )
+    strict = not args.no_strict
+
+    def retrieve(item):
+        stages = Timings()
+        t0 = time.perf_counter()
+        with recording(stages):
+            question_fr, nodes = retrieve_nodes(
+                index,
+                item["question"],
+                top_k=args.top_k,
+                strict_context=strict,
+                expand_abbr=not args.no_expand,
+                persist_dir=args.persist_dir,
+            )
+        return question_fr, nodes, time.perf_counter() - t0, stages
+
+    # Terminer une éventuelle ligne tronquée avant d'ajouter
+    if out_path.exists() and out_path.stat().st_size > 0:
+        with out_path.open("rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_nl = f.read(1) != b"\n"
+        if needs_nl:
+            with out_path.open("a", encoding="utf-8") as f:
+                f.write("\n")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    t_start = time.perf_counter()
+    sum_latency = 0.0
+    n_ok = 0
+    depth = max(1, int(args.prefetch))
+    with ThreadPoolExecutor(max_workers=depth) as pool, out_path.open("a", encoding="utf-8") as out:
+        pending = deque()
+        it = iter(todo)
+        for item in it:
+            pending.append((item, pool.submit(retrieve, item)))
+            if len(pending) >= depth:
+                break
+
+        while pending:
+            item, fut = pending.popleft()
+            # Lance la recherche suivante pendant la génération de la question courante
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(retrieve, nxt)))
+
+            rec = {"id": item["id"], "question": item["question"]}
+            try:
+                question_fr, nodes, t_retrieve, stages = fut.result()
+                t0 = time.perf_counter()
+                with recording(stages):
+                    response = generate_answer(
+                        question_fr,
+                        nodes,
+                        model_name=args.llm_model,
+                        base_url=args.base_url,
+                        num_ctx=args.num_ctx,
+                        cpu_only=args.cpu_only,
+                        max_tokens=args.max_tokens,
+                        strict_context=strict,
+                        priority=PRIORITY_BATCH,
+                    )
+                t_generate = time.perf_counter() - t0
+                stages.add("total", t_retrieve + t_generate)
+                rec["answer"] = str(response)
+                rec["sources"] = list(dict.fromkeys(sources_from_nodes(getattr(response, "source_nodes", None) or nodes, args.persist_dir)))
+                rec["timings"] = {
+                    "retrieve_s": round(t_retrieve, 3),
+                    "generate_s": round(t_generate, 3),
+                    "total_s": round(t_retrieve + t_generate, 3),
+                    **stages.as_dict(),
+                }
+                append_metrics(args.persist_dir, "query", stages, model=args.llm_model, top_k=args.top_k, batch=True)
+                sum_latency += t_retrieve + t_generate
+                n_ok += 1
+            except Exception as e:
+                rec["error"] = str(e)
+            _append_record(out, rec)
+            status = "ERREUR" if rec.get("error") else "ok"
+            print(f"[{n_ok}/{len(todo)}] {item['id']} {status}")
+
+    wall = time.perf_counter() - t_start
+    print(f"Terminé: {n_ok}/{len(todo)} réponses en {wall:.1f}s (somme des latences: {sum_latency:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
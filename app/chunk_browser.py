@@ -0,0 +1,262 @@
+"""Parcours paginé des chunks d'une collection (Chroma ou backend plat).
+
+Service commun à la page Streamlit `pages/Chunks.py` et à
+`inspect_chunks.py`. Les filtres "contient" sur la source (`file_path`) et
+sur le `json_path` ne parcourent plus la collection à chaque affichage:
+
+- un catalogue des valeurs distinctes de `file_path` et `json_path`
+  (index de métadonnées annexe) est lu une fois par génération de la
+  collection;
+- un filtre est traduit en clause `where` Chroma (`$in` sur les valeurs du
+  catalogue qui contiennent le texte cherché), que le backend plat évalue
+  aussi (`app.vectorstore_health.open_collection`);
+- la liste des identifiants filtrés (et donc le total) est mise en cache par
+  filtre, et seule la page demandée est lue (`get(ids=...)`).
+
+La génération est le couple (nombre de vecteurs, empreinte du stockage,
+voir `app.retrieval_cache.store_generation`): une indexation invalide les
+caches. L'export CSV/JSONL
+lit la collection page par page et écrit au fil de l'eau.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SOURCE_KEYS = ("file_path", "filename", "source", "id")
+FIELDS = ("id", "source", "json_path", "text")
+
+_MAX_CACHED_FILTERS = 32
+
+
+def chunk_source(meta: Optional[dict]) -> str:
+    meta = meta or {}
+    return str(next((meta[k] for k in SOURCE_KEYS if meta.get(k)), ""))
+
+
+def _record(cid, meta, doc) -> dict:
+    meta = meta or {}
+    return {
+        "id": str(cid),
+        "source": chunk_source(meta),
+        "json_path": str(meta.get("json_path", "") or ""),
+        "text": doc or "",
+        "metadata": meta,
+    }
+
+
+class ChunkBrowser:
+    """Pagination et filtres d'une collection, avec caches par génération.
+
+    `collection`: objet à l'interface de `Collection` Chroma (`count`, `get`),
+    par exemple une collection de `app.vectorstore_health.open_collection`.
+    """
+
+    def __init__(self, collection, persist_dir: Optional[str] = None, batch_size: int = 500) -> None:
+        self.collection = collection
+        self.persist_dir = persist_dir
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._generation: Optional[tuple] = None
+        self._catalog: Optional[Dict[str, List[str]]] = None
+        self._ids: "OrderedDict[tuple, List[str]]" = OrderedDict()
+
+    # -------------------- génération / caches --------------------
+    def generation(self) -> tuple:
+        try:
+            count = int(self.collection.count())
+        except Exception:
+            count = -1
+        from app.retrieval_cache import store_generation
+
+        return count, store_generation(self.persist_dir)
+
+    def _check_generation(self) -> None:
+        gen = self.generation()
+        if gen != self._generation:
+            self._generation = gen
+            self._catalog = None
+            self._ids.clear()
+
+    def catalog(self) -> Dict[str, List[str]]:
+        """Valeurs distinctes de `file_path` et `json_path` ({clé: [valeurs]})."""
+        with self._lock:
+            self._check_generation()
+            if self._catalog is not None:
+                return self._catalog
+            values: Dict[str, set] = {"file_path": set(), "json_path": set()}
+            offset = 0
+            while True:
+                batch = self.collection.get(include=["metadatas"], limit=self.batch_size, offset=offset)
+                ids = batch.get("ids") or []
+                if not ids:
+                    break
+                for meta in batch.get("metadatas") or []:
+                    for key, seen in values.items():
+                        v = (meta or {}).get(key)
+                        if v:
+                            seen.add(str(v))
+                offset += len(ids)
+            self._catalog = {k: sorted(v) for k, v in values.items()}
+            return self._catalog
+
+    # -------------------- filtres --------------------
+    def where(self, source: Optional[str] = None, json_path: Optional[str] = None) -> Optional[dict]:
+        """Clause `where` Chroma des filtres "contient" (None si aucun filtre).
+
+        Un filtre qui ne correspond à aucune valeur donne un `$in` vide, que
+        `ids` résout en liste vide sans interroger Chroma.
+        """
+        clauses = []
+        for key, needle in (("file_path", source), ("json_path", json_path)):
+            if not needle:
+                continue
+            n = needle.lower()
+            clauses.append({key: {"$in": [v for v in self.catalog()[key] if n in v.lower()]}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def ids(self, source: Optional[str] = None, json_path: Optional[str] = None) -> Optional[List[str]]:
+        """Identifiants filtrés (mis en cache), ou None sans filtre."""
+        where = self.where(source, json_path)
+        if where is None:
+            return None
+        key = ((source or "").lower(), (json_path or "").lower())
+        with self._lock:
+            self._check_generation()
+            if key in self._ids:
+                self._ids.move_to_end(key)
+                return self._ids[key]
+        clauses = where.get("$and", [where])
+        if any(not list(c.values())[0]["$in"] for c in clauses):
+            found: List[str] = []
+        else:
+            found = [str(i) for i in (self.collection.get(where=where, include=[]).get("ids") or [])]
+        with self._lock:
+            self._ids[key] = found
+            while len(self._ids) > _MAX_CACHED_FILTERS:
+                self._ids.popitem(last=False)
+        return found
+
+    def count(self, source: Optional[str] = None, json_path: Optional[str] = None) -> int:
+        ids = self.ids(source, json_path)
+        if ids is not None:
+            return len(ids)
+        try:
+            return int(self.collection.count())
+        except Exception:
+            return 0
+
+    # -------------------- lecture --------------------
+    def all_ids(self) -> List[str]:
+        """Tous les identifiants de la collection (sans textes ni métadonnées)."""
+        out: List[str] = []
+        while True:
+            ids = self.collection.get(include=[], limit=self.batch_size * 10, offset=len(out)).get("ids") or []
+            if not ids:
+                return out
+            out.extend(str(i) for i in ids)
+
+    def records(self, ids: Sequence[str]) -> List[dict]:
+        """Enregistrements des identifiants donnés, dans cet ordre."""
+        if not ids:
+            return []
+        batch = self.collection.get(ids=list(ids), include=["metadatas", "documents"])
+        got = {
+            str(cid): (meta, doc)
+            for cid, meta, doc in zip(batch.get("ids") or [], batch.get("metadatas") or [], batch.get("documents") or [])
+        }
+        return [_record(cid, *got[cid]) for cid in ids if cid in got]
+
+    def page(self, offset: int, limit: int, source: Optional[str] = None, json_path: Optional[str] = None) -> List[dict]:
+        """Enregistrements `{id, source, json_path, text, metadata}` d'une page."""
+        ids = self.ids(source, json_path)
+        if ids is not None:
+            return self.records(ids[offset: offset + limit])
+        batch = self.collection.get(include=["metadatas", "documents"], limit=limit, offset=offset)
+        return [
+            _record(cid, meta, doc)
+            for cid, meta, doc in zip(batch.get("ids") or [], batch.get("metadatas") or [], batch.get("documents") or [])
+        ]
+
+    def iter_records(self, source: Optional[str] = None, json_path: Optional[str] = None) -> Iterator[dict]:
+        """Tous les enregistrements filtrés, lus par lots de `batch_size`."""
+        offset = 0
+        while True:
+            rows = self.page(offset, self.batch_size, source, json_path)
+            if not rows:
+                break
+            yield from rows
+            offset += self.batch_size
+
+    def export(
+        self,
+        out,
+        fmt: str = "jsonl",
+        source: Optional[str] = None,
+        json_path: Optional[str] = None,
+        fields: Sequence[str] = FIELDS,
+        transform: Optional[Callable[[str], str]] = None,
+    ) -> int:
+        """Écrit les enregistrements filtrés dans le flux `out` (CSV ou JSONL).
+
+        `transform` (optionnel) s'applique à chaque valeur texte. Retourne le
+        nombre de lignes écrites.
+        """
+        writer = csv.DictWriter(out, fieldnames=list(fields), extrasaction="ignore") if fmt == "csv" else None
+        if writer is not None:
+            writer.writeheader()
+        n = 0
+        for rec in self.iter_records(source, json_path):
+            row = {k: rec.get(k, "") for k in fields}
+            if transform is not None:
+                row = {k: transform(v) if isinstance(v, str) else v for k, v in row.items()}
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+        return n
+
+
+_BROWSERS: Dict[Tuple[str, str, str], ChunkBrowser] = {}
+_BROWSERS_LOCK = threading.Lock()
+
+
+def _backend(backend: Optional[str]) -> str:
+    if backend is None:
+        from app.utils.config import load_config
+
+        backend = load_config().get("vector_store", {}).get("backend") or "chroma"
+    return backend.lower()
+
+
+def collection_names(persist_dir: str, base: str = "eau_docs", backend: Optional[str] = None) -> List[str]:
+    """Collections de l'index: `base` et ses partitions (`base_<type>`).
+
+    `backend`: "chroma" ou "flat" (défaut: `vector_store.backend` de la configuration).
+    """
+    from app.vectorstore_health import collection_names as stored_names
+
+    return stored_names(persist_dir, _backend(backend), base)
+
+
+def get_browser(persist_dir: str, collection_name: str, backend: Optional[str] = None) -> ChunkBrowser:
+    """Navigateur (partagé par processus) d'une collection; lève si elle n'existe pas."""
+    backend = _backend(backend)
+    key = (str(Path(persist_dir).resolve()), collection_name, backend)
+    with _BROWSERS_LOCK:
+        browser = _BROWSERS.get(key)
+    if browser is not None:
+        return browser
+    from app.vectorstore_health import open_collection
+
+    browser = ChunkBrowser(open_collection(persist_dir, backend, collection_name), persist_dir=persist_dir)
+    with _BROWSERS_LOCK:
+        return _BROWSERS.setdefault(key, browser)
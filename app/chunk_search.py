@@ -0,0 +1,227 @@
+"""Recherche plein texte dans les chunks indexés (SQLite FTS5).
+
+Trouver le chunk qui cite un modèle de pompe ou un PPV obligeait à parcourir
+des milliers de chunks. `chunks_fts.sqlite` (dossier de persistance) indexe
+le texte, la source et le `json_path` de chaque chunk vectorisé:
+
+- l'indexation y écrit les chunks insérés dans la collection (mêmes
+  identifiants que Chroma), `vectorstore_health --fix` y retire les chunks
+  supprimés;
+- `sync_collection` rattrape une collection Chroma modifiée hors de ce
+  circuit (index créé avant cette recherche, suppression manuelle...).
+
+La tokenisation ignore casse et accents ("debit" trouve "Débit"); chaque mot
+de la requête doit apparaître, le dernier pouvant être un préfixe.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+SEARCH_FILE = "chunks_fts.sqlite"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text: str) -> str:
+    """Requête FTS5 sûre: mots entre guillemets (ET implicite), dernier en préfixe."""
+    words = _WORD_RE.findall(text or "")
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class ChunkSearchIndex:
+    """Chunks (par collection) et leur index FTS5, dans un fichier SQLite."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, collection TEXT NOT NULL,"
+            " node_id TEXT NOT NULL, source TEXT, json_path TEXT, text TEXT, UNIQUE (collection, node_id));"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(source, json_path, text,"
+            " content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2');"
+            "CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN"
+            " INSERT INTO chunks_fts (rowid, source, json_path, text) VALUES (new.id, new.source, new.json_path, new.text);"
+            " END;"
+            "CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN"
+            " INSERT INTO chunks_fts (chunks_fts, rowid, source, json_path, text)"
+            " VALUES ('delete', old.id, old.source, old.json_path, old.text);"
+            " END;"
+            "CREATE TABLE IF NOT EXISTS synced (collection TEXT PRIMARY KEY, generation TEXT NOT NULL);"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def upsert(self, collection: str, rows: Iterable[Tuple[str, str, str, str]]) -> int:
+        """Ajoute ou remplace des chunks `(node_id, source, json_path, texte)`."""
+        n = 0
+        with self._lock, self._conn:
+            c = self._conn
+            for node_id, source, json_path, text in rows:
+                c.execute("DELETE FROM chunks WHERE collection = ? AND node_id = ?", (collection, node_id))
+                c.execute(
+                    "INSERT INTO chunks (collection, node_id, source, json_path, text) VALUES (?, ?, ?, ?, ?)",
+                    (collection, node_id, source or "", json_path or "", text or ""),
+                )
+                n += 1
+        return n
+
+    def forget(self, collection: str, node_ids: Iterable[str]) -> int:
+        ids = list(dict.fromkeys(node_ids))
+        n = 0
+        with self._lock, self._conn:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                n += self._conn.execute(
+                    f"DELETE FROM chunks WHERE collection = ? AND node_id IN ({marks})", (collection, *part)
+                ).rowcount
+        return n
+
+    def node_ids(self, collection: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT node_id FROM chunks WHERE collection = ?", (collection,))]
+
+    def synced_generation(self, collection: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM synced WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else None
+
+    def set_synced_generation(self, collection: str, generation: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO synced VALUES (?, ?)", (collection, generation))
+
+    def count(self, collection: Optional[str] = None) -> int:
+        with self._lock:
+            if collection is None:
+                return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM chunks WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def _where(self, query: str, collection, source, json_path) -> Tuple[str, list]:
+        # CROSS JOIN: la table FTS reste la boucle externe (sinon SQLite peut
+        # parcourir toute la collection et tester MATCH ligne par ligne)
+        sql = "FROM chunks_fts CROSS JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        params: list = [fts_query(query)]
+        if collection is not None and not isinstance(collection, str):
+            # Plusieurs collections (partitions d'un index)
+            names = list(collection)
+            sql += f" AND c.collection IN ({','.join('?' * len(names))})" if names else " AND 0"
+            params.extend(names)
+            collection = None
+        for col, value, like in (("collection", collection, False), ("source", source, True), ("json_path", json_path, True)):
+            if value:
+                sql += f" AND c.{col} {'LIKE' if like else '='} ?"
+                params.append(f"%{value}%" if like else value)
+        return sql, params
+
+    def search(
+        self,
+        query: str,
+        collection: Union[str, Sequence[str], None] = None,
+        limit: int = 50,
+        offset: int = 0,
+        source: Optional[str] = None,
+        json_path: Optional[str] = None,
+        marks: Tuple[str, str] = ("[", "]"),
+        snippet_words: int = 24,
+    ) -> List[dict]:
+        """Chunks correspondants, du plus pertinent au moins pertinent (bm25).
+
+        Chaque résultat contient `snippet`: extrait du texte où les termes
+        trouvés sont entourés de `marks`. `collection` est un nom ou une liste
+        de noms (partitions d'un index); `source` / `json_path` filtrent en
+        plus par sous-chaîne.
+        """
+        if not fts_query(query):
+            return []
+        from_where, params = self._where(query, collection, source, json_path)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id, c.collection, c.node_id, c.source, c.json_path, c.text, chunks_fts.rank"
+                f" {from_where} ORDER BY chunks_fts.rank LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+            # Extraits calculés pour la seule page affichée
+            marks_sql = ",".join("?" * len(rows))
+            snippets = dict(self._conn.execute(
+                f"SELECT rowid, snippet(chunks_fts, 2, ?, ?, ' … ', ?) FROM chunks_fts"
+                f" WHERE chunks_fts MATCH ? AND rowid IN ({marks_sql})",
+                [marks[0], marks[1], snippet_words, params[0], *(r[0] for r in rows)],
+            ).fetchall()) if rows else {}
+        return [
+            {
+                "collection": r[1], "id": r[2], "source": r[3], "json_path": r[4], "text": r[5],
+                "snippet": snippets.get(r[0], ""), "score": -r[6],
+            }
+            for r in rows
+        ]
+
+    def count_matches(
+        self,
+        query: str,
+        collection: Union[str, Sequence[str], None] = None,
+        source: Optional[str] = None,
+        json_path: Optional[str] = None,
+    ) -> int:
+        if not fts_query(query):
+            return 0
+        from_where, params = self._where(query, collection, source, json_path)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) {from_where}", params).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_search_index(persist_dir: str) -> ChunkSearchIndex:
+    return ChunkSearchIndex(str(Path(persist_dir) / SEARCH_FILE))
+
+
+def node_rows(nodes: Sequence) -> List[Tuple[str, str, str, str]]:
+    """Lignes `(node_id, source, json_path, texte)` de nœuds LlamaIndex."""
+    from llama_index.core.schema import MetadataMode
+
+    from app.chunk_browser import chunk_source
+
+    return [
+        (
+            n.node_id,
+            chunk_source(n.metadata),
+            str((n.metadata or {}).get("json_path", "") or ""),
+            n.get_content(metadata_mode=MetadataMode.NONE),
+        )
+        for n in nodes
+    ]
+
+
+def sync_collection(index: ChunkSearchIndex, browser, collection: str) -> bool:
+    """Aligne l'index plein texte d'une collection sur la collection vectorielle.
+
+    `browser`: `ChunkBrowser` de la collection. Rien n'est relu tant que la
+    génération de la collection (nombre de vecteurs, empreinte du stockage)
+    est celle de la dernière synchronisation; sinon seuls les identifiants
+    sont comparés, puis les chunks manquants sont lus et les chunks disparus
+    retirés. Retourne True si l'index a été modifié.
+    """
+    generation = repr(browser.generation())
+    if index.synced_generation(collection) == generation:
+        return False
+    in_chroma = browser.all_ids()
+    known = set(index.node_ids(collection))
+    missing = [i for i in in_chroma if i not in known]
+    gone = known.difference(in_chroma)
+    index.forget(collection, gone)
+    for i in range(0, len(missing), browser.batch_size):
+        recs = browser.records(missing[i:i + browser.batch_size])
+        index.upsert(collection, [(r["id"], r["source"], r["json_path"], r["text"]) for r in recs])
+    index.set_synced_generation(collection, generation)
+    return bool(missing or gone)
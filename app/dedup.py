@@ -0,0 +1,285 @@
+"""Dédoublonnage des chunks avant embedding (MinHash / LSH).
+
+Le corpus contient des copies (`A2I - Copie.json` à côté de `A2I.json`) et
+des passages répétés d'une fiche à l'autre. Chaque copie coûtait un
+embedding et les doublons occupaient plusieurs places du top_k.
+
+Avant l'insertion dans une collection, chaque chunk est comparé aux chunks
+déjà retenus de la même collection:
+
+- doublon exact: même texte normalisé (en-tête "[Source: ...]" retiré,
+  casse et espaces ignorés);
+- quasi-doublon: similarité de Jaccard estimée (MinHash sur des trigrammes
+  de mots) au moins égale au seuil, avec les mêmes nombres (un chunk qui ne
+  diffère que par un débit ou un code n'est pas un doublon). Les candidats
+  sont trouvés par LSH (bandes de la signature), sans comparaison deux à deux.
+
+Un doublon n'est pas vectorisé; il est rattaché au chunk retenu dans
+`dedup.sqlite` (dossier de persistance) et `duplicate_sources` retrouve ses
+fichiers pour les citations.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEDUP_FILE = "dedup.sqlite"
+
+NUM_PERM = 64
+BANDS = 8  # 8 bandes de 8 lignes: candidat dès ~0.77 de similarité
+SHINGLE_WORDS = 3
+
+_HEADER_RE = re.compile(r"^\[Source: [^\n]*\]\s*$", re.MULTILINE)
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _random_u64(rng: np.random.RandomState, n: int) -> np.ndarray:
+    hi = rng.randint(0, 2**32, n, dtype=np.uint64)
+    lo = rng.randint(0, 2**32, n, dtype=np.uint64)
+    return (hi << np.uint64(32)) | lo
+
+
+# Hachage "multiply-shift" ((a*x + b) mod 2^64) >> 32, une paire (a, b) par permutation
+_rng = np.random.RandomState(20251101)
+_PERM_A = _random_u64(_rng, NUM_PERM) | np.uint64(1)
+_PERM_B = _random_u64(_rng, NUM_PERM)
+
+
+def normalize_chunk(text: str) -> str:
+    """Texte comparable: sans en-tête de source, en minuscules, espaces réduits."""
+    return re.sub(r"\s+", " ", _HEADER_RE.sub("", text or "")).strip().lower()
+
+
+def exact_key(norm: str) -> str:
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()
+
+
+def numbers_key(norm: str) -> str:
+    return hashlib.sha1(" ".join(sorted(_NUMBER_RE.findall(norm))).encode("utf-8")).hexdigest()[:16]
+
+
+def minhash(norm: str, k: int = SHINGLE_WORDS) -> np.ndarray:
+    """Signature MinHash (NUM_PERM valeurs uint32) des k-grammes de mots."""
+    words = norm.split()
+    grams = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+    x = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    h = (x[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) >> np.uint64(32)
+    return h.min(axis=0).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> List[str]:
+    rows = NUM_PERM // BANDS
+    return [f"{b}:{hashlib.sha1(sig[b * rows:(b + 1) * rows].tobytes()).hexdigest()[:16]}" for b in range(BANDS)]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard estimée: part des composantes égales des deux signatures."""
+    return float(np.mean(a == b))
+
+
+class DedupIndex:
+    """Chunks retenus et doublons par collection, dans un fichier SQLite."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks (collection TEXT NOT NULL, node_id TEXT NOT NULL,"
+            " exact TEXT NOT NULL, numbers TEXT NOT NULL, sig BLOB, canonical TEXT, kind TEXT, source TEXT,"
+            " PRIMARY KEY (collection, node_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS chunks_exact ON chunks (collection, exact);"
+            "CREATE INDEX IF NOT EXISTS chunks_canonical ON chunks (canonical);"
+            "CREATE TABLE IF NOT EXISTS bands (collection TEXT NOT NULL, band TEXT NOT NULL, node_id TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS bands_key ON bands (collection, band);"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def _find(self, collection: str, exact: str, numbers: str, sig, threshold: float):
+        c = self._conn
+        row = c.execute(
+            "SELECT node_id FROM chunks WHERE collection = ? AND exact = ? AND canonical IS NULL LIMIT 1",
+            (collection, exact),
+        ).fetchone()
+        if row:
+            return row[0], "exact"
+        if sig is None:
+            return None, None
+        keys = band_keys(sig)
+        marks = ",".join("?" * len(keys))
+        cands = c.execute(
+            f"SELECT DISTINCT b.node_id, ch.sig FROM bands b JOIN chunks ch"
+            f" ON ch.collection = b.collection AND ch.node_id = b.node_id"
+            f" WHERE b.collection = ? AND b.band IN ({marks}) AND ch.numbers = ?",
+            (collection, *keys, numbers),
+        ).fetchall()
+        best, best_sim = None, threshold
+        for node_id, blob in cands:
+            s = similarity(sig, np.frombuffer(blob, dtype=np.uint32))
+            if s >= best_sim:
+                best, best_sim = node_id, s
+        return (best, "near") if best else (None, None)
+
+    def filter_nodes(
+        self,
+        nodes: Sequence,
+        collection: str,
+        threshold: float = 0.9,
+        min_words: int = 40,
+        stats: Optional[dict] = None,
+    ) -> List:
+        """Nœuds à vectoriser: les doublons (exacts ou proches) sont écartés.
+
+        Un nœud déjà connu garde sa décision précédente (ré-indexation
+        idempotente). La détection des quasi-doublons ne s'applique qu'aux
+        chunks d'au moins `min_words` mots: sur des enregistrements courts, un
+        seul mot différent (nom de site) pèse trop peu dans la similarité.
+        `stats` (optionnel) cumule `chunks`, `kept`, `exact` et `near`.
+        """
+        kept = []
+        counts = {"chunks": 0, "kept": 0, "exact": 0, "near": 0}
+        with self._lock, self._conn:
+            c = self._conn
+            for node in nodes:
+                counts["chunks"] += 1
+                node_id = node.node_id
+                row = c.execute(
+                    "SELECT canonical, kind FROM chunks WHERE collection = ? AND node_id = ?", (collection, node_id)
+                ).fetchone()
+                if row is not None:
+                    if row[0] is None:
+                        kept.append(node)
+                        counts["kept"] += 1
+                    else:
+                        counts[row[1]] += 1
+                    continue
+
+                norm = normalize_chunk(node.get_content())
+                exact, numbers = exact_key(norm), numbers_key(norm)
+                sig = minhash(norm) if len(norm.split()) >= min_words else None
+                canonical, kind = self._find(collection, exact, numbers, sig, threshold)
+                source = str((node.metadata or {}).get("file_path") or "")
+                if canonical is not None:
+                    c.execute(
+                        "INSERT INTO chunks VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+                        (collection, node_id, exact, numbers, canonical, kind, source),
+                    )
+                    counts[kind] += 1
+                    continue
+                c.execute(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, NULL, NULL, ?)",
+                    (collection, node_id, exact, numbers, None if sig is None else sig.tobytes(), source),
+                )
+                if sig is not None:
+                    c.executemany(
+                        "INSERT INTO bands VALUES (?, ?, ?)", [(collection, k, node_id) for k in band_keys(sig)]
+                    )
+                kept.append(node)
+                counts["kept"] += 1
+        if stats is not None:
+            for k, v in counts.items():
+                stats[k] = stats.get(k, 0) + v
+        return kept
+
+    def mark_duplicates(self, collection: str, entries: Iterable[tuple]) -> None:
+        """Enregistre des doublons `(node_id, id du chunk retenu, texte, fichier)`."""
+        rows = []
+        for node_id, canonical, text, source in entries:
+            norm = normalize_chunk(text)
+            rows.append((collection, node_id, exact_key(norm), numbers_key(norm), canonical, "exact", source or ""))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, NULL, ?, ?, ?)", rows
+            )
+
+    def forget(self, collection: str, node_ids: Iterable[str]) -> int:
+        """Oublie des chunks supprimés de l'index (et les doublons qui s'y rattachent).
+
+        Un doublon oublié sera de nouveau vectorisé à la prochaine indexation
+        de son fichier.
+        """
+        ids = list(dict.fromkeys(node_ids))
+        n = 0
+        with self._lock, self._conn:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                cur = self._conn.execute(
+                    f"DELETE FROM chunks WHERE collection = ? AND (node_id IN ({marks}) OR canonical IN ({marks}))",
+                    (collection, *part, *part),
+                )
+                n += cur.rowcount
+                self._conn.execute(
+                    f"DELETE FROM bands WHERE collection = ? AND node_id IN ({marks})", (collection, *part)
+                )
+        return n
+
+    def duplicate_sources(self, node_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """{id du chunk retenu: [fichiers de ses doublons]}."""
+        ids = list(dict.fromkeys(node_ids))
+        out: Dict[str, List[str]] = {}
+        if not ids:
+            return out
+        marks = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT canonical, source FROM chunks WHERE canonical IN ({marks}) ORDER BY source", ids
+            ).fetchall()
+        for canonical, source in rows:
+            if source and source not in out.setdefault(canonical, []):
+                out[canonical].append(source)
+        return out
+
+    def canonicals(self, node_ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """{id d'un doublon écarté: (id du chunk retenu, "exact" | "near")}."""
+        ids = list(dict.fromkeys(node_ids))
+        out: Dict[str, Tuple[str, str]] = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT node_id, canonical, kind FROM chunks"
+                    f" WHERE node_id IN ({marks}) AND canonical IS NOT NULL",
+                    part,
+                ).fetchall()
+                out.update({node_id: (canonical, kind) for node_id, canonical, kind in rows})
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def duplicate_sources(persist_dir: Optional[str], node_ids: Iterable[str]) -> Dict[str, List[str]]:
+    """Fichiers des doublons écartés, par chunk retenu ({} sans `dedup.sqlite`)."""
+    if not persist_dir:
+        return {}
+    path = Path(persist_dir) / DEDUP_FILE
+    if not path.exists():
+        return {}
+    index = DedupIndex(str(path))
+    try:
+        return index.duplicate_sources(node_ids)
+    finally:
+        index.close()
+
+
+def duplicate_canonicals(persist_dir: Optional[str], node_ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """Doublons écartés parmi `node_ids` ({} sans `dedup.sqlite`), voir `DedupIndex.canonicals`."""
+    if not persist_dir:
+        return {}
+    path = Path(persist_dir) / DEDUP_FILE
+    if not path.exists():
+        return {}
+    index = DedupIndex(str(path))
+    try:
+        return index.canonicals(node_ids)
+    finally:
+        index.close()
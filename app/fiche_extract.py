@@ -0,0 +1,310 @@
+"""Extraction structurée des fiches d'audit PDF (postes de relevage, STEP).
+
+Les fiches "<Commune> - PR <site>.pdf" et "<Commune> - Fiche STEP <site>.pdf"
+suivent un gabarit fixe: une ligne par rubrique, "Libellé valeur" (ex.
+"Pompage 1+1 - Marque : XYLEM", "Capacité nominale 350 EH"). Lues comme du
+texte libre, leurs tableaux sont coupés d'un chunk à l'autre par le
+`SentenceSplitter`.
+
+Ce module relit le texte des pages, reconnaît les libellés du gabarit et
+produit un enregistrement clé/valeur par fiche. Les champs sont projetés sur
+les clés canoniques de l'ontologie (`schemas` de `ontology/schemas.yaml`:
+nombre_pompes, debit_m3h, charge_eqh, procede...) avec conversion de type.
+L'enregistrement est rendu comme un enregistrement JSON ("[Source: ...]",
+"canon line : ...", puis "Libellé : valeur"): un seul chunk compact par fiche.
+
+`FichePDFReader` s'utilise comme lecteur `.pdf` de `SimpleDirectoryReader`;
+un PDF qui ne suit pas le gabarit est lu page par page comme avant.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+
+from app.partitions import ASSET_TYPE_CLASSES, SCHEMA_PATH
+from app.site_metadata import parse_site_filename
+
+# Libellés du gabarit, par type de fiche (apostrophes typographiques)
+FICHE_LABELS: Dict[str, Tuple[str, ...]] = {
+    "poste_relevage": (
+        "Date visite", "Contrôle établi par", "Capacité du poste", "Mise en route",
+        "Localisation", "Facilité d’accès", "Zone inondable", "Présence d’un bâtiment",
+        "Nature de la cuve", "Dégrillage", "Pompage", "Variation de fréquence",
+        "Mesure de niveau", "Ballon anti bélier", "Mesure de débit", "Temps fonctionnement",
+        "Chambre à vannes", "Désodorisation /ventilation", "Traitement H2S",
+        "Isolement du poste", "Présence d’un trop plein", "Equipement du trop plein",
+        "Armoire électrique", "Automatisme", "Télésurveillance", "Groupe électrogène",
+        "Clôture / Portail", "Accès aux ouvrages", "Accès équipements", "Eau potable",
+        "Génie Civil", "Equipements", "Serrurerie", "Moyens de levage",
+        "Installations électriques", "Dispositif d’auto-surveillance", "Fréquence passage",
+        "Cahier de relevé site", "Fréquence de curage", "Schéma électrique", "Espace vert",
+        "Locaux d’exploitation", "Equipement",
+    ),
+    "station_epuration": (
+        "Capacité nominale", "Mise en service", "Filière", "Etat général", "Date visite",
+        "Contrôle établi par", "Présence industriels", "Matières de vidange",
+        "Produits de curage", "Graisses extérieures", "Milieu de rejet", "QMNA5", "Type",
+        "Longueur / nature", "Poste de relèvement", "Eaux claires parasites",
+        "Déversoir d’orage", "Bassin d’orage", "Schéma Directeur Assainissement",
+        "Voisinage", "Inondabilité", "Armoire électrique", "Automatisme", "Supervision",
+        "Groupe électrogène", "Télésurveillance", "By-pass", "Entrée station",
+        "Sortie station", "Mesures process", "Clôture / Portail", "Accès aux ouvrages",
+        "Accès équipements", "Arrêté préfectoral", "Nb bilans auto-surveillance",
+        "Manuel d’auto-surveillance", "Zonage ATEX", "Installation ICPE",
+        "Réactifs", "Personnel affecté", "Déchets",
+    ),
+}
+# Libellés qui peuvent suivre une valeur sur la même ligne
+# ("Capacité du poste 26,3 m3/h Mise en route Non précisé")
+_INLINE_LABELS = ("Mise en route", "Mise en service", "QMNA5", "Nb bilans auto-surveillance")
+# Intitulés de section en marge, devant le premier libellé de la section
+_SECTION_PREFIXES = ("Situation", "Technique", "Sécurité", "Installation de commandes", "Autosurveillance")
+# Titre de la fiche ("Poste de relèvement De Garavet (Allassac)")
+_TITLE_RES = {
+    "poste_relevage": re.compile(r"^Poste de relèvement\s+(\S.*)$"),
+    "station_epuration": re.compile(r"^Station d’épuration\s+(\S.*)$"),
+}
+_CONCLUSION_RE = re.compile(r"^Conclusions?\s*$")
+
+_MAX_VALUE_CHARS = 120
+_MAX_CONCLUSION_CHARS = 500
+# En dessous, le PDF n'est pas considéré comme une fiche du gabarit
+MIN_FIELDS = 5
+
+# Valeurs sans information pour un champ typé
+_EMPTY_VALUES = {"sans objet", "non précisé", "non precise", "ne sait pas", "-", ""}
+
+
+def _norm_line(line: str) -> str:
+    return re.sub(r"\s+", " ", (line or "").replace("'", "’")).strip()
+
+
+@lru_cache(maxsize=8)
+def _line_re(kind: str) -> re.Pattern:
+    labels = sorted(FICHE_LABELS[kind], key=len, reverse=True)
+    alt = "|".join(re.escape(l) for l in labels)
+    prefix = "|".join(re.escape(p) for p in _SECTION_PREFIXES)
+    return re.compile(rf"^(?:(?:{prefix})\s+)?({alt})(?=\s|:|$)\s*(.*)$")
+
+
+@lru_cache(maxsize=8)
+def _inline_re(kind: str) -> re.Pattern:
+    labels = [l for l in _INLINE_LABELS if l in FICHE_LABELS[kind]]
+    alt = "|".join(re.escape(l) for l in labels) or r"(?!)"
+    return re.compile(rf"\s(?:[–-]\s*)?({alt})(?=\s|:|$)\s*")
+
+
+def _clean_value(value: str) -> str:
+    value = re.sub(r"^[\s:–-]+|[\s–-]+$", "", value or "")
+    if len(value) > _MAX_VALUE_CHARS:
+        value = value[:_MAX_VALUE_CHARS].rsplit(" ", 1)[0] + " …"
+    return value
+
+
+def extract_fields(text: str, kind: str) -> Dict[str, str]:
+    """Champs "Libellé -> valeur" d'une fiche (première occurrence de chaque libellé).
+
+    Les lignes de suite (commençant par une minuscule) complètent la valeur
+    précédente; la conclusion est rendue sous le libellé "Conclusion".
+    """
+    if kind not in FICHE_LABELS:
+        return {}
+    line_re, inline_re = _line_re(kind), _inline_re(kind)
+    fields: Dict[str, str] = {}
+    last: Optional[str] = None
+    lines = [_norm_line(l) for l in (text or "").splitlines()]
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        if not line:
+            last = None
+            continue
+        if "titre" not in fields:
+            m = _TITLE_RES[kind].match(line)
+            if m:
+                fields["titre"] = _clean_value(m.group(1))
+                continue
+        if _CONCLUSION_RE.match(line) and "Conclusion" not in fields:
+            parts, blanks = [], 0
+            while i < len(lines) and blanks < 2 and sum(map(len, parts)) < _MAX_CONCLUSION_CHARS:
+                blanks = blanks + 1 if not lines[i] else 0
+                if lines[i]:
+                    parts.append(lines[i])
+                i += 1
+            conclusion = " ".join(parts)
+            if len(conclusion) > _MAX_CONCLUSION_CHARS:
+                conclusion = conclusion[:_MAX_CONCLUSION_CHARS].rsplit(" ", 1)[0] + " …"
+            fields["Conclusion"] = conclusion
+            last = None
+            continue
+        m = line_re.match(line)
+        if m:
+            chunks = inline_re.split(" " + m.group(2))
+            pairs = [(m.group(1), chunks[0])] + list(zip(chunks[1::2], chunks[2::2]))
+            last = None
+            for label, value in pairs:
+                value = _clean_value(value)
+                if label not in fields and value:
+                    fields[label] = value
+                    last = label
+            continue
+        if last and line[0].islower() and not fields[last].endswith("…"):
+            fields[last] = _clean_value(f"{fields[last]} {line}")
+        else:
+            last = None
+    return fields
+
+
+# ------------------------------------------------------------------
+# Projection sur l'ontologie (schemas.yaml)
+# ------------------------------------------------------------------
+
+@lru_cache(maxsize=4)
+def load_schema_mappings(kind: str, schema_path: str = str(SCHEMA_PATH)) -> Tuple[dict, ...]:
+    """Mappings `schemas.<kind>.mappings` de schemas.yaml (tuple vide si absent)."""
+    try:
+        data = yaml.safe_load(Path(schema_path).read_text(encoding="utf-8")) or {}
+    except Exception:
+        return ()
+    spec = (data.get("schemas") or {}).get(kind) or {}
+    return tuple(m for m in spec.get("mappings") or [] if m.get("source") and m.get("target"))
+
+
+def _number(text: str) -> Optional[float]:
+    try:
+        return float(text.replace(" ", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+def coerce_value(value: str, type_: str = "string", unit: Optional[str] = None):
+    """Convertit une valeur de fiche selon le type du mapping (None si inexploitable).
+
+    - int: "1+1 - Marque ..." -> 2 (somme), "350 EH" -> 350;
+    - float avec unité: nombre placé devant l'unité ("26,3 m3/h (...)" -> 26.3).
+    """
+    value = (value or "").strip()
+    if value.lower().rstrip(" .") in _EMPTY_VALUES:
+        return None
+    if type_ == "int":
+        m = re.match(r"^\s*(\d+(?:\s*\+\s*\d+)+)\b", value)
+        if m:
+            return sum(int(x) for x in re.findall(r"\d+", m.group(1)))
+        m = re.search(r"\d[\d ]*", value)
+        return int(m.group(0).replace(" ", "")) if m else None
+    if type_ == "float":
+        if unit:
+            m = re.search(rf"(\d+(?:[.,]\d+)?)\s*{re.escape(unit)}", value)
+            if m:
+                return _number(m.group(1))
+        m = re.search(r"\d+(?:[.,]\d+)?", value)
+        return _number(m.group(0)) if m else None
+    return value
+
+
+def apply_schema(fields: Dict[str, str], mappings) -> Tuple[Dict[str, object], List[str]]:
+    """(valeurs canoniques {cible: valeur}, paires "Label : valeur" affichables)."""
+    canon: Dict[str, object] = {}
+    pairs: List[str] = []
+    for m in mappings:
+        target = str(m["target"])
+        if target in canon:
+            continue
+        src = str(m["source"])
+        for label, raw in fields.items():
+            hit = re.search(src, label) if m.get("regex") else label == src
+            if not hit:
+                continue
+            if m.get("value_regex"):
+                vm = re.search(str(m["value_regex"]), raw)
+                raw = vm.group(1).strip() if vm else ""
+            val = coerce_value(raw, str(m.get("type") or "string"), m.get("unit"))
+            if val is not None and val != "":
+                canon[target] = val
+                pairs.append(f"{m.get('label', target)} : {val}")
+            break
+    return canon, pairs
+
+
+# ------------------------------------------------------------------
+# Enregistrement et lecteur PDF
+# ------------------------------------------------------------------
+
+def fiche_kind(path: str) -> Optional[str]:
+    """Type d'ontologie d'une fiche d'après son nom de fichier (None si autre)."""
+    return ASSET_TYPE_CLASSES.get(parse_site_filename(path).get("asset_type", ""))
+
+
+def fiche_record(text: str, path: str, extra_info: Optional[dict] = None) -> Optional[Document]:
+    """Enregistrement compact d'une fiche, ou None si le texte ne suit pas le gabarit."""
+    kind = fiche_kind(path)
+    if kind is None:
+        return None
+    fields = extract_fields(text, kind)
+    if len(fields) < MIN_FIELDS:
+        return None
+    canon, pairs = apply_schema(fields, load_schema_mappings(kind))
+
+    lines = [f"[Source: {Path(path).name} | Fiche: {kind}]"]
+    if pairs:
+        lines.append(f"canon line : {' | '.join(pairs)}")
+    # Rubriques sans information regroupées sur une ligne par valeur
+    # ("Sans objet : Ballon anti bélier, Mesure de débit, ...")
+    empty: Dict[str, List[str]] = {}
+    for label, value in fields.items():
+        if value.lower().rstrip(" .") in _EMPTY_VALUES:
+            empty.setdefault(value.rstrip(" .").capitalize(), []).append(label)
+        else:
+            lines.append(f"{label} : {value}")
+    lines.extend(f"{value} : {', '.join(labels)}" for value, labels in empty.items())
+
+    meta = dict(extra_info or {})
+    meta.setdefault("file_path", str(path))
+    meta.setdefault("file_name", Path(path).name)
+    meta["record_kind"] = "fiche"
+    meta["canon_type"] = kind
+    meta.update({f"canon_{k}": v for k, v in canon.items()})
+    if pairs:
+        meta["canon_line"] = " | ".join(pairs)
+    doc = Document(text="\n".join(lines), metadata=meta)
+    # Champs canoniques déjà présents dans le texte ("canon line"): hors du
+    # texte embarqué et du prompt, pour tenir dans un seul chunk
+    hidden = [k for k in meta if k.startswith("canon_")]
+    doc.excluded_embed_metadata_keys = list(dict.fromkeys(doc.excluded_embed_metadata_keys + hidden))
+    doc.excluded_llm_metadata_keys = list(dict.fromkeys(doc.excluded_llm_metadata_keys + hidden))
+    return doc
+
+
+def _pdf_pages(path: str) -> List[str]:
+    from pypdf import PdfReader
+
+    return [page.extract_text() or "" for page in PdfReader(str(path)).pages]
+
+
+class FichePDFReader(BaseReader):
+    """Lecteur `.pdf`: une fiche reconnue donne un seul Document enregistrement."""
+
+    def load_data(self, file, extra_info: Optional[dict] = None, fs=None) -> List[Document]:
+        try:
+            from llama_index.readers.file import PDFReader
+        except ImportError:
+            PDFReader = None
+        if fs is not None and PDFReader is not None:
+            return PDFReader().load_data(file, extra_info=extra_info, fs=fs)
+
+        pages = _pdf_pages(str(file))
+        record = fiche_record("\n".join(pages), str(file), extra_info)
+        if record is not None:
+            return [record]
+        if PDFReader is not None:
+            return PDFReader().load_data(file, extra_info=extra_info)
+        return [
+            Document(text=t, metadata={**(extra_info or {}), "page_label": str(i + 1)})
+            for i, t in enumerate(pages)
+        ]
@@ -0,0 +1,298 @@
+"""Index vectoriel plat en mémoire (NumPy), stockage quantifié.
+
+Alternative à Chroma pour un corpus de quelques milliers à quelques dizaines
+de milliers de chunks: pas de SQLite ni de graphe HNSW, une recherche exacte
+par produit matriciel suffit et le chargement se réduit à un `np.load` en
+mémoire mappée.
+
+Stockage (un dossier par collection):
+- `vectors.npy`: embeddings en float16, ou int8 avec une échelle par ligne
+  (`scales.npy`);
+- `norms.npy`: normes des vecteurs d'origine (similarité cosinus);
+- `rows.jsonl`: identifiant, texte et métadonnées de chaque ligne;
+- `meta.json`: dimension, type de stockage, nombre de lignes.
+
+Option `resident`: une copie float32 des vecteurs est gardée en mémoire
+(4 fois la taille int8) pour éviter la conversion à chaque requête; plus
+rapide sans filtre, au prix de la mémoire.
+
+Les filtres metadata (égalité) sont appliqués par masques booléens
+précalculés par clé, combinés en ET avant la sélection du top-k
+(`np.argpartition`).
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DTYPES = ("float16", "int8")
+_BLOCK_ROWS = 512
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    # int8 symétrique: une échelle par ligne (max |v| -> 127)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+class FlatIndex:
+    """Vecteurs quantifiés + normes + lignes (id, texte, métadonnées)."""
+
+    def __init__(self, dtype: str = "float16", resident: bool = False):
+        if dtype not in DTYPES:
+            raise ValueError(f"Type de stockage inconnu: {dtype} (attendu: {', '.join(DTYPES)})")
+        self.dtype = dtype
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._masks: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = threading.RLock()
+        self.resident = resident
+        self._f32: Optional[np.ndarray] = None
+        self._pos: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # -------------------- écriture --------------------
+    def add(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        texts: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[dict]] = None,
+    ) -> None:
+        """Ajoute des lignes (un identifiant déjà présent est remplacé)."""
+        if not ids:
+            return
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        if vecs.ndim != 2 or vecs.shape[0] != len(ids):
+            raise ValueError("embeddings: une ligne par identifiant attendue")
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vecs.shape[1])
+            elif vecs.shape[1] != self.dim:
+                raise ValueError(f"Dimension {vecs.shape[1]} incompatible avec l'index ({self.dim})")
+            self.delete_ids(ids)
+            q, scales = _quantize(vecs, self.dtype)
+            norms = np.linalg.norm(vecs, axis=1).astype(np.float32)
+            if self._vectors is None or len(self.ids) == 0:
+                self._vectors, self._scales, self._norms = q, scales, norms
+            else:
+                self._vectors = np.concatenate([self._vectors, q])
+                self._norms = np.concatenate([self._norms, norms])
+                if scales is not None:
+                    self._scales = np.concatenate([self._scales, scales])
+            self.ids.extend(str(i) for i in ids)
+            self.texts.extend(list(texts) if texts is not None else [""] * len(ids))
+            self.metadatas.extend(dict(m or {}) for m in (metadatas or [{}] * len(ids)))
+            self._masks.clear()
+            self._pos = None
+            self._f32 = None
+
+    def set_rows(
+        self,
+        ids: Sequence[str],
+        texts: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[dict]] = None,
+    ) -> int:
+        """Remplace texte et/ou métadonnées de lignes existantes (vecteurs inchangés)."""
+        with self._lock:
+            pos = {cid: i for i, cid in enumerate(self.ids)}
+            n = 0
+            for j, cid in enumerate(ids):
+                i = pos.get(str(cid))
+                if i is None:
+                    continue
+                if texts is not None:
+                    self.texts[i] = texts[j]
+                if metadatas is not None:
+                    self.metadatas[i] = dict(metadatas[j] or {})
+                n += 1
+            if metadatas is not None:
+                self._masks.clear()
+            return n
+
+    def positions(self, ids: Iterable[str]) -> List[Optional[int]]:
+        """Lignes des identifiants (None si absent)."""
+        with self._lock:
+            if self._pos is None:
+                self._pos = {cid: i for i, cid in enumerate(self.ids)}
+            return [self._pos.get(str(cid)) for cid in ids]
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        """Supprime des lignes par identifiant; retourne le nombre supprimé."""
+        drop = set(str(i) for i in ids)
+        keep = [i for i, cid in enumerate(self.ids) if cid not in drop]
+        return self._keep(keep)
+
+    def delete_where(self, key: str, value) -> int:
+        """Supprime les lignes dont `metadata[key] == value` (ex. ref_doc_id)."""
+        keep = [i for i, m in enumerate(self.metadatas) if str(m.get(key)) != str(value)]
+        return self._keep(keep)
+
+    def _keep(self, keep: List[int]) -> int:
+        with self._lock:
+            removed = len(self.ids) - len(keep)
+            if not removed:
+                return 0
+            sel = np.asarray(keep, dtype=np.int64)
+            self._vectors = np.asarray(self._vectors[sel])
+            self._norms = np.asarray(self._norms[sel])
+            if self._scales is not None:
+                self._scales = np.asarray(self._scales[sel])
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self._masks.clear()
+            self._f32 = None
+            self._pos = None
+            return removed
+
+    # -------------------- persistance --------------------
+    def save(self, path) -> None:
+        """Écrit l'index dans `path` (fichiers remplacés atomiquement)."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if isinstance(self._vectors, np.memmap):
+                # Fichier mappé remplacé ci-dessous (impossible sous Windows sans copie)
+                self._vectors = np.array(self._vectors)
+            arrays = {"vectors": self._vectors, "norms": self._norms}
+            if self._scales is not None:
+                arrays["scales"] = self._scales
+            for name, arr in arrays.items():
+                if arr is None:
+                    continue
+                tmp = path / f"{name}.tmp.npy"
+                np.save(tmp, np.ascontiguousarray(arr))
+                os.replace(tmp, path / f"{name}.npy")
+            tmp = path / "rows.jsonl.tmp"
+            with tmp.open("w", encoding="utf-8") as f:
+                for cid, text, meta in zip(self.ids, self.texts, self.metadatas):
+                    f.write(json.dumps({"id": cid, "text": text, "metadata": meta}, ensure_ascii=False) + "\n")
+            os.replace(tmp, path / "rows.jsonl")
+            info = {"dim": self.dim, "dtype": self.dtype, "count": len(self.ids)}
+            (path / "meta.json").write_text(json.dumps(info), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path, mmap: bool = True, resident: bool = False) -> "FlatIndex":
+        """Charge un index; les vecteurs restent sur disque (mémoire mappée) si `mmap`."""
+        path = Path(path)
+        info = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        idx = cls(dtype=info.get("dtype", "float16"), resident=resident)
+        idx.dim = info.get("dim")
+        mode = "r" if mmap else None
+        if (path / "vectors.npy").exists():
+            idx._vectors = np.load(path / "vectors.npy", mmap_mode=mode)
+            idx._norms = np.load(path / "norms.npy")
+            if (path / "scales.npy").exists():
+                idx._scales = np.load(path / "scales.npy")
+        with (path / "rows.jsonl").open("r", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                idx.ids.append(rec["id"])
+                idx.texts.append(rec.get("text") or "")
+                idx.metadatas.append(rec.get("metadata") or {})
+        return idx
+
+    @staticmethod
+    def exists(path) -> bool:
+        return (Path(path) / "meta.json").exists()
+
+    # -------------------- recherche --------------------
+    def _value_masks(self, key: str) -> Dict[str, np.ndarray]:
+        masks = self._masks.get(key)
+        if masks is None:
+            rows: Dict[str, List[int]] = {}
+            for i, m in enumerate(self.metadatas):
+                if key in m:
+                    rows.setdefault(str(m[key]), []).append(i)
+            masks = {}
+            for val, sel in rows.items():
+                mask = np.zeros(len(self.ids), dtype=bool)
+                mask[sel] = True
+                masks[val] = mask
+            self._masks[key] = masks
+        return masks
+
+    def filter_mask(self, filters: Optional[Sequence[Tuple[str, object]]]) -> Optional[np.ndarray]:
+        """Masque booléen des lignes satisfaisant toutes les égalités (None = tout)."""
+        if not filters:
+            return None
+        with self._lock:
+            mask = np.ones(len(self.ids), dtype=bool)
+            for key, value in filters:
+                hit = self._value_masks(str(key)).get(str(value))
+                if hit is None:
+                    return np.zeros(len(self.ids), dtype=bool)
+                mask &= hit
+            return mask
+
+    def _resident_matrix(self) -> np.ndarray:
+        with self._lock:
+            if self._f32 is None:
+                m = np.asarray(self._vectors, dtype=np.float32)
+                if self._scales is not None:
+                    m = m * self._scales[:, None]
+                self._f32 = m
+            return self._f32
+
+    def _dot(self, q: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        if self.resident:
+            m = self._resident_matrix()
+            return (m if rows is None else m[rows]) @ q
+        # Conversion en float32 par blocs: BLAS sur des blocs bornés en mémoire
+        vecs = self._vectors if rows is None else self._vectors[rows]
+        out = np.empty(vecs.shape[0], dtype=np.float32)
+        for start in range(0, vecs.shape[0], _BLOCK_ROWS):
+            block = np.asarray(vecs[start:start + _BLOCK_ROWS], dtype=np.float32)
+            out[start:start + block.shape[0]] = block @ q
+        if self._scales is not None:
+            out *= self._scales if rows is None else self._scales[rows]
+        return out
+
+    def search(
+        self,
+        query: Sequence[float],
+        top_k: int = 4,
+        filters: Optional[Sequence[Tuple[str, object]]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Top-k par similarité cosinus: liste de (ligne, score), score décroissant."""
+        if not self.ids or top_k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        qn = float(np.linalg.norm(q))
+        if qn == 0.0:
+            return []
+        mask = self.filter_mask(filters)
+        rows = None
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if rows.size == 0:
+                return []
+        scores = self._dot(q, rows)
+        norms = self._norms if rows is None else self._norms[rows]
+        scores /= np.maximum(norms, 1e-12) * qn
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        pos = top if rows is None else rows[top]
+        return [(int(p), float(scores[t])) for p, t in zip(pos, top)]
+
+    def memory_bytes(self) -> int:
+        """Taille des tableaux NumPy (vecteurs, normes, échelles)."""
+        arrays = (self._vectors, self._norms, self._scales, self._f32)
+        return sum(int(a.nbytes) for a in arrays if a is not None)
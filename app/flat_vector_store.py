@@ -0,0 +1,137 @@
+"""Vector store LlamaIndex adossé à `app.flat_index.FlatIndex`.
+
+Sélectionné par `vector_store.backend: flat` dans `settings.yaml` (voir
+`app.indexer`). Les données d'une collection sont stockées dans
+`<persist_dir>/flat/<collection>/`.
+"""
+
+from pathlib import Path
+from typing import Any, List, Optional
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode, TextNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+from app.flat_index import FlatIndex
+
+FLAT_DIR = "flat"
+
+
+def flat_collection_dir(persist_dir: str, collection_name: str) -> Path:
+    """Dossier de stockage d'une collection du backend plat."""
+    return Path(persist_dir) / FLAT_DIR / collection_name
+
+
+def flat_collection_names(persist_dir: str) -> List[str]:
+    """Collections présentes sur disque pour le backend plat."""
+    root = Path(persist_dir) / FLAT_DIR
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if FlatIndex.exists(p))
+
+
+def _exact_pairs(filters: Optional[MetadataFilters]) -> list:
+    if filters is None:
+        return []
+    pairs = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            raise ValueError("Filtres imbriqués non pris en charge par le backend plat")
+        op = getattr(f, "operator", FilterOperator.EQ)
+        if op != FilterOperator.EQ:
+            raise ValueError(f"Opérateur de filtre non pris en charge par le backend plat: {op}")
+        pairs.append((f.key, f.value))
+    return pairs
+
+
+class FlatVectorStore(BasePydanticVectorStore):
+    """Vector store exact (produit matriciel NumPy), texte stocké avec les vecteurs."""
+
+    stores_text: bool = True
+    flat_metadata: bool = True
+    path: str
+    dtype: str = "float16"
+    resident: bool = False
+
+    _index: FlatIndex = PrivateAttr()
+
+    def __init__(self, path: str, dtype: str = "float16", resident: bool = False, **kwargs: Any) -> None:
+        super().__init__(path=str(path), dtype=dtype, resident=resident, **kwargs)
+        if FlatIndex.exists(path):
+            self._index = FlatIndex.load(path, resident=resident)
+        else:
+            self._index = FlatIndex(dtype=dtype, resident=resident)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FlatVectorStore"
+
+    @property
+    def client(self) -> FlatIndex:
+        return self._index
+
+    def count(self) -> int:
+        return len(self._index)
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        self._index.add(
+            ids=[n.node_id for n in nodes],
+            embeddings=[n.get_embedding() for n in nodes],
+            texts=[n.get_content() for n in nodes],
+            metadatas=[
+                node_to_metadata_dict(n, remove_text=True, flat_metadata=self.flat_metadata) for n in nodes
+            ],
+        )
+        return [n.node_id for n in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._index.delete_where("ref_doc_id", ref_doc_id)
+        self._index.delete_where("doc_id", ref_doc_id)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("Le backend plat n'accepte que des requêtes par embedding")
+        pairs = _exact_pairs(query.filters)
+        if query.doc_ids:
+            raise ValueError("Filtre par doc_ids non pris en charge par le backend plat")
+        hits = self._index.search(query.query_embedding, top_k=query.similarity_top_k, filters=pairs)
+        nodes, sims, ids = [], [], []
+        for row, score in hits:
+            nodes.append(self._node(row))
+            sims.append(score)
+            ids.append(self._index.ids[row])
+        return VectorStoreQueryResult(nodes=nodes, similarities=sims, ids=ids)
+
+    def get_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **kwargs: Any,
+    ) -> List[BaseNode]:
+        """Nœuds par identifiant (absents ignorés), dans l'ordre demandé."""
+        if node_ids is None:
+            raise ValueError("Le backend plat ne lit les nœuds que par identifiant")
+        rows = [r for r in self._index.positions(node_ids) if r is not None]
+        mask = self._index.filter_mask(_exact_pairs(filters)) if filters else None
+        return [self._node(r) for r in rows if mask is None or mask[r]]
+
+    def _node(self, row: int) -> BaseNode:
+        text = self._index.texts[row]
+        try:
+            return metadata_dict_to_node(self._index.metadatas[row], text=text)
+        except Exception:
+            return TextNode(id_=self._index.ids[row], text=text, metadata=dict(self._index.metadatas[row]))
+
+    def persist(self, persist_path: str = "", fs: Any = None) -> None:
+        # `persist_path` (fichier proposé par StorageContext) est ignoré: la
+        # collection a son propre dossier.
+        self._index.save(self.path)
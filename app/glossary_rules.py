@@ -0,0 +1,322 @@
+"""Validation, coût et compilation des règles du glossaire.
+
+Une règle regex invalide faisait silencieusement retomber `_load_resources`
+sur les règles par défaut, et rien n'empêchait un motif pathologique
+(quantificateurs imbriqués) de faire exploser le temps de normalisation de
+chaque chunk. Avant l'enregistrement (page **Glossaire**) ou en ligne de
+commande:
+
+- `validate_rules` vérifie la structure, les drapeaux, la compilation du
+  motif et les références de groupes du remplacement;
+- `profile_rules` mesure chaque règle sur un échantillon de chunks réels
+  (`sample_chunks`) dans un processus séparé, interrompu au-delà de
+  `rule_timeout_s`: une règle plus lente que `rule_max_ms` sur un chunk est
+  rejetée, au-delà de `rule_warn_us` en moyenne elle est signalée (section
+  `glossary` de `settings.yaml`);
+- `compile_glossary` écrit l'artefact précompilé lu au démarrage à la place
+  des JSON (`app.text_normalize.COMPILED_FILE`).
+
+Exemples:
+  python -m app.glossary_rules --persist-dir vectorstore
+  python -m app.glossary_rules --persist-dir vectorstore --compile
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.text_normalize import (
+    ABBR_FILE,
+    COMPILED_FILE,
+    REGEX_FILE,
+    RULE_FLAGS,
+    compile_rule,
+    sources_digest,
+)
+from app.utils.config import load_config
+
+SAMPLE_FILE = Path(__file__).resolve().parent / "test_abreviations.json"
+
+# Groupe répété contenant lui-même un quantificateur: "(a+)+", "(\w*\s?)*"...
+_NESTED_QUANTIFIER = re.compile(r"\((?:[^()\\]|\\.)*[+*](?:[^()\\]|\\.)*\)(?:[+*]|\{\d*,\d*\})")
+
+
+def glossary_settings() -> dict:
+    cfg = load_config().get("glossary", {})
+    return {
+        "sample_size": int(cfg.get("sample_size", 300)),
+        "rule_warn_us": float(cfg.get("rule_warn_us", 200.0)),
+        "rule_max_ms": float(cfg.get("rule_max_ms", 20.0)),
+        "rule_timeout_s": float(cfg.get("rule_timeout_s", 2.0)),
+    }
+
+
+# ------------------------------------------------------------------
+# Validation
+# ------------------------------------------------------------------
+
+def validate_mapping(mapping) -> dict:
+    """`errors` et `warnings` du dictionnaire (objet {abréviation: expansion})."""
+    if not isinstance(mapping, dict):
+        return {"errors": ["le dictionnaire doit être un objet JSON {abréviation: expansion}"], "warnings": []}
+    errors, warnings = [], []
+    seen: Dict[str, str] = {}
+    for k, v in mapping.items():
+        if not str(k).strip():
+            errors.append("abréviation vide")
+        if not isinstance(v, str) or not v.strip():
+            errors.append(f"{k}: expansion vide ou non textuelle")
+        # Les abréviations sont cherchées sans tenir compte de la casse
+        if k.upper() in seen:
+            warnings.append(f"{k}: même abréviation que {seen[k.upper()]} (casse ignorée), une seule expansion s'applique")
+        seen.setdefault(k.upper(), k)
+    return {"errors": errors, "warnings": warnings}
+
+
+def validate_rules(raw) -> List[dict]:
+    """Une entrée par règle: `index`, `pattern`, `errors`, `warnings`, `compiled` (ou None)."""
+    if not isinstance(raw, list):
+        return [{"index": None, "pattern": "", "errors": ["les règles doivent être une liste JSON"], "warnings": [], "compiled": None}]
+    out = []
+    for i, rule in enumerate(raw):
+        rep = {"index": i, "pattern": "", "errors": [], "warnings": [], "compiled": None}
+        out.append(rep)
+        if not isinstance(rule, dict):
+            rep["errors"].append("objet {pattern, replacement, flags} attendu")
+            continue
+        patt = rule.get("pattern")
+        rep["pattern"] = str(patt or "")
+        if not isinstance(patt, str) or not patt:
+            rep["errors"].append("motif manquant")
+            continue
+        if not isinstance(rule.get("replacement", ""), str):
+            rep["errors"].append("remplacement non textuel")
+            continue
+        flags = rule.get("flags", []) or []
+        unknown = [f for f in flags if str(f).upper() not in RULE_FLAGS] if isinstance(flags, list) else [flags]
+        if unknown:
+            rep["errors"].append(f"drapeaux inconnus {unknown} (acceptés: {', '.join(RULE_FLAGS)})")
+            continue
+        if "\u0008" in patt:
+            rep["warnings"].append("caractère retour arrière (\\b mal échappé en JSON), lu comme limite de mot")
+        try:
+            compiled, repl = compile_rule(rule)
+            compiled.sub(repl, "")  # analyse du remplacement (\1, \g<nom>)
+        except (re.error, IndexError) as e:
+            rep["errors"].append(f"regex invalide: {e}")
+            continue
+        if _NESTED_QUANTIFIER.search(compiled.pattern):
+            rep["warnings"].append("quantificateurs imbriqués: risque de retour arrière exponentiel")
+        rep["compiled"] = (compiled, repl)
+    return out
+
+
+# ------------------------------------------------------------------
+# Coût sur des chunks réels
+# ------------------------------------------------------------------
+
+def sample_chunks(persist_dir: Optional[str], n: int = 300, seed: int = 0) -> List[str]:
+    """Textes de `n` chunks tirés de l'index; à défaut, les exemples de `test_abreviations.json`."""
+    texts: List[str] = []
+    if persist_dir and os.path.isdir(persist_dir):
+        try:
+            from app.vectorstore_health import open_collections
+
+            backend = (load_config().get("vector_store", {}).get("backend") or "chroma").lower()
+            rnd = random.Random(seed)
+            seen = 0
+            for coll in open_collections(persist_dir, backend):
+                for _, _, text in coll.rows():
+                    # Échantillonnage par réservoir: une seule lecture des collections
+                    seen += 1
+                    if len(texts) < n:
+                        texts.append(text or "")
+                    else:
+                        j = rnd.randrange(seen)
+                        if j < n:
+                            texts[j] = text or ""
+        except Exception:
+            texts = []
+    if not texts:
+        try:
+            texts = [str(r.get("text", "")) for r in json.loads(SAMPLE_FILE.read_text(encoding="utf-8"))]
+        except Exception:
+            texts = []
+    return texts
+
+
+def _profile_worker(conn, rules: Sequence[Tuple[int, re.Pattern, str]], samples: Sequence[str]) -> None:
+    for i, patt, repl in rules:
+        worst = total = 0.0
+        changed = 0
+        for text in samples:
+            t0 = time.perf_counter()
+            out = patt.sub(repl, text)
+            dt = time.perf_counter() - t0
+            total += dt
+            worst = max(worst, dt)
+            changed += out != text
+        conn.send((i, total, worst, changed))
+    conn.close()
+
+
+def profile_rules(
+    rules: Sequence[Tuple[int, re.Pattern, str]],
+    samples: Sequence[str],
+    warn_us: float = 200.0,
+    max_ms: float = 20.0,
+    timeout_s: float = 2.0,
+) -> List[dict]:
+    """Coût de chaque règle `(index, motif, remplacement)` sur `samples`.
+
+    Les règles tournent dans un processus séparé: une règle qui dépasse
+    `timeout_s` (retour arrière catastrophique) est interrompue et rejetée,
+    puis la mesure reprend à la suivante. Statut: `ok`, `lente` (moyenne
+    > `warn_us` µs par chunk), `rejetée` (un chunk > `max_ms` ms) ou `timeout`.
+    """
+    pending = list(rules)
+    out: List[dict] = []
+    ctx = multiprocessing.get_context()
+    while pending:
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_profile_worker, args=(child, pending, list(samples)), daemon=True)
+        proc.start()
+        child.close()
+        while pending:
+            i = pending[0][0]
+            if not parent.poll(timeout_s):
+                proc.kill()
+                out.append({"index": i, "status": "timeout", "mean_us": None, "max_ms": None, "changed": None})
+                pending.pop(0)
+                break
+            try:
+                _, total, worst, changed = parent.recv()
+            except EOFError:
+                # Processus mort sans réponse (mémoire...): règle rejetée
+                out.append({"index": i, "status": "timeout", "mean_us": None, "max_ms": None, "changed": None})
+                pending.pop(0)
+                break
+            pending.pop(0)
+            mean_us = total / max(1, len(samples)) * 1e6
+            status = "rejetée" if worst * 1000 > max_ms else "lente" if mean_us > warn_us else "ok"
+            out.append({"index": i, "status": status, "mean_us": round(mean_us, 2), "max_ms": round(worst * 1000, 3), "changed": changed})
+        proc.join(timeout=1)
+        parent.close()
+    return out
+
+
+def check_rules(raw, samples: Sequence[str], settings: Optional[dict] = None) -> dict:
+    """Validation puis coût des règles valides; `ok` est faux si une règle est refusée."""
+    settings = settings or glossary_settings()
+    reports = validate_rules(raw)
+    valid = [(r["index"], *r["compiled"]) for r in reports if r["compiled"] is not None]
+    costs = {
+        c["index"]: c
+        for c in profile_rules(
+            valid,
+            samples,
+            warn_us=settings["rule_warn_us"],
+            max_ms=settings["rule_max_ms"],
+            timeout_s=settings["rule_timeout_s"],
+        )
+    }
+    for r in reports:
+        r.pop("compiled", None)
+        cost = costs.get(r["index"])
+        r["status"] = "erreur" if r["errors"] else cost["status"]
+        r["cost"] = cost
+    return {
+        "ok": all(r["status"] in ("ok", "lente") for r in reports),
+        "rules": reports,
+        "samples": len(samples),
+    }
+
+
+# ------------------------------------------------------------------
+# Artefact précompilé
+# ------------------------------------------------------------------
+
+def compile_glossary(mapping: dict, raw_rules: list, path: Path = COMPILED_FILE) -> Path:
+    """Écrit l'artefact lu par `_load_resources` (règles supposées validées).
+
+    L'artefact porte l'empreinte des deux fichiers JSON: il est ignoré dès
+    que l'un d'eux change sans recompilation.
+    """
+    rules = []
+    for rule in raw_rules:
+        if rule.get("pattern"):
+            patt, repl = compile_rule(rule)
+            rules.append((patt.pattern, patt.flags, repl))
+    data = {"source": sources_digest(), "mapping": dict(mapping), "rules": rules, "ts": time.time()}
+    tmp = Path(path).with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return Path(path)
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['samples']} chunks d'échantillon"]
+    for r in report["rules"]:
+        cost = r.get("cost") or {}
+        timing = f"{cost['mean_us']:9.1f} µs/chunk, pire {cost['max_ms']:8.3f} ms, {cost['changed']} modifiés" if cost.get("mean_us") is not None else ""
+        lines.append(f"  [{r['index']}] {r['status']:8s} {timing} | {r['pattern'][:60]}")
+        for e in r["errors"]:
+            lines.append(f"      erreur: {e}")
+        for w in r["warnings"]:
+            lines.append(f"      attention: {w}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Valide et mesure les règles du glossaire, écrit l'artefact compilé")
+    ap.add_argument("--persist-dir", default="vectorstore", help="Index dont les chunks servent d'échantillon")
+    ap.add_argument("--rules", default=str(REGEX_FILE), help="Fichier de règles à vérifier")
+    ap.add_argument("--sample", type=int, default=None, help="Nombre de chunks (défaut: configuration)")
+    ap.add_argument("--compile", action="store_true", help="Écrire l'artefact précompilé si tout est valide")
+    args = ap.parse_args(argv)
+
+    settings = glossary_settings()
+    try:
+        raw = json.loads(Path(args.rules).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"{args.rules}: JSON invalide ({e})", file=sys.stderr)
+        return 1
+    try:
+        mapping = json.loads(ABBR_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"{ABBR_FILE.name}: JSON invalide ({e})", file=sys.stderr)
+        return 1
+    mapping_check = validate_mapping(mapping)
+    for e in mapping_check["errors"]:
+        print(f"{ABBR_FILE.name}: erreur: {e}", file=sys.stderr)
+    for w in mapping_check["warnings"]:
+        print(f"{ABBR_FILE.name}: attention: {w}")
+
+    samples = sample_chunks(args.persist_dir, args.sample or settings["sample_size"])
+    report = check_rules(raw, samples, settings)
+    print(format_report(report))
+    if not report["ok"] or mapping_check["errors"]:
+        print("Règles refusées: corrigez-les avant de les enregistrer.", file=sys.stderr)
+        return 1
+    if args.compile:
+        if Path(args.rules).resolve() != REGEX_FILE.resolve():
+            print(f"--compile ne s'applique qu'à {REGEX_FILE.name}", file=sys.stderr)
+            return 1
+        path = compile_glossary(mapping, raw)
+        print(f"Artefact compilé: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
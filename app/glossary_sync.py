@@ -0,0 +1,345 @@
+"""Mise à jour sélective de l'index après une modification du glossaire.
+
+Chaque chunk normalisé porte la version du glossaire qui lui a été appliquée
+(`glossary_version`, voir `app.text_normalize`) et chaque version utilisée à
+l'indexation est conservée dans `glossary_versions.json` (dossier de
+persistance). Après un enregistrement du glossaire, seuls les chunks d'une
+version antérieure sont examinés.
+
+Chunks compacts (texte d'origine, développé pour l'embedding seulement):
+le texte stocké ne change pas; le chunk est ré-embeddé si son texte
+développé diffère entre l'ancienne et la nouvelle version (dictionnaire ou
+règles regex), ou si l'ancienne version est inconnue. Ses expansions
+(`glossaire`) sont recalculées dans tous les cas.
+
+Chunks développés (index antérieurs):
+
+- le dictionnaire de leur version est comparé au dictionnaire courant
+  (abréviations ajoutées, modifiées, supprimées);
+- les expansions modifiées ou supprimées sont retirées ("Station
+  d'épuration (STEP)" -> "STEP") puis les abréviations ajoutées ou modifiées
+  sont développées, sur le texte et la ligne `kv_line`;
+- un chunk dont le texte change est ré-embeddé et réécrit (vector store et
+  index plein texte); les autres reçoivent seulement la nouvelle version.
+
+Les règles regex ne sont pas réversibles: si elles ont changé entre les deux
+versions, les chunks développés concernés gardent leur version et une réindexation
+complète est nécessaire. Les chunks sans version (index antérieur, JSON de
+`build_index` non normalisés) ne sont pas touchés.
+
+Exemples:
+  python -m app.glossary_sync --persist-dir vectorstore --dry-run
+  python -m app.glossary_sync --persist-dir vectorstore --embedding-model nomic-embed-text
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.partitions import BASE_COLLECTION
+from app.text_normalize import (
+    GLOSSARY_ENTRIES_KEY,
+    GLOSSARY_VERSION_KEY,
+    embedding_text,
+    expand_mapping,
+    expand_with,
+    format_entries,
+    glossary_entries,
+    glossary_snapshot,
+    is_compact,
+)
+
+HISTORY_FILE = "glossary_versions.json"
+
+
+# ------------------------------------------------------------------
+# Versions connues
+# ------------------------------------------------------------------
+
+def load_history(persist_dir: str) -> Dict[str, dict]:
+    """{version: {"mapping", "rules", "ts"}} des glossaires utilisés pour indexer."""
+    try:
+        return json.loads((Path(persist_dir) / HISTORY_FILE).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def record_glossary(persist_dir: str, snapshot: Optional[dict] = None) -> str:
+    """Conserve le glossaire courant (ou `snapshot`) sous sa version; retourne la version."""
+    snap = snapshot or glossary_snapshot()
+    history = load_history(persist_dir)
+    if snap["version"] not in history:
+        history[snap["version"]] = {"mapping": snap["mapping"], "rules": snap["rules"], "ts": time.time()}
+        path = Path(persist_dir) / HISTORY_FILE
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(history, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+    return snap["version"]
+
+
+# ------------------------------------------------------------------
+# Différences et re-normalisation
+# ------------------------------------------------------------------
+
+def glossary_diff(old: dict, new: dict) -> dict:
+    """Abréviations ajoutées / modifiées / supprimées entre deux glossaires."""
+    old_map, new_map = old.get("mapping") or {}, new.get("mapping") or {}
+    return {
+        "added": sorted(k for k in new_map if k not in old_map),
+        "changed": sorted(k for k in new_map if k in old_map and new_map[k] != old_map[k]),
+        "removed": sorted(k for k in old_map if k not in new_map),
+        "rules_changed": (old.get("rules") or []) != (new.get("rules") or []),
+    }
+
+
+def _collapse(text: str, abbr: str, expansion: str) -> str:
+    # "expansion (ABBR)" -> "ABBR" (casse rencontrée conservée)
+    pattern = re.compile(rf"{re.escape(expansion)} \(\s*({re.escape(abbr)})\s*\)", re.IGNORECASE)
+    return pattern.sub(lambda m: m.group(1), text)
+
+
+def renormalize(text: str, old_mapping: Dict[str, str], new_mapping: Dict[str, str], diff: dict) -> str:
+    """Texte normalisé avec `old_mapping`, ramené à `new_mapping` pour les seules entrées du diff."""
+    if not text:
+        return text
+    out = text
+    for abbr in sorted([*diff["changed"], *diff["removed"]], key=len, reverse=True):
+        out = _collapse(out, abbr, old_mapping[abbr])
+    fresh = {k: new_mapping[k] for k in (*diff["added"], *diff["changed"])}
+    return expand_mapping(out, fresh) if fresh else out
+
+
+def _restamped(meta: dict, updates: Dict[str, Optional[str]], embed_hidden: Iterable[str] = ()) -> dict:
+    """Métadonnées (plates et `_node_content`) mises à jour (`None`: clé retirée).
+
+    `embed_hidden`: clés ajoutées aux métadonnées exclues de l'embedding.
+    """
+    meta = dict(meta or {})
+    node = None
+    content = meta.get("_node_content")
+    if isinstance(content, str):
+        try:
+            node = json.loads(content)
+        except ValueError:
+            node = None
+    for target in (meta, None if node is None else node.setdefault("metadata", {})):
+        if target is None:
+            continue
+        for k, v in updates.items():
+            if v is None:
+                target.pop(k, None)
+            else:
+                target[k] = v
+    if node is not None:
+        excluded = node.setdefault("excluded_embed_metadata_keys", [])
+        excluded.extend(k for k in embed_hidden if k not in excluded)
+        meta["_node_content"] = json.dumps(node, ensure_ascii=False)
+    return meta
+
+
+def _compiled(snapshot: dict) -> Tuple[Dict[str, str], List[tuple]]:
+    rules = []
+    for patt, flags, repl in snapshot.get("rules") or []:
+        try:
+            rules.append((re.compile(patt, flags), repl))
+        except re.error:
+            continue
+    return dict(snapshot.get("mapping") or {}), rules
+
+
+def _embed_content(text: str, meta: dict) -> str:
+    """Contenu embeddé du chunk (texte + métadonnées non exclues), avant expansion."""
+    from llama_index.core.schema import MetadataMode
+    from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+    try:
+        return metadata_dict_to_node(meta, text=text).get_content(metadata_mode=MetadataMode.EMBED)
+    except Exception:
+        return text
+
+
+def plan_collection(
+    rows: Iterable[Tuple[str, dict, str]],
+    history: Dict[str, dict],
+    current: dict,
+    stats: dict,
+) -> Tuple[List[tuple], List[tuple]]:
+    """Chunks à ré-embedder `(id, texte, métadonnées)` et à seulement re-versionner `(id, métadonnées)`."""
+    reembed: List[tuple] = []
+    restamp: List[tuple] = []
+    diffs: Dict[str, Optional[dict]] = {}
+    glossaries: Dict[str, Optional[tuple]] = {}
+    version = current["version"]
+    current_glossary = _compiled(current)
+    for cid, meta, text in rows:
+        stats["chunks"] += 1
+        old_version = (meta or {}).get(GLOSSARY_VERSION_KEY)
+        if not old_version:
+            stats["unversioned"] += 1
+            continue
+        if old_version == version:
+            stats["current"] += 1
+            continue
+        if is_compact(meta):
+            # Texte stocké inchangé: seul le texte développé (embedding) compte
+            if old_version not in glossaries:
+                old = history.get(old_version)
+                glossaries[old_version] = None if old is None else _compiled(old)
+            old_glossary = glossaries[old_version]
+            content = _embed_content(text or "", meta)
+            entries = glossary_entries(text or "", *current_glossary)
+            updates = {GLOSSARY_VERSION_KEY: version, GLOSSARY_ENTRIES_KEY: format_entries(entries) or None}
+            new_meta = _restamped(meta, updates, embed_hidden=[GLOSSARY_ENTRIES_KEY])
+            if old_glossary is None or expand_with(content, *old_glossary) != expand_with(content, *current_glossary):
+                reembed.append((cid, text or "", new_meta))
+            else:
+                restamp.append((cid, new_meta))
+            continue
+        if old_version not in diffs:
+            old = history.get(old_version)
+            diffs[old_version] = None if old is None else glossary_diff(old, current)
+        diff = diffs[old_version]
+        if diff is None:
+            stats["unknown_version"] += 1
+            continue
+        if diff["rules_changed"]:
+            stats["rules_changed"] += 1
+            continue
+        old_map = history[old_version]["mapping"]
+        new_text = renormalize(text or "", old_map, current["mapping"], diff)
+        kv_line = meta.get("kv_line")
+        new_kv = renormalize(kv_line, old_map, current["mapping"], diff) if isinstance(kv_line, str) else None
+        if new_text != (text or "") or (new_kv is not None and new_kv != kv_line):
+            updates = {GLOSSARY_VERSION_KEY: version}
+            if new_kv is not None:
+                updates["kv_line"] = new_kv
+            reembed.append((cid, new_text, _restamped(meta, updates)))
+        else:
+            restamp.append((cid, _restamped(meta, {GLOSSARY_VERSION_KEY: version})))
+    return reembed, restamp
+
+
+def _embed_texts(items: List[tuple], embed_model, batch_size: int) -> List[List[float]]:
+    """Embeddings des chunks (texte + métadonnées non exclues, comme à l'indexation)."""
+    texts = [embedding_text(_embed_content(text, meta), meta) for _, text, meta in items]
+    out: List[List[float]] = []
+    for i in range(0, len(texts), batch_size):
+        out.extend(embed_model.get_text_embedding_batch(texts[i:i + batch_size]))
+    return out
+
+
+def _default_embed_model(embedding_name: Optional[str], ollama_base_url: str):
+    from llama_index.embeddings.ollama import OllamaEmbedding
+
+    from app.utils.config import load_config
+
+    return OllamaEmbedding(
+        model_name=embedding_name or load_config()["model"]["embedding_name"],
+        base_url=ollama_base_url,
+        ollama_additional_kwargs={"keep_alive": "30m"},
+    )
+
+
+def sync_glossary(
+    persist_dir: str,
+    embed_model=None,
+    embedding_name: Optional[str] = None,
+    backend: Optional[str] = None,
+    base_collection: str = BASE_COLLECTION,
+    dry_run: bool = False,
+    batch_size: int = 64,
+    ollama_base_url: str = "http://127.0.0.1:11434",
+) -> dict:
+    """Ramène les chunks de `persist_dir` à la version courante du glossaire.
+
+    `embed_model`: modèle LlamaIndex (par défaut `OllamaEmbedding` de
+    `embedding_name`, celui de l'index). Retourne les compteurs: `chunks`,
+    `current`, `reembedded`, `restamped`, `unversioned`, `unknown_version`,
+    `rules_changed`, et `version`.
+    """
+    from app.chunk_browser import chunk_source
+    from app.chunk_search import open_search_index
+    from app.vectorstore_health import open_collections
+
+    if backend is None:
+        from app.utils.config import load_config
+
+        backend = (load_config().get("vector_store", {}).get("backend") or "chroma").lower()
+    current = glossary_snapshot()
+    record_glossary(persist_dir, current)
+    history = load_history(persist_dir)
+    stats = {k: 0 for k in ("chunks", "current", "reembedded", "restamped", "unversioned", "unknown_version", "rules_changed")}
+    stats["version"] = current["version"]
+    search = None if dry_run else open_search_index(persist_dir)
+    try:
+        for coll in open_collections(persist_dir, backend, base_collection):
+            reembed, restamp = plan_collection(coll.rows(), history, current, stats)
+            stats["reembedded"] += len(reembed)
+            stats["restamped"] += len(restamp)
+            if dry_run:
+                continue
+            if reembed:
+                if embed_model is None:
+                    embed_model = _default_embed_model(embedding_name, ollama_base_url)
+                embeddings = _embed_texts(reembed, embed_model, batch_size)
+                coll.update(
+                    [cid for cid, _, _ in reembed],
+                    [meta for _, _, meta in reembed],
+                    texts=[text for _, text, _ in reembed],
+                    embeddings=embeddings,
+                )
+                search.upsert(
+                    coll.name,
+                    [(cid, chunk_source(meta), str(meta.get("json_path", "") or ""), text) for cid, text, meta in reembed],
+                )
+            if restamp:
+                coll.update([cid for cid, _ in restamp], [meta for _, meta in restamp])
+    finally:
+        if search is not None:
+            search.close()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Re-normalise et ré-embedde les seuls chunks touchés par le glossaire")
+    ap.add_argument("--persist-dir", default="vectorstore", help="Dossier de persistance")
+    ap.add_argument("--collection", default=BASE_COLLECTION, help="Collection de base (partitions comprises)")
+    ap.add_argument("--backend", default=None, choices=["chroma", "flat"], help="Backend (défaut: configuration)")
+    ap.add_argument("--embedding-model", default=None, help="Modèle d'embedding de l'index (défaut: configuration)")
+    ap.add_argument("--ollama-base-url", default="http://127.0.0.1:11434")
+    ap.add_argument("--dry-run", action="store_true", help="Compter les chunks concernés sans rien modifier")
+    args = ap.parse_args(argv)
+
+    if not os.path.isdir(args.persist_dir):
+        raise SystemExit(f"Dossier de persistance introuvable: {args.persist_dir}")
+    stats = sync_glossary(
+        args.persist_dir,
+        embedding_name=args.embedding_model,
+        backend=args.backend,
+        base_collection=args.collection,
+        dry_run=args.dry_run,
+        ollama_base_url=args.ollama_base_url,
+    )
+    verb = "à ré-embedder" if args.dry_run else "ré-embeddés"
+    print(
+        f"Glossaire {stats['version']}: {stats['chunks']} chunks, {stats['current']} déjà à jour,"
+        f" {stats['reembedded']} {verb}, {stats['restamped']} inchangés (version mise à jour)"
+    )
+    if stats["unversioned"]:
+        print(f"{stats['unversioned']} chunks sans version (non normalisés ou index antérieur) ignorés.")
+    if stats["unknown_version"]:
+        print(f"{stats['unknown_version']} chunks d'une version inconnue de {HISTORY_FILE}: réindexation complète nécessaire.")
+    if stats["rules_changed"]:
+        print(f"{stats['rules_changed']} chunks concernés par une modification des règles regex: réindexation complète nécessaire.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,409 @@
+"""Indexation en tâche de fond, dans un processus séparé, avec reprise.
+
+Le bouton "📥 Charger & indexer" bloquait la session Streamlit pendant toute
+la reconstruction, et un rafraîchissement du navigateur l'interrompait. Une
+tâche d'indexation tourne maintenant dans son propre processus:
+
+- chaque tâche a un dossier `<persist_dir>/jobs/<id>/` avec `state.json`
+  (paramètres, statut, progression), `checkpoint.jsonl` (une ligne par
+  fichier indexé, écrite et synchronisée sur disque avec les tables annexes
+  de l'index, au plus toutes les `SIDECAR_FLUSH_SEC` secondes) et `log.txt`;
+- la progression (fichiers, chunks, vecteurs/s, temps restant estimé) est
+  réécrite dans `state.json` après chaque fichier et toutes les quelques
+  secondes (battement de cœur), et l'interface la relit;
+- une tâche dont le battement de cœur s'est arrêté (processus tué, machine
+  redémarrée) est "interrompue": la relancer reprend après le dernier
+  fichier enregistré. Un fichier modifié depuis est réindexé.
+
+Exemples:
+  python -m app.index_jobs start --data-dir data --persist-dir vectorstore
+  python -m app.index_jobs status --persist-dir vectorstore
+  python -m app.index_jobs resume --persist-dir vectorstore
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional
+
+JOBS_DIR = "jobs"
+STATE_FILE = "state.json"
+CHECKPOINT_FILE = "checkpoint.jsonl"
+LOG_FILE = "log.txt"
+
+HEARTBEAT_SEC = 5.0
+# Tables annexes (plein texte, sites, enregistrements) réécrites au plus à ce rythme
+SIDECAR_FLUSH_SEC = 30.0
+STALE_SEC = 30.0
+
+_ACTIVE = ("queued", "running")
+
+
+# ------------------------------------------------------------------
+# État et points de reprise
+# ------------------------------------------------------------------
+
+def jobs_root(persist_dir: str) -> Path:
+    return Path(persist_dir) / JOBS_DIR
+
+
+def _write_state(job_dir: Path, state: dict) -> None:
+    # Écriture atomique: l'interface ne lit jamais un fichier à moitié écrit
+    tmp = job_dir / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, job_dir / STATE_FILE)
+
+
+def read_state(job_dir: Path) -> dict:
+    """État d'une tâche; `running` sans battement de cœur récent devient `interrupted`."""
+    try:
+        state = json.loads((Path(job_dir) / STATE_FILE).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    if state.get("status") in _ACTIVE and time.time() - float(state.get("heartbeat") or 0) > STALE_SEC:
+        state["status"] = "interrupted"
+    return state
+
+
+def list_jobs(persist_dir: str) -> List[Path]:
+    """Dossiers des tâches, de la plus ancienne à la plus récente."""
+    root = jobs_root(persist_dir)
+    return sorted(p for p in root.iterdir() if (p / STATE_FILE).exists()) if root.is_dir() else []
+
+
+def latest_job(persist_dir: str) -> Optional[Path]:
+    jobs = list_jobs(persist_dir)
+    return jobs[-1] if jobs else None
+
+
+def active_job(persist_dir: str) -> Optional[Path]:
+    for job_dir in reversed(list_jobs(persist_dir)):
+        if read_state(job_dir).get("status") in _ACTIVE:
+            return job_dir
+    return None
+
+
+def file_signature(path: Path) -> Dict[str, object]:
+    st = path.stat()
+    return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+
+def read_checkpoint(job_dir: Path) -> Dict[str, dict]:
+    """Fichiers déjà indexés ({chemin: ligne}); une ligne tronquée est ignorée."""
+    done: Dict[str, dict] = {}
+    path = Path(job_dir) / CHECKPOINT_FILE
+    if not path.exists():
+        return done
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if rec.get("file"):
+                done[str(rec["file"])] = rec
+    return done
+
+
+def _append_checkpoint(f, rec: dict) -> None:
+    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def pending_files(files: List[Path], done: Dict[str, dict]) -> List[Path]:
+    """Fichiers à (ré)indexer: absents du point de reprise ou modifiés depuis."""
+    out = []
+    for p in files:
+        rec = done.get(str(p))
+        if rec is None or any(rec.get(k) != v for k, v in file_signature(p).items()):
+            out.append(p)
+    return out
+
+
+def list_data_files(data_dir: str, extensions: Optional[List[str]] = None) -> List[Path]:
+    allowed = {e.lower() for e in extensions} if extensions else None
+    return sorted(
+        p for p in Path(data_dir).rglob("*")
+        if p.is_file() and (allowed is None or p.suffix.lower() in allowed)
+    )
+
+
+def progress(state: dict, now: Optional[float] = None) -> dict:
+    """Débit et temps restant estimés depuis le début de l'exécution courante.
+
+    Le temps restant est extrapolé sur les octets restants, les fichiers
+    (JSON volumineux, PDF d'une page) étant de tailles très différentes.
+    """
+    now = time.time() if now is None else now
+    elapsed = max(1e-6, now - float(state.get("run_started_at") or now))
+    run_vectors = int(state.get("vectors", 0)) - int(state.get("run_vectors_start", 0))
+    run_bytes = int(state.get("bytes_done", 0)) - int(state.get("run_bytes_start", 0))
+    remaining = max(0, int(state.get("bytes_total", 0)) - int(state.get("bytes_done", 0)))
+    eta = remaining * elapsed / run_bytes if run_bytes > 0 else None
+    return {"elapsed_sec": round(elapsed, 1), "vectors_per_sec": round(run_vectors / elapsed, 2), "eta_sec": eta}
+
+
+# ------------------------------------------------------------------
+# Exécution (processus de la tâche)
+# ------------------------------------------------------------------
+
+class _Heartbeat(threading.Thread):
+    """Réécrit l'état à intervalle régulier tant que la tâche tourne."""
+
+    def __init__(self, job_dir: Path, state: dict, lock: threading.Lock) -> None:
+        super().__init__(daemon=True)
+        self.job_dir, self.state, self.lock = job_dir, state, lock
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(HEARTBEAT_SEC):
+            with self.lock:
+                self.state["heartbeat"] = time.time()
+                self.state.update(progress(self.state))
+                _write_state(self.job_dir, self.state)
+
+
+def run_job(job_dir: Path) -> int:
+    """Indexe les fichiers de la tâche non encore enregistrés dans le point de reprise."""
+    from app.indexer import IndexSidecars, build_or_load_partitioned_index, get_vector_count
+    from app.loader import load_documents
+    from app.metrics import Timings, append_metrics, recording
+
+    job_dir = Path(job_dir)
+    state = json.loads((job_dir / STATE_FILE).read_text(encoding="utf-8"))
+    params = state["params"]
+    files = list_data_files(params["data_dir"], params.get("extensions"))
+    done = read_checkpoint(job_dir)
+    sigs = {str(p): file_signature(p) for p in files}
+    todo = pending_files(files, done)
+    pending = set(todo)
+    kept = [done[str(p)] for p in files if str(p) in done and p not in pending]
+
+    now = time.time()
+    lock = threading.Lock()
+    state.update({
+        "status": "running",
+        "pid": os.getpid(),
+        "heartbeat": now,
+        "started_at": state.get("started_at") or now,
+        "run_started_at": now,
+        "files_total": len(files),
+        "files_done": len(kept),
+        "bytes_total": sum(int(s["size"]) for s in sigs.values()),
+        "bytes_done": sum(int(r.get("size", 0)) for r in kept),
+        "docs": sum(int(r.get("docs", 0)) for r in kept),
+        "chunks": sum(int(r.get("chunks", 0)) for r in kept),
+        "vectors": sum(int(r.get("vectors", 0)) for r in kept),
+        "errors": sum(1 for r in kept if r.get("error")),
+        "current_file": None,
+        "error": None,
+    })
+    state["run_vectors_start"], state["run_bytes_start"] = state["vectors"], state["bytes_done"]
+    _write_state(job_dir, state)
+    beat = _Heartbeat(job_dir, state, lock)
+    beat.start()
+
+    index_kwargs = {k: v for k, v in params.items() if k not in ("data_dir", "extensions")}
+    stages = Timings()
+    sidecars = IndexSidecars(index_kwargs["persist_dir"])
+    # Points de reprise écrits après les tables annexes: un fichier dont les
+    # annexes sont perdues (processus tué) est réindexé à la reprise
+    unflushed: List[dict] = []
+    last_flush = time.monotonic()
+
+    def commit(ckpt) -> None:
+        nonlocal last_flush
+        sidecars.flush()
+        for rec in unflushed:
+            _append_checkpoint(ckpt, rec)
+        unflushed.clear()
+        last_flush = time.monotonic()
+
+    try:
+        with (job_dir / CHECKPOINT_FILE).open("a", encoding="utf-8") as ckpt:
+            try:
+                for path in todo:
+                    with lock:
+                        state["current_file"] = str(path)
+                    rec = {"file": str(path), **sigs[str(path)], "docs": 0, "chunks": 0, "vectors": 0}
+                    try:
+                        with recording(stages):
+                            docs = load_documents(params["data_dir"], input_files=[str(path)])
+                    except Exception as e:
+                        # Fichier illisible: noté puis ignoré, la tâche continue
+                        docs, rec["error"] = [], f"{type(e).__name__}: {e}"
+                    if docs:
+                        stats: dict = {}
+                        with recording(stages):
+                            build_or_load_partitioned_index(
+                                data_documents=docs, dedup_stats=stats, sidecars=sidecars, **index_kwargs
+                            )
+                        rec.update({
+                            "docs": len(docs),
+                            "chunks": int(stats.get("chunks", 0)),
+                            "vectors": int(stats.get("kept", stats.get("chunks", 0))),
+                        })
+                    unflushed.append(rec)
+                    if time.monotonic() - last_flush >= SIDECAR_FLUSH_SEC:
+                        commit(ckpt)
+                    with lock:
+                        state["files_done"] += 1
+                        state["bytes_done"] += int(rec["size"])
+                        for k in ("docs", "chunks", "vectors"):
+                            state[k] += rec[k]
+                        state["errors"] += 1 if rec.get("error") else 0
+                        state["stages"] = stages.as_dict()["spans"]
+                        state["heartbeat"] = time.time()
+                        state.update(progress(state))
+                        _write_state(job_dir, state)
+            finally:
+                # Fichiers déjà indexés: annexes et points de reprise, même en cas d'échec
+                commit(ckpt)
+        status, error = "done", None
+    except Exception as e:
+        traceback.print_exc()
+        status, error = "failed", f"{type(e).__name__}: {e}"
+    finally:
+        beat.stopped.set()
+        beat.join()
+
+    with lock:
+        state.update({"status": status, "error": error, "current_file": None, "finished_at": time.time()})
+        state.update(progress(state))
+        if status == "done":
+            state["vector_count"] = get_vector_count(index_kwargs["persist_dir"])
+        _write_state(job_dir, state)
+    try:
+        append_metrics(index_kwargs["persist_dir"], "index", stages, job=job_dir.name, files=len(todo))
+    except Exception:
+        pass
+    return 0 if status == "done" else 1
+
+
+# ------------------------------------------------------------------
+# Lancement (depuis l'interface ou la ligne de commande)
+# ------------------------------------------------------------------
+
+def _spawn(job_dir: Path) -> None:
+    root = Path(__file__).resolve().parents[1]
+    log = (job_dir / LOG_FILE).open("a", encoding="utf-8")
+    kwargs: dict = {"cwd": str(root), "stdout": log, "stderr": subprocess.STDOUT, "stdin": subprocess.DEVNULL}
+    # Processus détaché: survit à la fin de la session Streamlit
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS
+    else:
+        kwargs["start_new_session"] = True
+    subprocess.Popen([sys.executable, "-m", "app.index_jobs", "run", str(job_dir)], **kwargs)
+    log.close()
+
+
+def _queue(job_dir: Path, state: dict) -> None:
+    state.update({"status": "queued", "heartbeat": time.time(), "error": None})
+    _write_state(job_dir, state)
+
+
+def start_job(data_dir: str, persist_dir: str, **index_kwargs) -> Path:
+    """Crée une tâche et lance son processus; `index_kwargs` va à l'indexeur.
+
+    Lève RuntimeError si une tâche est déjà en cours sur ce dossier.
+    """
+    running = active_job(persist_dir)
+    if running is not None:
+        raise RuntimeError(f"Indexation déjà en cours: {running.name}")
+    job_dir = jobs_root(persist_dir) / time.strftime("%Y%m%d-%H%M%S")
+    job_dir.mkdir(parents=True, exist_ok=False)
+    params = {"data_dir": str(data_dir), "persist_dir": str(persist_dir), **index_kwargs}
+    _queue(job_dir, {"job_id": job_dir.name, "params": params, "created_at": time.time()})
+    _spawn(job_dir)
+    return job_dir
+
+
+def resume_job(job_dir: Path) -> Path:
+    """Relance une tâche interrompue ou en échec à partir de son point de reprise."""
+    job_dir = Path(job_dir)
+    state = read_state(job_dir)
+    if state.get("status") in _ACTIVE:
+        raise RuntimeError(f"Indexation déjà en cours: {job_dir.name}")
+    if state.get("status") == "done":
+        raise RuntimeError(f"Tâche déjà terminée: {job_dir.name}")
+    _queue(job_dir, state)
+    _spawn(job_dir)
+    return job_dir
+
+
+def format_status(state: dict) -> str:
+    if not state:
+        return "Aucune tâche."
+    eta = state.get("eta_sec")
+    eta_s = f"{eta / 60:.1f} min" if isinstance(eta, (int, float)) else "?"
+    line = (
+        f"[{state.get('job_id')}] {state.get('status')} | fichiers {state.get('files_done', 0)}/{state.get('files_total', '?')}"
+        f" | chunks {state.get('chunks', 0)} | vecteurs {state.get('vectors', 0)}"
+        f" | {state.get('vectors_per_sec', 0)} vecteurs/s | reste ~{eta_s}"
+    )
+    if state.get("errors"):
+        line += f" | fichiers illisibles {state['errors']}"
+    if state.get("error"):
+        line += f"\nErreur: {state['error']}"
+    return line
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Indexation en tâche de fond (avec reprise)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_start = sub.add_parser("start", help="Lancer une nouvelle indexation")
+    p_start.add_argument("--data-dir", default="data")
+    p_start.add_argument("--persist-dir", default="vectorstore")
+    p_start.add_argument("--llm-model", default="mistral")
+    p_start.add_argument("--embedding-model", default="nomic-embed-text")
+    p_start.add_argument("--chunk-size", type=int, default=1000)
+    p_start.add_argument("--chunk-overlap", type=int, default=150)
+    for name in ("status", "resume"):
+        p = sub.add_parser(name, help="État de la dernière tâche" if name == "status" else "Reprendre la dernière tâche")
+        p.add_argument("--persist-dir", default="vectorstore")
+    p_run = sub.add_parser("run", help="(interne) exécuter une tâche dans ce processus")
+    p_run.add_argument("job_dir")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "run":
+        return run_job(Path(args.job_dir))
+    if args.cmd == "start":
+        try:
+            job_dir = start_job(
+                args.data_dir,
+                args.persist_dir,
+                llm_name=args.llm_model,
+                embedding_name=args.embedding_model,
+                chunk_size=args.chunk_size,
+                chunk_overlap=args.chunk_overlap,
+            )
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        print(f"Tâche lancée: {job_dir}")
+        return 0
+    job_dir = latest_job(args.persist_dir)
+    if job_dir is None:
+        print("Aucune tâche.")
+        return 0
+    if args.cmd == "resume":
+        try:
+            resume_job(job_dir)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        print(f"Tâche relancée: {job_dir}")
+        return 0
+    print(format_status(read_state(job_dir)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,24 +4,133 @@ Ce module configure LlamaIndex (LLM, embeddings, découpage en chunks)
 et s'appuie sur Chroma pour la persistance. Il expose une fonction
 `build_or_load_index` qui tente d'abord de charger un index existant
 depuis le stockage persistant, puis le reconstruit à partir de documents
-si nécessaire.
+si nécessaire, ainsi que `build_or_load_partitioned_index` qui répartit les
+documents en une collection par type d'actif (voir `app.partitions`).
+
+Le stockage des vecteurs est choisi par `vector_store.backend` dans
+`settings.yaml`: `chroma` (par défaut) ou `flat`, index NumPy exact en
+mémoire mappée (voir `app.flat_index`). Le docstore LlamaIndex est un
+fichier SQLite lu à la demande (`docstore.sqlite`, voir `app.sqlite_docstore`).
+Les chunks en double (exacts ou quasi-doublons) ne sont pas vectorisés
+(section `dedup` de la configuration, voir `app.dedup`). Les chunks
+vectorisés sont aussi indexés en plein texte (`app.chunk_search`). La
+version du glossaire appliquée est conservée pour les mises à jour
+sélectives (`app.glossary_sync`). Ces tables annexes (avec le répertoire des
+sites et la table des enregistrements) sont écrites une fois par tâche ou
+par exécution (`IndexSidecars`). Les chunks gardent leurs abréviations
+d'origine: seul le texte embeddé est développé (`embed_chunks`).
 """
 
+from __future__ import annotations
+
+import json
+import logging
 import os
-from typing import Optional, Sequence
-
-from chromadb import PersistentClient
-from llama_index.core import (
-    Settings,
-    StorageContext,
-    VectorStoreIndex,
-    load_index_from_storage,
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from app.chunk_search import node_rows, open_search_index
+from app.dedup import DEDUP_FILE, DedupIndex
+from app.glossary_sync import record_glossary
+from app.metrics import span
+from app.partitions import (
+    BASE_COLLECTION,
+    PartitionedIndex,
+    collection_name as partition_collection,
+    group_by_partition,
+    partition_of_collection,
 )
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.schema import Document
-from llama_index.embeddings.ollama import OllamaEmbedding
-from llama_index.llms.ollama import Ollama
-from llama_index.vector_stores.chroma import ChromaVectorStore
+from app.records_table import update_records_table
+from app.site_metadata import update_gazetteer
+from app.text_normalize import embedding_text
+from app.utils.config import load_config
+
+# LlamaIndex, Chroma et les clients Ollama (plusieurs secondes d'import) ne
+# sont chargés qu'à la construction / au chargement d'un index: la page
+# Streamlit et les CLI qui ne font que compter les vecteurs démarrent vite.
+if TYPE_CHECKING:
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.schema import Document
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSidecars:
+    """Tables annexes d'une indexation, écrites en une fois par `flush()`.
+
+    Les lignes plein texte des chunks vectorisés et les métadonnées des
+    documents sont cumulées au fil des lots; `flush()` met à jour l'index
+    plein texte, l'historique du glossaire, `sites.json` et la table des
+    enregistrements. Ces deux fichiers sont relus et réécrits en entier: une
+    écriture par lot rendait l'indexation quadratique. Une erreur est
+    journalisée sans interrompre l'indexation.
+    """
+
+    def __init__(self, persist_dir: str) -> None:
+        self.persist_dir = persist_dir
+        self._rows: Dict[str, List[tuple]] = {}
+        self._metadatas: List[dict] = []
+
+    def add(self, collection: str, nodes: Sequence, documents: Sequence[Document]) -> None:
+        self._rows.setdefault(collection, []).extend(node_rows(nodes))
+        self._metadatas.extend(dict(d.metadata) for d in documents)
+
+    def flush(self) -> None:
+        rows, metadatas = self._rows, self._metadatas
+        self._rows, self._metadatas = {}, []
+        if not rows and not metadatas:
+            return
+        # Recherche plein texte (page Chunks, inspect_chunks --query)
+        try:
+            index = open_search_index(self.persist_dir)
+            try:
+                for collection, part in rows.items():
+                    index.upsert(collection, part)
+            finally:
+                index.close()
+        except Exception:
+            logger.exception("Index plein texte non mis à jour (%s)", self.persist_dir)
+        # Glossaire appliqué aux chunks (mise à jour sélective, app.glossary_sync)
+        try:
+            record_glossary(self.persist_dir)
+        except Exception:
+            logger.exception("Historique du glossaire non mis à jour (%s)", self.persist_dir)
+        # Répertoire des communes/sites connus, utilisé pour filtrer les requêtes
+        try:
+            update_gazetteer(self.persist_dir, metadatas)
+        except Exception:
+            logger.exception("Répertoire des sites non mis à jour (%s)", self.persist_dir)
+        # Table des enregistrements JSON pour les questions de comptage/liste
+        try:
+            update_records_table(self.persist_dir, metadatas)
+        except Exception:
+            logger.exception("Table des enregistrements non mise à jour (%s)", self.persist_dir)
+
+
+def embed_chunks(nodes, embed_model) -> None:
+    """Calcule `node.embedding` des nœuds qui n'en ont pas.
+
+    Le texte embeddé est celui de `MetadataMode.EMBED`, abréviations
+    développées pour les chunks compacts (`app.text_normalize.embedding_text`);
+    le texte stocké et envoyé au LLM reste compact.
+    """
+    from llama_index.core.schema import MetadataMode
+
+    todo = [n for n in nodes if n.embedding is None]
+    if not todo:
+        return
+    texts = [embedding_text(n.get_content(metadata_mode=MetadataMode.EMBED), n.metadata) for n in todo]
+    for n, emb in zip(todo, embed_model.get_text_embedding_batch(texts)):
+        n.embedding = emb
+
+
+def _vector_backend(backend: Optional[str], dtype: Optional[str]) -> Tuple[str, str]:
+    # Paramètres explicites prioritaires, sinon section `vector_store` de la config
+    cfg = load_config().get("vector_store", {}) if backend is None or dtype is None else {}
+    backend = (backend or cfg.get("backend") or "chroma").lower()
+    dtype = dtype or cfg.get("dtype") or "float16"
+    if backend not in ("chroma", "flat"):
+        raise ValueError(f"Backend vectoriel inconnu: {backend} (attendu: chroma ou flat)")
+    return backend, dtype
 
 
 def build_or_load_index(
@@ -36,6 +145,11 @@ def build_or_load_index(
     llm_num_gpu: Optional[int] = None,
     embedding_num_gpu: Optional[int] = None,
     request_timeout_sec: int = 600,
+    collection_name: str = BASE_COLLECTION,
+    vector_backend: Optional[str] = None,
+    vector_dtype: Optional[str] = None,
+    dedup_stats: Optional[dict] = None,
+    sidecars: Optional[IndexSidecars] = None,
 ) -> VectorStoreIndex:
     """Charge un index persistant ou le construit depuis des documents.
 
@@ -46,12 +160,30 @@ def build_or_load_index(
     - embedding_name: nom du modèle d'embeddings servi par Ollama pour le vecteur.
     - chunk_size: taille des morceaux (tokens/caractères selon le splitter) pour le découpage.
     - chunk_overlap: recouvrement entre morceaux pour conserver le contexte local.
+    - collection_name: collection Chroma cible (les stores LlamaIndex d'une
+      collection autre que `eau_docs` sont persistés dans `partitions/<nom>`).
+    - vector_backend / vector_dtype: stockage des vecteurs (`chroma` ou `flat`,
+      `float16` ou `int8` pour `flat`); par défaut la section `vector_store`
+      de la configuration.
+    - dedup_stats: dict (optionnel) où sont cumulés les compteurs du
+      dédoublonnage (`chunks`, `kept`, `exact`, `near`); sans
+      dédoublonnage, seuls `chunks` et `kept` (chunks vectorisés).
+    - sidecars: tables annexes à compléter (écrites par l'appelant via
+      `flush()`); sans elles, écrites avant le retour.
 
     Retourne:
     - Un `VectorStoreIndex` prêt à l'emploi, chargé depuis le stockage s'il existe,
       sinon reconstruit à partir de `data_documents` et persisté.
     """
 
+    from llama_index.core import Settings, StorageContext, VectorStoreIndex, load_index_from_storage
+    from llama_index.embeddings.ollama import OllamaEmbedding
+    from llama_index.llms.ollama import Ollama
+    from llama_index.vector_stores.chroma import ChromaVectorStore
+
+    from app.node_store import make_splitter, split_documents
+    from app.sqlite_docstore import open_docstore
+
     # Configuration globale de LlamaIndex: LLM, embeddings et stratégie de découpage.
     llm_kwargs = {"num_ctx": llm_num_ctx}
     if llm_num_gpu is not None:
@@ -72,25 +204,42 @@ def build_or_load_index(
         request_timeout=request_timeout_sec,
         ollama_additional_kwargs=embed_kwargs,
     )
-    Settings.node_parser = SentenceSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
+    Settings.node_parser = make_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
     # S'assure que le dossier de persistance existe (idempotent).
     os.makedirs(persist_dir, exist_ok=True)
 
-    # Initialise un client Chroma persistant pointant vers `persist_dir`.
-    client = PersistentClient(path=persist_dir)
-
-    # Récupère ou crée une collection Chroma nommée "eau_docs".
-    try:
-        collection = client.get_collection("eau_docs")
-    except Exception:
-        collection = client.create_collection("eau_docs")
+    # Docstore/index store: à la racine pour la collection historique,
+    # dans un sous-dossier par partition sinon (évite les écrasements).
+    store_dir = persist_dir
+    if collection_name != BASE_COLLECTION:
+        store_dir = os.path.join(persist_dir, "partitions", collection_name)
+        os.makedirs(store_dir, exist_ok=True)
 
     # Prépare le vector store pour LlamaIndex (contexte défini selon le scénario build/load).
-    vector_store = ChromaVectorStore(chroma_collection=collection)
+    backend, dtype = _vector_backend(vector_backend, vector_dtype)
+    if backend == "flat":
+        from app.flat_vector_store import FlatVectorStore, flat_collection_dir
+
+        vector_store = FlatVectorStore(
+            str(flat_collection_dir(persist_dir, collection_name)),
+            dtype=dtype,
+            resident=bool(load_config().get("vector_store", {}).get("resident")),
+        )
+        stored_count = vector_store.count
+    else:
+        from chromadb import PersistentClient
+
+        # Initialise un client Chroma persistant pointant vers `persist_dir`.
+        client = PersistentClient(path=persist_dir)
+
+        # Récupère ou crée la collection Chroma ("eau_docs" par défaut).
+        try:
+            collection = client.get_collection(collection_name)
+        except Exception:
+            collection = client.create_collection(collection_name)
+        vector_store = ChromaVectorStore(chroma_collection=collection)
+        stored_count = collection.count
 
     # Si des documents sont fournis pendant l'étape d'indexation, on reconstruit directement
     # l'index puis on le persiste, sans tenter de charger un index inexistant.
@@ -99,19 +248,52 @@ def build_or_load_index(
         # afin d'éviter toute tentative de lecture de docstore.json inexistant.
         storage_context_build = StorageContext.from_defaults(
             vector_store=vector_store,
+            docstore=open_docstore(store_dir),
         )
-        index = VectorStoreIndex.from_documents(
-            data_documents,
-            storage_context=storage_context_build,
-        )
-        index.storage_context.persist(persist_dir)
+        # Découpage mémorisé (`nodes.sqlite`): un document inchangé n'est pas
+        # redécoupé, et l'export des chunks relit exactement ces nœuds.
+        for doc in data_documents:
+            storage_context_build.docstore.set_document_hash(doc.get_doc_id(), doc.hash)
+        with span("split"):
+            nodes = split_documents(data_documents, Settings.node_parser, persist_dir)
+        dedup_cfg = load_config().get("dedup", {})
+        if dedup_cfg.get("enabled", True):
+            dedup = DedupIndex(os.path.join(persist_dir, DEDUP_FILE))
+            try:
+                with span("dedup"):
+                    nodes = dedup.filter_nodes(
+                        nodes,
+                        collection_name,
+                        threshold=float(dedup_cfg.get("threshold", 0.9)),
+                        min_words=int(dedup_cfg.get("min_words", 40)),
+                        stats=dedup_stats,
+                    )
+            finally:
+                dedup.close()
+        elif dedup_stats is not None:
+            for k in ("chunks", "kept"):
+                dedup_stats[k] = dedup_stats.get(k, 0) + len(nodes)
+        # Embeddings calculés ici (texte développé des chunks compacts) pour
+        # mesurer séparément l'embedding et l'écriture dans le vector store
+        with span("embed"):
+            embed_chunks(nodes, Settings.embed_model)
+        with span("upsert"):
+            index = VectorStoreIndex(nodes=nodes, storage_context=storage_context_build)
+            index.storage_context.persist(store_dir)
+        if sidecars is None:
+            own = IndexSidecars(persist_dir)
+            own.add(collection_name, nodes, data_documents)
+            own.flush()
+        else:
+            sidecars.add(collection_name, nodes, data_documents)
         return index
 
     # Sinon, on tente d'abord de CHARGER un index existant depuis le stockage persistant.
     try:
         storage_context_load = StorageContext.from_defaults(
             vector_store=vector_store,
-            persist_dir=persist_dir,
+            docstore=open_docstore(store_dir),
+            persist_dir=store_dir,
         )
         index = load_index_from_storage(storage_context=storage_context_load)
         return index
@@ -119,7 +301,7 @@ def build_or_load_index(
         # Si l'index store n'est pas présent mais que des vecteurs existent déjà,
         # on reconstitue un index à partir du vector store (Chroma) uniquement.
         try:
-            if collection.count() > 0:
+            if stored_count() > 0:
                 return VectorStoreIndex.from_vector_store(
                     vector_store=vector_store,
                     storage_context=storage_context_load,
@@ -133,20 +315,121 @@ def build_or_load_index(
             "Ajoute des fichiers dans 'data/' puis clique sur 'Charger & indexer'."
         )
 
-def get_vector_count(persist_dir: str, collection_name: str = "eau_docs") -> int:
-    """Retourne le nombre de vecteurs présents dans la collection Chroma.
+def _collection_names(client) -> list:
+    # chromadb < 0.6 retourne des objets Collection, >= 0.6 des noms
+    names = []
+    for c in client.list_collections():
+        names.append(getattr(c, "name", c))
+    return [str(n) for n in names]
+
+
+def _stored_collection_names(persist_dir: str, backend: str) -> list:
+    if backend == "flat":
+        from app.flat_vector_store import flat_collection_names
 
-    Si la collection ou le dossier n'existe pas, retourne 0.
+        return flat_collection_names(persist_dir)
+    from chromadb import PersistentClient
+
+    return _collection_names(PersistentClient(path=persist_dir))
+
+
+def build_or_load_partitioned_index(
+    data_documents: Optional[Sequence[Document]],
+    persist_dir: str,
+    base_collection: str = BASE_COLLECTION,
+    **kwargs,
+) -> PartitionedIndex:
+    """Variante partitionnée de `build_or_load_index` (une collection par type d'actif).
+
+    - Avec des documents: chacun est classé (voir `app.partitions`) puis indexé
+      dans la collection de sa partition; seules les partitions alimentées
+      sont retournées.
+    - Sans document: charge toutes les partitions présentes dans `persist_dir`.
+
+    Les autres paramètres sont transmis tels quels à `build_or_load_index`;
+    sans `sidecars`, les tables annexes sont écrites une fois pour toutes les
+    partitions.
     """
-    try:
-        client = PersistentClient(path=persist_dir)
+    backend, _ = _vector_backend(kwargs.get("vector_backend"), kwargs.get("vector_dtype"))
+    if data_documents:
+        sidecars = kwargs.pop("sidecars", None)
+        own = sidecars is None
+        if own:
+            sidecars = IndexSidecars(persist_dir)
+        indexes = {}
+        for part, docs in group_by_partition(data_documents).items():
+            indexes[part] = build_or_load_index(
+                data_documents=docs,
+                persist_dir=persist_dir,
+                collection_name=partition_collection(part, base_collection),
+                sidecars=sidecars,
+                **kwargs,
+            )
+        if own:
+            sidecars.flush()
+        return PartitionedIndex(indexes)
+
+    parts = []
+    if os.path.isdir(persist_dir):
         try:
-            collection = client.get_collection(collection_name)
+            names = _stored_collection_names(persist_dir, backend)
         except Exception:
-            return 0
+            names = []
+        for name in names:
+            part = partition_of_collection(name, base_collection)
+            if part is not None:
+                parts.append((part, name))
+
+    indexes = {}
+    for part, name in parts:
         try:
-            return int(collection.count())
-        except Exception:
-            return 0
+            indexes[part] = build_or_load_index(
+                data_documents=None,
+                persist_dir=persist_dir,
+                collection_name=name,
+                **kwargs,
+            )
+        except ValueError:
+            # Collection vide: rien à interroger
+            continue
+    if not indexes:
+        raise ValueError(
+            "Aucun index existant détecté et aucun document fourni pour en créer un. "
+            "Ajoute des fichiers dans 'data/' puis clique sur 'Charger & indexer'."
+        )
+    return PartitionedIndex(indexes)
+
+
+def get_vector_count(persist_dir: str, collection_name: str = BASE_COLLECTION) -> int:
+    """Retourne le nombre de vecteurs présents dans la collection Chroma.
+
+    Les partitions par type d'actif (`<collection>_<type>`) sont incluses.
+    Si la collection ou le dossier n'existe pas, retourne 0. Avec le backend
+    `flat`, le compte est lu dans les fichiers `meta.json` des collections.
+    """
+    try:
+        backend, _ = _vector_backend(None, None)
+        if backend == "flat":
+            from app.flat_vector_store import flat_collection_dir, flat_collection_names
+
+            total = 0
+            for name in flat_collection_names(persist_dir):
+                if partition_of_collection(name, collection_name) is None:
+                    continue
+                meta = flat_collection_dir(persist_dir, name) / "meta.json"
+                total += int(json.loads(meta.read_text(encoding="utf-8")).get("count") or 0)
+            return total
+        from chromadb import PersistentClient
+
+        client = PersistentClient(path=persist_dir)
+        total = 0
+        for name in _collection_names(client):
+            if partition_of_collection(name, collection_name) is None:
+                continue
+            try:
+                total += int(client.get_collection(name).count())
+            except Exception:
+                continue
+        return total
     except Exception:
         return 0
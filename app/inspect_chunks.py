@@ -2,24 +2,29 @@
 Inspecteur de chunks indexés dans Chroma (persistance LlamaIndex).
 
 Affiche les chunks (texte) avec leurs métadonnées principales (fichier d'origine,
-identifiants, etc.). Permet un filtrage simple et une exportation CSV.
+identifiants, etc.). Permet un filtrage par source / json_path, une recherche
+plein texte (`--query`, voir `chunk_search.py`) et une exportation CSV ou
+JSONL (voir `chunk_browser.py`).
 
 Exemples:
-  python app/inspect_chunks.py --persist-dir vectorstore --limit 20
-  python app/inspect_chunks.py --persist-dir vectorstore --group-by-file
-  python app/inspect_chunks.py --persist-dir vectorstore --source-filter "test.txt"
-  python app/inspect_chunks.py --persist-dir vectorstore --export-csv chunks.csv
+  python -m app.inspect_chunks --persist-dir vectorstore --limit 20
+  python -m app.inspect_chunks --persist-dir vectorstore --group-by-file
+  python -m app.inspect_chunks --persist-dir vectorstore --source-filter "test.txt"
+  python -m app.inspect_chunks --persist-dir vectorstore --export-csv chunks.csv
+  python -m app.inspect_chunks --persist-dir vectorstore --query "flygt 112917"
+  python -m app.inspect_chunks --persist-dir vectorstore --json-path-filter "$[3]" --export-jsonl chunks.jsonl
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
 import os
+import time
 import unicodedata
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from chromadb import PersistentClient
+from app.chunk_browser import collection_names, get_browser
+from app.chunk_search import open_search_index, sync_collection
 
 
 def ascii_only(s: str) -> str:
@@ -55,52 +60,78 @@ def iter_collection_documents(collection, page_size: int = 200):
         offset += len(ids)
 
 
-def main():
+def search_chunks(args, collections: List[str], filters) -> None:
+    """Affiche les chunks trouvés par la recherche plein texte, termes entre [ ].
+
+    La recherche porte sur toutes les `collections` (partitions de l'index),
+    comme la recherche vectorielle de `rag_engine`.
+    """
+    index = open_search_index(args.persist_dir)
+    try:
+        rebuilt = False
+        for name in collections:
+            rebuilt |= sync_collection(index, get_browser(args.persist_dir, name), name)
+        if rebuilt:
+            print("Index plein texte reconstruit.")
+        t0 = time.perf_counter()
+        found = index.count_matches(args.query, collections, **filters)
+        hits = index.search(args.query, collections, limit=args.limit, offset=args.offset, **filters)
+        ms = (time.perf_counter() - t0) * 1000
+    finally:
+        index.close()
+    print(ascii_only(f"Chunks trouves pour \"{args.query}\": {found} ({ms:.1f} ms)"))
+    for h in hits:
+        where = f" [{h['collection']}]" if len(collections) > 1 else ""
+        print(ascii_only(f"{h['id']} | {h['source']} {h['json_path']}".rstrip() + where))
+        print(f"  {preview(h['snippet'], 240)}\n")
+
+
+def main(argv: Optional[List[str]] = None):
     ap = argparse.ArgumentParser(description="Inspecter les chunks indexés (Chroma)")
     ap.add_argument("--persist-dir", default="vectorstore", help="Dossier de persistance Chroma")
-    ap.add_argument("--collection", default="eau_docs", help="Nom de la collection Chroma")
+    ap.add_argument("--collection", default="eau_docs", help="Nom de la collection Chroma (base des partitions)")
     ap.add_argument("--limit", type=int, default=50, help="Nombre max de chunks à afficher")
     ap.add_argument("--offset", type=int, default=0, help="Décalage de départ")
     ap.add_argument("--group-by-file", action="store_true", help="Grouper l'affichage par fichier source")
     ap.add_argument("--source-filter", default=None, help="Afficher uniquement les chunks dont la source contient ce texte")
+    ap.add_argument("--json-path-filter", default=None, help="Afficher uniquement les chunks dont le json_path contient ce texte")
+    ap.add_argument("--query", default=None, help="Recherche plein texte (mots du chunk, de la source ou du json_path)")
     ap.add_argument("--export-csv", default=None, help="Chemin d'export CSV des chunks")
-    args = ap.parse_args()
+    ap.add_argument("--export-jsonl", default=None, help="Chemin d'export JSONL des chunks")
+    args = ap.parse_args(argv)
 
     if not os.path.isdir(args.persist_dir):
         raise SystemExit(f"Dossier de persistance introuvable: {args.persist_dir}")
 
-    client = PersistentClient(path=args.persist_dir)
+    # Collection de base et partitions par type d'actif (eau_docs_<type>)
     try:
-        collection = client.get_collection(args.collection)
+        names = collection_names(args.persist_dir, args.collection)
     except Exception:
+        names = []
+    if not names:
         raise SystemExit(f"Collection introuvable: {args.collection}. Avez-vous indexé des documents ?")
 
-    total = 0
-    try:
-        total = int(collection.count())
-    except Exception:
-        pass
-
-    records: List[Dict[str, Any]] = []
-    for cid, meta, doc in iter_collection_documents(collection):
-        src = meta.get("file_path") or meta.get("filename") or meta.get("source") or meta.get("id") or ""
-        if args.source_filter and (args.source_filter.lower() not in str(src).lower()):
-            continue
-        records.append({
-            "id": ascii_only(str(cid)),
-            "source": ascii_only(str(src)),
-            "text": ascii_only(doc or ""),
-        })
-
-    # Découpage offset/limit pour l'affichage
-    view = records[args.offset : args.offset + args.limit] if args.limit is not None else records[args.offset :]
-
-    print(f"Chunks trouvés: {len(records)} (total collection ~{total})")
+    filters = {"source": args.source_filter, "json_path": args.json_path_filter}
+    if args.query:
+        search_chunks(args, names, filters)
+        return
+    # Liste: la collection demandée, sinon la première partition existante
+    if args.collection not in names:
+        print(f"Collection {args.collection} absente, partition affichée: {names[0]} (partitions: {', '.join(names)})")
+        args.collection = names[0]
+    browser = get_browser(args.persist_dir, args.collection)
+    total = browser.count()
+    found = browser.count(**filters)
+    # Seule la page demandée est lue dans Chroma
+    view = [
+        {"id": ascii_only(r["id"]), "source": ascii_only(r["source"]), "text": r["text"]}
+        for r in browser.page(args.offset, args.limit, **filters)
+    ]
+
+    print(f"Chunks trouvés: {found} (total collection ~{total})")
     if not view:
         print("Aucun chunk à afficher (filtre trop restrictif ?)")
-        return
-
-    if args.group_by_file:
+    elif args.group_by_file:
         # Grouper par source
         by_src: Dict[str, List[Dict[str, Any]]] = {}
         for r in view:
@@ -114,14 +145,15 @@ def main():
         for r in view:
             print(f"{r['id']} | {r['source']}\n  {preview(r['text'])}\n")
 
-    # Export CSV optionnel
+    # Exports optionnels (écrits au fil de la lecture, sans tout charger)
     if args.export_csv:
         with open(args.export_csv, "w", newline="", encoding="ascii", errors="ignore") as f:
-            w = csv.DictWriter(f, fieldnames=["id", "source", "text"])
-            w.writeheader()
-            for r in records:
-                w.writerow(r)
-        print(ascii_only(f"\nExport CSV: {args.export_csv}"))
+            n = browser.export(f, "csv", fields=("id", "source", "text"), transform=ascii_only, **filters)
+        print(ascii_only(f"\nExport CSV: {args.export_csv} ({n} chunks)"))
+    if args.export_jsonl:
+        with open(args.export_jsonl, "w", encoding="utf-8") as f:
+            n = browser.export(f, "jsonl", **filters)
+        print(ascii_only(f"\nExport JSONL: {args.export_jsonl} ({n} chunks)"))
 
 
 if __name__ == "__main__":
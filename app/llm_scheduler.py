@@ -0,0 +1,182 @@
+"""Ordonnanceur des appels LLM (file d'attente partagée par le processus).
+
+Plusieurs sessions Streamlit partagent le même serveur Ollama. Sans
+coordination, chaque session envoie ses requêtes en parallèle: le modèle est
+saturé, toutes les latences explosent et certaines requêtes atteignent le
+timeout. Ce module sérialise ces appels derrière une limite de concurrence:
+
+- file FIFO avec priorité (les requêtes interactives passent avant les lots);
+- retour de la position dans la file via un callback (affichage UI);
+- rejet immédiat (`SchedulerFullError`) lorsque la file est trop longue.
+
+Le module ne dépend que de la bibliothèque standard.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# Plus la valeur est petite, plus la requête est prioritaire.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+# Préchauffage au démarrage (`app.warmup`): après toute autre requête
+PRIORITY_WARMUP = 20
+
+
+class SchedulerFullError(RuntimeError):
+    """Levée lorsque la file d'attente a atteint sa longueur maximale."""
+
+
+class LLMScheduler:
+    """Limite le nombre d'appels LLM simultanés et ordonne les requêtes en attente.
+
+    Paramètres:
+    - max_concurrency: nombre d'appels exécutés en même temps.
+    - max_queue: nombre maximal de requêtes en attente avant rejet.
+    - poll_interval: période (s) de rafraîchissement de la position en file.
+    """
+
+    def __init__(self, max_concurrency: int = 1, max_queue: int = 16, poll_interval: float = 0.25):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []  # tas de (priorité, numéro d'arrivée)
+        self._active = 0
+        self._seq = itertools.count()
+
+    def _position(self, ticket: Tuple[int, int]) -> int:
+        # Nombre de requêtes servies avant celle-ci (0 = prochaine à passer)
+        return sum(1 for t in self._waiting if t < ticket)
+
+    def _remove(self, ticket: Tuple[int, int]) -> None:
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+    @contextmanager
+    def slot(
+        self,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_wait: Optional[Callable[[int], None]] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[None]:
+        """Attend un créneau d'exécution puis le libère en sortie de bloc.
+
+        `on_wait(position)` est appelé à chaque changement de position tant que
+        la requête attend. Lève `SchedulerFullError` si la file est pleine à
+        l'arrivée, `TimeoutError` si `timeout` secondes s'écoulent en attente.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._active >= self.max_concurrency or self._waiting:
+                if len(self._waiting) >= self.max_queue:
+                    raise SchedulerFullError(
+                        f"File d'attente LLM pleine ({len(self._waiting)} requêtes en attente). "
+                        "Réessayez dans quelques instants."
+                    )
+            ticket = (int(priority), next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+
+        last_pos = None
+        try:
+            while True:
+                notify_pos = None
+                with self._cond:
+                    if self._active < self.max_concurrency and self._waiting[0] == ticket:
+                        heapq.heappop(self._waiting)
+                        self._active += 1
+                        break
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("Délai d'attente dépassé dans la file LLM.")
+                    pos = self._position(ticket)
+                    if on_wait is not None and pos != last_pos:
+                        notify_pos = pos
+                    else:
+                        self._cond.wait(self.poll_interval)
+                if notify_pos is not None:
+                    # Callback hors verrou: l'UI peut être lente à se rafraîchir
+                    try:
+                        on_wait(notify_pos)
+                    except Exception:
+                        pass
+                    last_pos = notify_pos
+        except BaseException:
+            # Interruption pendant l'attente (timeout, ou rerun Streamlit levé
+            # depuis `on_wait`): la place en file ne doit pas rester occupée
+            with self._cond:
+                if ticket in self._waiting:
+                    self._remove(ticket)
+            raise
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def run(
+        self,
+        fn: Callable,
+        *args,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_wait: Optional[Callable[[int], None]] = None,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        """Exécute `fn(*args, **kwargs)` dans un créneau de l'ordonnanceur."""
+        with self.slot(priority=priority, on_wait=on_wait, timeout=timeout):
+            return fn(*args, **kwargs)
+
+    def stats(self) -> dict:
+        """Retourne l'état courant: appels actifs et requêtes en attente."""
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": len(self._waiting),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+            }
+
+
+_SCHEDULER: Optional[LLMScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Retourne l'ordonnanceur unique du processus (créé au premier appel).
+
+    Les limites proviennent de la section `scheduler` de la configuration
+    (`settings.yaml`, surchargeable via `LLM_MAX_CONCURRENCY` / `LLM_MAX_QUEUE`).
+    """
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            from app.utils.config import config_section
+
+            sch = config_section("scheduler")
+            _SCHEDULER = LLMScheduler(
+                max_concurrency=int(sch.get("max_concurrency", 1)),
+                max_queue=int(sch.get("max_queue", 16)),
+            )
+        return _SCHEDULER
+
+
+def configure_scheduler(max_concurrency: Optional[int] = None, max_queue: Optional[int] = None) -> LLMScheduler:
+    """Remplace l'ordonnanceur du processus (tests de charge, essais de réglages).
+
+    Les limites non fournies reprennent celles de l'ordonnanceur courant. À
+    appeler quand aucune requête n'est en cours.
+    """
+    global _SCHEDULER
+    current = get_scheduler()
+    with _SCHEDULER_LOCK:
+        _SCHEDULER = LLMScheduler(
+            max_concurrency=current.max_concurrency if max_concurrency is None else max_concurrency,
+            max_queue=current.max_queue if max_queue is None else max_queue,
+        )
+        return _SCHEDULER
@@ -2,37 +2,260 @@
 
 Ce module fournit une fonction pour charger récursivement des documents
 depuis un dossier à l'aide de `SimpleDirectoryReader` de LlamaIndex.
-Il gère automatiquement plusieurs formats courants (PDF, DOCX, TXT, JSON, etc.).
+Il gère automatiquement plusieurs formats courants (PDF, DOCX, TXT, etc.);
+les fichiers JSON donnent un document par enregistrement.
 """
 
-from typing import List, Optional, Sequence
+from typing import Iterator, List, Optional, Sequence, Tuple
 from llama_index.core import SimpleDirectoryReader
 from llama_index.core.schema import Document
 import os
 import json
+import re
+from functools import lru_cache
 from pathlib import Path
-from app.text_normalize import expand_abbreviations
+from app.fiche_extract import FichePDFReader
+from app.metrics import span
+from app.site_metadata import RECORD_PLACE_KEYS, parse_site_filename, record_site_metadata, site_directory
+from app.text_normalize import COMPACT_TEXT, GLOSSARY_TEXT_KEY, GLOSSARY_VERSION_KEY, glossary_version
+
+
+def _with_site_metadata(metadata: dict) -> dict:
+    """Ajoute commune/asset_type/site déduits du nom de fichier (si reconnu)."""
+    meta = dict(metadata or {})
+    fp = meta.get("file_path") or meta.get("file_name") or ""
+    if fp:
+        meta.update(parse_site_filename(fp))
+    return meta
+
+
+_GLOSSARY_KEYS = (GLOSSARY_VERSION_KEY, GLOSSARY_TEXT_KEY)
+
+
+def _glossary_metadata() -> dict:
+    return {GLOSSARY_VERSION_KEY: glossary_version(), GLOSSARY_TEXT_KEY: COMPACT_TEXT}
+
+
+def _excluding_version(keys) -> list:
+    return [*(k for k in keys or [] if k not in _GLOSSARY_KEYS), *_GLOSSARY_KEYS]
+
+
+def _normalized(d: Document) -> Document:
+    """Copie du document: métadonnées de site et de glossaire ajoutées.
+
+    Le texte reste compact (abréviations d'origine): il n'est développé que
+    pour l'embedding, et les expansions de chaque chunk sont jointes au
+    prompt (voir `app.text_normalize.annotate_chunk`). La version du
+    glossaire est inscrite dans les métadonnées (hors embedding et prompt),
+    voir `app.glossary_sync`.
+    """
+    return Document(
+        text=d.text,
+        metadata={**_with_site_metadata(d.metadata), **_glossary_metadata()},
+        excluded_embed_metadata_keys=_excluding_version(d.excluded_embed_metadata_keys),
+        excluded_llm_metadata_keys=_excluding_version(d.excluded_llm_metadata_keys),
+    )
+
+
+def _fmt_val(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, (int, float)):
+        return str(v)
+    if isinstance(v, str):
+        return v
+    if isinstance(v, list):
+        return ", ".join(_fmt_val(x) for x in v)
+    if isinstance(v, dict):
+        # aplatir une profondeur
+        return "; ".join(f"{sk} : {_fmt_val(sv)}" for sk, sv in v.items())
+    return str(v)
+
+
+def make_kv_text_and_meta(obj) -> (str, dict, str):
+    """Rend l'objet sous forme lisible "cle : valeur", un dict metadata plat,
+    et une version compacte monoligne "cle : valeur | cle2 : valeur2".
+
+    - Si obj est un dict: une ligne par cle primaire; valeurs scalaires/strings
+      sont rendues directement, les listes sont jointes par ", ", les dicts
+      imbriqués sont aplanis en paires "souscle: valeur".
+    - Si obj est une liste: concatène les éléments (applique les mêmes règles).
+    - Sinon: retourne str(obj).
+    """
+    meta = {}
+
+    lines = []
+    kv_pairs = []
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            val = _fmt_val(v)
+            # Valeurs compactes: abréviations développées à l'embedding seulement
+            lines.append(f"{k} : {val}")
+            kv_pairs.append(f"{k} : {val}")
+            # Dupliquer la paire dans metadata (stringifiée)
+            try:
+                meta[str(k)] = val if isinstance(val, str) else str(val)
+            except Exception:
+                pass
+    elif isinstance(obj, list):
+        # Ligne unique avec elements
+        val = ", ".join(_fmt_val(x) for x in obj)
+        lines.append(val)
+        kv_pairs.append(val)
+    else:
+        val = _fmt_val(obj)
+        lines.append(val)
+        if isinstance(val, str):
+            kv_pairs.append(val)
+
+    text_block = "\n".join(l for l in lines if l and str(l).strip())
+    kv_line = " | ".join(p for p in kv_pairs if p and str(p).strip())
+    return text_block, meta, kv_line
+
+
+SCHEMA_PATH = Path(__file__).resolve().parent / "ontology" / "schemas.yaml"
+
+
+@lru_cache(maxsize=4)
+def load_record_mappings(schema_path: str = str(SCHEMA_PATH)) -> Tuple[dict, ...]:
+    """Mappings `schemas.generic_record` de schemas.yaml (clés canoniques des enregistrements JSON)."""
+    import yaml
+
+    try:
+        data = yaml.safe_load(Path(schema_path).read_text(encoding="utf-8")) or {}
+    except Exception:
+        return ()
+    spec = (data.get("schemas") or {}).get("generic_record") or {}
+    return tuple(m for m in spec.get("mappings") or [] if m.get("source") and m.get("target"))
+
+
+def apply_record_mappings(obj: dict, mappings: Sequence[dict]) -> Tuple[dict, List[str]]:
+    """Retourne (meta_canon, canon_pairs) pour l'objet JSON.
+
+    meta_canon: dict de paires canonisées (préfixées canon_)
+    canon_pairs: liste de "Label : valeur" pour affichage compact
+    """
+    meta_canon: dict = {}
+    pairs: List[str] = []
+    if not isinstance(obj, dict):
+        return meta_canon, pairs
+    for m in mappings:
+        src = m.get("source")
+        target = m.get("target")
+        if not src or not target:
+            continue
+        value = None
+        try:
+            if m.get("regex"):
+                # Première clé qui correspond
+                value = next((v for k, v in obj.items() if re.search(src, str(k))), None)
+            elif src in obj:
+                value = obj[src]
+        except Exception:
+            value = None
+        if value is not None:
+            val_s = _fmt_val(value)
+            meta_canon[f"canon_{target}"] = val_s
+            pairs.append(f"{m.get('label', target)} : {val_s}")
+    return meta_canon, pairs
+
+
+def _iter_records(data) -> Iterator[Tuple[str, object]]:
+    # (json_path, enregistrement): éléments d'une liste, ou valeurs d'un dict
+    if isinstance(data, list):
+        for i, item in enumerate(data):
+            yield f"$[{i}]", item
+    elif isinstance(data, dict):
+        for k, v in data.items():
+            if isinstance(v, list):
+                for i, item in enumerate(v):
+                    yield f"$.{k}[{i}]", item
+            else:
+                yield f"$.{k}", v
+    else:
+        yield "$", data
+
+
+def json_record_documents(path, mappings: Optional[Sequence[dict]] = None) -> List[Document]:
+    """Un Document par enregistrement d'un fichier JSON (métadonnée `json_path`).
+
+    Texte: ligne des clés canoniques ("canon line", mappings
+    `generic_record` de schemas.yaml), en-tête source/json_path puis
+    "clé : valeur". Les champs bruts et canoniques (`canon_*`) sont aussi en
+    métadonnées: ils alimentent la table des enregistrements
+    (`app.records_table`). Fichier illisible: liste vide.
+    """
+    mappings = load_record_mappings() if mappings is None else mappings
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return []
+    docs: List[Document] = []
+    for json_path, obj in _iter_records(data):
+        text, meta, _ = make_kv_text_and_meta(obj)
+        if not text:
+            continue
+        canon_meta, canon_pairs = apply_record_mappings(obj, mappings)
+        lines = [f"[Source: {os.path.basename(str(path))} | JSON path: {json_path}]", text]
+        if canon_pairs:
+            lines.insert(0, f"canon line : {' | '.join(canon_pairs)}")
+            canon_meta["canon_line"] = " | ".join(canon_pairs)
+        # Clés canoniques déjà dans le texte ("canon line"): hors embedding et prompt
+        hidden = list(canon_meta)
+        docs.append(Document(
+            text="\n".join(lines),
+            metadata={"file_path": str(path), "json_path": json_path, **meta, **canon_meta},
+            excluded_embed_metadata_keys=hidden,
+            excluded_llm_metadata_keys=list(hidden),
+        ))
+    return docs
+
+
+def _files_under(root: Path, input_files: Optional[Sequence[str]]) -> List[Path]:
+    if input_files is not None:
+        return [Path(f) for f in input_files if Path(f).is_file()]
+    # Fichiers cachés ignorés, comme SimpleDirectoryReader
+    return sorted(
+        p for p in root.rglob("*")
+        if p.is_file() and not any(part.startswith(".") for part in p.relative_to(root).parts)
+    )
 
 
 def load_documents(
     data_path: str,
     extensions: Optional[Sequence[str]] = None,
     num_workers: Optional[int] = None,
+    input_files: Optional[Sequence[str]] = None,
+    mappings: Optional[Sequence[dict]] = None,
 ) -> List[Document]:
     """Charge tous les documents lisibles depuis un dossier (récursif).
 
     Paramètres:
     - data_path: chemin du dossier racine contenant les fichiers à indexer.
+    - input_files: si fourni, seuls ces fichiers (sous `data_path`) sont lus
+      (indexation fichier par fichier, voir `app.index_jobs`).
+    - mappings: clés canoniques des enregistrements JSON (par défaut
+      `generic_record` de schemas.yaml).
 
     Retourne:
     - Une liste de `Document` (objets LlamaIndex) résultant de la lecture des
       fichiers trouvés dans `data_path` et ses sous-dossiers.
 
     Remarques:
-    - `SimpleDirectoryReader` détecte automatiquement de nombreux formats
-      (PDF, DOCX, TXT, JSON, etc.) et parcourt récursivement l'arborescence.
-    - Les identifiants de documents sont dérivés des noms de fichiers via
+    - Les fichiers JSON donnent un document par enregistrement
+      (`json_record_documents`); `utils/build_index.py` passe aussi par
+      cette fonction: l'interface et la ligne de commande produisent les
+      mêmes documents et la même table des enregistrements.
+    - `SimpleDirectoryReader` lit les autres formats (PDF, DOCX, TXT, etc.);
+      les identifiants de documents sont dérivés des noms de fichiers via
       `filename_as_id=True` pour une traçabilité simple.
+    - Les noms de fiches "<Commune> - <TYPE> <site>" alimentent les
+      métadonnées `commune`, `asset_type` et `site` (voir `app.site_metadata`);
+      les enregistrements JSON reçoivent `commune`/`site` de leurs champs de
+      lieu, comparés à ces noms de fiches.
+    - Les fiches d'audit PDF (PR, STEP) donnent chacune un seul document
+      enregistrement clé/valeur (voir `app.fiche_extract`).
     """
 
     # Contiendra tous les documents chargés depuis le dossier cible.
@@ -42,15 +265,18 @@ def load_documents(
     if not root.exists():
         return documents
 
-    # Bypass JSON spécifique: ingestion simple via SimpleDirectoryReader pour tous formats
-    try:
+    allowed = {e.lower() for e in extensions} if extensions else None
+    files = [p for p in _files_under(root, input_files) if allowed is None or p.suffix.lower() in allowed]
+    json_files = [p for p in files if p.suffix.lower() == ".json"]
+    other_files = [p for p in files if p.suffix.lower() != ".json"]
+
+    # 1) Fichiers non-JSON via SimpleDirectoryReader, en ciblant explicitement les fichiers
+    if other_files:
         reader_kwargs = dict(
-            input_dir=str(root),
-            recursive=True,
+            input_files=[str(p) for p in other_files],
             filename_as_id=True,
+            file_extractor={".pdf": FichePDFReader()},
         )
-        if extensions:
-            reader_kwargs["required_exts"] = list(extensions)
         if num_workers is not None:
             try:
                 reader = SimpleDirectoryReader(**{**reader_kwargs, "num_workers": int(num_workers)})
@@ -58,157 +284,25 @@ def load_documents(
                 reader = SimpleDirectoryReader(**reader_kwargs)
         else:
             reader = SimpleDirectoryReader(**reader_kwargs)
+        with span("load"):
+            raw = reader.load_data()
+        with span("normalize"):
+            documents.extend(_normalized(d) for d in raw)
 
-        for d in reader.load_data():
-            documents.append(Document(text=expand_abbreviations(d.text), metadata=d.metadata))
-        return documents
-    except Exception:
-        pass
-
-    # Partitionne les fichiers en JSON et non-JSON
-    all_files = [p for p in root.rglob('*') if p.is_file()]
-    json_files = [p for p in all_files if p.suffix.lower() == '.json']
-    other_files = [p for p in all_files if p.suffix.lower() != '.json']
-
-    # 1) Charger les fichiers non-JSON via SimpleDirectoryReader en ciblant explicitement les fichiers
-    if other_files:
-        input_list = [str(p) for p in other_files]
-        if extensions:
-            allowed = set(e.lower() for e in extensions)
-            input_list = [f for f in input_list if Path(f).suffix.lower() in allowed]
-        if input_list:
-            reader_kwargs = dict(
-                input_files=input_list,
-                filename_as_id=True,
-            )
-            if num_workers is not None:
-                try:
-                    reader = SimpleDirectoryReader(**{**reader_kwargs, 'num_workers': int(num_workers)})
-                except TypeError:
-                    reader = SimpleDirectoryReader(**reader_kwargs)
-            else:
-                reader = SimpleDirectoryReader(**reader_kwargs)
-            for d in reader.load_data():
-                documents.append(
-                    Document(text=expand_abbreviations(d.text), metadata=d.metadata)
-                )
-
-    # 2) Charger les JSON avec une logique par enregistrement/section et json_path
-    def iter_string_leaves(obj):
-        if obj is None:
-            return
-        if isinstance(obj, str):
-            yield obj
-        elif isinstance(obj, (int, float)):
-            yield str(obj)
-        elif isinstance(obj, list):
-            for it in obj:
-                yield from iter_string_leaves(it)
-        elif isinstance(obj, dict):
-            for v in obj.values():
-                yield from iter_string_leaves(v)
-
-    def make_kv_text_and_meta(obj) -> (str, dict, str):
-        """Rend l'objet sous forme lisible "cle : valeur", un dict metadata plat,
-        et une version compacte monoligne "cle : valeur | cle2 : valeur2".
-
-        - Si obj est un dict: une ligne par cle primaire; valeurs scalaires/strings
-          sont rendues directement, les listes sont jointes par ", ", les dicts
-          imbriqués sont aplanis en paires "souscle: valeur".
-        - Si obj est une liste: concatène les éléments (applique les mêmes règles).
-        - Sinon: retourne str(obj).
-        """
-        meta = {}
-
-        def fmt_val(v):
-            if v is None:
-                return ""
-            if isinstance(v, (int, float)):
-                return str(v)
-            if isinstance(v, str):
-                return v
-            if isinstance(v, list):
-                return ", ".join(fmt_val(x) for x in v)
-            if isinstance(v, dict):
-                # aplatir une profondeur
-                parts = []
-                for sk, sv in v.items():
-                    parts.append(f"{sk} : {fmt_val(sv)}")
-                return "; ".join(parts)
-            return str(v)
-
-        lines = []
-        kv_pairs = []
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                val = fmt_val(v)
-                # expansion d'abréviations uniquement sur les valeurs
-                val_exp = expand_abbreviations(val) if isinstance(val, str) else val
-                lines.append(f"{k} : {val_exp}")
-                kv_pairs.append(f"{k} : {val_exp}")
-                # Dupliquer la paire dans metadata (stringifiée)
-                try:
-                    meta[str(k)] = val if isinstance(val, str) else str(val)
-                except Exception:
-                    pass
-        elif isinstance(obj, list):
-            # Ligne unique avec elements
-            val = ", ".join(fmt_val(x) for x in obj)
-            lines.append(val)
-            kv_pairs.append(val)
-        else:
-            val = fmt_val(obj)
-            val_exp = expand_abbreviations(val) if isinstance(val, str) else val
-            lines.append(val_exp)
-            if isinstance(val_exp, str):
-                kv_pairs.append(val_exp)
-
-        text_block = "\n".join(l for l in lines if l and str(l).strip())
-        kv_line = " | ".join(p for p in kv_pairs if p and str(p).strip())
-        return text_block, meta, kv_line
-
+    # 2) JSON: un document par enregistrement, avec json_path et clés canoniques;
+    # commune/site repérés dans les champs de lieu, aux graphies des fiches du
+    # dossier (tout le dossier, même si `input_files` n'en cible qu'une partie)
+    directory = site_directory(str(p) for p in _files_under(root, None)) if json_files else {}
+    places: dict = {}
     for jf in json_files:
-        try:
-            with open(jf, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception:
-            continue
-
-        def emit_record(path_str: str, obj):
-            text, meta_extra, kv_line = make_kv_text_and_meta(obj)
-            if not text:
-                return
-            header = f"[Source: {os.path.basename(str(jf))} | JSON path: {path_str}]"
-            if kv_line:
-                final_text = header + "\n" + f"kv line : {kv_line}" + "\n" + text
-            else:
-                final_text = header + "\n" + text
-            documents.append(
-                Document(
-                    text=final_text,
-                    metadata={
-                        'file_path': str(jf),
-                        'json_path': path_str,
-                        'kv_line': kv_line,
-                        **meta_extra,
-                    },
-                )
-            )
-
-        try:
-            if isinstance(data, list):
-                for i, item in enumerate(data):
-                    emit_record(f'$[{i}]', item)
-            elif isinstance(data, dict):
-                for k, v in data.items():
-                    if isinstance(v, list):
-                        for i, item in enumerate(v):
-                            emit_record(f'$.{k}[{i}]', item)
-                    else:
-                        emit_record(f'$.{k}', v)
-            else:
-                emit_record('$', data)
-        except Exception:
-            pass
+        with span("load"):
+            raw = json_record_documents(jf, mappings)
+        with span("normalize"):
+            for d in raw:
+                key = tuple(d.metadata.get(k) for k in RECORD_PLACE_KEYS)
+                if key not in places:
+                    places[key] = record_site_metadata(d.metadata, directory)
+                d.metadata.update(places[key])
+            documents.extend(_normalized(d) for d in raw)
 
     return documents
@@ -1,7 +1,12 @@
 import streamlit as st
-from app.loader import load_documents
-from app.indexer import build_or_load_index, get_vector_count
-from app.rag_engine import ask_question
+# Modules légers uniquement: LlamaIndex, Chroma et Ollama (plusieurs secondes
+# d'import) sont chargés à la première question, après l'affichage de la page.
+from app.indexer import build_or_load_partitioned_index, get_vector_count
+from app.llm_scheduler import SchedulerFullError
+from app.index_jobs import latest_job, read_state, resume_job, start_job
+from app.metrics import Timings, recording, span
+from app.retrieval_cache import store_generation
+from app.warmup import start_warmup
 import os
 
 # ===============================
@@ -11,15 +16,41 @@ st.set_page_config(page_title="IA Traitement de l'Eau", page_icon="💧", layout
 
 DATA_DIR = "data"
 VECTOR_DIR = "vectorstore"
-try:
-    _VEC_COUNT = get_vector_count(VECTOR_DIR)
-except Exception:
-    _VEC_COUNT = 0
 LLM_NAME = "mistral"
 EMB_NAME = "nomic-embed-text"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 150
 TOP_K = 2
+CTX_LEN = 1536
+MAX_TOKENS = 256
+
+
+@st.cache_data(show_spinner=False)
+def _vector_count(persist_dir: str, generation) -> int:
+    # `generation`: empreinte du stockage, invalide le cache après une indexation
+    try:
+        return get_vector_count(persist_dir)
+    except Exception:
+        return 0
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _cached_index(generation):
+    # Un index chargé par génération du stockage (partagé entre sessions et
+    # avec le préchauffage): le backend plat n'est relu qu'après une indexation
+    return build_or_load_partitioned_index(
+        data_documents=[],  # essaie de recharger
+        persist_dir=VECTOR_DIR,
+        llm_name=LLM_NAME,
+        embedding_name=EMB_NAME,
+        embedding_num_gpu=0,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+    )
+
+
+def _load_index():
+    return _cached_index(store_generation(VECTOR_DIR))
 
 st.title("🤖 IA Technique - Traitement de l'Eau")
 st.caption("Assistant local propulsé par LlamaIndex + Ollama (Mistral)")
@@ -30,8 +61,9 @@ st.caption("Assistant local propulsé par LlamaIndex + Ollama (Mistral)")
 col1, col2 = st.columns([1, 2])
 
 # Indicateur global: nombre de vecteurs dans la base Chroma (avec mise à jour)
+# (compté une fois la page affichée, voir plus bas: ouvrir Chroma prend du temps)
 vec_metric = st.empty()
-vec_metric.metric(label="Vecteurs en base", value=_VEC_COUNT)
+vec_metric.metric(label="Vecteurs en base", value="…")
 
 # ===============================
 # CHARGEMENT & INDEXATION
@@ -40,35 +72,58 @@ with col1:
     st.subheader("📂 Données")
     st.write("Ce panneau charge les fichiers présents dans le dossier `data/`.")
 
+    # L'indexation tourne dans un processus séparé (app.index_jobs): la session
+    # reste utilisable et un rafraîchissement du navigateur ne l'interrompt pas.
     if st.button("📥 Charger & indexer"):
-        with st.spinner("Lecture et indexation des documents..."):
-            docs = load_documents(DATA_DIR)
-
-            # Comptage rapide
-            n_docs = len(docs)
-            st.info(f"{n_docs} documents détectés.")
-
-            if n_docs == 0:
-                st.warning("Aucun fichier trouvé dans `data/`.")
-            else:
+        try:
+            start_job(
+                DATA_DIR,
+                VECTOR_DIR,
+                llm_name=LLM_NAME,
+                embedding_name=EMB_NAME,
+                embedding_num_gpu=0,
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
+            )
+        except RuntimeError as e:
+            st.warning(str(e))
+        except Exception as e:
+            st.error(f"Erreur lors du lancement de l'indexation : {e}")
+
+    @st.fragment(run_every=2)
+    def _index_job_progress():
+        job_dir = latest_job(VECTOR_DIR)
+        if job_dir is None:
+            return
+        state = read_state(job_dir)
+        status = state.get("status")
+        total = int(state.get("files_total") or 0)
+        done = int(state.get("files_done") or 0)
+        if status in ("queued", "running"):
+            st.progress(done / total if total else 0.0, text=f"Indexation : {done}/{total or '?'} fichiers")
+            eta = state.get("eta_sec")
+            st.caption(
+                f"{state.get('chunks', 0)} chunks · {state.get('vectors', 0)} vecteurs · "
+                f"{state.get('vectors_per_sec', 0)} vecteurs/s · reste "
+                + (f"~{eta / 60:.1f} min" if isinstance(eta, (int, float)) else "?")
+            )
+            if state.get("current_file"):
+                st.caption(f"En cours : {os.path.basename(state['current_file'])}")
+        elif status == "done":
+            st.success(
+                f"✅ Index créé ou mis à jour ({state.get('docs', 0)} documents, {done} fichiers,"
+                f" {state.get('vector_count', state.get('vectors', 0))} vecteurs en base)."
+            )
+        elif status in ("interrupted", "failed"):
+            msg = "interrompue" if status == "interrupted" else f"en échec ({state.get('error')})"
+            st.warning(f"Indexation {msg} à {done}/{total} fichiers.")
+            if st.button("▶️ Reprendre l'indexation"):
                 try:
-                    index = build_or_load_index(
-                        data_documents=docs,
-                        persist_dir=VECTOR_DIR,
-                        llm_name=LLM_NAME,
-                        embedding_name=EMB_NAME,
-                        embedding_num_gpu=0,
-                        chunk_size=CHUNK_SIZE,
-                        chunk_overlap=CHUNK_OVERLAP,
-                    )
-                    # Met à jour l'indicateur du nombre de vecteurs après indexation
-                    try:
-                        vec_metric.metric(label="Vecteurs en base", value=get_vector_count(VECTOR_DIR))
-                    except Exception:
-                        pass
-                    st.success(f"✅ Index créé ou mis à jour ({n_docs} documents).")
+                    resume_job(job_dir)
                 except Exception as e:
-                    st.error(f"Erreur lors de l'indexation : {e}")
+                    st.error(str(e))
+
+    _index_job_progress()
 
     # Affiche le contenu du dossier data/
     if os.path.exists(DATA_DIR):
@@ -91,25 +146,39 @@ with col2:
     # Contrôle interactif du nombre de passages (Top-K)
     top_k_ui = st.slider("Passages (Top-K)", min_value=1, max_value=10, value=TOP_K, step=1)
     use_gpu = st.checkbox("Utiliser GPU pour la génération", value=True)
-    ctx_len_ui = st.slider("Contexte LLM (tokens)", min_value=512, max_value=4096, value=1536, step=128)
-    max_tokens_ui = st.slider("Longueur max réponse (tokens)", min_value=64, max_value=1024, value=256, step=64)
+    ctx_len_ui = st.slider("Contexte LLM (tokens)", min_value=512, max_value=4096, value=CTX_LEN, step=128)
+    max_tokens_ui = st.slider("Longueur max réponse (tokens)", min_value=64, max_value=1024, value=MAX_TOKENS, step=64)
     strict_only_ui = st.checkbox("Strict (contexte uniquement)", value=True)
     expand_abbr_ui = st.checkbox("Expansion des abreviations (requete)", value=True)
 
     question = st.text_input("❓ Ta question :")
 
+# Page affichée: compte des vecteurs (client Chroma ouvert ici, pas à l'import)
+vec_metric.metric(label="Vecteurs en base", value=_vector_count(VECTOR_DIR, store_generation(VECTOR_DIR)))
+
+# Préchauffage (une fois par processus): questions fréquentes rejouées en
+# arrière-plan avec les réglages par défaut, arrêté à la première question
+if not question and os.path.isdir(VECTOR_DIR):
+    start_warmup(
+        _load_index,
+        VECTOR_DIR,
+        top_k=TOP_K,
+        model_name=LLM_NAME,
+        num_ctx=CTX_LEN,
+        max_tokens=MAX_TOKENS,
+        strict_context=True,
+        expand_abbr=True,
+    )
+
+with col2:
     if question:
+        from app.rag_engine import ask_question
+
         with st.spinner("Génération de la réponse..."):
+            stage_times = Timings()
             try:
-                index = build_or_load_index(
-                    data_documents=[],  # essaie de recharger
-                    persist_dir=VECTOR_DIR,
-                    llm_name=LLM_NAME,
-                    embedding_name=EMB_NAME,
-                    embedding_num_gpu=0,
-                    chunk_size=CHUNK_SIZE,
-                    chunk_overlap=CHUNK_OVERLAP,
-                )
+                with recording(stage_times), span("load"):
+                    index = _load_index()
             except Exception as e:
                 st.error(
                     "⚠️ Aucun index existant détecté. "
@@ -118,19 +187,30 @@ with col2:
                 )
                 st.stop()
 
-            # Requête IA
+            # Requête IA (position dans la file d'attente partagée affichée si besoin)
+            queue_info = st.empty()
+
+            def _show_queue_position(pos: int) -> None:
+                queue_info.info(f"⏳ En file d'attente (position {pos + 1})...")
+
             try:
-                answer, sources = ask_question(
-                    index,
-                    question,
-                    top_k=top_k_ui,
-                    model_name=LLM_NAME,
-                    cpu_only=not use_gpu,
-                    num_ctx=ctx_len_ui,
-                    max_tokens=max_tokens_ui,
-                    strict_context=strict_only_ui,
-                    expand_abbr=expand_abbr_ui,
-                )
+                timings: dict = {}
+                with recording(stage_times):
+                    answer, sources = ask_question(
+                        index,
+                        question,
+                        top_k=top_k_ui,
+                        model_name=LLM_NAME,
+                        cpu_only=not use_gpu,
+                        num_ctx=ctx_len_ui,
+                        max_tokens=max_tokens_ui,
+                        strict_context=strict_only_ui,
+                        expand_abbr=expand_abbr_ui,
+                        on_queue_position=_show_queue_position,
+                        persist_dir=VECTOR_DIR,
+                        timings=timings,
+                    )
+                queue_info.empty()
                 st.subheader("🧠 Réponse")
                 st.write(answer)
 
@@ -138,6 +218,12 @@ with col2:
                     st.subheader("🔗 Sources (extraits)")
                     for s in dict.fromkeys(sources):
                         st.code(str(s))
+
+                with st.expander("⏱️ Durées par étape"):
+                    st.json(timings)
+            except SchedulerFullError as e:
+                queue_info.empty()
+                st.warning(f"⚠️ Serveur très sollicité : {e}")
             except Exception as e:
                 st.error(f"Erreur pendant la génération : {e}")
 
@@ -0,0 +1,236 @@
+"""Mesure du temps passé par étape (indexation et questions).
+
+Une réponse lente pouvait venir du chargement de l'index, de l'embedding de
+la question, de la recherche Chroma, des requêtes filtrées ou de la
+génération Ollama, sans moyen de le savoir. Les étapes sont maintenant
+entourées de `span("nom")`:
+
+- indexation: `load`, `normalize` (`mappings` des enregistrements JSON dans `loader`), `split`,
+  `dedup`, `embed`, `upsert`;
+- question: `load` (chargement de l'index, mesuré par l'appelant),
+  `aggregate`, `normalize`, `embed`, `retrieve`, `postprocess`, `queue`
+  (attente de l'ordonnanceur LLM), `generate`, et `total`.
+
+Un `span` ne coûte rien hors d'un bloc `recording()`. Dans un bloc, les
+durées (secondes, cumulées si une étape se répète ou tourne en parallèle
+dans plusieurs threads) et les compteurs (`prompt_tokens`,
+`completion_tokens` lus dans les réponses Ollama, `searches`...) sont
+collectés dans un `Timings`. `append_metrics` les ajoute au fichier
+`metrics.jsonl` du dossier de persistance (rotation au-delà de
+`metrics.max_bytes`), lu par la page Streamlit `pages/Metrics.py`.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+METRICS_FILE = "metrics.jsonl"
+
+_current: contextvars.ContextVar[Optional["Timings"]] = contextvars.ContextVar("timings", default=None)
+
+
+class Timings:
+    """Durées par étape et compteurs d'une opération (thread-safe)."""
+
+    def __init__(self) -> None:
+        self.spans: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Mesure d'une étape (`span`); redéfinie par `app.profiling.RunProfiler`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {k: round(v, 6) for k, v in self.spans.items()},
+                "counts": dict(self.counts),
+            }
+
+
+@contextmanager
+def recording(timings: Optional[Timings] = None) -> Iterator[Timings]:
+    """Collecte les `span`/`count` du bloc (et des fonctions `bind`ées)."""
+    timings = timings if timings is not None else Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def current() -> Optional[Timings]:
+    """`Timings` du bloc `recording()` en cours, s'il y en a un."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def add(name: str, seconds: float) -> None:
+    """Durée mesurée à part (ex. attente d'un créneau), ajoutée à l'étape `name`."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def count(name: str, n: int = 1) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.count(name, n)
+
+
+def bind(fn: Callable) -> Callable:
+    """`fn` exécutée (dans un autre thread) avec le `Timings` courant."""
+    timings = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(timings)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+# ------------------------------------------------------------------
+# Jetons des réponses LLM (événements d'instrumentation LlamaIndex)
+# ------------------------------------------------------------------
+
+_TOKENS_INSTALLED = False
+_TOKENS_LOCK = threading.Lock()
+
+
+def install_token_counter() -> None:
+    """Compte les jetons (prompt / réponse) rapportés par Ollama (idempotent)."""
+    global _TOKENS_INSTALLED
+    with _TOKENS_LOCK:
+        if _TOKENS_INSTALLED:
+            return
+        try:
+            from llama_index.core.instrumentation import get_dispatcher
+            from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+            from llama_index.core.instrumentation.events.llm import LLMChatEndEvent, LLMCompletionEndEvent
+        except ImportError:
+            return
+
+        class _TokenCounter(BaseEventHandler):
+            @classmethod
+            def class_name(cls) -> str:
+                return "TokenCounter"
+
+            def handle(self, event, **kwargs) -> None:
+                if _current.get() is None or not isinstance(event, (LLMChatEndEvent, LLMCompletionEndEvent)):
+                    return
+                raw = getattr(getattr(event, "response", None), "raw", None)
+                if not isinstance(raw, dict):
+                    raw = dict(raw) if hasattr(raw, "keys") else {}
+                for key, name in (("prompt_eval_count", "prompt_tokens"), ("eval_count", "completion_tokens")):
+                    if raw.get(key) is not None:
+                        count(name, int(raw[key]))
+
+        get_dispatcher().add_event_handler(_TokenCounter())
+        _TOKENS_INSTALLED = True
+
+
+# ------------------------------------------------------------------
+# Fichier de métriques
+# ------------------------------------------------------------------
+
+_FILE_LOCK = threading.Lock()
+def _metrics_config() -> dict:
+    """Section `metrics` de la configuration (lue une fois par processus).
+
+    `append_metrics` est appelée à chaque question: relire `settings.yaml`
+    à chaque fois coûtait plus que l'écriture de la ligne.
+    """
+    from app.utils.config import config_section
+
+    return config_section("metrics")
+
+
+def append_metrics(persist_dir: Optional[str], kind: str, timings: Timings, **extra) -> None:
+    """Ajoute une ligne `{ts, kind, spans, counts, ...}` à `metrics.jsonl`.
+
+    Au-delà de `metrics.max_bytes`, le fichier devient `metrics.jsonl.1`
+    (l'ancien est remplacé). Sans effet si `metrics.enabled` est faux.
+    """
+    if not persist_dir:
+        return
+    cfg = _metrics_config()
+    if not cfg.get("enabled", True):
+        return
+    path = Path(persist_dir) / METRICS_FILE
+    rec = {"ts": round(time.time(), 3), "kind": kind, **timings.as_dict(), **extra}
+    line = json.dumps(rec, ensure_ascii=False) + "\n"
+    with _FILE_LOCK:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if path.stat().st_size + len(line) > int(cfg.get("max_bytes", 5_000_000)):
+                os.replace(path, path.with_name(METRICS_FILE + ".1"))
+        except OSError:
+            pass
+        with path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def read_metrics(persist_dir: str, kind: Optional[str] = None) -> List[dict]:
+    """Mesures enregistrées (fichier courant et précédent), des plus anciennes aux plus récentes."""
+    out: List[dict] = []
+    for name in (METRICS_FILE + ".1", METRICS_FILE):
+        path = Path(persist_dir) / name
+        if not path.exists():
+            continue
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                if kind is None or rec.get("kind") == kind:
+                    out.append(rec)
+    return out
+
+
+def percentiles(records: List[dict], qs=(50, 95)) -> Dict[str, Dict[str, float]]:
+    """{étape: {"n", "p50", "p95", ...}} sur les durées des mesures."""
+    import numpy as np
+
+    by_stage: Dict[str, List[float]] = {}
+    for rec in records:
+        for name, sec in (rec.get("spans") or {}).items():
+            by_stage.setdefault(name, []).append(float(sec))
+    out: Dict[str, Dict[str, float]] = {}
+    for name, values in by_stage.items():
+        arr = np.asarray(values)
+        out[name] = {"n": len(values), **{f"p{q}": float(np.percentile(arr, q)) for q in qs}}
+    return out
@@ -0,0 +1,159 @@
+"""Découpage en chunks mémorisé, partagé par l'indexation et l'export.
+
+Les nœuds produits par le splitter sont persistés dans `nodes.sqlite`
+(dossier de persistance), par couple (hash du document, paramètres du
+splitter). Un document déjà découpé avec les mêmes paramètres n'est pas
+redécoupé: changer seulement de modèle d'embedding réutilise les chunks, et
+`build_index --export-chunks` exporte exactement les nœuds indexés (mêmes
+identifiants, mêmes textes). Les nœuds de texte compact reçoivent au
+découpage les expansions du glossaire qu'ils contiennent
+(`app.text_normalize.annotate_chunk`).
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from llama_index.core.schema import BaseNode, Document, NodeRelationship
+from llama_index.core.storage.docstore.utils import doc_to_json, json_to_doc
+
+from app.text_normalize import annotate_chunk
+
+NODE_STORE_FILE = "nodes.sqlite"
+
+# Attributs du splitter qui influencent le découpage
+_SPLITTER_ATTRS = (
+    "chunk_size",
+    "chunk_overlap",
+    "separator",
+    "paragraph_separator",
+    "secondary_chunking_regex",
+    "include_metadata",
+    "include_prev_next_rel",
+)
+
+
+def make_splitter(chunk_size: int = 1000, chunk_overlap: int = 150):
+    """Splitter commun à l'indexation et à l'export."""
+    from llama_index.core.node_parser import SentenceSplitter
+
+    return SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def splitter_key(splitter) -> str:
+    """Empreinte stable des paramètres d'un splitter (classe + réglages)."""
+    params = {"class": type(splitter).__name__}
+    for attr in _SPLITTER_ATTRS:
+        if hasattr(splitter, attr):
+            params[attr] = getattr(splitter, attr)
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class NodeStore:
+    """Nœuds découpés par (hash du document, empreinte du splitter), dans SQLite."""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes (doc_hash TEXT NOT NULL, splitter TEXT NOT NULL,"
+            " payload BLOB NOT NULL, PRIMARY KEY (doc_hash, splitter)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, doc_hash: str, key: str) -> Optional[List[BaseNode]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM nodes WHERE doc_hash = ? AND splitter = ?", (doc_hash, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return [json_to_doc(d) for d in json.loads(zlib.decompress(row[0]).decode("utf-8"))]
+
+    def put_many(self, entries: Dict[str, List[BaseNode]], key: str) -> None:
+        rows = []
+        for doc_hash, nodes in entries.items():
+            payload = json.dumps([doc_to_json(n) for n in nodes], ensure_ascii=False)
+            rows.append((doc_hash, key, zlib.compress(payload.encode("utf-8"), 6)))
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?)", rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _attach(nodes: List[BaseNode], doc: Document) -> List[BaseNode]:
+    # Les identifiants de Document changent d'un chargement à l'autre:
+    # rattacher les nœuds mémorisés au document courant.
+    for n in nodes:
+        n.relationships[NodeRelationship.SOURCE] = doc.as_related_node_info()
+    return nodes
+
+
+def _annotated(nodes: List[BaseNode]) -> List[BaseNode]:
+    for n in nodes:
+        annotate_chunk(n)
+    return nodes
+
+
+def split_documents(
+    documents: Sequence[Document],
+    splitter,
+    persist_dir: Optional[str] = None,
+    stats: Optional[dict] = None,
+) -> List[BaseNode]:
+    """Nœuds des documents, découpés une seule fois par (document, paramètres).
+
+    Sans `persist_dir`, découpe simplement. Des documents identiques (même
+    hash) ne produisent leurs nœuds qu'une fois. `stats` (optionnel) reçoit
+    le nombre de documents relus (`reused`) et découpés (`split`).
+    """
+    documents = list(documents or [])
+    if not persist_dir:
+        if stats is not None:
+            stats.update({"reused": 0, "split": len(documents)})
+        return _annotated(splitter.get_nodes_from_documents(documents))
+
+    key = splitter_key(splitter)
+    store = NodeStore(str(Path(persist_dir) / NODE_STORE_FILE))
+    try:
+        cached: Dict[str, List[BaseNode]] = {}
+        missing: Dict[str, Document] = {}
+        for doc in documents:
+            h = doc.hash
+            if h in cached or h in missing:
+                continue
+            nodes = store.get(h, key)
+            if nodes is None:
+                missing[h] = doc
+            else:
+                cached[h] = _attach(nodes, doc)
+
+        fresh: Dict[str, List[BaseNode]] = {}
+        if missing:
+            by_id = {d.doc_id: d for d in missing.values()}
+            for n in _annotated(splitter.get_nodes_from_documents(list(missing.values()))):
+                doc = by_id.get(n.ref_doc_id)
+                if doc is not None:
+                    fresh.setdefault(doc.hash, []).append(n)
+            store.put_many(fresh, key)
+    finally:
+        store.close()
+
+    if stats is not None:
+        stats.update({"reused": len(cached), "split": len(missing)})
+    out: List[BaseNode] = []
+    emitted = set()
+    for doc in documents:
+        h = doc.hash
+        if h not in emitted:
+            emitted.add(h)
+            out.extend(cached.get(h) or fresh.get(h, []))
+    return out
@@ -1,103 +1,86 @@
 import math
-from typing import Any, Dict, List, Tuple
+import tempfile
+import time
+from pathlib import Path
 
 import streamlit as st
-from chromadb import PersistentClient
-
-
-def iter_collection_documents(collection, page_size: int = 500):
-    """Iterate over a Chroma collection in pages, yielding (id, meta, doc)."""
-    offset = 0
-    while True:
-        batch = collection.get(
-            include=["metadatas", "documents"],
-            limit=page_size,
-            offset=offset,
-        )
-        ids = batch.get("ids") or []
-        if not ids:
-            break
-        metas = batch.get("metadatas") or []
-        docs = batch.get("documents") or []
-        for i, cid in enumerate(ids):
-            yield cid, (metas[i] if i < len(metas) else {}), (docs[i] if i < len(docs) else "")
-        offset += len(ids)
 
+from app.chunk_browser import collection_names, get_browser
+from app.chunk_search import open_search_index, sync_collection
 
 st.set_page_config(page_title="Chunks", page_icon="📚", layout="wide")
 st.title("📚 Chunks en mémoire")
-st.caption("Parcourir les passages indexés dans Chroma (pagination / filtre par source)")
+st.caption("Parcourir les passages indexés dans Chroma (pagination / filtres par source et json_path / recherche plein texte)")
 
-col_top_a, col_top_b, col_top_c = st.columns([2, 1, 1])
+col_top_a, col_top_b, col_top_c, col_top_d = st.columns([2, 2, 1, 1])
 
 with col_top_a:
     src_filter = st.text_input("Filtre source (contient)", value="")
 with col_top_b:
-    page_size = st.selectbox("Taille de page", options=[50, 100, 200], index=0)
+    json_filter = st.text_input("Filtre json_path (contient)", value="")
 with col_top_c:
+    page_size = st.selectbox("Taille de page", options=[50, 100, 200], index=0)
+with col_top_d:
     refresh = st.button("🔄 Rafraîchir")
+query = st.text_input("Recherche plein texte", value="", placeholder="ex. flygt, 112917, relevage brive")
 
 persist_dir = st.session_state.get("persist_dir", "vectorstore")
 collection_name = st.session_state.get("collection", "eau_docs")
 
-client = PersistentClient(path=persist_dir)
+# Collections partitionnées par type d'actif (eau_docs, eau_docs_<type>)
+try:
+    names = collection_names(persist_dir, collection_name)
+except Exception:
+    names = []
+if len(names) == 1:
+    # Une seule partition (ex. eau_docs_poste_relevage): pas de collection de base
+    collection_name = names[0]
+elif len(names) > 1:
+    collection_name = st.selectbox("Collection", options=names, index=names.index(collection_name) if collection_name in names else 0)
 try:
-    collection = client.get_collection(collection_name)
+    browser = get_browser(persist_dir, collection_name)
 except Exception:
     st.error("Collection introuvable. Lancez une indexation pour créer des chunks.")
     st.stop()
 
-# Charger les enregistrements avec filtre optionnel
-records: List[Dict[str, Any]] = []
-if src_filter:
-    f = src_filter.lower()
-    for cid, meta, doc in iter_collection_documents(collection):
-        src = meta.get("file_path") or meta.get("filename") or meta.get("source") or meta.get("id") or ""
-        if f in str(src).lower():
-            records.append({
-                "id": str(cid),
-                "source": str(src),
-                "json_path": str(meta.get("json_path", "")),
-                "text": doc or "",
-            })
+# Filtres traduits en clause `where` Chroma; identifiants et total mis en cache
+# par filtre, seule la page courante est lue.
+filters = {"source": src_filter or None, "json_path": json_filter or None}
+if query:
+    # Recherche FTS5 (chunks_fts.sqlite), reconstruite si la collection a changé
+    search = open_search_index(persist_dir)
+    try:
+        if sync_collection(search, browser, collection_name):
+            st.caption("Index plein texte reconstruit.")
+        t0 = time.perf_counter()
+        total = search.count_matches(query, collection_name, **filters)
+        n_pages = max(1, math.ceil(total / page_size))
+        page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
+        view = search.search(
+            query, collection_name, limit=page_size, offset=(page - 1) * page_size, marks=("**", "**"), **filters
+        )
+        ms = (time.perf_counter() - t0) * 1000
+    finally:
+        search.close()
+    st.write(f"Chunks trouvés: {total} ({ms:.0f} ms) | Pages: {n_pages} | Page courante: {page}")
 else:
-    # Pas de filtre: on ne charge que la page courante via offset/limit plus bas
-    pass
-
-# Pagination
-if src_filter:
-    total = len(records)
+    total = browser.count(**filters)
     n_pages = max(1, math.ceil(total / page_size))
     page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
-    start = (page - 1) * page_size
-    end = start + page_size
-    view = records[start:end]
-    st.write(f"Total filtré: {total} | Pages: {n_pages} | Page courante: {page}")
-else:
-    # Sans filtre: s'appuyer sur Chroma pour offset/limit
-    try:
-        total = int(collection.count())
-    except Exception:
-        total = 0
-    n_pages = max(1, math.ceil(max(0, total) / page_size))
-    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
-    offset = (page - 1) * page_size
-    batch = collection.get(include=["metadatas", "documents"], limit=page_size, offset=offset)
-    view = []
-    ids = batch.get("ids") or []
-    metas = batch.get("metadatas") or []
-    docs = batch.get("documents") or []
-    for i, cid in enumerate(ids):
-        meta = metas[i] if i < len(metas) else {}
-        doc = docs[i] if i < len(docs) else ""
-        src = meta.get("file_path") or meta.get("filename") or meta.get("source") or meta.get("id") or ""
-        view.append({
-            "id": str(cid),
-            "source": str(src),
-            "json_path": str(meta.get("json_path", "")),
-            "text": doc or "",
-        })
-    st.write(f"Total: {total} | Pages: {n_pages} | Page courante: {page}")
+    view = browser.page((page - 1) * page_size, page_size, **filters)
+    label = "Total filtré" if src_filter or json_filter else "Total"
+    st.write(f"{label}: {total} | Pages: {n_pages} | Page courante: {page}")
+
+# Export des chunks filtrés, écrit au fil de la lecture
+with st.expander("Exporter"):
+    fmt = st.radio("Format", options=["jsonl", "csv"], horizontal=True)
+    if st.button("Exporter les chunks filtrés"):
+        out_path = Path(tempfile.gettempdir()) / f"{collection_name}_chunks.{fmt}"
+        with open(out_path, "w", newline="", encoding="utf-8") as f:
+            n = browser.export(f, fmt, **filters)
+        st.success(f"{n} chunks exportés: {out_path}")
+        with open(out_path, "rb") as f:
+            st.download_button("Télécharger", data=f, file_name=out_path.name)
 
 # Affichage
 if not view:
@@ -107,5 +90,7 @@ else:
         with st.expander(f"{rec['id']} — {rec['source']}"):
             if rec.get("json_path"):
                 st.caption(f"json_path: {rec['json_path']}")
-            st.write(rec["text"]) 
-
+            if rec.get("snippet"):
+                st.markdown(f"… {rec['snippet']} …")
+                st.divider()
+            st.write(rec["text"])
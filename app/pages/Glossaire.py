@@ -2,10 +2,11 @@ import json
 from pathlib import Path
 import streamlit as st
 
-BASE_APP = Path(__file__).resolve().parent.parent  # app/
-ABBR_DIR = BASE_APP / "abreviations"
-ABBR_FILE = ABBR_DIR / "abreviations.json"
-REGEX_FILE = ABBR_DIR / "abreviations_regex.json"
+from app.glossary_rules import check_rules, compile_glossary, glossary_settings, sample_chunks, validate_mapping
+from app.glossary_sync import glossary_diff, load_history, record_glossary
+from app.text_normalize import ABBR_FILE, REGEX_FILE, glossary_snapshot, reload_glossary
+
+persist_dir = st.session_state.get("persist_dir", "vectorstore")
 
 
 def load_json(path: Path, fallback):
@@ -25,9 +26,83 @@ def save_json(path: Path, data) -> bool:
         return False
 
 
+@st.cache_data(ttl=600, show_spinner=False)
+def _samples(persist_dir: str, n: int) -> list:
+    return sample_chunks(persist_dir, n)
+
+
+def show_rules_report(report: dict) -> None:
+    rows = []
+    for r in report["rules"]:
+        cost = r.get("cost") or {}
+        rows.append({
+            "#": r["index"],
+            "statut": r["status"],
+            "motif": r["pattern"],
+            "µs/chunk": cost.get("mean_us"),
+            "pire (ms)": cost.get("max_ms"),
+            "chunks modifiés": cost.get("changed"),
+            "détail": "; ".join([*r["errors"], *r["warnings"]]),
+        })
+    st.caption(f"Coût mesuré sur {report['samples']} chunks de l'index")
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+
+def compile_saved_glossary() -> None:
+    """Artefact précompilé lu au démarrage (ignoré tant que les JSON ne sont pas valides)."""
+    try:
+        compile_glossary(load_json(ABBR_FILE, {}), json.loads(REGEX_FILE.read_text(encoding="utf-8")))
+    except Exception as e:
+        st.warning(f"Artefact compilé non mis à jour ({e}) : le glossaire sera relu depuis les JSON.")
+
+
+def apply_saved_glossary(previous: dict) -> None:
+    """Recharge le glossaire dans le processus et met à jour les seuls chunks concernés.
+
+    `previous`: glossaire chargé avant l'enregistrement (`glossary_snapshot()`).
+    """
+    if Path(persist_dir).is_dir():
+        # Version dont les chunks existants peuvent porter l'empreinte
+        record_glossary(persist_dir, previous)
+    version = reload_glossary()
+    if version == previous["version"]:
+        st.success("Enregistré (contenu inchangé).")
+        return
+    diff = glossary_diff(previous, glossary_snapshot())
+    st.success(
+        f"Glossaire rechargé (version {version}) : {len(diff['added'])} ajoutées,"
+        f" {len(diff['changed'])} modifiées, {len(diff['removed'])} supprimées"
+        + (", règles regex modifiées" if diff["rules_changed"] else "")
+        + "."
+    )
+    if not load_history(persist_dir):
+        st.info("Aucun index versionné : le glossaire s'appliquera à la prochaine indexation.")
+        return
+    from app.glossary_sync import sync_glossary
+
+    try:
+        with st.spinner("Mise à jour des chunks concernés..."):
+            stats = sync_glossary(persist_dir)
+    except Exception as e:
+        st.error(f"Mise à jour des chunks impossible ({e}). Relancez `python -m app.glossary_sync --persist-dir {persist_dir}`.")
+        return
+    st.info(
+        f"{stats['reembedded']} chunks re-normalisés et ré-embeddés, {stats['restamped']} inchangés,"
+        f" {stats['current']} déjà à jour sur {stats['chunks']}."
+    )
+    if stats["rules_changed"] or stats["unknown_version"]:
+        st.warning(
+            f"{stats['rules_changed'] + stats['unknown_version']} chunks ne peuvent pas être mis à jour"
+            " sélectivement (règles regex modifiées ou version inconnue) : relancez l'indexation."
+        )
+
+
 st.set_page_config(page_title="Glossaire d'abréviations", page_icon="🗂️", layout="wide")
 st.title("🗂️ Glossaire d'abréviations")
-st.caption("Éditez les abréviations utilisées lors de l'indexation et des requêtes.")
+st.caption(
+    "Éditez les abréviations utilisées lors de l'indexation et des requêtes. À l'enregistrement, le glossaire"
+    " est rechargé et seuls les chunks concernés sont re-normalisés et ré-embeddés."
+)
 
 col_a, col_b = st.columns(2)
 
@@ -39,10 +114,19 @@ with col_a:
     if st.button("💾 Enregistrer le dictionnaire"):
         try:
             data = json.loads(abbr_text)
-            if save_json(ABBR_FILE, data):
-                st.success("Dictionnaire enregistré. Relancez l'indexation pour appliquer côté embeddings.")
         except Exception as e:
             st.error(f"JSON invalide: {e}")
+        else:
+            check = validate_mapping(data)
+            for w in check["warnings"]:
+                st.warning(w)
+            if check["errors"]:
+                st.error("Dictionnaire refusé : " + " ; ".join(check["errors"]))
+            else:
+                previous = glossary_snapshot()
+                if save_json(ABBR_FILE, data):
+                    compile_saved_glossary()
+                    apply_saved_glossary(previous)
 
 with col_b:
     st.subheader("Règles regex (pattern/replacement/flags)")
@@ -51,10 +135,21 @@ with col_b:
     if st.button("💾 Enregistrer les règles"):
         try:
             data = json.loads(rules_text)
-            if save_json(REGEX_FILE, data):
-                st.success("Règles enregistrées. Relancez l'indexation pour appliquer côté embeddings.")
         except Exception as e:
             st.error(f"JSON invalide: {e}")
+        else:
+            # Validation et coût de chaque règle sur des chunks réels avant écriture
+            settings = glossary_settings()
+            with st.spinner("Vérification des règles..."):
+                report = check_rules(data, _samples(persist_dir, settings["sample_size"]), settings)
+            show_rules_report(report)
+            if not report["ok"]:
+                st.error("Règles refusées (erreur, trop lentes ou interrompues) : corrigez-les puis réenregistrez.")
+            else:
+                previous = glossary_snapshot()
+                if save_json(REGEX_FILE, data):
+                    compile_saved_glossary()
+                    apply_saved_glossary(previous)
 
 st.markdown("---")
 st.info("Astuce: l'expansion à la requête peut être désactivée dans l'écran principal.")
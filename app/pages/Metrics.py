@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from app.metrics import percentiles, read_metrics
+
+st.set_page_config(page_title="Métriques", page_icon="⏱️", layout="wide")
+st.title("⏱️ Durées par étape")
+st.caption("Mesures enregistrées dans metrics.jsonl (questions et indexations)")
+
+persist_dir = st.session_state.get("persist_dir", "vectorstore")
+
+col_a, col_b, col_c = st.columns([1, 1, 1])
+with col_a:
+    kind = st.selectbox(
+        "Type",
+        options=["query", "index", "warmup"],
+        format_func=lambda k: {"query": "Questions", "index": "Indexations", "warmup": "Préchauffage"}[k],
+    )
+with col_b:
+    last_n = st.selectbox("Dernières mesures", options=[100, 500, 2000, 0], format_func=lambda n: str(n) if n else "Toutes")
+with col_c:
+    st.button("🔄 Rafraîchir")
+
+records = read_metrics(persist_dir, kind)
+if last_n:
+    records = records[-last_n:]
+if not records:
+    st.info(f"Aucune mesure dans `{persist_dir}/metrics.jsonl` pour l'instant.")
+    st.stop()
+
+st.subheader(f"p50 / p95 par étape ({len(records)} mesures)")
+stats = percentiles(records, qs=(50, 95))
+table = pd.DataFrame(
+    [{"étape": name, "n": s["n"], "p50 (s)": round(s["p50"], 3), "p95 (s)": round(s["p95"], 3)} for name, s in stats.items()]
+).sort_values("p95 (s)", ascending=False)
+st.dataframe(table, hide_index=True, use_container_width=True)
+
+rows = []
+for rec in records:
+    row = {"date": datetime.fromtimestamp(rec.get("ts", 0))}
+    row.update(rec.get("spans") or {})
+    row.update(rec.get("counts") or {})
+    rows.append(row)
+frame = pd.DataFrame(rows).set_index("date")
+
+span_cols = [c for c in stats if c in frame.columns]
+if span_cols:
+    st.subheader("Durées dans le temps (s)")
+    st.line_chart(frame[span_cols])
+
+token_cols = [c for c in ("prompt_tokens", "completion_tokens") if c in frame.columns]
+if token_cols:
+    st.subheader("Jetons par question")
+    st.line_chart(frame[token_cols])
@@ -0,0 +1,157 @@
+"""Partitionnement de l'index par type d'actif.
+
+Chaque document est classé à l'ingestion (poste de relevage, station
+d'épuration, ...) et écrit dans une collection Chroma dédiée. Les questions
+sont routées vers la ou les partitions concernées; en cas de doute, la
+recherche est répartie en parallèle sur toutes les partitions.
+
+Règles de classement:
+1) type déduit du nom de fichier (`asset_type`, voir `app.site_metadata`);
+2) sinon, mots-clés de la section `identify` de `ontology/schemas.yaml`.
+
+Les documents non classés restent dans la collection historique `eau_docs`.
+"""
+
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import yaml
+
+from app.text_normalize import embedding_text
+
+BASE_COLLECTION = "eau_docs"
+GENERIC = "generique"
+
+# Types issus des noms de fichiers -> types de l'ontologie
+ASSET_TYPE_CLASSES = {
+    "PR": "poste_relevage",
+    "R": "poste_relevage",
+    "STEP": "station_epuration",
+}
+
+SCHEMA_PATH = Path(__file__).resolve().parent / "ontology" / "schemas.yaml"
+
+
+@lru_cache(maxsize=1)
+def load_identify_rules(schema_path: str = str(SCHEMA_PATH)) -> Dict[str, List[str]]:
+    """Lit la section `identify` ({type: [mots-clés]}) de schemas.yaml."""
+    try:
+        data = yaml.safe_load(Path(schema_path).read_text(encoding="utf-8")) or {}
+    except Exception:
+        return {}
+    rules: Dict[str, List[str]] = {}
+    for name, spec in (data.get("identify") or {}).items():
+        kws = [str(k) for k in (spec or {}).get("keywords", []) or [] if str(k).strip()]
+        if kws:
+            rules[str(name)] = kws
+    return rules
+
+
+@lru_cache(maxsize=256)
+def _compiled(keyword: str) -> re.Pattern:
+    kw = keyword.strip()
+    # Sigles courts ("PR", "STEP", "SBR"): casse respectée pour éviter les faux positifs
+    flags = 0 if (kw.isupper() and len(kw) <= 5) else re.IGNORECASE
+    # Pluriel toléré sur les mots ("postes de relevage", "stations d'épuration")
+    words = [re.escape(w) + ("s?" if len(w) > 3 and w[-1].isalpha() else "") for w in kw.split()]
+    body = r"\s+".join(words)
+    return re.compile(rf"(?<!\w){body}(?!\w)", flags)
+
+
+def _keyword_hits(text: str, rules: Dict[str, List[str]]) -> Dict[str, int]:
+    hits: Dict[str, int] = {}
+    for name, kws in rules.items():
+        n = sum(len(_compiled(k).findall(text)) for k in kws)
+        if n:
+            hits[name] = n
+    return hits
+
+
+def classify_document(text: str, metadata: Optional[dict] = None, rules: Optional[Dict[str, List[str]]] = None) -> str:
+    """Retourne la partition d'un document (type d'ontologie ou `GENERIC`)."""
+    meta = metadata or {}
+    cls = ASSET_TYPE_CLASSES.get(str(meta.get("asset_type") or ""))
+    if cls:
+        return cls
+    if str(meta.get("asset_type") or ""):
+        # Type reconnu mais hors ontologie (ex. DO): pas de partition dédiée
+        return GENERIC
+    rules = load_identify_rules() if rules is None else rules
+    hits = _keyword_hits(text or "", rules)
+    if not hits:
+        return GENERIC
+    ranked = sorted(hits.items(), key=lambda kv: kv[1], reverse=True)
+    if len(ranked) > 1 and ranked[0][1] == ranked[1][1]:
+        return GENERIC
+    return ranked[0][0]
+
+
+def route_query(question: str, rules: Optional[Dict[str, List[str]]] = None) -> Optional[List[str]]:
+    """Partitions ciblées par la question, ou None si le type n'est pas certain.
+
+    Une question qui cite un seul type (ex. "STEP") n'interroge que cette
+    partition; une question qui en cite plusieurs ou aucun est répartie sur
+    toutes les partitions.
+    """
+    rules = load_identify_rules() if rules is None else rules
+    hits = _keyword_hits(question or "", rules)
+    if len(hits) == 1:
+        return list(hits)
+    return None
+
+
+def collection_name(partition: str, base: str = BASE_COLLECTION) -> str:
+    """Nom de la collection Chroma d'une partition."""
+    return base if partition == GENERIC else f"{base}_{partition}"
+
+
+def partition_of_collection(name: str, base: str = BASE_COLLECTION) -> Optional[str]:
+    """Partition correspondant à un nom de collection (None si étrangère)."""
+    if name == base:
+        return GENERIC
+    prefix = f"{base}_"
+    if name.startswith(prefix):
+        return name[len(prefix):]
+    return None
+
+
+def group_by_partition(documents: Iterable, rules: Optional[Dict[str, List[str]]] = None) -> Dict[str, list]:
+    """Classe des `Document` et les regroupe par partition.
+
+    La partition est aussi reportée dans les métadonnées (`asset_class`).
+    Les textes compacts sont classés sur leur forme développée ("R" ->
+    "Poste de relevage (R)"), comme avant l'indexation compacte.
+    """
+    groups: Dict[str, list] = {}
+    for d in documents:
+        meta = getattr(d, "metadata", None) or {}
+        part = classify_document(embedding_text(getattr(d, "text", "") or "", meta), meta, rules)
+        try:
+            d.metadata["asset_class"] = part
+        except Exception:
+            pass
+        groups.setdefault(part, []).append(d)
+    return groups
+
+
+class PartitionedIndex:
+    """Ensemble d'index vectoriels, un par partition (type d'actif)."""
+
+    def __init__(self, indexes: Dict[str, object]):
+        self.indexes = dict(indexes)
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def partitions(self) -> List[str]:
+        return list(self.indexes)
+
+    def select(self, partitions: Optional[List[str]]) -> Dict[str, object]:
+        """Index à interroger: partitions routées si disponibles, sinon toutes."""
+        if partitions:
+            chosen = {p: self.indexes[p] for p in partitions if p in self.indexes}
+            if chosen:
+                return chosen
+        return dict(self.indexes)
@@ -0,0 +1,267 @@
+"""Profil d'une indexation: temps, CPU et mémoire par fichier et par étape.
+
+L'indexation de tout `reducteur/` fait parfois exploser la mémoire sans
+qu'on sache quel fichier ni quelle étape en est la cause. `RunProfiler` est
+un `Timings` (voir `app.metrics`): utilisé avec `recording()`, chaque
+`span()` des étapes existantes (`load`, `normalize`, `split`, `dedup`,
+`embed`, `upsert`...) est mesuré pour le fichier en cours (`profiler.file()`):
+
+- temps écoulé et temps CPU du processus (tous threads confondus);
+- pic de mémoire résidente (RSS du processus) et hausse par rapport au
+  début de l'étape, échantillonnés par un thread;
+- avec `trace_memory=True`, pic des allocations Python au-delà de celles
+  présentes au début de l'étape (`tracemalloc`, plus précis mais ralentit
+  l'exécution).
+
+`report()` classe les fichiers les plus lents et les plus gourmands en
+mémoire; `profile_call` (cProfile) enregistre en plus un profil des
+fonctions lisible par `pstats` / snakeviz.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from app.metrics import Timings
+
+_MB = 1e6
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        import resource
+
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+
+class _Window:
+    """Pic de RSS observé pendant qu'une fenêtre est ouverte."""
+
+    def __init__(self) -> None:
+        self.start = self.peak = rss_bytes()
+
+
+class _RSSSampler:
+    """Thread qui relève la mémoire résidente et met à jour les fenêtres ouvertes."""
+
+    def __init__(self, period: float = 0.02) -> None:
+        self.period = period
+        self._windows: List[_Window] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _sample(self) -> None:
+        rss = rss_bytes()
+        with self._lock:
+            for w in self._windows:
+                if rss > w.peak:
+                    w.peak = rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.period):
+            self._sample()
+
+    @contextmanager
+    def window(self) -> Iterator[_Window]:
+        w = _Window()
+        with self._lock:
+            self._windows.append(w)
+        try:
+            yield w
+        finally:
+            self._sample()
+            with self._lock:
+                self._windows.remove(w)
+
+
+def _new_stat() -> Dict[str, float]:
+    return {"wall_s": 0.0, "cpu_s": 0.0, "rss_peak_mb": 0.0, "rss_growth_mb": 0.0, "py_peak_mb": 0.0, "calls": 0}
+
+
+def _merge(stat: Dict[str, float], m: dict) -> None:
+    stat["wall_s"] += m["wall"]
+    stat["cpu_s"] += m["cpu"]
+    stat["rss_peak_mb"] = max(stat["rss_peak_mb"], m["rss_peak"] / _MB)
+    stat["rss_growth_mb"] = max(stat["rss_growth_mb"], (m["rss_peak"] - m["rss_start"]) / _MB)
+    stat["py_peak_mb"] = max(stat["py_peak_mb"], m["py_peak"] / _MB)
+    stat["calls"] += 1
+
+
+class RunProfiler(Timings):
+    """`Timings` qui mesure aussi CPU et mémoire, par fichier et par étape."""
+
+    def __init__(self, trace_memory: bool = False, sample_period: float = 0.02) -> None:
+        super().__init__()
+        self.trace_memory = trace_memory
+        self.files: Dict[str, Dict[str, float]] = {}
+        self.file_stages: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._sampler = _RSSSampler(sample_period)
+        self._file_local = threading.local()
+        self._py_windows: List[list] = []
+        self._started_tracemalloc = False
+
+    # -------------------- cycle de vie --------------------
+    def start(self) -> "RunProfiler":
+        self._sampler.start()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        return self
+
+    def stop(self) -> None:
+        self._sampler.stop()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def __enter__(self) -> "RunProfiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # -------------------- mesures --------------------
+    def _py_open(self) -> list:
+        """Fenêtre tracemalloc `[base, pic]`; les fenêtres englobantes gardent leur pic."""
+        if not tracemalloc.is_tracing():
+            return [0, 0]
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            for w in self._py_windows:
+                w[1] = max(w[1], peak)
+            win = [current, current]
+            self._py_windows.append(win)
+        tracemalloc.reset_peak()
+        return win
+
+    def _py_close(self, win: list) -> int:
+        if not tracemalloc.is_tracing():
+            return 0
+        peak = tracemalloc.get_traced_memory()[1]
+        with self._lock:
+            self._py_windows = [w for w in self._py_windows if w is not win]
+        return max(0, max(win[1], peak) - win[0])
+
+    @contextmanager
+    def _measure(self) -> Iterator[dict]:
+        out: dict = {}
+        win = self._py_open()
+        t0, c0 = time.perf_counter(), time.process_time()
+        with self._sampler.window() as w:
+            try:
+                yield out
+            finally:
+                out.update(
+                    wall=time.perf_counter() - t0,
+                    cpu=time.process_time() - c0,
+                    rss_start=w.start,
+                    rss_peak=w.peak,
+                    py_peak=self._py_close(win),
+                )
+
+    @contextmanager
+    def file(self, path: str) -> Iterator[None]:
+        """Attribue au fichier `path` les étapes exécutées dans le bloc (cumulées)."""
+        previous = getattr(self._file_local, "path", None)
+        self._file_local.path = str(path)
+        m: dict = {}
+        try:
+            with self._measure() as m:
+                yield
+        finally:
+            self._file_local.path = previous
+            if m:
+                with self._lock:
+                    _merge(self.files.setdefault(str(path), _new_stat()), m)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        path = getattr(self._file_local, "path", None) or "(hors fichier)"
+        m: dict = {}
+        try:
+            with self._measure() as m:
+                yield
+        finally:
+            if m:
+                self.add(name, m["wall"])
+                with self._lock:
+                    _merge(self.stages.setdefault(name, _new_stat()), m)
+                    per_file = self.file_stages.setdefault(path, {})
+                    _merge(per_file.setdefault(name, _new_stat()), m)
+
+    # -------------------- restitution --------------------
+    def as_dict(self) -> dict:
+        out = super().as_dict()
+
+        def rounded(stat: Dict[str, float]) -> Dict[str, float]:
+            return {k: round(v, 3) if isinstance(v, float) else v for k, v in stat.items()}
+
+        with self._lock:
+            out["stages"] = {k: rounded(v) for k, v in self.stages.items()}
+            out["files"] = {
+                path: {**rounded(stat), "stages": {k: rounded(v) for k, v in self.file_stages.get(path, {}).items()}}
+                for path, stat in self.files.items()
+            }
+        return out
+
+    def report(self, top: int = 10) -> str:
+        """Texte: totaux par étape, fichiers les plus lents et les plus gourmands."""
+        mem_key = "py_peak_mb" if self.trace_memory else "rss_growth_mb"
+        mem_label = "pic Python" if self.trace_memory else "hausse RSS"
+        lines = ["Étapes:"]
+        for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1]["wall_s"]):
+            lines.append(
+                f"  {name:10s} {s['wall_s']:8.2f}s écoulées | CPU {s['cpu_s']:8.2f}s"
+                f" | {mem_label} {s[mem_key]:8.1f} Mo | pic RSS {s['rss_peak_mb']:8.1f} Mo | {s['calls']} appels"
+            )
+
+        def worst_stage(path: str, key: str) -> tuple:
+            stages = self.file_stages.get(path) or {}
+            return max(stages.items(), key=lambda kv: kv[1][key]) if stages else (None, None)
+
+        lines.append(f"Fichiers les plus lents (top {top}):")
+        for path, s in sorted(self.files.items(), key=lambda kv: -kv[1]["wall_s"])[:top]:
+            name, st = worst_stage(path, "wall_s")
+            detail = f" (surtout {name} {st['wall_s']:.2f}s)" if name else ""
+            lines.append(f"  {s['wall_s']:8.2f}s | CPU {s['cpu_s']:8.2f}s | {os.path.basename(path)}{detail}")
+        lines.append(f"Fichiers les plus gourmands en mémoire ({mem_label}, top {top}):")
+        for path, s in sorted(self.files.items(), key=lambda kv: -kv[1][mem_key])[:top]:
+            name, _ = worst_stage(path, mem_key)
+            detail = f" (surtout {name})" if name else ""
+            lines.append(f"  {s[mem_key]:8.1f} Mo | pic RSS {s['rss_peak_mb']:8.1f} Mo | {os.path.basename(path)}{detail}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_call(dump_path: Optional[str]) -> Iterator[Optional[cProfile.Profile]]:
+    """cProfile du bloc (thread courant), écrit dans `dump_path` (rien si None)."""
+    if not dump_path:
+        yield None
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        prof.dump_stats(dump_path)
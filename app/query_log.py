@@ -0,0 +1,137 @@
+"""Journal local des questions fréquentes (préchauffage des caches).
+
+Chaque question posée dans l'application est normalisée
+(`normalize_question`) et comptée dans `query_log.json` (dossier de
+persistance): `{question: {"count": n, "last": "AAAA-MM-JJ"}}`. Le
+préchauffage au démarrage (`app.warmup`) rejoue les plus fréquentes.
+
+Confidentialité:
+- rien ne quitte la machine; ni utilisateur, ni session, ni heure (le jour
+  de la dernière occurrence seulement);
+- les questions contenant une adresse e-mail ou un numéro de téléphone ne
+  sont pas enregistrées;
+- seules les questions posées au moins `min_count` fois sont rejouées, et le
+  journal est borné (`max_entries`, les moins fréquentes sont oubliées);
+- `warmup.log_questions: false` désactive le journal, `--clear` l'efface.
+
+Exemples:
+  python -m app.query_log --persist-dir vectorstore --top 20
+  python -m app.query_log --persist-dir vectorstore --clear
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import List, Optional
+
+LOG_FILE = "query_log.json"
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+# Numéros de téléphone (06 12 34 56 78, 06.12.34.56.78, +33 6 12 34 56 78)
+_PHONE = re.compile(r"(?<!\d)(?:\+\d{2}\s?|0)\d(?:[\s.-]?\d{2}){4}(?!\d)")
+
+_LOCK = threading.Lock()
+
+
+def normalize_question(question: str) -> str:
+    """Forme canonique d'une question (Unicode NFC, espaces réduits)."""
+    return " ".join(unicodedata.normalize("NFC", question or "").split())
+
+
+def is_personal(question: str) -> bool:
+    """Question contenant une donnée personnelle évidente (e-mail, téléphone)."""
+    return bool(_EMAIL.search(question) or _PHONE.search(question))
+
+
+def warmup_settings() -> dict:
+    """Section `warmup` de la configuration, lue une fois par processus (appelée à chaque question)."""
+    from app.utils.config import config_section
+
+    return config_section("warmup")
+
+
+def load_log(persist_dir: str) -> dict:
+    try:
+        return json.loads((Path(persist_dir) / LOG_FILE).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save(persist_dir: str, log: dict) -> None:
+    path = Path(persist_dir) / LOG_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(log, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def record_question(persist_dir: Optional[str], question: str, max_entries: Optional[int] = None) -> bool:
+    """Compte une question posée; retourne False si elle n'est pas enregistrée."""
+    settings = warmup_settings()
+    if not persist_dir or not settings.get("log_questions", True):
+        return False
+    q = normalize_question(question)
+    if not q or is_personal(q):
+        return False
+    limit = int(max_entries if max_entries is not None else settings.get("max_entries", 2000))
+    with _LOCK:
+        log = load_log(persist_dir)
+        entry = log.setdefault(q, {"count": 0})
+        entry["count"] = int(entry.get("count", 0)) + 1
+        entry["last"] = time.strftime("%Y-%m-%d")
+        if len(log) > limit:
+            # Oublier les moins fréquentes, puis les plus anciennes
+            keep = sorted(log.items(), key=lambda kv: (kv[1].get("count", 0), kv[1].get("last", "")), reverse=True)
+            log = dict(keep[:limit])
+        _save(persist_dir, log)
+    return True
+
+
+def top_questions(
+    persist_dir: str,
+    n: int = 20,
+    min_count: int = 2,
+    recent_days: Optional[int] = 30,
+) -> List[str]:
+    """Questions les plus fréquentes (puis les plus récentes), posées dans les `recent_days` derniers jours."""
+    log = load_log(persist_dir)
+    cutoff = time.strftime("%Y-%m-%d", time.localtime(time.time() - recent_days * 86400)) if recent_days else ""
+    rows = [
+        (q, e) for q, e in log.items()
+        if int(e.get("count", 0)) >= min_count and str(e.get("last", "")) >= cutoff and not is_personal(q)
+    ]
+    rows.sort(key=lambda kv: (int(kv[1].get("count", 0)), str(kv[1].get("last", ""))), reverse=True)
+    return [q for q, _ in rows[: max(0, int(n))]]
+
+
+def clear_log(persist_dir: str) -> bool:
+    try:
+        (Path(persist_dir) / LOG_FILE).unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Questions fréquentes enregistrées pour le préchauffage")
+    ap.add_argument("--persist-dir", default="vectorstore", help="Dossier de persistance")
+    ap.add_argument("--top", type=int, default=20, help="Nombre de questions affichées")
+    ap.add_argument("--clear", action="store_true", help="Efface le journal")
+    args = ap.parse_args(argv)
+
+    if args.clear:
+        print("Journal effacé." if clear_log(args.persist_dir) else "Aucun journal.")
+        return 0
+    log = load_log(args.persist_dir)
+    for q in top_questions(args.persist_dir, args.top, min_count=1, recent_days=None):
+        print(f"{log[q].get('count', 0):>5}  {log[q].get('last', '')}  {q}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
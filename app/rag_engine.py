@@ -1,16 +1,304 @@
-from typing import List
-from llama_index.core import VectorStoreIndex
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, Union
+from llama_index.core import VectorStoreIndex, get_response_synthesizer
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.llms.ollama import Ollama
-from app.text_normalize import expand_abbreviations
+from app.llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_WARMUP, get_scheduler
+from app.metrics import Timings, add, append_metrics, bind, count, current, install_token_counter, recording, span
+from app.partitions import PartitionedIndex, route_query
+from app.dedup import duplicate_sources
+from app.query_log import normalize_question, record_question
+from app.records_table import answer_aggregate
+from app.retrieval_cache import get_retrieval_cache, model_key, result_key, store_generation
+from app.site_metadata import load_gazetteer, match_site_entities, match_site_filters
+from app.text_normalize import expand_abbreviations, reload_if_changed
+from app.warmup import note_traffic
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.postprocessor import SimilarityPostprocessor
+import math
 import re
+import threading
+import time
 
 
-def ask_question(
-    index: VectorStoreIndex,
+# Prompt QA strictement ancré au contexte
+STRICT_QA_PROMPT = """
+Tu es un assistant technique. Réponds UNIQUEMENT avec les informations contenues dans le CONTEXTE ci‑dessous.
+Si le CONTEXTE ne permet pas de répondre, dis explicitement: "Je ne sais pas d'après le contexte fourni." Ne fais aucun appel à des connaissances générales.
+
+CONTEXT:
+{context_str}
+
+QUESTION (réponds en français, de manière concise):
+{query_str}
+
+RÉPONSE:
+"""
+
+
+def _metadata_filter_from_question(question: str) -> Optional[Tuple[str, str]]:
+    """Détecte une clé/valeur connue (CodePPV, RAE ou PRM) dans la question."""
+    m = re.search(r"\b(?:code\s*ppv|codeppv|ppv)\s*[:=]?\s*(\d{3,})", question, flags=re.IGNORECASE)
+    if m:
+        return ("CodePPV", m.group(1))
+    m = re.search(r"\b(?:rae\s*ou\s*prm|rae|prm)\s*[:=]?\s*(\d{6,})", question, flags=re.IGNORECASE)
+    if m:
+        return ("RAE ou PRM", m.group(1))
+    return None
+
+
+def prepare_question(question: str, expand_abbr: bool = True) -> str:
+    """Renforce la consigne de langue et applique l'expansion d'abréviations."""
+    # Glossaire modifié sur disque (page Glossaire, autre processus): relu ici
+    reload_if_changed()
+    question_expanded = expand_abbreviations(question) if expand_abbr else question
+    return f"En français, de manière concise :\n{question_expanded}"
+
+
+def _candidate_filters(question: str, persist_dir: Optional[str]) -> List[List[Tuple[str, str]]]:
+    """Filtres metadata à essayer, du plus précis au plus large.
+
+    1) clé/valeur explicite (CodePPV, RAE ou PRM);
+    2) commune et/ou site reconnus dans la question (répertoire `sites.json`).
+    """
+    candidates: List[List[Tuple[str, str]]] = []
+    try:
+        mf = _metadata_filter_from_question(question)
+        if mf:
+            candidates.append([mf])
+    except Exception:
+        pass
+    if persist_dir:
+        try:
+            site = match_site_filters(question, load_gazetteer(persist_dir))
+            if site:
+                candidates.append(sorted(site.items()))
+                if "site" in site:
+                    candidates.append([("commune", site["commune"])])
+        except Exception:
+            pass
+    return candidates
+
+
+def _store_key(index) -> str:
+    vs = getattr(index, "vector_store", None)
+    name = getattr(vs, "collection_name", None) or getattr(getattr(vs, "_collection", None), "name", None)
+    return str(name or getattr(vs, "path", None) or f"{type(vs).__name__}:{id(vs)}")
+
+
+def _cached_nodes(index, hits) -> Optional[List[NodeWithScore]]:
+    """Passages d'un résultat en cache, relus par identifiant (None si incomplet)."""
+    if not hits:
+        return [] if hits is not None else None
+    try:
+        nodes = index.vector_store.get_nodes(node_ids=[nid for nid, _ in hits])
+    except Exception:
+        return None
+    by_id = {n.node_id: n for n in nodes}
+    if any(nid not in by_id for nid, _ in hits):
+        return None
+    return [NodeWithScore(node=by_id[nid], score=score) for nid, score in hits]
+
+
+def _search(index: VectorStoreIndex, question_fr, top_k: int, pairs=None, embed=None, generation=None) -> List[NodeWithScore]:
+    """Recherche vectorielle sur un index, avec filtre metadata optionnel.
+
+    `question_fr`: texte ou `QueryBundle` dont l'embedding est déjà calculé.
+    `embed` (voir `_query_embedder`): n'est appelé que si le résultat n'est
+    pas en cache; le cache des résultats n'est utilisé qu'avec la
+    `generation` du stockage (voir `app.retrieval_cache`).
+    """
+    key = None
+    if embed is not None and generation is not None and isinstance(question_fr, str):
+        cache = get_retrieval_cache()
+        key = result_key(question_fr, embed.model, top_k, pairs, _store_key(index), generation)
+        nodes = _cached_nodes(index, cache.results(key))
+        if nodes is not None:
+            count("retrieval_cache_hits")
+            return nodes
+    if embed is not None:
+        question_fr = embed(question_fr)
+    count("searches")
+    if not pairs:
+        with span("retrieve"):
+            nodes = index.as_retriever(similarity_top_k=top_k).retrieve(question_fr)
+    else:
+        from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+        filters = MetadataFilters(filters=[ExactMatchFilter(key=k, value=str(v)) for k, v in pairs])
+        with span("retrieve"):
+            nodes = index.as_retriever(similarity_top_k=top_k, filters=filters).retrieve(question_fr)
+    if key is not None:
+        get_retrieval_cache().put_results(key, [(n.node.node_id, n.score) for n in nodes])
+    return nodes
+
+
+class _QueryEmbedder:
+    """Embedding des requêtes calculé une fois par texte et par modèle.
+
+    Appelé avec un texte, retourne un `QueryBundle` (ou le texte tel quel si
+    le modèle d'embedding de l'index est inaccessible). Les vecteurs sont
+    conservés dans le cache du processus (`app.retrieval_cache`); des
+    recherches parallèles sur le même texte n'appellent le modèle qu'une fois.
+    """
+
+    def __init__(self, embed_model):
+        self.embed_model = embed_model
+        self.model = model_key(embed_model) if embed_model is not None else ""
+        self._locks: dict = {}
+        self._guard = threading.Lock()
+
+    def __call__(self, query):
+        if self.embed_model is None or not isinstance(query, str):
+            return query
+        with self._guard:
+            lock = self._locks.setdefault(query, threading.Lock())
+        cache = get_retrieval_cache()
+        with lock:
+            vector = cache.vector(self.model, query)
+            if vector is None:
+                with span("embed"):
+                    vector = self.embed_model.get_query_embedding(query)
+                cache.put_vector(self.model, query, vector)
+            else:
+                count("embed_cache_hits")
+        return QueryBundle(query, embedding=vector)
+
+
+def _query_embedder(index) -> _QueryEmbedder:
+    first = next(iter(index.indexes.values()), None) if isinstance(index, PartitionedIndex) else index
+    return _QueryEmbedder(getattr(first, "_embed_model", None))
+
+
+def _search_partitions(indexes: dict, question_fr: str, top_k: int, pairs=None, embed=None, generation=None) -> List[NodeWithScore]:
+    """Recherche répartie en parallèle sur plusieurs partitions, fusion par score."""
+    if len(indexes) == 1:
+        return _search(next(iter(indexes.values())), question_fr, top_k, pairs, embed, generation)
+
+    def one(idx):
+        try:
+            return _search(idx, question_fr, top_k, pairs, embed, generation)
+        except Exception:
+            return []
+
+    with ThreadPoolExecutor(max_workers=len(indexes)) as pool:
+        results = list(pool.map(bind(one), indexes.values()))
+    merged = [n for nodes in results for n in nodes]
+    merged.sort(key=lambda n: n.score if n.score is not None else float("-inf"), reverse=True)
+    return merged[:top_k]
+
+
+def _retrieve_per_entity(search, question_fr: str, entities: List[dict], top_k: int) -> List[NodeWithScore]:
+    """Une recherche filtrée par lieu (toutes en parallèle), puis fusion des passages.
+
+    Chaque lieu reçoit au moins 2 passages (et au total environ `top_k`); les
+    passages sont entrelacés (un par lieu à tour de rôle) et dédoublonnés
+    pour qu'un seul appel de génération couvre tous les lieux.
+    """
+    k_each = max(2, math.ceil(top_k / len(entities)))
+
+    def one(entity):
+        label = " ".join(v for v in (entity.get("site"), entity.get("commune")) if v)
+        try:
+            return search(sorted(entity.items()), f"{question_fr}\n({label})", k_each)
+        except Exception:
+            return []
+
+    with ThreadPoolExecutor(max_workers=len(entities)) as pool:
+        per_entity = list(pool.map(bind(one), entities))
+
+    merged: List[NodeWithScore] = []
+    seen = set()
+    for rank in range(k_each):
+        for nodes in per_entity:
+            if rank < len(nodes):
+                n = nodes[rank]
+                nid = getattr(n.node, "node_id", None) or id(n.node)
+                if nid not in seen:
+                    seen.add(nid)
+                    merged.append(n)
+    return merged
+
+
+def retrieve_nodes(
+    index: Union[VectorStoreIndex, PartitionedIndex],
     question: str,
     top_k: int = 4,
+    strict_context: bool = True,
+    similarity_cutoff: float = 0.1,
+    expand_abbr: bool = True,
+    persist_dir: Optional[str] = None,
+) -> Tuple[str, List[NodeWithScore]]:
+    """Étape de recherche seule (embedding de la requête + recherche vectorielle).
+
+    Retourne la question reformulée (celle envoyée au LLM) et les passages
+    retenus. Si la question contient une clé/valeur connue (CodePPV, PRM) ou,
+    lorsque `persist_dir` est fourni, une commune/un site connus, la recherche
+    est restreinte par filtre metadata (clause `where` de Chroma), avec repli
+    sur la recherche non filtrée si rien ne correspond.
+
+    Avec un `PartitionedIndex`, seule la partition du type d'actif cité dans
+    la question est interrogée (ex. STEP); à défaut, ou si elle ne renvoie
+    rien, la recherche est répartie en parallèle sur toutes les partitions.
+
+    Si la question cite plusieurs lieux ("compare les PR de Garavet, Verdier
+    Bas et Pissotes"), une recherche filtrée par lieu est lancée pour chacun
+    en parallèle et les passages sont fusionnés (voir `_retrieve_per_entity`).
+
+    Les embeddings de requête et, avec `persist_dir`, les résultats de chaque
+    recherche sont mis en cache (`app.retrieval_cache`): une question reposée
+    avec d'autres réglages de génération n'appelle ni le modèle d'embedding
+    ni le vector store.
+    """
+    with span("normalize"):
+        question_fr = prepare_question(question, expand_abbr=expand_abbr)
+    embed = _query_embedder(index)
+    # Résultats en cache valides tant que le stockage n'a pas changé
+    generation = store_generation(persist_dir)
+
+    if isinstance(index, PartitionedIndex):
+        routed = index.select(route_query(question))
+        everything = index.select(None)
+
+        def search(pairs=None, query=question_fr, k=top_k):
+            nodes = _search_partitions(routed, query, k, pairs, embed, generation)
+            if not nodes and len(routed) < len(everything):
+                nodes = _search_partitions(everything, query, k, pairs, embed, generation)
+            return nodes
+    else:
+        def search(pairs=None, query=question_fr, k=top_k):
+            return _search(index, query, k, pairs, embed, generation)
+
+    nodes: List[NodeWithScore] = []
+    entities: List[dict] = []
+    if persist_dir:
+        try:
+            entities = match_site_entities(question, load_gazetteer(persist_dir))
+        except Exception:
+            entities = []
+    if len(entities) > 1:
+        nodes = _retrieve_per_entity(search, question_fr, entities, top_k)
+    if not nodes:
+        for pairs in _candidate_filters(question, persist_dir):
+            try:
+                nodes = search(pairs)
+            except Exception:
+                nodes = []
+            if nodes:
+                break
+    if not nodes:
+        nodes = search()
+
+    if strict_context:
+        with span("postprocess"):
+            nodes = SimilarityPostprocessor(similarity_cutoff=similarity_cutoff).postprocess_nodes(
+                nodes, query_str=question_fr
+            )
+    return question_fr, nodes
+
+
+def generate_answer(
+    question_fr: str,
+    nodes: List[NodeWithScore],
     model_name: str = "mistral",
     base_url: str = "http://127.0.0.1:11434",
     num_ctx: int = 2048,
@@ -18,16 +306,14 @@ def ask_question(
     max_tokens: int = 256,
     request_timeout_sec: int = 600,
     strict_context: bool = True,
-    similarity_cutoff: float = 0.1,
-    expand_abbr: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    on_queue_position: Optional[Callable[[int], None]] = None,
 ):
-    """Interroge l'index avec un LLM local via Ollama et renvoie la réponse + sources.
+    """Étape de génération seule: synthèse de la réponse à partir des passages.
 
-    Par défaut, on privilégie la compatibilité CPU (cpu_only=True) et un
-    contexte réduit (num_ctx=2048) pour éviter les erreurs CUDA sur GPU avec
-    faible VRAM.
+    L'appel au LLM passe par l'ordonnanceur partagé du processus
+    (`app.llm_scheduler`).
     """
-
     additional_kwargs = {
         "num_ctx": num_ctx,
         "num_predict": max_tokens,
@@ -43,69 +329,197 @@ def ask_question(
         additional_kwargs=additional_kwargs,
         request_timeout=request_timeout_sec,
     )
-    # Prompt QA strictement ancré au contexte
-    qa_prompt = None
-    node_post = None
-    if strict_context:
-        qa_prompt = PromptTemplate(
-            """
-Tu es un assistant technique. Réponds UNIQUEMENT avec les informations contenues dans le CONTEXTE ci‑dessous.
-Si le CONTEXTE ne permet pas de répondre, dis explicitement: "Je ne sais pas d'après le contexte fourni." Ne fais aucun appel à des connaissances générales.
-
-CONTEXT:
-{context_str}
-
-QUESTION (réponds en français, de manière concise):
-{query_str}
-
-RÉPONSE:
-"""
-        )
-        node_post = [SimilarityPostprocessor(similarity_cutoff=similarity_cutoff)]
-
-    query_engine = index.as_query_engine(
+    synthesizer = get_response_synthesizer(
         llm=llm,
-        similarity_top_k=top_k,
         response_mode="compact",
-        text_qa_template=qa_prompt if qa_prompt is not None else None,
-        node_postprocessors=node_post if node_post is not None else None,
+        text_qa_template=PromptTemplate(STRICT_QA_PROMPT) if strict_context else None,
     )
+    install_token_counter()
+    t_queue = time.perf_counter()
+    with get_scheduler().slot(priority=priority, on_wait=on_queue_position):
+        add("queue", time.perf_counter() - t_queue)
+        with span("generate"):
+            return synthesizer.synthesize(question_fr, nodes=nodes)
 
-    # Renforcer la consigne de langue et expansion d'abréviations au niveau de la requête
-    question_expanded = expand_abbreviations(question) if expand_abbr else question
-    question_fr = f"En français, de manière concise :\n{question_expanded}"
-    response = query_engine.query(question_fr)
 
-    # Tentative d'application d'un filtre metadata si la question contient une clé/valeur connue
-    try:
-        mf = None
-        m = re.search(r"\b(?:code\s*ppv|codeppv|ppv)\s*[:=]?\s*(\d{3,})", question, flags=re.IGNORECASE)
-        if m:
-            mf = ("CodePPV", m.group(1))
-        else:
-            m = re.search(r"\b(?:rae\s*ou\s*prm|rae|prm)\s*[:=]?\s*(\d{6,})", question, flags=re.IGNORECASE)
-            if m:
-                mf = ("RAE ou PRM", m.group(1))
-        if mf:
-            k, v = mf
-            try:
-                from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
-                filters = MetadataFilters(filters=[ExactMatchFilter(key=k, value=str(v))])
-                response = query_engine.query(question_fr, filters=filters)
-            except Exception:
-                response = query_engine.query(f"[Filtre: {k}={v}]\n{question_fr}")
-    except Exception:
-        pass
+def sources_from_nodes(nodes, persist_dir: Optional[str] = None) -> List[str]:
+    """Extraction robuste des sources (chemin de fichier ou identifiant).
 
-    # Extraction robuste des sources
+    Avec `persist_dir`, les fichiers des doublons écartés à l'indexation
+    (`app.dedup`) suivent la source du chunk retenu.
+    """
     sources: List[str] = []
     try:
-        for sn in getattr(response, "source_nodes", []) or []:
-            meta = getattr(sn, "node", None)
-            meta = getattr(meta, "metadata", {}) if meta is not None else {}
+        nodes = list(nodes or [])
+        try:
+            dups = duplicate_sources(persist_dir, (sn.node.node_id for sn in nodes))
+        except Exception:
+            dups = {}
+        for sn in nodes:
+            node = getattr(sn, "node", None)
+            meta = getattr(node, "metadata", {}) if node is not None else {}
             src = meta.get("file_path") or meta.get("filename") or meta.get("id") or "source"
             sources.append(src)
+            sources.extend(dups.get(getattr(node, "node_id", None), []))
     except Exception:
         pass
+    return sources
+
 
+def ask_question(
+    index: Union[VectorStoreIndex, PartitionedIndex],
+    question: str,
+    top_k: int = 4,
+    model_name: str = "mistral",
+    base_url: str = "http://127.0.0.1:11434",
+    num_ctx: int = 2048,
+    cpu_only: bool = False,
+    max_tokens: int = 256,
+    request_timeout_sec: int = 600,
+    strict_context: bool = True,
+    similarity_cutoff: float = 0.1,
+    expand_abbr: bool = True,
+    priority: int = PRIORITY_INTERACTIVE,
+    on_queue_position: Optional[Callable[[int], None]] = None,
+    persist_dir: Optional[str] = None,
+    timings: Optional[dict] = None,
+):
+    """Interroge l'index avec un LLM local via Ollama et renvoie la réponse + sources.
+
+    Par défaut, on privilégie la compatibilité CPU (cpu_only=True) et un
+    contexte réduit (num_ctx=2048) pour éviter les erreurs CUDA sur GPU avec
+    faible VRAM.
+
+    Enchaîne `retrieve_nodes` puis `generate_answer`. Seule la génération
+    passe par l'ordonnanceur partagé (`app.llm_scheduler`): `priority` ordonne
+    la file (interactif avant lots) et `on_queue_position(position)` est
+    notifié tant que la requête attend. Lève `SchedulerFullError` si la file
+    d'attente est pleine. `persist_dir` active le filtrage par commune/site
+    (voir `retrieve_nodes`).
+
+    Avec `persist_dir`, les questions de comptage/liste ("combien de PR à
+    Brive ?") sont d'abord résolues sur la table des enregistrements JSON
+    (`app.records_table`): la réponse est calculée sans LLM et cite les
+    enregistrements exacts.
+
+    `timings` (optionnel) reçoit les durées par étape (`spans`, en secondes)
+    et les compteurs (`counts`: jetons, recherches), voir `app.metrics`. Avec
+    `persist_dir`, ils sont aussi ajoutés à `metrics.jsonl`. Appelée dans un
+    bloc `recording()`, les étapes s'ajoutent à celles de l'appelant (ex.
+    chargement de l'index).
+
+    La question est normalisée (`app.query_log.normalize_question`). Avec
+    `persist_dir`, la réponse est mise en cache (mêmes passages et mêmes
+    réglages de génération: pas d'appel au LLM, voir `app.retrieval_cache`)
+    et la question est comptée dans le journal local qui sert au
+    préchauffage (`app.warmup`). Toute question autre que de préchauffage
+    (`PRIORITY_WARMUP`) interrompt celui-ci.
+    """
+    warmup = priority == PRIORITY_WARMUP
+    if not warmup:
+        note_traffic()
+    question = normalize_question(question)
+    rec = current() or Timings()
+    t0 = time.perf_counter()
+    try:
+        with recording(rec):
+            return _ask(
+                index,
+                question,
+                top_k=top_k,
+                model_name=model_name,
+                base_url=base_url,
+                num_ctx=num_ctx,
+                cpu_only=cpu_only,
+                max_tokens=max_tokens,
+                request_timeout_sec=request_timeout_sec,
+                strict_context=strict_context,
+                similarity_cutoff=similarity_cutoff,
+                expand_abbr=expand_abbr,
+                priority=priority,
+                on_queue_position=on_queue_position,
+                persist_dir=persist_dir,
+            )
+    finally:
+        rec.add("total", time.perf_counter() - t0)
+        if timings is not None:
+            timings.update(rec.as_dict())
+        try:
+            append_metrics(persist_dir, "warmup" if warmup else "query", rec, model=model_name, top_k=top_k)
+        except Exception:
+            pass
+        if not warmup:
+            try:
+                record_question(persist_dir, question)
+            except Exception:
+                pass
+
+
+def _ask(
+    index,
+    question: str,
+    top_k: int,
+    model_name: str,
+    base_url: str,
+    num_ctx: int,
+    cpu_only: bool,
+    max_tokens: int,
+    request_timeout_sec: int,
+    strict_context: bool,
+    similarity_cutoff: float,
+    expand_abbr: bool,
+    priority: int,
+    on_queue_position: Optional[Callable[[int], None]],
+    persist_dir: Optional[str],
+):
+    if persist_dir:
+        try:
+            with span("aggregate"):
+                aggregate = answer_aggregate(question, persist_dir)
+        except Exception:
+            aggregate = None
+        if aggregate is not None:
+            return aggregate
+    question_fr, nodes = retrieve_nodes(
+        index,
+        question,
+        top_k=top_k,
+        strict_context=strict_context,
+        similarity_cutoff=similarity_cutoff,
+        expand_abbr=expand_abbr,
+        persist_dir=persist_dir,
+    )
+    # Mêmes passages, mêmes réglages de génération, stockage inchangé: réponse en cache
+    answer_key = None
+    generation = store_generation(persist_dir)
+    if generation is not None:
+        answer_key = (
+            question_fr,
+            tuple((n.node.node_id, n.score) for n in nodes),
+            model_name,
+            num_ctx,
+            max_tokens,
+            strict_context,
+            generation,
+        )
+        cached = get_retrieval_cache().answer(answer_key)
+        if cached is not None:
+            count("answer_cache_hits")
+            return cached
+    response = generate_answer(
+        question_fr,
+        nodes,
+        model_name=model_name,
+        base_url=base_url,
+        num_ctx=num_ctx,
+        cpu_only=cpu_only,
+        max_tokens=max_tokens,
+        request_timeout_sec=request_timeout_sec,
+        strict_context=strict_context,
+        priority=priority,
+        on_queue_position=on_queue_position,
+    )
+    sources = sources_from_nodes(getattr(response, "source_nodes", None) or nodes, persist_dir)
+    if answer_key is not None:
+        get_retrieval_cache().put_answer(answer_key, str(response), sources)
     return str(response), sources
@@ -0,0 +1,423 @@
+"""Table en colonnes des enregistrements JSON et requêtes d'agrégat.
+
+Les questions de comptage ou de liste ("combien de postes de relevage à
+Brive ?", "liste des PPV de l'agence AG_BRIVE") ne peuvent pas être
+résolues par le LLM à partir de 2 à 10 passages: il ne voit qu'une partie des
+enregistrements. Ce module tient, à côté de l'index, une table en colonnes
+(`records_table.json`) construite à l'ingestion à partir des métadonnées des
+enregistrements JSON (champs bruts + champs canoniques `canon_*`) et des
+fiches d'audit PDF (`record_kind = "fiche"`, voir `app.fiche_extract`).
+
+Pour chaque colonne filtrable, un index inversé associe chaque valeur à un
+masque de lignes (entier Python utilisé comme bitset): un filtre est un ET
+bit à bit sur toutes les lignes à la fois, un comptage un `bit_count()`.
+La réponse est calculée directement et cite les enregistrements exacts.
+"""
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.partitions import route_query
+from app.site_metadata import _mentions, fold, load_gazetteer, normalize_place_name
+
+TABLE_FILE = "records_table.json"
+
+# Colonnes techniques, jamais utilisées comme filtre
+_KEY_COLUMNS = ("file_path", "json_path")
+# Colonnes de lieu (nom de fichier), filtrables quelle que soit leur cardinalité
+_PLACE_COLUMNS = ("commune", "site")
+_SKIP_COLUMNS = {"kv_line", "canon_line", "file_name", "file_type", "file_size",
+                 "creation_date", "last_modified_date", "last_accessed_date"}
+
+# Colonnes affichées pour nommer un enregistrement, par ordre de préférence
+_LABEL_COLUMNS = ("canon_site_nom", "Nom Site PPV", "NOM", "Site", "site")
+_PPV_COLUMNS = ("canon_ppv", "CodePPV", "PPV")
+
+# Type d'ouvrage déduit des champs usuels des enregistrements
+_TYPE_FROM_METIER = {"ass_relevement": "poste_relevage", "ass_epuration": "station_epuration"}
+_TYPE_FROM_PREFIX = (
+    (re.compile(r"^(?:pr|r|poste)\b", re.IGNORECASE), "poste_relevage"),
+    (re.compile(r"^step\b", re.IGNORECASE), "station_epuration"),
+)
+
+_COUNT_RE = re.compile(r"\bcombien\b|\bnombre\s+(?:de|d')|\bnb\s+(?:de|d')", re.IGNORECASE)
+_LIST_RE = re.compile(
+    r"\blist(?:e|er|ez)\b|\bénum[eè]r|\benum[eè]r|\bquel(?:le)?s\s+sont\b|\bdonne(?:z)?[- ]moi\s+(?:les|tous)\b",
+    re.IGNORECASE,
+)
+# Questions de mesure ("combien de temps", "combien coûte"): pas des comptages
+_MEASURE_RE = re.compile(
+    r"\bcombien\s+(?:de\s+temps|d'heures|de\s+minutes|de\s+m3|de\s+litres|de\s+kw|co[uû]te|vaut|mesure|p[eè]se)",
+    re.IGNORECASE,
+)
+# Objet compté ou listé: le mot qui suit "combien de", "liste des"... doit
+# désigner les enregistrements eux-mêmes ("combien de pompes au PR de X" porte
+# sur le contenu d'une fiche, pas sur le nombre d'ouvrages).
+_TARGET_RE = re.compile(
+    r"\b(?:combien|nombre|nb|list(?:e|er|ez)|enum[ae]r\w*|quel(?:le)?s sont|donne(?:z)? moi)\b((?: \w+){1,6})"
+)
+_TARGET_SKIP = {"de", "d", "des", "du", "les", "la", "le", "l", "y", "a", "t", "il", "on", "existe", "compte",
+                "tous", "toutes", "total"}
+_COUNTABLE = {"pr", "poste", "postes", "step", "station", "stations", "ppv", "site", "sites",
+              "ouvrage", "ouvrages", "enregistrement", "enregistrements"}
+_AGENCE_RE = re.compile(r"\bagence\s+([\w\-]+)", re.IGNORECASE)
+
+
+def derive_record_type(meta: dict) -> str:
+    """Type d'ouvrage (type d'ontologie) d'un enregistrement, ou chaîne vide."""
+    metier = fold(str(meta.get("canon_metier") or meta.get("Metier") or "")).replace(" ", "_")
+    if metier in _TYPE_FROM_METIER:
+        return _TYPE_FROM_METIER[metier]
+    for col in ("TYPE", "canon_site_nom", "Nom Site PPV", "Site"):
+        val = str(meta.get(col) or "").strip()
+        if not val:
+            continue
+        for patt, name in _TYPE_FROM_PREFIX:
+            if patt.search(val):
+                return name
+    return ""
+
+
+class RecordsTable:
+    """Table en colonnes ({colonne: [valeurs]}), une ligne par enregistrement JSON."""
+
+    def __init__(self, columns: Optional[Dict[str, List[str]]] = None, n_rows: int = 0):
+        self.columns: Dict[str, List[str]] = columns or {}
+        self.n_rows = n_rows
+        self._index: Dict[str, Dict[str, int]] = {}
+        self._filterable: Optional[List[str]] = None
+        self._phrases: Optional[Dict[str, List[str]]] = None
+        self._lock = threading.Lock()
+
+    # -------------------- construction / persistance --------------------
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "RecordsTable":
+        rows = list(rows)
+        names: List[str] = []
+        for r in rows:
+            for k in r:
+                if k not in names:
+                    names.append(k)
+        columns = {k: ["" if r.get(k) is None else str(r[k]) for r in rows] for k in names}
+        return cls(columns, len(rows))
+
+    def rows(self) -> List[dict]:
+        return [self.row(i) for i in range(self.n_rows)]
+
+    def row(self, i: int) -> dict:
+        return {k: col[i] for k, col in self.columns.items() if col[i] != ""}
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"n_rows": self.n_rows, "columns": self.columns}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RecordsTable":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(data.get("columns") or {}, int(data.get("n_rows") or 0))
+
+    # -------------------- index inversé (bitsets) --------------------
+    def filterable_columns(self) -> List[str]:
+        """Colonnes textuelles de faible cardinalité (commune, agence, métier...)."""
+        if self._filterable is not None:
+            return self._filterable
+        out = []
+        limit = max(50, self.n_rows // 2)
+        for name, col in self.columns.items():
+            if name in _KEY_COLUMNS or name in _SKIP_COLUMNS:
+                continue
+            distinct = {v for v in col if v}
+            if not distinct or (len(distinct) > limit and name not in _PLACE_COLUMNS):
+                continue
+            if all(re.fullmatch(r"[\d.,\s-]+", v) for v in distinct):
+                continue
+            out.append(name)
+        self._filterable = out
+        return out
+
+    def value_index(self, column: str) -> Dict[str, int]:
+        """{valeur normalisée: masque des lignes} pour une colonne (calculé une fois)."""
+        with self._lock:
+            idx = self._index.get(column)
+            if idx is not None:
+                return idx
+            buckets: Dict[str, bytearray] = {}
+            nbytes = (self.n_rows + 7) // 8
+            for i, v in enumerate(self.columns.get(column, [])):
+                key = fold(normalize_place_name(v)) if v else ""
+                if not key:
+                    continue
+                b = buckets.get(key)
+                if b is None:
+                    b = buckets[key] = bytearray(nbytes)
+                b[i >> 3] |= 1 << (i & 7)
+            idx = {k: int.from_bytes(b, "little") for k, b in buckets.items()}
+            self._index[column] = idx
+            return idx
+
+    def all_mask(self) -> int:
+        return (1 << self.n_rows) - 1
+
+    @staticmethod
+    def iter_rows(mask: int):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+
+# ------------------------------------------------------------------
+# Persistance côté index
+# ------------------------------------------------------------------
+
+_CACHE: Dict[str, Tuple[float, RecordsTable]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def load_records_table(persist_dir: str) -> Optional[RecordsTable]:
+    """Charge la table (mise en cache tant que le fichier n'est pas modifié)."""
+    path = Path(persist_dir) / TABLE_FILE
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    key = str(path.resolve())
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    try:
+        table = RecordsTable.load(path)
+    except Exception:
+        return None
+    with _CACHE_LOCK:
+        _CACHE[key] = (mtime, table)
+    return table
+
+
+def update_records_table(persist_dir: str, metadatas: Iterable[dict]) -> int:
+    """Ajoute/remplace les enregistrements (clé: file_path + json_path).
+
+    Seules les métadonnées portant un `json_path` (enregistrement JSON) ou un
+    `record_kind` (fiche PDF, une ligne par fichier) sont retenues. Retourne
+    le nombre de lignes de la table.
+    """
+    new_rows = []
+    for meta in metadatas:
+        meta = dict(meta or {})
+        if not meta.get("json_path") and not meta.get("record_kind"):
+            continue
+        row = {k: v for k, v in meta.items() if k not in _SKIP_COLUMNS}
+        row.setdefault("canon_type", derive_record_type(meta))
+        new_rows.append(row)
+    if not new_rows:
+        table = load_records_table(persist_dir)
+        return table.n_rows if table else 0
+
+    existing = load_records_table(persist_dir)
+    merged: Dict[Tuple[str, str], dict] = {}
+    for r in (existing.rows() if existing else []):
+        merged[(r.get("file_path", ""), r.get("json_path", ""))] = r
+    for r in new_rows:
+        merged[(str(r.get("file_path", "")), str(r.get("json_path", "")))] = r
+    table = RecordsTable.from_rows(merged.values())
+    table.save(Path(persist_dir) / TABLE_FILE)
+    return table.n_rows
+
+
+# ------------------------------------------------------------------
+# Requêtes d'agrégat
+# ------------------------------------------------------------------
+
+_MAX_PHRASE_WORDS = 6
+
+
+def _phrase_columns(table: RecordsTable) -> Dict[str, List[str]]:
+    """{valeur normalisée: [colonnes]} pour toutes les colonnes filtrables (cache)."""
+    if table._phrases is not None:
+        return table._phrases
+    phrases: Dict[str, List[str]] = {}
+    for col in table.filterable_columns():
+        if col == "canon_type":
+            continue
+        for val in table.value_index(col):
+            if len(val) >= 3 and len(val.split()) <= _MAX_PHRASE_WORDS:
+                phrases.setdefault(val, []).append(col)
+    table._phrases = phrases
+    return phrases
+
+
+def _values_with_prefix(table: RecordsTable, col: str, val: str) -> List[str]:
+    # "Brive" couvre aussi "Brive-la-Gaillarde" dans la même colonne
+    return [val] + sorted(v for v in table.value_index(col) if v.startswith(val + " "))
+
+
+def _counts_records(question: str) -> bool:
+    # Premier mot significatif après "combien de", "liste des"...
+    m = _TARGET_RE.search(fold(question))
+    if not m:
+        return False
+    words = [w for w in m.group(1).split() if w not in _TARGET_SKIP]
+    return bool(words) and words[0] in _COUNTABLE
+
+
+def _covers_places(question: str, filters: List[Tuple[str, List[str]]], gazetteer: Dict[str, List[str]]) -> bool:
+    # Chaque commune/site cité doit être devenu un filtre: sinon le comptage
+    # porterait sur tous les ouvrages du type
+    communes, sites = _mentions(question, gazetteer)
+    values = {v for _, vals in filters for v in vals}
+    for place in [*communes, *sites]:
+        key = fold(normalize_place_name(place))
+        if not any(v == key or v.startswith(key + " ") for v in values):
+            return False
+    return True
+
+
+def parse_aggregate_query(
+    question: str,
+    table: RecordsTable,
+    gazetteer: Optional[Dict[str, List[str]]] = None,
+) -> Optional[dict]:
+    """Détecte une intention de comptage/liste et les filtres exacts associés.
+
+    Retourne `{"intent": "count"|"list", "filters": [(colonne, [valeurs]), ...]}`
+    (valeurs normalisées, combinées en OU) ou None si la question n'est pas une
+    requête d'agrégat résoluble: objet compté autre que les ouvrages eux-mêmes
+    ("combien de pompes..."), ou lieu du répertoire `gazetteer` cité mais
+    absent de la table.
+    """
+    if not question or table is None or table.n_rows == 0:
+        return None
+    if _MEASURE_RE.search(question):
+        return None
+    if _COUNT_RE.search(question):
+        intent = "count"
+    elif _LIST_RE.search(question):
+        intent = "list"
+    else:
+        return None
+    if not _counts_records(question):
+        return None
+
+    filters: List[Tuple[str, List[str]]] = []
+    tokens = fold(normalize_place_name(question)).split()
+    used = [False] * len(tokens)
+
+    # "agence X": correspondance partielle sur les colonnes d'agence
+    m = _AGENCE_RE.search(question)
+    agence_cols = [c for c in table.filterable_columns() if "agence" in c.lower()]
+    if m and agence_cols:
+        token = fold(m.group(1))
+        col = agence_cols[0]
+        hits = sorted(v for v in table.value_index(col) if token and (token == v or token in v.split()))
+        if hits:
+            filters.append((col, hits))
+            used = [u or t in token.split() for u, t in zip(used, tokens)]
+
+    # Type d'ouvrage cité (mots-clés `identify` de schemas.yaml)
+    types = route_query(question)
+    if types and "canon_type" in table.columns:
+        filters.append(("canon_type", [fold(types[0])]))
+
+    # Valeurs exactes citées (commune, métier...): n-grammes de la question
+    # cherchés dans le dictionnaire des valeurs, plus long d'abord.
+    phrases = _phrase_columns(table)
+    seen_cols = {c for c, _ in filters}
+    for n in range(min(_MAX_PHRASE_WORDS, len(tokens)), 0, -1):
+        for i in range(len(tokens) - n + 1):
+            if any(used[i:i + n]):
+                continue
+            val = " ".join(tokens[i:i + n])
+            cols = [c for c in phrases.get(val, ()) if c not in seen_cols]
+            if not cols:
+                continue
+            # Colonne canonique de préférence (canon_localite plutôt que Localite)
+            col = min(cols, key=lambda c: (not c.startswith("canon_"), c))
+            filters.append((col, _values_with_prefix(table, col, val)))
+            # Même valeur dans une colonne équivalente (Localite / COMMUNE)
+            seen_cols.update(phrases[val])
+            for j in range(i, i + n):
+                used[j] = True
+
+    if not filters:
+        return None
+    # "agence BRIVE" désigne l'agence, pas la commune
+    places = _AGENCE_RE.sub(" ", question) if m and agence_cols else question
+    if gazetteer and not _covers_places(places, filters, gazetteer):
+        return None
+    return {"intent": intent, "filters": filters}
+
+
+def apply_filters(table: RecordsTable, filters: List[Tuple[str, List[str]]]) -> int:
+    """Masque des lignes satisfaisant tous les filtres (valeurs d'un filtre = OU)."""
+    mask = table.all_mask()
+    for col, values in filters:
+        idx = table.value_index(col)
+        col_mask = 0
+        for v in ([values] if isinstance(values, str) else values):
+            col_mask |= idx.get(fold(normalize_place_name(v)), 0)
+        mask &= col_mask
+        if not mask:
+            break
+    return mask
+
+
+def _display_value(table: RecordsTable, col: str, value: str) -> str:
+    # Première valeur brute de la colonne dont la forme normalisée correspond
+    mask = table.value_index(col).get(value, 0)
+    if mask:
+        return table.columns[col][(mask & -mask).bit_length() - 1]
+    return value
+
+
+def _record_label(row: dict) -> str:
+    name = next((row[c] for c in _LABEL_COLUMNS if row.get(c)), "")
+    ppv = next((row[c] for c in _PPV_COLUMNS if row.get(c)), "")
+    if name and ppv:
+        return f"{name} (PPV {ppv})"
+    return name or (f"PPV {ppv}" if ppv else row.get("json_path", "?"))
+
+
+def answer_aggregate(question: str, persist_dir: str, max_listed: int = 50) -> Optional[Tuple[str, List[str]]]:
+    """Répond à une question de comptage/liste à partir de la table.
+
+    Retourne `(réponse, sources)` où chaque source désigne un enregistrement
+    exact (`fichier#json_path`, ou le fichier d'une fiche PDF), ou None si la
+    question ne s'y prête pas.
+    """
+    table = load_records_table(persist_dir)
+    if table is None:
+        return None
+    parsed = parse_aggregate_query(question, table, load_gazetteer(persist_dir))
+    if parsed is None:
+        return None
+    mask = apply_filters(table, parsed["filters"])
+    n = mask.bit_count()
+    crit = ", ".join(
+        f"{c.replace('canon_', '')} = {' / '.join(_display_value(table, c, v) for v in vals)}"
+        for c, vals in parsed["filters"]
+    )
+
+    rows = [table.row(i) for i in table.iter_rows(mask)]
+    sources = [
+        f"{r.get('file_path', '')}#{r['json_path']}" if r.get("json_path") else r.get("file_path", "")
+        for r in rows
+    ]
+    if parsed["intent"] == "count":
+        answer = f"{n} enregistrement(s) correspondent aux critères ({crit})."
+    else:
+        answer = f"{n} enregistrement(s) correspondent aux critères ({crit})"
+        if n:
+            lines = [f"- {_record_label(r)}" for r in rows[:max_listed]]
+            if n > max_listed:
+                lines.append(f"- ... ({n - max_listed} autres)")
+            answer += " :\n" + "\n".join(lines)
+        else:
+            answer += "."
+    return answer, sources
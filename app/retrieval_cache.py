@@ -0,0 +1,178 @@
+"""Cache des embeddings de requête, des résultats de recherche et des réponses.
+
+Une question répétée (ou reposée avec d'autres réglages de génération:
+`max_tokens`, contexte strict ou non, seuil de similarité) ne repasse ni par
+l'embedding Ollama ni par la recherche vectorielle:
+
+- embeddings: clé (modèle d'embedding, texte de la requête développé);
+- résultats: clé (texte, modèle, `top_k`, filtres metadata, collection,
+  génération du stockage) -> identifiants des nœuds et scores. Les nœuds
+  sont relus par identifiant dans le vector store au moment du succès
+  (texte et métadonnées à jour);
+- réponses: clé (question envoyée au LLM, passages retenus et leurs
+  scores, modèle, `num_ctx`, `max_tokens`, contexte strict, génération)
+  -> réponse et sources. Rempli aussi par le préchauffage (`app.warmup`).
+
+La génération (`store_generation`) est l'empreinte `stat` des fichiers du
+stockage (`chroma.sqlite3` et son journal, `meta.json` des collections
+plates): une indexation ou une mise à jour du glossaire invalide les
+résultats et les réponses, pas les embeddings. Le cache est propre au
+processus, borné (LRU) et réglé par la section `retrieval_cache` de la
+configuration.
+"""
+
+import glob
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+Hits = List[Tuple[str, Optional[float]]]
+
+
+def store_generation(persist_dir: Optional[str]) -> Optional[tuple]:
+    """Empreinte des fichiers du stockage vectoriel (None si inconnue)."""
+    if not persist_dir:
+        return None
+    paths = [
+        os.path.join(persist_dir, "chroma.sqlite3"),
+        os.path.join(persist_dir, "chroma.sqlite3-wal"),
+        *sorted(glob.glob(os.path.join(persist_dir, "flat", "*", "meta.json"))),
+    ]
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stamp.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(stamp) if stamp else None
+
+
+def model_key(embed_model) -> str:
+    """Identifiant du modèle d'embedding (classe et nom du modèle)."""
+    try:
+        name = embed_model.class_name()
+    except Exception:
+        name = type(embed_model).__name__
+    return f"{name}:{getattr(embed_model, 'model_name', '')}"
+
+
+def result_key(
+    text: str,
+    model: str,
+    top_k: int,
+    pairs: Optional[Sequence[Tuple[str, object]]],
+    store: Hashable,
+    generation: tuple,
+) -> tuple:
+    filters = tuple(sorted((str(k), str(v)) for k, v in pairs or []))
+    return (text, model, int(top_k), filters, store, generation)
+
+
+class RetrievalCache:
+    """LRU bornés (embeddings, résultats, réponses), partagés par les threads."""
+
+    def __init__(self, max_queries: int = 2048, max_results: int = 4096, max_answers: int = 256, enabled: bool = True):
+        self.max_queries = int(max_queries)
+        self.max_results = int(max_results)
+        self.max_answers = int(max_answers)
+        self.enabled = bool(enabled)
+        self._vectors: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._results: "OrderedDict[tuple, Hits]" = OrderedDict()
+        self._answers: "OrderedDict[tuple, Tuple[str, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "vector_hits": 0, "vector_misses": 0,
+            "result_hits": 0, "result_misses": 0,
+            "answer_hits": 0, "answer_misses": 0,
+        }
+
+    @staticmethod
+    def _get(store: OrderedDict, key):
+        value = store.get(key)
+        if value is not None:
+            store.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _put(store: OrderedDict, key, value, limit: int) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > limit:
+            store.popitem(last=False)
+
+    def vector(self, model: str, text: str) -> Optional[List[float]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            vec = self._get(self._vectors, (model, text))
+            self._stats["vector_hits" if vec is not None else "vector_misses"] += 1
+            return vec
+
+    def put_vector(self, model: str, text: str, vector: Sequence[float]) -> None:
+        if self.enabled:
+            with self._lock:
+                self._put(self._vectors, (model, text), list(vector), self.max_queries)
+
+    def results(self, key: tuple) -> Optional[Hits]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            hits = self._get(self._results, key)
+            self._stats["result_hits" if hits is not None else "result_misses"] += 1
+            return None if hits is None else list(hits)
+
+    def put_results(self, key: tuple, hits: Hits) -> None:
+        if self.enabled:
+            with self._lock:
+                self._put(self._results, key, list(hits), self.max_results)
+
+    def answer(self, key: tuple) -> Optional[Tuple[str, List[str]]]:
+        if not self.enabled or self.max_answers <= 0:
+            return None
+        with self._lock:
+            hit = self._get(self._answers, key)
+            self._stats["answer_hits" if hit is not None else "answer_misses"] += 1
+            return None if hit is None else (hit[0], list(hit[1]))
+
+    def put_answer(self, key: tuple, answer: str, sources: Sequence[str]) -> None:
+        if self.enabled and self.max_answers > 0:
+            with self._lock:
+                self._put(self._answers, key, (str(answer), list(sources)), self.max_answers)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors.clear()
+            self._results.clear()
+            self._answers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "vectors": len(self._vectors),
+                "results": len(self._results),
+                "answers": len(self._answers),
+            }
+
+
+_CACHE: Optional[RetrievalCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Cache unique du processus (section `retrieval_cache` de la configuration)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            from app.utils.config import config_section
+
+            cfg = config_section("retrieval_cache")
+            _CACHE = RetrievalCache(
+                max_queries=int(cfg.get("max_queries", 2048)),
+                max_results=int(cfg.get("max_results", 4096)),
+                max_answers=int(cfg.get("max_answers", 256)),
+                enabled=bool(cfg.get("enabled", True)),
+            )
+        return _CACHE
@@ -0,0 +1,234 @@
+"""Métadonnées de site dérivées des noms de fichiers.
+
+Les fiches du corpus suivent la convention
+"<Commune> - [Fiche] <TYPE> <site>.pdf", par exemple:
+
+- "Allassac - PR de Garavet.pdf"        -> commune=Allassac, asset_type=PR, site=Garavet
+- "Cublac - Fiche STEP de Loubignac.pdf" -> commune=Cublac, asset_type=STEP, site=Loubignac
+- "St Robert - R de l'Atelier Municipal.pdf" -> commune=Saint Robert, asset_type=R, ...
+
+Ces champs sont ajoutés aux métadonnées des documents à l'ingestion; les
+enregistrements JSON, dont le nom de fichier ne dit rien du lieu, les reçoivent
+de leurs champs localité/nom de site (`record_site_metadata`). Un
+répertoire des communes/sites connus (`sites.json`) est tenu à jour dans le
+dossier de persistance. Côté requête, `match_site_filters` repère une commune
+ou un site dans la question pour restreindre la recherche vectorielle.
+"""
+
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ASSET_TYPES = ("PR", "STEP", "R", "DO")
+GAZETTEER_FILE = "sites.json"
+
+# "<commune><sep>[Fiche ]<TYPE>[ site]" ; le séparateur est un tiret entouré
+# d'au moins un espace pour ne pas couper les communes composées
+# (Perpezac-le-Blanc, Vars-sur-Roseix).
+_FILENAME_RE = re.compile(
+    r"^(?P<commune>.+?)(?:\s+-\s*|\s*-\s+)(?:Fiche\s+)?(?P<type>PR|STEP|R|DO)\b(?P<site>.*)$"
+)
+# Articles en tête du nom de site ("de la Croix" -> "Croix")
+_SITE_ARTICLE_RE = re.compile(r"^(?:de\s+la\s+|de\s+l'|du\s+|des\s+|de\s+|d')", re.IGNORECASE)
+
+
+def _place_rules():
+    # Règles du glossaire qui substituent un mot (St -> Saint) sans ajouter
+    # d'expansion entre parenthèses, applicables aux noms propres.
+    from app.text_normalize import _load_resources
+
+    _, rules = _load_resources()
+    return [(patt, repl) for patt, repl in rules if "(" not in repl]
+
+
+def normalize_place_name(name: str) -> str:
+    """Nom de lieu canonique: espaces normalisés et abréviations du glossaire (St -> Saint)."""
+    out = re.sub(r"\s+", " ", (name or "")).strip(" -")
+    for patt, repl in _place_rules():
+        try:
+            out = patt.sub(repl, out)
+        except Exception:
+            continue
+    # "St." -> "Saint." : retirer le point résiduel
+    out = re.sub(r"\b(Saint|Sainte)\.", r"\1", out)
+    return re.sub(r"\s+", " ", out).strip()
+
+
+def fold(text: str) -> str:
+    """Forme de comparaison: minuscules, sans accents ni ponctuation."""
+    t = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    t = re.sub(r"[^a-z0-9]+", " ", t.lower())
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def parse_site_filename(path: str) -> Dict[str, str]:
+    """Extrait `commune`, `asset_type` et `site` d'un nom de fichier.
+
+    Retourne un dict vide si le nom ne suit pas la convention.
+    """
+    stem = Path(str(path)).stem
+    m = _FILENAME_RE.match(stem.strip())
+    if not m:
+        return {}
+    # "Malemort -Venarsal" / "Malemort-Venarsal" -> une seule forme
+    commune = normalize_place_name(re.sub(r"\s*-\s*", "-", m.group("commune")))
+    site = re.sub(r"\s+", " ", m.group("site")).strip(" -")
+    site = normalize_place_name(_SITE_ARTICLE_RE.sub("", site))
+    if not commune:
+        return {}
+    meta = {"commune": commune, "asset_type": m.group("type")}
+    if site:
+        meta["site"] = site
+    return meta
+
+
+def site_directory(paths: Iterable[str]) -> Dict[str, List[str]]:
+    """Répertoire {commune: [sites]} tiré des noms de fichiers (fiches du corpus)."""
+    directory: Dict[str, List[str]] = {}
+    for path in paths:
+        meta = parse_site_filename(path)
+        if not meta:
+            continue
+        sites = directory.setdefault(meta["commune"], [])
+        if meta.get("site") and meta["site"] not in sites:
+            sites.append(meta["site"])
+    return directory
+
+
+# Champs canoniques des enregistrements JSON qui nomment le lieu
+# ("Localite"/"COMMUNE", "Nom Site PPV"/"NOM"/"Site", voir schemas.yaml)
+RECORD_PLACE_KEYS = ("canon_localite", "canon_site_nom")
+
+
+def record_site_metadata(meta: dict, directory: Dict[str, List[str]]) -> Dict[str, str]:
+    """`commune` et `site` d'un enregistrement JSON, aux graphies du répertoire.
+
+    Les champs de lieu ("R DES PISSOTES ALLASSAC", "ALLASSAC" + "Garavet")
+    sont confrontés au répertoire comme une question
+    (`match_site_filters`): mêmes valeurs que les fiches, donc mêmes
+    filtres commune/site à la requête. Dict vide si aucun lieu connu.
+    """
+    text = " ".join(str(meta.get(k) or "") for k in RECORD_PLACE_KEYS).strip()
+    return match_site_filters(text, directory) if text else {}
+
+
+# ------------------------------------------------------------------
+# Répertoire des communes/sites connus (persisté avec l'index)
+# ------------------------------------------------------------------
+
+def load_gazetteer(persist_dir: str) -> Dict[str, List[str]]:
+    """Charge `sites.json` ({commune: [sites]}); dict vide si absent."""
+    path = Path(persist_dir) / GAZETTEER_FILE
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return {str(k): list(v or []) for k, v in data.items()}
+    except Exception:
+        return {}
+
+
+def update_gazetteer(persist_dir: str, metadatas: Iterable[dict]) -> Dict[str, List[str]]:
+    """Fusionne les communes/sites des métadonnées dans `sites.json`."""
+    gaz = load_gazetteer(persist_dir)
+    changed = False
+    for meta in metadatas:
+        commune = (meta or {}).get("commune")
+        if not commune:
+            continue
+        if commune not in gaz:
+            gaz[commune] = []
+            changed = True
+        site = meta.get("site")
+        if site and site not in gaz[commune]:
+            gaz[commune].append(site)
+            changed = True
+    if changed:
+        path = Path(persist_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        ordered = {k: sorted(v) for k, v in sorted(gaz.items())}
+        (path / GAZETTEER_FILE).write_text(json.dumps(ordered, ensure_ascii=False, indent=2), encoding="utf-8")
+    return gaz
+
+
+def _find(needle: str, haystack: str) -> Optional[re.Match]:
+    if not needle:
+        return None
+    return re.search(rf"(?<![a-z0-9]){re.escape(needle)}(?![a-z0-9])", haystack)
+
+
+def _consume(names: Dict[str, List[str]], text: str) -> Dict[str, List[str]]:
+    # Plus long nom d'abord: une zone du texte n'est attribuée qu'une fois
+    # ("Croix de Louradour" masque "Croix"). Retourne {nom: [communes]} dans
+    # l'ordre d'apparition.
+    found = []
+    for name in sorted(names, key=lambda n: len(fold(n)), reverse=True):
+        m = _find(fold(name), text)
+        if m:
+            found.append((m.start(), name))
+            text = text[: m.start()] + " " * (m.end() - m.start()) + text[m.end():]
+    return {name: names[name] for _, name in sorted(found)}
+
+
+def _mentions(question: str, gazetteer: Dict[str, List[str]]) -> Tuple[List[str], Dict[str, List[str]]]:
+    """Communes citées et sites cités ({site: [communes possibles]}).
+
+    Les sites sont cherchés dans les communes citées, ou partout si aucune.
+    """
+    q = fold(normalize_place_name(question))
+    communes = list(_consume({c: [c] for c in gazetteer}, q))
+    site_owners: Dict[str, List[str]] = {}
+    for commune in communes or list(gazetteer):
+        for site in gazetteer.get(commune, []):
+            site_owners.setdefault(site, []).append(commune)
+    return communes, _consume(site_owners, q)
+
+
+def match_site_filters(question: str, gazetteer: Dict[str, List[str]]) -> Dict[str, str]:
+    """Repère une commune et/ou un site connus dans la question.
+
+    Retourne des paires metadata exactes à appliquer en filtre
+    (`{"commune": ..., "site": ...}`), ou un dict vide si la question ne cible
+    pas un lieu unique. Un site n'est retenu que s'il n'est pas ambigu (même
+    nom dans plusieurs communes, ex. "Bourg") ou si sa commune est citée.
+    """
+    if not question or not gazetteer:
+        return {}
+    communes, owners_by_site = _mentions(question, gazetteer)
+    if len(communes) > 1:
+        return {}
+
+    filters: Dict[str, str] = {}
+    if communes:
+        filters["commune"] = communes[0]
+    if len(owners_by_site) == 1:
+        site, owners = next(iter(owners_by_site.items()))
+        if len(owners) == 1:
+            filters["site"] = site
+            filters.setdefault("commune", owners[0])
+    return filters
+
+
+def match_site_entities(question: str, gazetteer: Dict[str, List[str]]) -> List[Dict[str, str]]:
+    """Liste des lieux distincts cités dans la question, un filtre par lieu.
+
+    "compare les PR de Garavet, Verdier Bas et Pissotes" donne trois filtres
+    `{"commune": "Allassac", "site": ...}`. Les sites ambigus sont ignorés
+    sauf si leurs communes sont citées; une commune citée sans site non ambigu donne un filtre `{"commune": ...}`.
+    """
+    if not question or not gazetteer:
+        return []
+    communes, owners_by_site = _mentions(question, gazetteer)
+    entities: List[Dict[str, str]] = []
+    covered = set()
+    for site, owners in owners_by_site.items():
+        # Site ambigu accepté seulement si ses communes sont citées
+        # ("PR du Bourg à Varetz et à Noailles")
+        if len(owners) == 1 or communes:
+            for owner in owners:
+                entities.append({"commune": owner, "site": site})
+                covered.add(owner)
+    for commune in communes:
+        if commune not in covered:
+            entities.append({"commune": commune})
+    return entities
@@ -0,0 +1,150 @@
+"""Docstore LlamaIndex sur SQLite, chargé à la demande.
+
+Le docstore JSON par défaut (`docstore.json`) est lu et désérialisé en entier
+à chaque chargement d'index. Ici chaque entrée (nœud, info de document, hash)
+est une ligne SQLite dont la valeur est du JSON compressé (zlib): ouvrir le
+docstore ne lit rien, un nœud n'est décompressé que lorsqu'il est demandé.
+
+Un `docstore.json` existant est converti une fois en `docstore.sqlite`
+(voir `open_docstore`).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.kvstore.types import DEFAULT_BATCH_SIZE, DEFAULT_COLLECTION, BaseKVStore
+
+DOCSTORE_FILE = "docstore.sqlite"
+LEGACY_DOCSTORE_FILE = "docstore.json"
+
+
+def _pack(val: dict) -> bytes:
+    return zlib.compress(json.dumps(val, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _unpack(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class SQLiteKVStore(BaseKVStore):
+    """Stockage clé/valeur ({collection, clé} -> dict) dans un fichier SQLite."""
+
+    def __init__(self, path: str) -> None:
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (collection TEXT NOT NULL, key TEXT NOT NULL,"
+            " value BLOB NOT NULL, PRIMARY KEY (collection, key)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection)
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        rows = [(collection, key, _pack(val)) for key, val in kv_pairs]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", rows)
+
+    async def aput_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        self.put_all(kv_pairs, collection, batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            ).fetchone()
+        return _unpack(row[0]) if row else None
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv WHERE collection = ?", (collection,)).fetchall()
+        return {key: _unpack(blob) for key, blob in rows}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key))
+        return cur.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
+
+    def count(self, collection: Optional[str] = None) -> int:
+        with self._lock:
+            if collection is None:
+                return int(self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0])
+            return int(self._conn.execute("SELECT COUNT(*) FROM kv WHERE collection = ?", (collection,)).fetchone()[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """Docstore LlamaIndex adossé à `SQLiteKVStore` (écritures immédiates)."""
+
+    def __init__(self, path: str, namespace: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        super().__init__(SQLiteKVStore(path), namespace=namespace, batch_size=batch_size)
+
+    def persist(self, persist_path: str = "", fs=None) -> None:
+        # Déjà écrit à chaque modification; `persist_path` (docstore.json) ignoré
+        return None
+
+
+def migrate_json_docstore(json_path: Path, sqlite_path: Path) -> int:
+    """Copie un `docstore.json` dans un fichier SQLite; retourne le nombre d'entrées."""
+    data = json.loads(Path(json_path).read_text(encoding="utf-8"))
+    tmp = Path(str(sqlite_path) + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    kv = SQLiteKVStore(str(tmp))
+    n = 0
+    for collection, entries in (data or {}).items():
+        if isinstance(entries, dict):
+            kv.put_all(list(entries.items()), collection=collection)
+            n += len(entries)
+    kv.close()
+    os.replace(tmp, sqlite_path)
+    return n
+
+
+def open_docstore(store_dir: str) -> SQLiteDocumentStore:
+    """Ouvre (ou crée) le docstore SQLite d'un dossier d'index.
+
+    Un `docstore.json` hérité est converti au premier passage puis supprimé.
+    """
+    store = Path(store_dir)
+    sqlite_path = store / DOCSTORE_FILE
+    legacy = store / LEGACY_DOCSTORE_FILE
+    if not sqlite_path.exists() and legacy.exists():
+        migrate_json_docstore(legacy, sqlite_path)
+        legacy.unlink()
+    return SQLiteDocumentStore(str(sqlite_path))
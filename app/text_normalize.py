@@ -1,45 +1,138 @@
+"""Expansion des abréviations du glossaire (`app/abreviations/`).
+
+Le glossaire est lu une fois par processus (`_load_resources`); sa version
+(`glossary_version()`, empreinte du contenu effectivement chargé) est
+inscrite dans les métadonnées de chaque chunk normalisé
+(`GLOSSARY_VERSION_KEY`), ce qui permet de ne re-normaliser que les chunks
+concernés par une modification (voir `app.glossary_sync`).
+`reload_glossary()` relit les fichiers sans redémarrer l'application.
+
+Les chunks gardent leur texte d'origine, compact (`GLOSSARY_TEXT_KEY`):
+le texte développé ne sert qu'à l'embedding (`embedding_text`) et les
+expansions présentes dans le chunk sont jointes au prompt dans la
+métadonnée `GLOSSARY_ENTRIES_KEY` (`annotate_chunk`).
+Un artefact précompilé à jour (`COMPILED_FILE`) évite de relire et de
+valider le JSON au démarrage.
+"""
+
+import hashlib
 import json
+import logging
+import os
+import pickle
 import re
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+ABBR_DIR = Path(__file__).resolve().parent / "abreviations"  # app/abreviations
+ABBR_FILE = ABBR_DIR / "abreviations.json"
+REGEX_FILE = ABBR_DIR / "abreviations_regex.json"
+# Glossaire validé et précompilé (voir `app.glossary_rules`)
+COMPILED_FILE = ABBR_DIR / "glossaire.compiled.pickle"
 
-@lru_cache(maxsize=1)
-def _load_resources() -> Tuple[Dict[str, str], List[Tuple[re.Pattern, str]]]:
-    base_app = Path(__file__).resolve().parent  # app/
-    abbr_dir = base_app / "abreviations"
+RULE_FLAGS = {"I": re.IGNORECASE, "M": re.MULTILINE, "S": re.DOTALL, "X": re.VERBOSE}
+
+logger = logging.getLogger(__name__)
+
+# Métadonnée des chunks: version du glossaire appliquée (exclue des embeddings et du prompt)
+GLOSSARY_VERSION_KEY = "glossary_version"
+# Forme du texte stocké: "compact" (abréviations d'origine, développées pour
+# l'embedding seulement); absente sur les index antérieurs au texte développé
+GLOSSARY_TEXT_KEY = "glossary_text"
+COMPACT_TEXT = "compact"
+# Expansions présentes dans le chunk ("STEP = Station d'épuration ; ..."), pour le LLM
+GLOSSARY_ENTRIES_KEY = "glossaire"
+
+_ENTRY_STRIP = " \t\r\n-\u2013\u2014\u2022:;,"
+
+_loaded_stamp: Optional[tuple] = None
+
+
+def _files_stamp() -> tuple:
+    stamp = []
+    for path in (ABBR_FILE, REGEX_FILE):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def compile_rule(rule: dict) -> Tuple[re.Pattern, str]:
+    """Règle `{"pattern", "replacement", "flags"}` compilée (lève `re.error` si invalide)."""
+    patt = rule.get("pattern")
+    repl = rule.get("replacement", "")
+    flags = 0
+    for f in rule.get("flags", []) or []:
+        flags |= RULE_FLAGS.get(str(f).upper(), 0)
+    # Fix JSON-escaped backspace (\b) -> regex word boundary \b
+    # In JSON, "\b" becomes a backspace char (U+0008) after decoding.
+    # Replace that control char with a literal backslash-b sequence for regex.
+    patt = str(patt).replace("\u0008", "\\b")
+    return re.compile(patt, flags), repl
+
+
+def sources_digest() -> str:
+    """Empreinte du contenu des deux fichiers du glossaire (fraîcheur de l'artefact compilé)."""
+    h = hashlib.sha1()
+    for path in (ABBR_FILE, REGEX_FILE):
+        try:
+            h.update(path.read_bytes())
+        except OSError:
+            pass
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _load_compiled() -> Optional[Tuple[Dict[str, str], List[Tuple[re.Pattern, str]]]]:
+    # Artefact écrit par `python -m app.glossary_rules --compile` (règles déjà
+    # validées): ni JSON à relire ni règle à valider, s'il correspond aux fichiers.
+    try:
+        with open(COMPILED_FILE, "rb") as f:
+            data = pickle.load(f)
+        if data.get("source") != sources_digest():
+            return None
+        return dict(data["mapping"]), [(re.compile(p, fl), repl) for p, fl, repl in data["rules"]]
+    except Exception:
+        return None
+
+
+def _parse_sources() -> Tuple[Dict[str, str], List[Tuple[re.Pattern, str]]]:
     # Dictionnaire d'abréviations
-    abbr_path = abbr_dir / "abreviations.json"
+    abbr_path = ABBR_FILE
     mapping: Dict[str, str] = {}
     if abbr_path.exists():
         try:
             mapping = json.loads(abbr_path.read_text(encoding="utf-8"))
-        except Exception:
+        except Exception as e:
+            logger.warning("Glossaire %s illisible (%s): dictionnaire vide", abbr_path.name, e)
             mapping = {}
     # Règles regex optionnelles
-    regex_path = abbr_dir / "abreviations_regex.json"
+    regex_path = REGEX_FILE
     rules: List[Tuple[re.Pattern, str]] = []
     if regex_path.exists():
         try:
             raw = json.loads(regex_path.read_text(encoding="utf-8"))
             for r in raw:
-                patt = r.get("pattern")
-                repl = r.get("replacement", "")
-                flags = 0
-                for f in r.get("flags", []) or []:
-                    if f.upper() == "I":
-                        flags |= re.IGNORECASE
-                    if f.upper() == "M":
-                        flags |= re.MULTILINE
-                if patt:
-                    # Fix JSON-escaped backspace (\b) -> regex word boundary \b
-                    # In JSON, "\b" becomes a backspace char (U+0008) after decoding.
-                    # Replace that control char with a literal backslash-b sequence for regex.
-                    patt = patt.replace("\u0008", "\\b")
-                    rules.append((re.compile(patt, flags), repl))
-        except Exception:
-            pass
+                if r.get("pattern"):
+                    rules.append(compile_rule(r))
+        except Exception as e:
+            # `python -m app.glossary_rules` détaille les erreurs règle par règle
+            logger.warning("Règles %s invalides (%s)", regex_path.name, e)
+    return mapping, rules
+
+
+@lru_cache(maxsize=1)
+def _load_resources() -> Tuple[Dict[str, str], List[Tuple[re.Pattern, str]]]:
+    global _loaded_stamp
+    _loaded_stamp = _files_stamp()
+    compiled = _load_compiled()
+    if compiled is not None:
+        mapping, rules = compiled
+    else:
+        mapping, rules = _parse_sources()
     # Fallback par défaut si le JSON est invalide ou vide
     if not rules:
         try:
@@ -55,16 +148,61 @@ def _load_resources() -> Tuple[Dict[str, str], List[Tuple[re.Pattern, str]]]:
     return mapping, rules
 
 
-def expand_abbreviations(text: str) -> str:
-    if not text:
-        return text
+def glossary_snapshot() -> dict:
+    """Glossaire chargé: `version`, `mapping` et règles `[motif, drapeaux, remplacement]`."""
+    mapping, rules = _load_resources()
+    return {
+        "version": glossary_version(),
+        "mapping": dict(mapping),
+        "rules": [[patt.pattern, patt.flags, repl] for patt, repl in rules],
+    }
+
+
+@lru_cache(maxsize=1)
+def glossary_version() -> str:
+    """Empreinte (12 hex) du dictionnaire et des règles effectivement chargés."""
     mapping, rules = _load_resources()
+    raw = json.dumps(
+        {"mapping": mapping, "rules": [[patt.pattern, patt.flags, repl] for patt, repl in rules]},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def reload_glossary() -> str:
+    """Relit le glossaire (après un enregistrement) et retourne sa nouvelle version."""
+    _load_resources.cache_clear()
+    glossary_version.cache_clear()
+    return glossary_version()
+
+
+def reload_if_changed() -> bool:
+    """Relit le glossaire si ses fichiers ont changé depuis le chargement (deux `stat`)."""
+    if _loaded_stamp is None or _files_stamp() == _loaded_stamp:
+        return False
+    reload_glossary()
+    return True
+
+
+@lru_cache(maxsize=4096)
+def _abbr_pattern(abbr: str) -> re.Pattern:
+    # Bordures de mot, insensible à la casse (compilé une fois par abréviation)
+    return re.compile(rf"\b{re.escape(abbr)}\b", re.IGNORECASE)
+
+
+def expand_mapping(text: str, mapping: Dict[str, str]) -> str:
+    """Expansion par dictionnaire seule: "ABBR" -> "expansion (ABBR)"."""
     out = text
+    # Les abréviations absentes du texte (comparaison casefold, plus large
+    # que IGNORECASE) ne lancent pas de recherche regex
+    folded = out.casefold()
     # Remplacements par dictionnaire (ordonnés par longueur décroissante)
     for abbr in sorted(mapping.keys(), key=len, reverse=True):
+        if abbr.casefold() not in folded:
+            continue
         exp = mapping[abbr]
-        # Bordures de mot, insensible à la casse; préserve l'abréviation rencontrée
-        pattern = re.compile(rf"\b{re.escape(abbr)}\b", re.IGNORECASE)
+        pattern = _abbr_pattern(abbr)
 
         def _repl(m: re.Match) -> str:
             seen = m.group(0)
@@ -73,7 +211,18 @@ def expand_abbreviations(text: str) -> str:
                 return seen
             return f"{exp} ({seen})"
 
-        out = pattern.sub(_repl, out)
+        expanded = pattern.sub(_repl, out)
+        if expanded != out:
+            out = expanded
+            folded = out.casefold()
+    return out
+
+
+def expand_with(text: str, mapping: Dict[str, str], rules: List[Tuple[re.Pattern, str]]) -> str:
+    """Expansion avec un glossaire donné (dictionnaire puis règles regex)."""
+    if not text:
+        return text
+    out = expand_mapping(text, mapping)
 
     # Règles regex spécifiques
     for patt, repl in rules:
@@ -82,3 +231,64 @@ def expand_abbreviations(text: str) -> str:
         except Exception:
             continue
     return out
+
+
+def expand_abbreviations(text: str) -> str:
+    return expand_with(text, *_load_resources())
+
+
+def glossary_entries(
+    text: str,
+    mapping: Optional[Dict[str, str]] = None,
+    rules: Optional[List[Tuple[re.Pattern, str]]] = None,
+) -> Dict[str, str]:
+    """Abréviations présentes dans `text` et leur expansion (glossaire chargé par défaut)."""
+    if mapping is None or rules is None:
+        mapping, rules = _load_resources()
+    entries: Dict[str, str] = {}
+    if not text:
+        return entries
+    folded = text.casefold()
+    for abbr in sorted(mapping.keys(), key=len, reverse=True):
+        if abbr.casefold() in folded and _abbr_pattern(abbr).search(text):
+            entries.setdefault(abbr, mapping[abbr])
+    for patt, repl in rules:
+        try:
+            for m in patt.finditer(text):
+                seen = m.group(0).strip(_ENTRY_STRIP)
+                exp = m.expand(repl).strip(_ENTRY_STRIP)
+                # "Poste de relevage (R)" -> "Poste de relevage"
+                if exp.endswith(f"({seen})"):
+                    exp = exp[: -len(seen) - 2].rstrip()
+                if seen and exp and exp != seen:
+                    entries.setdefault(seen, exp)
+        except Exception:
+            continue
+    return entries
+
+
+def format_entries(entries: Dict[str, str]) -> str:
+    return " ; ".join(f"{k} = {v}" for k, v in entries.items())
+
+
+def is_compact(metadata: Optional[dict]) -> bool:
+    """Chunk stocké sous forme compacte (expansion à l'embedding seulement)."""
+    return (metadata or {}).get(GLOSSARY_TEXT_KEY) == COMPACT_TEXT
+
+
+def embedding_text(content: str, metadata: Optional[dict] = None) -> str:
+    """Texte à embedder pour un chunk: développé s'il est stocké compact."""
+    return expand_abbreviations(content) if is_compact(metadata) else content
+
+
+def annotate_chunk(node) -> None:
+    """Ajoute au nœud compact la métadonnée des expansions (prompt seulement, hors embedding)."""
+    if not is_compact(node.metadata):
+        return
+    entries = glossary_entries(node.text)
+    if entries:
+        node.metadata[GLOSSARY_ENTRIES_KEY] = format_entries(entries)
+    else:
+        node.metadata.pop(GLOSSARY_ENTRIES_KEY, None)
+    if GLOSSARY_ENTRIES_KEY not in node.excluded_embed_metadata_keys:
+        node.excluded_embed_metadata_keys.append(GLOSSARY_ENTRIES_KEY)
@@ -0,0 +1,154 @@
+"""
+Gain du texte compact: chunks et tokens de prompt, par corpus.
+
+Les chunks stockent le texte d'origine (abréviations non développées) et
+n'utilisent le texte développé que pour l'embedding (voir
+`app.text_normalize`). Ce banc compare, pour chaque partition (type
+d'actif, voir `app.partitions`) des documents de `--data-dir`:
+
+- compact: les documents tels que chargés, découpés avec le splitter de
+  l'indexation (les expansions du chunk sont jointes au prompt);
+- développé: les mêmes documents, texte entièrement développé comme avant
+  (approximation pour les enregistrements JSON, dont seules les valeurs
+  étaient développées).
+
+Mesures: nombre de chunks, tokens du corpus tel que vu par le LLM
+(`MetadataMode.LLM`, tokenizer de LlamaIndex, somme sur les chunks) et
+tokens de contexte d'une question (`top_k` chunks moyens). Des chunks
+pleins (`chunk_size` atteint) coûtent autant de tokens de prompt sous les
+deux formes mais couvrent plus de texte source sous forme compacte: le
+gain se lit alors sur les chunks et les tokens du corpus; les chunks
+courts (fiches, enregistrements JSON) réduisent directement le prompt.
+
+Exemples:
+  python -m app.utils.bench_compact_text --data-dir data
+  python -m app.utils.bench_compact_text --data-dir data --chunk-size 512 --top-k 4 --json compact.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Callable, Dict, List, Optional, Sequence
+
+TOTAL = "total"
+
+
+def expanded_documents(documents: Sequence) -> list:
+    """Copies des documents au texte développé (indexation antérieure au texte compact)."""
+    from llama_index.core.schema import Document
+
+    from app.text_normalize import GLOSSARY_TEXT_KEY, embedding_text
+
+    out = []
+    for d in documents:
+        meta = {k: v for k, v in d.metadata.items() if k != GLOSSARY_TEXT_KEY}
+        out.append(
+            Document(
+                text=embedding_text(d.text, d.metadata),
+                metadata=meta,
+                excluded_embed_metadata_keys=list(d.excluded_embed_metadata_keys),
+                excluded_llm_metadata_keys=list(d.excluded_llm_metadata_keys),
+            )
+        )
+    return out
+
+
+def _measure(documents: Sequence, splitter, tokenizer: Callable[[str], list]) -> dict:
+    from llama_index.core.schema import MetadataMode
+
+    from app.node_store import split_documents
+
+    nodes = split_documents(documents, splitter)
+    tokens = [len(tokenizer(n.get_content(metadata_mode=MetadataMode.LLM))) for n in nodes]
+    return {"chunks": len(nodes), "llm_tokens": sum(tokens)}
+
+
+def _reduction(before: float, after: float) -> Optional[float]:
+    return round(100.0 * (before - after) / before, 1) if before else None
+
+
+def compare_corpus(
+    documents: Sequence,
+    splitter,
+    top_k: int = 4,
+    tokenizer: Optional[Callable[[str], list]] = None,
+) -> Dict[str, dict]:
+    """Mesures compact vs développé par partition (et `total`).
+
+    Chaque entrée: `chunks` et `llm_tokens` des deux variantes (`compact`,
+    `expanded`), `prompt_tokens` (top_k x tokens moyens par chunk) et les
+    réductions en pourcentage (`chunks_reduction`, `llm_tokens_reduction`,
+    `prompt_reduction`).
+    """
+    from app.partitions import group_by_partition
+
+    if tokenizer is None:
+        from llama_index.core.utils import get_tokenizer
+
+        tokenizer = get_tokenizer()
+    groups = group_by_partition(list(documents))
+    groups[TOTAL] = [d for docs in groups.values() for d in docs]
+    report: Dict[str, dict] = {}
+    for name, docs in groups.items():
+        entry: dict = {"documents": len(docs)}
+        for variant, variant_docs in (("compact", docs), ("expanded", expanded_documents(docs))):
+            m = _measure(variant_docs, splitter, tokenizer)
+            m["prompt_tokens"] = round(top_k * m["llm_tokens"] / m["chunks"]) if m["chunks"] else 0
+            entry[variant] = m
+        entry["chunks_reduction"] = _reduction(entry["expanded"]["chunks"], entry["compact"]["chunks"])
+        entry["prompt_reduction"] = _reduction(entry["expanded"]["prompt_tokens"], entry["compact"]["prompt_tokens"])
+        entry["llm_tokens_reduction"] = _reduction(entry["expanded"]["llm_tokens"], entry["compact"]["llm_tokens"])
+        report[name] = entry
+    return report
+
+
+def format_report(report: Dict[str, dict], top_k: int) -> str:
+    def pct(v):
+        # Réduction affichée comme une variation ("-12.5 %")
+        return "-" if v is None else f"{-v or 0.0:+.1f} %"
+
+    lines = [
+        f"{'corpus':<20} {'docs':>5} {'chunks dév.':>12} {'compact':>8} {'gain':>9}"
+        f" {'tokens dév.':>12} {'compact':>8} {'gain':>9}"
+        f" {f'prompt top-{top_k} dév.':>18} {'compact':>8} {'gain':>9}"
+    ]
+    for name, e in sorted(report.items(), key=lambda kv: (kv[0] == TOTAL, kv[0])):
+        lines.append(
+            f"{name:<20} {e['documents']:>5} {e['expanded']['chunks']:>12} {e['compact']['chunks']:>8}"
+            f" {pct(e['chunks_reduction']):>9} {e['expanded']['llm_tokens']:>12}"
+            f" {e['compact']['llm_tokens']:>8} {pct(e['llm_tokens_reduction']):>9}"
+            f" {e['expanded']['prompt_tokens']:>18} {e['compact']['prompt_tokens']:>8} {pct(e['prompt_reduction']):>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.utils.config import load_config
+
+    cfg = load_config()
+    ap = argparse.ArgumentParser(description="Chunks et tokens de prompt: texte compact vs développé, par corpus")
+    ap.add_argument("--data-dir", default=cfg["paths"]["data_dir"], help="Dossier des documents")
+    ap.add_argument("--chunk-size", type=int, default=int(cfg["indexing"]["chunk_size"]))
+    ap.add_argument("--chunk-overlap", type=int, default=int(cfg["indexing"]["chunk_overlap"]))
+    ap.add_argument("--top-k", type=int, default=int(cfg["indexing"]["top_k"]))
+    ap.add_argument("--json", default=None, help="Écrit les résultats dans ce fichier JSON")
+    args = ap.parse_args(argv)
+
+    from app.loader import load_documents
+    from app.node_store import make_splitter
+
+    documents = load_documents(args.data_dir)
+    if not documents:
+        raise SystemExit(f"Aucun document dans {args.data_dir}")
+    report = compare_corpus(documents, make_splitter(args.chunk_size, args.chunk_overlap), top_k=args.top_k)
+    print(f"Documents: {len(documents)} | chunk_size: {args.chunk_size} | top_k: {args.top_k}")
+    print(format_report(report, args.top_k))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+"""
+Banc d'essai du docstore: JSON (`SimpleDocumentStore`) vs SQLite paresseux.
+
+Un docstore synthétique (N documents avec leur hash et N nœuds texte) est
+écrit dans les deux formats, puis chacun est ouvert dans un processus séparé:
+temps d'ouverture, mémoire résidente ajoutée, temps de lecture de k nœuds
+(simulation d'une recherche top-k).
+
+Exemple:
+  python -m app.utils.bench_docstore --docs 20000 --text-chars 900
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        import resource
+
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+
+def _nodes(n: int, text_chars: int):
+    from llama_index.core.schema import Document, TextNode
+
+    rnd = random.Random(0)
+    words = ["pompe", "bâche", "relevage", "débit", "station", "boues", "clarificateur", "poste", "vanne", "trop-plein"]
+    docs, nodes = [], []
+    for i in range(n):
+        text = " ".join(rnd.choice(words) for _ in range(text_chars // 7))[:text_chars]
+        doc = Document(text=text, doc_id=f"doc{i}", metadata={"file_path": f"data/f{i % 300}.json", "json_path": f"$[{i}]"})
+        docs.append(doc)
+        nodes.append(TextNode(text=text, id_=f"node{i}", metadata=doc.metadata))
+    return docs, nodes
+
+
+def write_stores(root: Path, n: int, text_chars: int) -> None:
+    from llama_index.core.storage.docstore import SimpleDocumentStore
+
+    from app.sqlite_docstore import DOCSTORE_FILE, SQLiteDocumentStore
+
+    docs, nodes = _nodes(n, text_chars)
+    for store in (SimpleDocumentStore(), SQLiteDocumentStore(str(root / DOCSTORE_FILE))):
+        for d in docs:
+            store.set_document_hash(d.doc_id, d.hash)
+        store.add_documents(nodes, allow_update=True)
+        store.persist(str(root / "docstore.json"))
+
+
+def _measure(kind: str, root: str, n: int, k: int, out) -> None:
+    # Imports hors mesure: seul le chargement du docstore est chronométré
+    from llama_index.core.storage.docstore import SimpleDocumentStore
+
+    from app.sqlite_docstore import DOCSTORE_FILE, SQLiteDocumentStore
+
+    rss0 = _rss_bytes()
+    t0 = time.perf_counter()
+    if kind == "json":
+        store = SimpleDocumentStore.from_persist_path(os.path.join(root, "docstore.json"))
+    else:
+        store = SQLiteDocumentStore(os.path.join(root, DOCSTORE_FILE))
+    open_s = time.perf_counter() - t0
+    ids = [f"node{i}" for i in random.Random(1).sample(range(n), k)]
+    t1 = time.perf_counter()
+    store.get_nodes(ids)
+    fetch_ms = (time.perf_counter() - t1) * 1000.0
+    out.put({"kind": kind, "open_s": round(open_s, 3), "fetch_ms": round(fetch_ms, 2),
+             "rss_mb": round((_rss_bytes() - rss0) / 1e6, 1)})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc d'essai docstore JSON vs SQLite")
+    ap.add_argument("--docs", type=int, default=20000)
+    ap.add_argument("--text-chars", type=int, default=900)
+    ap.add_argument("--top-k", type=int, default=4)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        write_stores(root, args.docs, args.text_chars)
+        ctx = mp.get_context("spawn")
+        for kind, fname in (("json", "docstore.json"), ("sqlite", "docstore.sqlite")):
+            q = ctx.Queue()
+            p = ctx.Process(target=_measure, args=(kind, tmp, args.docs, args.top_k, q))
+            p.start()
+            res = q.get()
+            p.join()
+            size = (root / fname).stat().st_size / 1e6
+            print(f"{kind:7s} ouverture {res['open_s']:.3f}s | RSS +{res['rss_mb']} Mo | disque {size:.1f} Mo"
+                  f" | lecture de {args.top_k} nœuds {res['fetch_ms']:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
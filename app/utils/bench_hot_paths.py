@@ -0,0 +1,410 @@
+"""
+Microbenchmarks des chemins chauds de l'ingestion, sans Ollama.
+
+Mesure, sur un corpus synthétique de taille réglable et sur les JSON de
+`reducteur/`:
+
+- `expand_abbreviations` (textes libres et valeurs d'enregistrements);
+- `loader.make_kv_text_and_meta` (rendu clé/valeur des enregistrements JSON);
+- `loader.apply_record_mappings` (projection sur les clés canoniques
+  de `app/ontology/schemas.yaml`);
+- `split`: découpe en chunks (`make_splitter`, mêmes réglages que l'index);
+- `embed`: `indexer.embed_chunks` (texte développé des chunks compacts,
+  comme à l'indexation) avec un modèle d'embedding factice (vecteurs
+  déterministes calculés par hachage des mots), coût du pipeline hors modèle.
+
+Chaque mesure est répétée (`--repeat`, après un tour d'échauffement); le
+résultat JSON garde médiane, minimum et temps par élément (µs). Avec
+`--compare`, les temps par élément sont comparés à une référence enregistrée
+et la commande sort en erreur (code 1) si l'un d'eux dépasse la référence de
+plus de `--threshold`.
+
+Le temps d'import des modules chargés au démarrage de la page Streamlit et
+des CLI (`IMPORT_BUDGETS_MS`) est aussi contrôlé dans un interpréteur neuf
+(`python -X importtime`): code 1 si l'un dépasse son budget ou charge
+LlamaIndex, Chroma ou Ollama.
+
+Exemples:
+  python -m app.utils.bench_hot_paths --records 5000 --output bench_baseline.json
+  python -m app.utils.bench_hot_paths --records 5000 --compare bench_baseline.json --threshold 0.2
+  python -m app.utils.bench_hot_paths --imports-only
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+ROOT = Path(__file__).resolve().parents[2]
+REDUCTEUR_DIR = ROOT / "reducteur"
+SCHEMAS_PATH = ROOT / "app" / "ontology" / "schemas.yaml"
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dim: int) -> np.ndarray:
+    return np.random.default_rng(zlib.crc32(word.encode("utf-8"))).standard_normal(dim, dtype=np.float32)
+
+
+def fake_vector(text: str, dim: int = 256) -> List[float]:
+    """Vecteur déterministe d'un texte: somme de vecteurs fixes par mot, normalisée."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        vec += _word_vector(word, dim)
+    norm = float(np.linalg.norm(vec))
+    return (vec / norm if norm else vec).tolist()
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Embedding factice (`fake_vector`), sans serveur."""
+
+    dim: int = 256
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return fake_vector(query, self.dim)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return fake_vector(query, self.dim)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return fake_vector(text, self.dim)
+
+
+# ------------------------------------------------------------------
+# Corpus
+# ------------------------------------------------------------------
+
+_COMMUNES = ["ALLASSAC", "BRIVE", "COSNAC", "CUBLAC", "AYEN", "CHABRIGNAC", "USSAC", "MALEMORT"]
+_SITES = ["PR du Bourg", "STEP de Laval", "PR des Carrières", "RES Haut", "SURP ET RES Lacombe", "PR St Pierre", "DO Mazaud"]
+_WORDS = [
+    "pompe", "bâche", "relevage", "débit", "station", "boues", "clarificateur", "poste", "vanne",
+    "trop-plein", "PR", "STEP", "EU", "EP", "DO", "BO", "PPV", "TE", "St", "Ste", "aération", "dégrilleur",
+]
+
+
+def synthetic_records(n: int, seed: int = 0) -> List[dict]:
+    """Enregistrements proches de `prm.json` / `recap.json` / fiches PR."""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        rec = {
+            "Agence": "AG_BRIVE",
+            "CodePPV": 110000 + i,
+            "Nom Site PPV": f"{rnd.choice(_SITES)} {i}",
+            "Localite": rnd.choice(_COMMUNES),
+            "TYPE": rnd.choice(["STEP Boues activées - aération prolongée", "PR EU", "RES", "SURP"]),
+            "DEBIT(m3/j)": rnd.randint(5, 2000),
+            "CAPACITE(eH)": rnd.randint(50, 20000),
+            "Pompage": f"{rnd.randint(1, 3)}+1 - Marque : XYLEM (ex Flygt)",
+            "Observations": " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(5, 40))),
+        }
+        if i % 3 == 0:
+            rec["Equipements"] = {"Vanne": "DN100", "Clapet": "oui", "Télégestion": "Sofrel S550"}
+        out.append(rec)
+    return out
+
+
+def synthetic_texts(n: int, words: int = 120, seed: int = 1) -> List[str]:
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(_WORDS) for _ in range(words)) for _ in range(n)]
+
+
+def reducteur_records(folder: Path = REDUCTEUR_DIR) -> List[dict]:
+    """Enregistrements des fichiers JSON de `reducteur/` (fichiers invalides ignorés)."""
+    out: List[dict] = []
+    for path in sorted(folder.glob("*.json")):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        items = data if isinstance(data, list) else list(data.values()) if isinstance(data, dict) else [data]
+        out.extend(x for x in items if isinstance(x, dict))
+    return out
+
+
+def build_corpus(records: List[dict], texts: List[str]) -> dict:
+    from llama_index.core.schema import Document
+
+    from app.loader import _normalized, make_kv_text_and_meta
+
+    rendered = [make_kv_text_and_meta(r)[0] for r in records]
+    documents = [Document(text=t, doc_id=f"rec{i}") for i, t in enumerate(rendered) if t]
+    # Quelques longs documents (cours, rapports) pour exercer la découpe
+    documents += [Document(text="\n\n".join(texts[i:i + 40]), doc_id=f"long{i}") for i in range(0, len(texts), 40)]
+    # Métadonnées de glossaire du chargeur: chunks compacts, développés à l'embedding
+    documents = [_normalized(d) for d in documents]
+    values = [str(v) for r in records for v in r.values() if isinstance(v, str) and v]
+    return {"records": records, "texts": texts + values, "documents": documents}
+
+
+# ------------------------------------------------------------------
+# Bancs
+# ------------------------------------------------------------------
+
+def _bench_expand(corpus: dict, ctx: dict) -> int:
+    from app.text_normalize import expand_abbreviations
+
+    for t in corpus["texts"]:
+        expand_abbreviations(t)
+    return len(corpus["texts"])
+
+
+def _bench_kv(corpus: dict, ctx: dict) -> int:
+    from app.loader import make_kv_text_and_meta
+
+    for r in corpus["records"]:
+        make_kv_text_and_meta(r)
+    return len(corpus["records"])
+
+
+def _bench_mappings(corpus: dict, ctx: dict) -> int:
+    from app.loader import apply_record_mappings
+
+    mappings = ctx["mappings"]
+    for r in corpus["records"]:
+        apply_record_mappings(r, mappings)
+    return len(corpus["records"])
+
+
+def _bench_split(corpus: dict, ctx: dict) -> int:
+    corpus["nodes"] = ctx["splitter"].get_nodes_from_documents(corpus["documents"])
+    return len(corpus["documents"])
+
+
+def _bench_embed(corpus: dict, ctx: dict) -> int:
+    from app.indexer import embed_chunks
+
+    nodes = corpus.get("nodes") or ctx["splitter"].get_nodes_from_documents(corpus["documents"])
+    corpus["nodes"] = nodes
+    # embed_chunks ignore les nœuds déjà vectorisés (tour précédent)
+    for n in nodes:
+        n.embedding = None
+    embed_chunks(nodes, ctx["embed_model"])
+    return len(nodes)
+
+
+BENCHMARKS: Dict[str, Callable[[dict, dict], int]] = {
+    "expand_abbreviations": _bench_expand,
+    "make_kv_text_and_meta": _bench_kv,
+    "apply_mappings": _bench_mappings,
+    "split": _bench_split,
+    "embed": _bench_embed,
+}
+
+
+def measure(fn: Callable[[], int], repeat: int) -> dict:
+    """Médiane / minimum de `repeat` exécutions (après un échauffement)."""
+    items = fn()
+    times = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    median = statistics.median(times)
+    return {
+        "items": items,
+        "repeat": len(times),
+        "median_s": round(median, 6),
+        "min_s": round(min(times), 6),
+        "us_per_item": round(median / max(1, items) * 1e6, 3),
+    }
+
+
+def run_benchmarks(
+    records: int = 2000,
+    repeat: int = 5,
+    use_reducteur: bool = True,
+    only: Optional[List[str]] = None,
+    embed_dim: int = 256,
+) -> dict:
+    """Résultats `{"meta": {...}, "results": {"<corpus>/<banc>": {...}}}`."""
+    from app.loader import load_record_mappings
+    from app.node_store import make_splitter
+    from app.utils.config import load_config
+
+    cfg = load_config().get("indexing", {})
+    ctx = {
+        "mappings": load_record_mappings(str(SCHEMAS_PATH)),
+        "splitter": make_splitter(int(cfg.get("chunk_size", 1000)), int(cfg.get("chunk_overlap", 150))),
+        "embed_model": FakeEmbedding(dim=embed_dim),
+    }
+    corpora = {"synthetic": build_corpus(synthetic_records(records), synthetic_texts(max(1, records // 4)))}
+    if use_reducteur:
+        red = reducteur_records()
+        if red:
+            corpora["reducteur"] = build_corpus(red, [])
+    names = [n for n in BENCHMARKS if not only or n in only]
+    results: Dict[str, dict] = {}
+    for corpus_name, corpus in corpora.items():
+        for name in names:
+            results[f"{corpus_name}/{name}"] = measure(lambda: BENCHMARKS[name](corpus, ctx), repeat)
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "records": records,
+            "repeat": repeat,
+            "embed_dim": embed_dim,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2) -> List[dict]:
+    """Écart des temps par élément avec la référence (bancs présents des deux côtés).
+
+    `regression` est vrai si le temps par élément dépasse la référence de plus
+    de `threshold` (0.2 = +20 %).
+    """
+    rows = []
+    base = baseline.get("results", {})
+    for key, cur in current.get("results", {}).items():
+        ref = base.get(key)
+        if not ref or not ref.get("us_per_item"):
+            continue
+        ratio = cur["us_per_item"] / ref["us_per_item"]
+        rows.append({
+            "bench": key,
+            "baseline_us": ref["us_per_item"],
+            "current_us": cur["us_per_item"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1.0 + threshold,
+        })
+    return rows
+
+
+# ------------------------------------------------------------------
+# Temps d'import des modules de démarrage (page Streamlit, CLI)
+# ------------------------------------------------------------------
+
+# Budget (ms) par module: ce qu'importent `main.py` avant l'affichage et les
+# CLI avant `--help`. Aucun ne doit charger LlamaIndex, Chroma ni Ollama.
+IMPORT_BUDGETS_MS: Dict[str, float] = {
+    "app.indexer": 400,
+    "app.index_jobs": 200,
+    "app.llm_scheduler": 100,
+    "app.metrics": 100,
+    "app.inspect_chunks": 300,
+    "app.batch_ask": 300,
+    "app.vectorstore_health": 400,
+    "app.utils.build_index": 500,
+}
+HEAVY_PACKAGES = ("llama_index", "chromadb", "ollama")
+
+
+def import_time(module: str) -> dict:
+    """Durée d'import de `module` dans un interpréteur neuf (`python -X importtime`).
+
+    Somme des temps cumulés du module et de ses paquets parents; `heavy`
+    liste les dépendances lourdes (`HEAVY_PACKAGES`) chargées au passage.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} a échoué:\n{proc.stderr[-2000:]}")
+    parents = {".".join(module.split(".")[: i + 1]) for i in range(module.count(".") + 1)}
+    total_us = 0
+    heavy = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line.split("|", 2)
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue
+        top = name.strip().split(".")[0]
+        if top in HEAVY_PACKAGES:
+            heavy.add(top)
+        if name.strip() in parents and not name[1:].startswith(" "):
+            total_us += cumulative_us
+    return {"ms": round(total_us / 1000.0, 1), "heavy": sorted(heavy)}
+
+
+def check_imports(budgets: Optional[Dict[str, float]] = None, repeat: int = 3) -> Dict[str, dict]:
+    """{module: {"ms", "budget_ms", "heavy", "ok"}}; `ms` est le meilleur de `repeat` essais."""
+    out: Dict[str, dict] = {}
+    for module, budget in (budgets or IMPORT_BUDGETS_MS).items():
+        runs = [import_time(module) for _ in range(max(1, repeat))]
+        best = min(runs, key=lambda r: r["ms"])
+        out[module] = {**best, "budget_ms": budget, "ok": best["ms"] <= budget and not best["heavy"]}
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Microbenchmarks hors-ligne des chemins chauds (ingestion)")
+    ap.add_argument("--records", type=int, default=2000, help="Taille du corpus synthétique (enregistrements)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="Bancs à exécuter (tous par défaut)")
+    ap.add_argument("--no-reducteur", action="store_true", help="Ignorer les fichiers de reducteur/")
+    ap.add_argument("--embed-dim", type=int, default=256)
+    ap.add_argument("--output", help="Fichier JSON des résultats")
+    ap.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    ap.add_argument("--threshold", type=float, default=0.2, help="Régression tolérée (0.2 = +20 %%)")
+    ap.add_argument("--imports-only", action="store_true", help="Seulement le contrôle des temps d'import")
+    ap.add_argument("--no-imports", action="store_true", help="Sans le contrôle des temps d'import")
+    args = ap.parse_args(argv)
+
+    status = 0
+    res: dict = {"meta": {}, "results": {}}
+    if not args.imports_only:
+        res = run_benchmarks(
+            records=args.records,
+            repeat=args.repeat,
+            use_reducteur=not args.no_reducteur,
+            only=args.only,
+            embed_dim=args.embed_dim,
+        )
+        for key, r in res["results"].items():
+            print(f"{key:38s} {r['items']:7d} éléments | médiane {r['median_s'] * 1000:9.2f} ms | {r['us_per_item']:9.2f} µs/élément")
+    if not args.no_imports:
+        res["imports"] = check_imports()
+        print("\nTemps d'import (python -X importtime):")
+        for module, r in res["imports"].items():
+            heavy = f" | charge {', '.join(r['heavy'])}" if r["heavy"] else ""
+            print(f"{module:38s} {r['ms']:8.1f} ms (budget {r['budget_ms']:.0f} ms){heavy} {'ok' if r['ok'] else 'HORS BUDGET'}")
+        if not all(r["ok"] for r in res["imports"].values()):
+            print("Des modules de démarrage dépassent leur budget d'import.", file=sys.stderr)
+            status = 1
+    if args.output:
+        Path(args.output).write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Résultats écrits dans {args.output}")
+
+    if not args.compare:
+        return status
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    rows = compare(res, baseline, args.threshold)
+    print(f"\nComparaison avec {args.compare} (seuil +{args.threshold:.0%}):")
+    for row in rows:
+        flag = "RÉGRESSION" if row["regression"] else "ok"
+        print(f"{row['bench']:38s} {row['baseline_us']:9.2f} -> {row['current_us']:9.2f} µs (x{row['ratio']:.2f}) {flag}")
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"{len(regressions)} régression(s) au-delà du seuil.", file=sys.stderr)
+        return 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+"""
+Banc d'essai des backends vectoriels: Chroma vs index plat NumPy.
+
+Les mêmes vecteurs sont écrits dans une collection Chroma et dans un index
+plat (float16, int8, int8 avec copie float32 résidente), puis chaque backend
+est mesuré dans un processus séparé (mémoire propre): temps de chargement à froid (ouverture + première
+requête), mémoire résidente ajoutée, latences p50/p95 des requêtes top-k,
+avec ou sans filtre metadata.
+
+Vecteurs: ceux d'une collection Chroma existante (--persist-dir), ou un
+corpus synthétique (--synthetic N).
+
+Exemples:
+  python -m app.utils.bench_vector_backends --synthetic 20000 --dim 768
+  python -m app.utils.bench_vector_backends --persist-dir vectorstore --collection eau_docs --filter commune=Allassac
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        import resource
+
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values), q))
+
+
+def load_source_vectors(persist_dir: str, collection: str) -> Tuple[List[str], np.ndarray, List[dict]]:
+    """Vecteurs, identifiants et métadonnées d'une collection Chroma existante."""
+    from chromadb import PersistentClient
+
+    col = PersistentClient(path=persist_dir).get_collection(collection)
+    ids: List[str] = []
+    vecs: List[list] = []
+    metas: List[dict] = []
+    offset = 0
+    while True:
+        batch = col.get(include=["embeddings", "metadatas"], limit=1000, offset=offset)
+        if not batch.get("ids"):
+            break
+        ids.extend(batch["ids"])
+        vecs.extend(batch["embeddings"])
+        metas.extend(batch.get("metadatas") or [{}] * len(batch["ids"]))
+        offset += len(batch["ids"])
+    return ids, np.asarray(vecs, dtype=np.float32), [dict(m or {}) for m in metas]
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> Tuple[List[str], np.ndarray, List[dict]]:
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim), dtype=np.float32)
+    metas = [{"commune": f"C{i % 50}", "asset_class": ("poste_relevage", "station_epuration")[i % 2]} for i in range(n)]
+    return [f"n{i}" for i in range(n)], vecs, metas
+
+
+def write_chroma(path: Path, ids, vecs: np.ndarray, metas) -> None:
+    from chromadb import PersistentClient
+
+    col = PersistentClient(path=str(path)).get_or_create_collection("bench")
+    step = 2000
+    for i in range(0, len(ids), step):
+        col.add(
+            ids=list(ids[i:i + step]),
+            embeddings=vecs[i:i + step].tolist(),
+            metadatas=[m or {"_": ""} for m in metas[i:i + step]],
+            documents=[""] * len(ids[i:i + step]),
+        )
+
+
+def write_flat(path: Path, ids, vecs: np.ndarray, metas, dtype: str) -> None:
+    from app.flat_index import FlatIndex
+
+    idx = FlatIndex(dtype=dtype)
+    idx.add(ids, vecs, texts=[""] * len(ids), metadatas=metas)
+    idx.save(path)
+
+
+def _measure(backend: str, path: str, queries: np.ndarray, top_k: int, where: Optional[Dict[str, str]], out,
+             resident: bool = False):
+    # Exécuté dans un processus dédié
+    rss0 = _rss_bytes()
+    t0 = time.perf_counter()
+    if backend == "chroma":
+        from chromadb import PersistentClient
+
+        col = PersistentClient(path=path).get_collection("bench")
+
+        def search(q):
+            return col.query(query_embeddings=[q.tolist()], n_results=top_k, where=where or None)
+    else:
+        from app.flat_index import FlatIndex
+
+        idx = FlatIndex.load(path, resident=resident)
+        pairs = sorted((where or {}).items())
+
+        def search(q):
+            return idx.search(q, top_k=top_k, filters=pairs)
+
+    search(queries[0])
+    load_s = time.perf_counter() - t0
+    lat = []
+    for q in queries[1:]:
+        t = time.perf_counter()
+        search(q)
+        lat.append((time.perf_counter() - t) * 1000.0)
+    out.put({
+        "backend": backend,
+        "load_s": round(load_s, 4),
+        "rss_mb": round((_rss_bytes() - rss0) / 1e6, 1),
+        "p50_ms": round(_percentile(lat, 50), 3),
+        "p95_ms": round(_percentile(lat, 95), 3),
+    })
+
+
+def run_isolated(backend: str, path: str, queries: np.ndarray, top_k: int, where, resident: bool = False) -> dict:
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_measure, args=(backend, path, queries, top_k, where, q, resident))
+    p.start()
+    res = q.get()
+    p.join()
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc d'essai Chroma vs index plat NumPy")
+    ap.add_argument("--persist-dir", default=None, help="Collection Chroma source (sinon corpus synthétique)")
+    ap.add_argument("--collection", default="eau_docs")
+    ap.add_argument("--synthetic", type=int, default=20000, help="Nombre de vecteurs synthétiques")
+    ap.add_argument("--dim", type=int, default=768, help="Dimension des vecteurs synthétiques")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=4)
+    ap.add_argument("--filter", default=None, help="Filtre metadata clé=valeur (ex. commune=C3)")
+    ap.add_argument(
+        "--backends",
+        default="chroma,flat-float16,flat-int8,flat-int8-resident",
+        help="Liste: chroma, flat-<float16|int8>[-resident]",
+    )
+    ap.add_argument("--json", default=None, help="Écrit les résultats dans ce fichier JSON")
+    args = ap.parse_args()
+
+    if args.persist_dir:
+        ids, vecs, metas = load_source_vectors(args.persist_dir, args.collection)
+    else:
+        ids, vecs, metas = synthetic_vectors(args.synthetic, args.dim)
+    if not ids:
+        raise SystemExit("Aucun vecteur à mesurer")
+    where = None
+    if args.filter:
+        k, _, v = args.filter.partition("=")
+        where = {k: v}
+    rng = np.random.default_rng(1)
+    queries = vecs[rng.integers(0, len(ids), size=args.queries + 1)] + rng.normal(0, 0.01, (args.queries + 1, vecs.shape[1])).astype(np.float32)
+    print(f"Vecteurs: {len(ids)} x {vecs.shape[1]} | requêtes: {args.queries} | top_k: {args.top_k} | filtre: {where or '-'}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            path = Path(tmp) / name
+            t0 = time.perf_counter()
+            if name == "chroma":
+                write_chroma(path, ids, vecs, metas)
+                backend = "chroma"
+            else:
+                write_flat(path, ids, vecs, metas, dtype=name.split("-")[1])
+                backend = "flat"
+            write_s = time.perf_counter() - t0
+            size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+            res = run_isolated(backend, str(path), queries, args.top_k, where, resident=name.endswith("-resident"))
+            res.update({"backend": name, "write_s": round(write_s, 2), "disk_mb": round(size / 1e6, 1)})
+            results.append(res)
+            print(
+                f"{name:14s} chargement {res['load_s']:.3f}s | RSS +{res['rss_mb']} Mo | disque {res['disk_mb']} Mo"
+                f" | p50 {res['p50_ms']:.2f} ms | p95 {res['p95_ms']:.2f} ms"
+            )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
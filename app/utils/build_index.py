@@ -1,172 +1,83 @@
+from __future__ import annotations
+
 import argparse
 import json
 import logging
 import math
-import os
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Optional
-
-from app.loader import load_documents
-from app.indexer import build_or_load_index, get_vector_count
-from llama_index.core.schema import Document
-import yaml
-
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from app.index_jobs import list_data_files
+from app.indexer import IndexSidecars, build_or_load_partitioned_index, get_vector_count
+from app.metrics import Timings, append_metrics, recording, span
+from app.profiling import RunProfiler, profile_call
+from app.partitions import group_by_partition
+
+# LlamaIndex (loader, découpage) est importé à l'usage: `--help` reste immédiat
+if TYPE_CHECKING:
+    from llama_index.core.schema import Document
+
+PROFILE_FILE = "build_profile.json"
+
+
+def export_chunks(
+    documents,
+    export_path: Path,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 150,
+    persist_dir: Optional[str] = None,
+) -> int:
+    """Exporte les chunks en JSONL, tels qu'indexés.
+
+    Le découpage passe par le magasin de nœuds de l'index (`app.node_store`):
+    avec le même `persist_dir` et les mêmes paramètres, les nœuds exportés sont
+    ceux qui sont (ou seront) indexés, sans second découpage. Appelée après
+    l'indexation, elle marque les doublons écartés (`dedup.sqlite`): champs
+    `duplicate_of` (id du chunk indexé) et `duplicate_kind` ("exact" ou
+    "near"); seuls les chunks sans ces champs ont été vectorisés.
+    """
+    from app.dedup import duplicate_canonicals
+    from app.node_store import make_splitter, split_documents
 
-def export_chunks(documents, export_path: Path, chunk_size: int = 1000, chunk_overlap: int = 150) -> None:
-    try:
-        from llama_index.core.node_parser import SentenceSplitter
-    except Exception:
-        # If splitter not available, export raw documents
-        splitter = None
+    nodes = split_documents(documents, make_splitter(chunk_size, chunk_overlap), persist_dir)
+    dups = duplicate_canonicals(persist_dir, (n.node_id for n in nodes))
     export_path.parent.mkdir(parents=True, exist_ok=True)
     with export_path.open("w", encoding="utf-8", newline="") as f:
-        if 'splitter' in locals() and splitter is not None:
-            sp = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            nodes = sp.get_nodes_from_documents(documents)
-            for n in nodes:
-                rec = {
-                    "id": getattr(n, "id_", None),
-                    "text": getattr(n, "text", ""),
-                    "metadata": getattr(n, "metadata", {}) or {},
-                }
-                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        else:
-            # Fallback: export document-level records (one line per Document)
-            for d in documents:
-                rec = {
-                    "id": getattr(d, "doc_id", None),
-                    "text": getattr(d, "text", ""),
-                    "metadata": getattr(d, "metadata", {}) or {},
-                }
-                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-
-def _fmt_val(v):
-    if v is None:
-        return ""
-    if isinstance(v, (int, float)):
-        return str(v)
-    if isinstance(v, str):
-        return v
-    if isinstance(v, list):
-        return ", ".join(_fmt_val(x) for x in v)
-    if isinstance(v, dict):
-        parts = []
-        for sk, sv in v.items():
-            parts.append(f"{sk} : {_fmt_val(sv)}")
-        return "; ".join(parts)
-    return str(v)
-
-
-def _kv_text_and_meta(obj):
-    meta = {}
-    lines = []
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            val = _fmt_val(v)
-            lines.append(f"{k} : {val}")
-            meta[str(k)] = val
-    elif isinstance(obj, list):
-        val = ", ".join(_fmt_val(x) for x in obj)
-        lines.append(val)
-    else:
-        lines.append(_fmt_val(obj))
-    text = "\n".join(l for l in lines if l and str(l).strip())
-    return text, meta
-
-
-def _json_docs_from_file(path: Path) -> list[Document]:
-    docs: list[Document] = []
-    try:
-        raw = path.read_text(encoding="utf-8")
-        data = json.loads(raw)
-    except Exception:
-        return docs
+        for n in nodes:
+            rec = {
+                "id": getattr(n, "id_", None),
+                "text": getattr(n, "text", ""),
+                "metadata": getattr(n, "metadata", {}) or {},
+            }
+            if n.node_id in dups:
+                rec["duplicate_of"], rec["duplicate_kind"] = dups[n.node_id]
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return len(nodes)
+
+
+def collect_documents(
+    data_dir: Path,
+    mappings: Sequence[dict],
+    timings: Timings,
+    input_files: Optional[list[Path]] = None,
+) -> list[Document]:
+    """Documents à indexer, lus par `app.loader.load_documents`.
+
+    Les JSON donnent un document par enregistrement (clés canoniques
+    `mappings`), avec les mêmes métadonnées que dans l'interface (site,
+    version du glossaire). `input_files` limite la lecture à ces fichiers
+    (profil fichier par fichier).
+    """
+    from app.loader import load_documents
 
-    def emit(path_str: str, obj):
-        text, meta = _kv_text_and_meta(obj)
-        if not text:
-            return
-        header = f"[Source: {path.name} | JSON path: {path_str}]"
-        final_text = f"{header}\n{text}"
-        docs.append(
-            Document(
-                text=final_text,
-                metadata={"file_path": str(path), "json_path": path_str, **meta},
-            )
+    with recording(timings):
+        return load_documents(
+            str(data_dir),
+            input_files=None if input_files is None else [str(p) for p in input_files],
+            mappings=mappings,
         )
 
-    try:
-        if isinstance(data, list):
-            for i, item in enumerate(data):
-                emit(f"$[{i}]", item)
-        elif isinstance(data, dict):
-            for k, v in data.items():
-                if isinstance(v, list):
-                    for i, item in enumerate(v):
-                        emit(f"$.{k}[{i}]", item)
-                else:
-                    emit(f"$.{k}", v)
-        else:
-            emit("$", data)
-    except Exception:
-        pass
-    return docs
-
-
-def _load_schema_mappings(schema_path: Path) -> list[dict]:
-    try:
-        data = yaml.safe_load(schema_path.read_text(encoding="utf-8"))
-    except Exception:
-        return []
-    mappings: list[dict] = []
-    try:
-        sch = data.get("schemas", {}) or {}
-        # Utiliser generic_record + autres si besoin
-        for name in ("generic_record",):
-            if name in sch:
-                for m in sch[name].get("mappings", []) or []:
-                    mappings.append(m)
-    except Exception:
-        return mappings
-    return mappings
-
-
-def _apply_mappings_to_obj(obj: dict, mappings: list[dict]) -> tuple[dict, list[str]]:
-    """Retourne (meta_canon, canon_pairs) pour l'objet JSON.
-    meta_canon: dict de paires canonisées (prefixées canon_)
-    canon_pairs: liste de "Label : valeur" pour affichage compact
-    """
-    meta_canon: dict = {}
-    pairs: list[str] = []
-    if not isinstance(obj, dict):
-        return meta_canon, pairs
-    for m in mappings:
-        src = m.get("source")
-        target = m.get("target")
-        if not src or not target:
-            continue
-        label = m.get("label", target)
-        is_regex = bool(m.get("regex"))
-        value = None
-        try:
-            if is_regex:
-                # Cherche la première clé qui matche
-                for k, v in obj.items():
-                    if re.search(src, str(k)):
-                        value = v
-                        break
-            else:
-                if src in obj:
-                    value = obj[src]
-        except Exception:
-            value = None
-        if value is not None:
-            val_s = _fmt_val(value)
-            meta_canon[f"canon_{target}"] = val_s
-            pairs.append(f"{label} : {val_s}")
-    return meta_canon, pairs
-
 
 def main():
     ap = argparse.ArgumentParser(description="Build index and optionally export chunks")
@@ -179,6 +90,10 @@ def main():
     ap.add_argument("--export-chunks", default=None, help="Path to write chunks (JSONL)")
     ap.add_argument("--chunk-size", type=int, default=1000)
     ap.add_argument("--chunk-overlap", type=int, default=150)
+    ap.add_argument("--profile", action="store_true", help="Per-file / per-stage wall, CPU and peak memory report")
+    ap.add_argument("--profile-top", type=int, default=10, help="Files listed in the profile report")
+    ap.add_argument("--profile-tracemalloc", action="store_true", help="Also trace Python allocations (slower)")
+    ap.add_argument("--profile-dump", default=None, help="Write a cProfile dump of the run to this path")
     args = ap.parse_args()
 
     data_dir = Path(args.data_dir)
@@ -200,79 +115,93 @@ def main():
         except Exception:
             pass
 
-    # Build documents: JSON files -> one chunk per JSON record (enrichi);
-    # autres fichiers via loader
-    documents = []
-    # Non-JSON via loader
-    loaded = load_documents(str(data_dir))
-    for d in loaded:
-        fp = (d.metadata or {}).get("file_path") or ""
-        if not str(fp).lower().endswith(".json"):
-            documents.append(d)
-    # Charger les mappings schema pour enrichir
-    schema_path = Path(__file__).resolve().parents[1] / "ontology" / "schemas.yaml"
-    mappings = _load_schema_mappings(schema_path) if schema_path.exists() else []
+    # Durées par étape (load, normalize, split, dedup, embed, upsert), voir app.metrics;
+    # avec --profile, aussi CPU et mémoire par fichier (app.profiling)
+    profiler = RunProfiler(trace_memory=args.profile_tracemalloc) if args.profile else None
+    stages = profiler if profiler is not None else Timings()
 
-    # JSON files per record (enrichissement canon_ + ligne labels)
-    for p in Path(data_dir).rglob("*.json"):
-        raw_docs = _json_docs_from_file(p)
-        if not mappings:
-            documents.extend(raw_docs)
-            continue
-        # Enrichir chaque doc
-        for d in raw_docs:
-            obj_meta = dict(d.metadata or {})
-            # Reconstituer un dict source minimal à partir des meta non canon_
-            source_obj = {k: v for k, v in obj_meta.items() if k not in ("file_path", "json_path") and not str(k).startswith("canon_")}
-            canon_meta, canon_pairs = _apply_mappings_to_obj(source_obj, mappings)
-            if canon_meta:
-                obj_meta.update(canon_meta)
-            # Ajout d'une ligne compacte de labels canoniques (sans muter le Document d'origine)
-            new_text = d.text or ""
-            if canon_pairs:
-                head = f"canon line : {' | '.join(canon_pairs)}"
-                obj_meta["canon_line"] = " | ".join(canon_pairs)
-                new_text = head + "\n" + new_text
-            # Recréer un Document immuable avec le texte/metadata enrichis
-            new_kwargs = {"text": new_text, "metadata": obj_meta}
-            try:
-                _id = getattr(d, "id_", None) or getattr(d, "doc_id", None)
-                if _id:
-                    new_kwargs["id_"] = _id
-            except Exception:
-                pass
-            documents.append(Document(**new_kwargs))
-    total = len(documents)
-    if total == 0:
-        print("Aucun document a indexer.")
-        return 0
+    # Mappings schema (clés canoniques des enregistrements JSON)
+    from app.loader import load_record_mappings
 
-    # Optional export of chunks before inserting
-    if args.export_chunks:
-        export_chunks(
-            documents,
-            Path(args.export_chunks),
-            chunk_size=args.chunk_size,
-            chunk_overlap=args.chunk_overlap,
-        )
+    mappings = load_record_mappings()
 
-    processed = 0
-    batch_size = max(1, min(64, math.ceil(total / 10)))
-    for i in range(0, total, batch_size):
-        batch = documents[i : i + batch_size]
+    with profile_call(args.profile_dump), (profiler if profiler is not None else nullcontext()):
+        # Build documents: JSON files -> one chunk per JSON record (enrichi);
+        # autres fichiers via loader. Avec --profile, fichier par fichier.
+        if profiler is None:
+            groups = [(None, collect_documents(data_dir, mappings, stages))]
+        else:
+            groups = []
+            for path in list_data_files(str(data_dir)):
+                with profiler.file(str(path)):
+                    groups.append((path, collect_documents(data_dir, mappings, stages, input_files=[path])))
+        documents = [d for _, docs in groups for d in docs]
+        total = len(documents)
+        if total == 0:
+            print("Aucun document a indexer.")
+            return 0
+
+        # Classement par type d'actif (metadata `asset_class`) avant l'export, pour
+        # que les chunks exportés portent les mêmes métadonnées que ceux indexés
+        group_by_partition(documents)
+
+        processed = 0
+        dedup_stats: dict = {}
         emb_gpu = None if str(args.embedding_num_gpu).lower() == "none" else int(args.embedding_num_gpu)
-        _ = build_or_load_index(
-            data_documents=batch,
-            persist_dir=str(persist_dir),
-            llm_name=str(args.llm_model),
-            embedding_name=str(args.embedding_model),
-            llm_num_ctx=int(args.llm_num_ctx),
-            embedding_num_gpu=emb_gpu,
-        )
-        processed += len(batch)
-        pct = int(processed * 100 / total)
-        print(f"[{pct:3d}%] Indexation {processed}/{total}")
+        batch_size = max(1, min(64, math.ceil(total / 10)))
+        # Tables annexes (plein texte, sites, enregistrements) écrites une fois, après tous les lots
+        sidecars = IndexSidecars(str(persist_dir))
+        for path, docs in groups:
+            # Profil: un fichier par lot, pour lui attribuer découpe, embedding et écriture
+            batches = [docs] if path is not None else [docs[i : i + batch_size] for i in range(0, len(docs), batch_size)]
+            for batch in batches:
+                if not batch:
+                    continue
+                with (profiler.file(str(path)) if path is not None else nullcontext()), recording(stages):
+                    _ = build_or_load_partitioned_index(
+                        data_documents=batch,
+                        persist_dir=str(persist_dir),
+                        llm_name=str(args.llm_model),
+                        embedding_name=str(args.embedding_model),
+                        llm_num_ctx=int(args.llm_num_ctx),
+                        embedding_num_gpu=emb_gpu,
+                        chunk_size=int(args.chunk_size),
+                        chunk_overlap=int(args.chunk_overlap),
+                        dedup_stats=dedup_stats,
+                        sidecars=sidecars,
+                    )
+                processed += len(batch)
+                pct = int(processed * 100 / total)
+                print(f"[{pct:3d}%] Indexation {processed}/{total}")
+        sidecars.flush()
+
+        # Export après l'indexation: les doublons écartés y sont marqués
+        if args.export_chunks:
+            n_chunks = export_chunks(
+                documents,
+                Path(args.export_chunks),
+                chunk_size=args.chunk_size,
+                chunk_overlap=args.chunk_overlap,
+                persist_dir=str(persist_dir),
+            )
+            print(f"Export: {n_chunks} chunks -> {args.export_chunks}")
 
+    if dedup_stats.get("chunks"):
+        saved = dedup_stats.get("exact", 0) + dedup_stats.get("near", 0)
+        print(
+            f"Dédoublonnage: {saved} embeddings évités sur {dedup_stats['chunks']} chunks"
+            f" ({dedup_stats.get('exact', 0)} doublons exacts, {dedup_stats.get('near', 0)} quasi-doublons)"
+        )
+    spans = stages.as_dict()["spans"]
+    print("Durées par étape: " + " | ".join(f"{k} {v:.1f}s" for k, v in spans.items()))
+    append_metrics(str(persist_dir), "index", stages, documents=total, chunks=dedup_stats.get("chunks", 0))
+    if profiler is not None:
+        print(profiler.report(top=args.profile_top))
+        profile_path = persist_dir / PROFILE_FILE
+        profile_path.write_text(json.dumps(profiler.as_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Profil détaillé: {profile_path}")
+    if args.profile_dump:
+        print(f"Profil cProfile: {args.profile_dump} (python -m pstats {args.profile_dump})")
     count = get_vector_count(str(persist_dir))
     print(f"OK - vecteurs: {count}")
     return 0
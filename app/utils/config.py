@@ -1,4 +1,8 @@
+import copy
 import os
+from contextlib import contextmanager
+from functools import lru_cache
+
 import yaml
 
 _DEFAULTS = {
@@ -16,10 +20,87 @@ _DEFAULTS = {
         "chunk_overlap": 150,
         "top_k": 4,
     },
+    "scheduler": {
+        "max_concurrency": 1,
+        "max_queue": 16,
+    },
+    "vector_store": {
+        "backend": "chroma",
+        "dtype": "float16",
+        "resident": False,
+    },
+    "dedup": {
+        "enabled": True,
+        "threshold": 0.9,
+        "min_words": 40,
+    },
+    "glossary": {
+        "sample_size": 300,
+        "rule_warn_us": 200.0,
+        "rule_max_ms": 20.0,
+        "rule_timeout_s": 2.0,
+    },
+    "retrieval_cache": {
+        "enabled": True,
+        "max_queries": 2048,
+        "max_results": 4096,
+        "max_answers": 256,
+    },
+    "warmup": {
+        "enabled": True,
+        "log_questions": True,
+        "top_n": 20,
+        "min_count": 2,
+        "recent_days": 30,
+        "max_entries": 2000,
+        "answers": True,
+    },
+    "metrics": {
+        "enabled": True,
+        "max_bytes": 5_000_000,
+    },
 }
 
 def load_config(path: str = "settings.yaml") -> dict:
-    cfg = dict(_DEFAULTS)
+    """Configuration complète (copie modifiable), lue une fois par processus."""
+    return copy.deepcopy(_read_config(os.path.abspath(path)))
+
+
+def config_section(name: str, path: str = "settings.yaml") -> dict:
+    """Section `name` de la configuration (copie), lue une fois par processus.
+
+    Accès des chemins appelés à chaque question (ordonnanceur, cache de
+    recherche, métriques, préchauffage); configuration illisible: {}.
+    """
+    try:
+        return copy.deepcopy(_read_config(os.path.abspath(path)).get(name) or {})
+    except Exception:
+        return {}
+
+
+@contextmanager
+def config_overrides(name: str, path: str = "settings.yaml", **values):
+    """Remplace des valeurs de la section `name` le temps du bloc (tout le processus).
+
+    Ex. `with config_overrides("warmup", log_questions=False): ...` pour un
+    test de charge qui ne doit pas alimenter le journal des questions.
+    """
+    section = _read_config(os.path.abspath(path)).setdefault(name, {})
+    saved = {k: section[k] for k in values if k in section}
+    section.update(values)
+    try:
+        yield
+    finally:
+        for k in values:
+            if k in saved:
+                section[k] = saved[k]
+            else:
+                section.pop(k, None)
+
+
+@lru_cache(maxsize=8)
+def _read_config(path: str) -> dict:
+    cfg = copy.deepcopy(_DEFAULTS)
     if os.path.exists(path):
         with open(path, "r", encoding="utf-8") as f:
             file_cfg = yaml.safe_load(f) or {}
@@ -31,6 +112,10 @@ def load_config(path: str = "settings.yaml") -> dict:
     cfg["paths"]["data_dir"] = os.getenv("DATA_DIR", cfg["paths"]["data_dir"])
     cfg["paths"]["images_dir"] = os.getenv("IMAGES_DIR", cfg["paths"]["images_dir"])
     cfg["paths"]["vectorstore_dir"] = os.getenv("VECTORSTORE_DIR", cfg["paths"]["vectorstore_dir"])
+    cfg["scheduler"]["max_concurrency"] = int(os.getenv("LLM_MAX_CONCURRENCY", cfg["scheduler"]["max_concurrency"]))
+    cfg["scheduler"]["max_queue"] = int(os.getenv("LLM_MAX_QUEUE", cfg["scheduler"]["max_queue"]))
+    cfg["vector_store"]["backend"] = os.getenv("VECTOR_BACKEND", cfg["vector_store"]["backend"])
+    cfg["vector_store"]["dtype"] = os.getenv("VECTOR_DTYPE", cfg["vector_store"]["dtype"])
     return cfg
 
 def _deep_update(base: dict, updates: dict) -> dict:
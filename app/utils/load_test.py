@@ -0,0 +1,552 @@
+"""
+Test de charge de bout en bout, avec un faux serveur Ollama local.
+
+Dimensionner la machine (GPU, nombre de sessions, `top_k`, `num_ctx`,
+`scheduler.max_concurrency`) se faisait au jugé. Ce banc démarre un serveur
+HTTP qui imite les points d'entrée d'Ollama utilisés par l'application
+(`/api/chat`, `/api/generate`, `/api/embed`, `/api/embeddings`, `/api/show`)
+avec une latence et un débit de jetons réglables:
+
+- génération: latence fixe + jetons du prompt / `--prompt-rate` + jetons
+  produits (`num_predict`) / `--token-rate`; le prompt est tronqué à
+  `num_ctx` comme le fait Ollama, d'où l'effet de `top_k` et `num_ctx`;
+- embeddings: vecteurs déterministes (`bench_hot_paths.fake_vector`),
+  `--embed-ms` par texte;
+- `--parallel` requêtes traitées à la fois (créneaux du modèle), les autres
+  attendent côté serveur comme avec `OLLAMA_NUM_PARALLEL`.
+
+Puis il indexe un corpus synthétique (fichiers JSON, `load_documents` +
+`build_or_load_partitioned_index`) et lance N utilisateurs simultanés qui
+appellent `rag_engine.ask_question`. Pour chaque combinaison de
+`--users` / `--top-k` / `--num-ctx` / `--concurrency`: débit, latences
+p50/p95/p99, attente dans la file de l'ordonnanceur, durées de recherche et
+de génération, refus (`SchedulerFullError`) et mémoire résidente maximale.
+
+Exemples:
+  python -m app.utils.load_test --records 2000 --users 1 4 8 --questions 5
+  python -m app.utils.load_test --users 8 --top-k 4 8 --num-ctx 2048 4096 --concurrency 1 2 --parallel 2 --output charge.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        import resource
+
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values), q))
+
+
+def _tokens(text: str) -> int:
+    """Estimation grossière du nombre de jetons (≈ 4 caractères par jeton)."""
+    return max(1, len(text or "") // 4)
+
+
+# ------------------------------------------------------------------
+# Faux serveur Ollama
+# ------------------------------------------------------------------
+
+class OllamaStub:
+    """Serveur HTTP local imitant Ollama (génération et embeddings simulés).
+
+    Paramètres:
+    - latency_ms: latence fixe de chaque génération (chargement, réseau...).
+    - token_rate: jetons produits par seconde.
+    - prompt_rate: jetons de prompt évalués par seconde.
+    - embed_ms: durée par texte vectorisé.
+    - parallel: requêtes de génération (et d'embedding) traitées à la fois.
+    - default_tokens: jetons produits quand `num_predict` n'est pas fourni.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        token_rate: float = 25.0,
+        prompt_rate: float = 800.0,
+        embed_ms: float = 2.0,
+        parallel: int = 1,
+        embed_dim: int = 256,
+        context_length: int = 8192,
+        default_tokens: int = 128,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.token_rate = token_rate
+        self.prompt_rate = prompt_rate
+        self.embed_ms = embed_ms
+        self.embed_dim = embed_dim
+        self.context_length = context_length
+        self.default_tokens = default_tokens
+        self._gen_slots = threading.Semaphore(max(1, parallel))
+        self._embed_slots = threading.Semaphore(max(1, parallel))
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OllamaStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "OllamaStub":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + value
+
+    def stats(self, reset: bool = False) -> Dict[str, float]:
+        """Requêtes par point d'entrée, jetons simulés, attente côté serveur (s)."""
+        with self._lock:
+            out = {k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()}
+            if reset:
+                self._stats.clear()
+        return out
+
+    # -------------------- simulation --------------------
+    def _wait_slot(self, slots: threading.Semaphore) -> None:
+        t0 = time.perf_counter()
+        slots.acquire()
+        self._count("server_wait_s", time.perf_counter() - t0)
+
+    def generate(self, prompt: str, options: dict) -> Dict[str, int]:
+        """Simule une génération; retourne les compteurs de jetons."""
+        num_ctx = int(options.get("num_ctx") or self.context_length)
+        prompt_tokens = min(_tokens(prompt), num_ctx)
+        out_tokens = int(options.get("num_predict") or self.default_tokens)
+        if out_tokens < 0:
+            out_tokens = self.default_tokens
+        self._wait_slot(self._gen_slots)
+        try:
+            time.sleep(
+                self.latency_ms / 1000.0
+                + prompt_tokens / max(self.prompt_rate, 1e-9)
+                + out_tokens / max(self.token_rate, 1e-9)
+            )
+        finally:
+            self._gen_slots.release()
+        self._count("prompt_tokens", prompt_tokens)
+        self._count("completion_tokens", out_tokens)
+        return {"prompt_eval_count": prompt_tokens, "eval_count": out_tokens}
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        from app.utils.bench_hot_paths import fake_vector
+
+        self._wait_slot(self._embed_slots)
+        try:
+            time.sleep(self.embed_ms * len(texts) / 1000.0)
+        finally:
+            self._embed_slots.release()
+        self._count("embedded_texts", len(texts))
+        return [fake_vector(t, self.embed_dim) for t in texts]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, payload: dict, status: int = 200) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, chunks: List[dict]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write((json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.close_connection = True
+
+            def _body(self) -> dict:
+                n = int(self.headers.get("Content-Length") or 0)
+                try:
+                    return json.loads(self.rfile.read(n) or b"{}")
+                except Exception:
+                    return {}
+
+            def do_GET(self) -> None:
+                stub._count(f"GET {self.path}")
+                if self.path == "/api/tags":
+                    self._send({"models": []})
+                elif self.path == "/api/version":
+                    self._send({"version": "0.0.0-stub"})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def do_HEAD(self) -> None:
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self) -> None:
+                req = self._body()
+                path = self.path
+                stub._count(f"POST {path}")
+                base = {
+                    "model": req.get("model", "stub"),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "done": True,
+                    "done_reason": "stop",
+                }
+                if path in ("/api/chat", "/api/generate"):
+                    if path == "/api/chat":
+                        prompt = "\n".join(str(m.get("content") or "") for m in req.get("messages") or [])
+                    else:
+                        prompt = f"{req.get('system') or ''}\n{req.get('prompt') or ''}"
+                    t0 = time.perf_counter()
+                    counts = stub.generate(prompt, req.get("options") or {})
+                    text = " ".join(["réponse"] * counts["eval_count"])
+                    done = {**base, **counts, "total_duration": int((time.perf_counter() - t0) * 1e9)}
+                    if path == "/api/chat":
+                        done["message"] = {"role": "assistant", "content": text}
+                    else:
+                        done["response"] = text
+                    if req.get("stream", True):
+                        empty = {"message": {"role": "assistant", "content": ""}} if path == "/api/chat" else {"response": ""}
+                        self._send_stream([{**done, "done": False, "done_reason": None}, {**done, **empty}])
+                    else:
+                        self._send(done)
+                elif path == "/api/embed":
+                    texts = req.get("input") or []
+                    texts = [texts] if isinstance(texts, str) else list(texts)
+                    self._send({**base, "embeddings": stub.embed(texts)})
+                elif path == "/api/embeddings":
+                    self._send({"embedding": stub.embed([req.get("prompt") or ""])[0]})
+                elif path == "/api/show":
+                    self._send({
+                        "model_info": {"general.architecture": "stub", "stub.context_length": stub.context_length},
+                        "capabilities": ["completion"],
+                    })
+                else:
+                    self._send({"error": "not found"}, 404)
+
+        return Handler
+
+
+# ------------------------------------------------------------------
+# Charge
+# ------------------------------------------------------------------
+
+class _MemorySampler:
+    """Mémoire résidente maximale (échantillonnée) pendant un bloc `with`."""
+
+    def __init__(self, period: float = 0.05) -> None:
+        self.period = period
+        self.base = 0
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.period):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self) -> "_MemorySampler":
+        self.base = self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def write_corpus(data_dir: Path, records: int, per_file: int = 200) -> int:
+    """Fichiers JSON synthétiques (listes d'enregistrements) sous `data_dir`."""
+    from app.utils.bench_hot_paths import synthetic_records
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    recs = synthetic_records(records)
+    n = 0
+    for i in range(0, len(recs), per_file):
+        (data_dir / f"synthetique_{i // per_file:04d}.json").write_text(
+            json.dumps(recs[i:i + per_file], ensure_ascii=False), encoding="utf-8"
+        )
+        n += 1
+    return n
+
+
+def synthetic_questions(n: int, seed: int = 2) -> List[str]:
+    from app.utils.bench_hot_paths import _COMMUNES, _SITES
+
+    rnd = random.Random(seed)
+    forms = [
+        "Quel est le débit du {site} à {commune} ?",
+        "Quelle marque de pompe équipe le {site} ({commune}) ?",
+        "Quelle est la capacité de la station du {site} à {commune} ?",
+        "Quels équipements de télégestion sur le {site} ?",
+    ]
+    return [rnd.choice(forms).format(site=rnd.choice(_SITES), commune=rnd.choice(_COMMUNES).title()) for _ in range(n)]
+
+
+def run_ingestion(data_dir: str, persist_dir: str, base_url: str, **index_kwargs) -> dict:
+    """Indexe `data_dir` avec le faux serveur; durées par étape et mémoire."""
+    from app.indexer import build_or_load_partitioned_index
+    from app.loader import load_documents
+    from app.metrics import Timings, recording
+
+    stages = Timings()
+    stats: dict = {}
+    t0 = time.perf_counter()
+    with _MemorySampler() as mem, recording(stages):
+        docs = load_documents(data_dir)
+        index = build_or_load_partitioned_index(
+            docs, persist_dir=persist_dir, ollama_base_url=base_url, dedup_stats=stats, **index_kwargs
+        )
+    wall = time.perf_counter() - t0
+    kept = int(stats.get("kept", 0))
+    return {
+        "index": index,
+        "documents": len(docs),
+        "chunks": int(stats.get("chunks", 0)),
+        "vectors": kept,
+        "wall_s": round(wall, 3),
+        "vectors_per_s": round(kept / wall, 1) if wall else 0.0,
+        "stages": stages.as_dict()["spans"],
+        "peak_rss_mb": round(mem.peak / 1e6, 1),
+        "rss_growth_mb": round((mem.peak - mem.base) / 1e6, 1),
+    }
+
+
+def run_queries(
+    index,
+    base_url: str,
+    questions: Sequence[str],
+    users: int,
+    per_user: int,
+    top_k: int = 4,
+    num_ctx: int = 2048,
+    max_tokens: int = 256,
+    think_time: float = 0.0,
+    model_name: str = "mistral",
+    persist_dir: Optional[str] = None,
+) -> dict:
+    """`users` utilisateurs simultanés posant chacun `per_user` questions.
+
+    Chaque mesure part de caches vides (embeddings, résultats, réponses):
+    les mêmes questions sont rejouées pour chaque combinaison et seraient
+    sinon servies par le cache dès la deuxième. Avec `persist_dir`, les
+    questions suivent le chemin de l'interface (filtres commune/site, table
+    des enregistrements, `metrics.jsonl`), mais le journal des questions
+    (`warmup.log_questions`) est désactivé pendant la mesure: les questions
+    synthétiques n'alimentent pas le préchauffage.
+    """
+    from app.llm_scheduler import SchedulerFullError
+    from app.rag_engine import ask_question
+    from app.retrieval_cache import get_retrieval_cache
+    from app.utils.config import config_overrides
+
+    get_retrieval_cache().clear()
+
+    results: List[dict] = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user(uid: int) -> None:
+        rnd = random.Random(uid)
+        barrier.wait()
+        for i in range(per_user):
+            q = questions[(uid * per_user + i) % len(questions)]
+            timings: dict = {}
+            t0 = time.perf_counter()
+            status = "ok"
+            try:
+                ask_question(
+                    index,
+                    q,
+                    top_k=top_k,
+                    model_name=model_name,
+                    base_url=base_url,
+                    num_ctx=num_ctx,
+                    max_tokens=max_tokens,
+                    persist_dir=persist_dir,
+                    timings=timings,
+                )
+            except SchedulerFullError:
+                status = "rejected"
+            except Exception as e:
+                status = f"error: {type(e).__name__}: {e}"
+            spans = timings.get("spans") or {}
+            with lock:
+                results.append({
+                    "latency_s": time.perf_counter() - t0,
+                    "status": status,
+                    "queue_s": spans.get("queue", 0.0),
+                    "retrieve_s": spans.get("retrieve", 0.0),
+                    "generate_s": spans.get("generate", 0.0),
+                })
+            if think_time:
+                time.sleep(rnd.uniform(0, 2 * think_time))
+
+    threads = [threading.Thread(target=user, args=(u,), daemon=True) for u in range(users)]
+    t0 = time.perf_counter()
+    with _MemorySampler() as mem, config_overrides("warmup", log_questions=False):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    wall = time.perf_counter() - t0
+
+    ok = [r for r in results if r["status"] == "ok"]
+    errors = [r["status"] for r in results if r["status"].startswith("error")]
+
+    def pct(key: str, q: float) -> float:
+        return round(_percentile([r[key] for r in ok], q), 3)
+
+    return {
+        "questions": len(results),
+        "answered": len(ok),
+        "rejected": sum(1 for r in results if r["status"] == "rejected"),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(len(ok) / wall, 3) if wall else 0.0,
+        "latency_p50_s": pct("latency_s", 50),
+        "latency_p95_s": pct("latency_s", 95),
+        "latency_p99_s": pct("latency_s", 99),
+        "queue_p50_s": pct("queue_s", 50),
+        "queue_p95_s": pct("queue_s", 95),
+        "retrieve_p50_s": pct("retrieve_s", 50),
+        "generate_p50_s": pct("generate_s", 50),
+        "peak_rss_mb": round(mem.peak / 1e6, 1),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Test de charge (faux serveur Ollama, utilisateurs simultanés)")
+    g = ap.add_argument_group("faux serveur Ollama")
+    g.add_argument("--latency-ms", type=float, default=50.0, help="Latence fixe par génération")
+    g.add_argument("--token-rate", type=float, default=25.0, help="Jetons produits par seconde")
+    g.add_argument("--prompt-rate", type=float, default=800.0, help="Jetons de prompt évalués par seconde")
+    g.add_argument("--embed-ms", type=float, default=2.0, help="Durée d'embedding par texte")
+    g.add_argument("--parallel", type=int, default=1, help="Requêtes traitées simultanément par le serveur")
+    g.add_argument("--embed-dim", type=int, default=256)
+    g = ap.add_argument_group("corpus et index")
+    g.add_argument("--records", type=int, default=1000, help="Enregistrements JSON synthétiques à indexer")
+    g.add_argument("--persist-dir", help="Dossier de l'index (temporaire par défaut)")
+    g.add_argument("--chunk-size", type=int, default=1000)
+    g.add_argument("--chunk-overlap", type=int, default=150)
+    g = ap.add_argument_group("charge (chaque combinaison est mesurée)")
+    g.add_argument("--users", type=int, nargs="+", default=[1, 4])
+    g.add_argument("--questions", type=int, default=5, help="Questions par utilisateur")
+    g.add_argument("--top-k", type=int, nargs="+", default=[4])
+    g.add_argument("--num-ctx", type=int, nargs="+", default=[2048])
+    g.add_argument("--concurrency", type=int, nargs="+", default=[1], help="scheduler.max_concurrency")
+    g.add_argument("--max-queue", type=int, default=None, help="scheduler.max_queue (settings.yaml par défaut)")
+    g.add_argument("--max-tokens", type=int, default=128, help="num_predict de chaque réponse")
+    g.add_argument("--think-time", type=float, default=0.0, help="Pause moyenne (s) entre deux questions")
+    ap.add_argument("--output", help="Fichier JSON des résultats")
+    args = ap.parse_args(argv)
+
+    from app.llm_scheduler import configure_scheduler
+
+    with tempfile.TemporaryDirectory() as tmp, OllamaStub(
+        latency_ms=args.latency_ms,
+        token_rate=args.token_rate,
+        prompt_rate=args.prompt_rate,
+        embed_ms=args.embed_ms,
+        parallel=args.parallel,
+        embed_dim=args.embed_dim,
+    ) as stub:
+        data_dir = Path(tmp) / "data"
+        persist_dir = args.persist_dir or str(Path(tmp) / "vectorstore")
+        files = write_corpus(data_dir, args.records)
+        print(f"Faux serveur Ollama: {stub.url} | corpus: {args.records} enregistrements, {files} fichiers")
+
+        ingest = run_ingestion(
+            str(data_dir), persist_dir, stub.url, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap
+        )
+        index = ingest.pop("index")
+        ingest["server"] = stub.stats(reset=True)
+        print(
+            f"Indexation: {ingest['documents']} documents, {ingest['vectors']} vecteurs en {ingest['wall_s']:.2f}s"
+            f" ({ingest['vectors_per_s']} vecteurs/s) | RSS max {ingest['peak_rss_mb']} Mo"
+        )
+        print("  étapes: " + ", ".join(f"{k} {v:.2f}s" for k, v in ingest["stages"].items()))
+
+        questions = synthetic_questions(200)
+        runs = []
+        header = f"{'users':>5} {'top_k':>5} {'num_ctx':>7} {'conc':>4} | {'q/s':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'file p95':>8} | refus err | RSS Mo"
+        print("\n" + header + "\n" + "-" * len(header))
+        for users, top_k, num_ctx, conc in itertools.product(args.users, args.top_k, args.num_ctx, args.concurrency):
+            configure_scheduler(max_concurrency=conc, max_queue=args.max_queue)
+            res = run_queries(
+                index,
+                stub.url,
+                questions,
+                users=users,
+                per_user=args.questions,
+                top_k=top_k,
+                num_ctx=num_ctx,
+                max_tokens=args.max_tokens,
+                think_time=args.think_time,
+                persist_dir=persist_dir,
+            )
+            res.update({"users": users, "top_k": top_k, "num_ctx": num_ctx, "concurrency": conc, "server": stub.stats(reset=True)})
+            runs.append(res)
+            print(
+                f"{users:5d} {top_k:5d} {num_ctx:7d} {conc:4d} | {res['throughput_qps']:6.2f} {res['latency_p50_s']:7.2f}"
+                f" {res['latency_p95_s']:7.2f} {res['latency_p99_s']:7.2f} {res['queue_p95_s']:8.2f} |"
+                f" {res['rejected']:5d} {res['errors']:3d} | {res['peak_rss_mb']}"
+            )
+            if res["first_error"]:
+                print(f"  première erreur: {res['first_error']}")
+
+    if args.output:
+        out = {"params": vars(args), "ingestion": ingest, "runs": runs}
+        Path(args.output).write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nRésultats écrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
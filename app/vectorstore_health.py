@@ -0,0 +1,375 @@
+"""
+Santé du dossier de persistance: taille, doublons, vecteurs orphelins, compaction.
+
+Rapporte, pour chaque collection (partitions comprises): nombre de vecteurs,
+part de textes en double, vecteurs dont le `file_path` n'existe plus; pour le
+dossier: octets sur disque par élément et espace libre récupérable des
+fichiers SQLite.
+
+Avec `--fix`: suppression des orphelins et des doublons (un exemplaire gardé
+par texte, ses doublons restent cités via `dedup.sqlite`), nettoyage de la
+table des enregistrements et de l'index plein texte, puis VACUUM des
+fichiers SQLite. Aucun ré-embedding n'est nécessaire.
+
+Exemples:
+  python -m app.vectorstore_health --persist-dir vectorstore
+  python -m app.vectorstore_health --persist-dir vectorstore --fix
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.chunk_search import open_search_index
+from app.dedup import DEDUP_FILE, DedupIndex, exact_key, normalize_chunk
+from app.partitions import BASE_COLLECTION, partition_of_collection
+from app.records_table import TABLE_FILE, RecordsTable, load_records_table
+
+_SQLITE_SUFFIXES = (".sqlite", ".sqlite3")
+
+
+def _source(meta: dict) -> str:
+    return str((meta or {}).get("file_path") or "")
+
+
+def analyze_rows(
+    rows: Iterable[Tuple[str, dict, str]],
+    file_exists: Callable[[str], bool],
+) -> dict:
+    """Orphelins et doublons d'une collection.
+
+    `rows`: triplets (id, métadonnées, texte). Un vecteur est orphelin si son
+    `file_path` est renseigné mais introuvable. Parmi les autres, à texte
+    identique (après normalisation), le premier vecteur est gardé et les
+    suivants sont des doublons `(id, id gardé, texte, fichier)`.
+    """
+    count = 0
+    orphans: List[str] = []
+    missing_files = set()
+    groups: Dict[str, List[Tuple[str, str, str]]] = {}
+    exists_cache: Dict[str, bool] = {}
+    for cid, meta, text in rows:
+        count += 1
+        src = _source(meta)
+        alive = True
+        if src:
+            if src not in exists_cache:
+                exists_cache[src] = bool(file_exists(src))
+            alive = exists_cache[src]
+        if not alive:
+            orphans.append(cid)
+            missing_files.add(src)
+            continue
+        groups.setdefault(exact_key(normalize_chunk(text)), []).append((cid, src, text or ""))
+
+    duplicates: List[Tuple[str, str, str, str]] = []
+    for members in groups.values():
+        keep = members[0][0]
+        duplicates.extend((cid, keep, text, src) for cid, src, text in members[1:])
+    return {
+        "count": count,
+        "orphans": orphans,
+        "missing_files": sorted(missing_files),
+        "duplicates": duplicates,
+        "duplicate_ratio": (len(duplicates) / count) if count else 0.0,
+    }
+
+
+# ------------------------------------------------------------------
+# Accès aux collections (Chroma ou backend plat)
+# ------------------------------------------------------------------
+
+class _ChromaCollection:
+    def __init__(self, collection) -> None:
+        self._c = collection
+        self.name = collection.name
+
+    def count(self) -> int:
+        return int(self._c.count())
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None) -> dict:
+        return self._c.get(ids=ids, where=where, include=list(include), limit=limit, offset=offset)
+
+    def rows(self):
+        from app.inspect_chunks import iter_collection_documents
+
+        yield from iter_collection_documents(self._c)
+
+    def delete(self, ids: List[str]) -> None:
+        for i in range(0, len(ids), 500):
+            self._c.delete(ids=ids[i:i + 500])
+
+    def update(self, ids: List[str], metadatas: List[dict], texts=None, embeddings=None) -> None:
+        for i in range(0, len(ids), 500):
+            part = slice(i, i + 500)
+            self._c.update(
+                ids=ids[part],
+                metadatas=metadatas[part],
+                documents=texts[part] if texts is not None else None,
+                embeddings=embeddings[part] if embeddings is not None else None,
+            )
+
+
+def _where_matches(meta: dict, where: Optional[dict]) -> bool:
+    # Sous-ensemble des clauses `where` Chroma: égalité, `$in`, `$and`
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_where_matches(meta, c) for c in where["$and"])
+    for key, cond in where.items():
+        value = (meta or {}).get(key)
+        if isinstance(cond, dict) and "$in" in cond:
+            if value not in cond["$in"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _FlatCollection:
+    def __init__(self, path: Path, name: str) -> None:
+        self._path = path
+        self.name = name
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._index = self._fresh()
+
+    def _fresh(self):
+        # Relu si `meta.json` a changé (indexation dans un autre processus)
+        from app.flat_index import FlatIndex
+
+        st = (self._path / "meta.json").stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            self._index = FlatIndex.load(self._path)
+            self._stamp = stamp
+        return self._index
+
+    def count(self) -> int:
+        return len(self._fresh())
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents"), limit=None, offset=None) -> dict:
+        """Lecture au format de `Collection.get` de Chroma (pagination, `where`)."""
+        index = self._fresh()
+        if ids is not None:
+            rows = [i for i in index.positions(ids) if i is not None]
+        else:
+            rows = [i for i, meta in enumerate(index.metadatas) if _where_matches(meta, where)]
+        start = offset or 0
+        rows = rows[start:] if limit is None else rows[start:start + limit]
+        out = {"ids": [index.ids[i] for i in rows]}
+        if "metadatas" in include:
+            out["metadatas"] = [index.metadatas[i] for i in rows]
+        if "documents" in include:
+            out["documents"] = [index.texts[i] for i in rows]
+        return out
+
+    def rows(self):
+        yield from zip(self._index.ids, self._index.metadatas, self._index.texts)
+
+    def delete(self, ids: List[str]) -> None:
+        # Réécriture des fichiers sans les lignes supprimées (compaction)
+        self._index.delete_ids(ids)
+        self._index.save(self._path)
+
+    def update(self, ids: List[str], metadatas: List[dict], texts=None, embeddings=None) -> None:
+        if embeddings is not None:
+            self._index.add(ids, embeddings, texts, metadatas)
+        else:
+            self._index.set_rows(ids, texts=texts, metadatas=metadatas)
+        self._index.save(self._path)
+
+
+def collection_names(persist_dir: str, backend: str, base: str = BASE_COLLECTION) -> List[str]:
+    """Noms des collections de l'index (`base` et ses partitions) pour le backend donné."""
+    if backend == "flat":
+        from app.flat_vector_store import flat_collection_names
+
+        names = flat_collection_names(persist_dir)
+    else:
+        from chromadb import PersistentClient
+
+        # chromadb < 0.6 retourne des objets Collection, >= 0.6 des noms
+        names = [str(getattr(c, "name", c)) for c in PersistentClient(path=persist_dir).list_collections()]
+    return sorted(n for n in names if partition_of_collection(n, base) is not None)
+
+
+def open_collection(persist_dir: str, backend: str, name: str):
+    """Une collection par son nom; lève si elle n'existe pas."""
+    if backend == "flat":
+        from app.flat_vector_store import flat_collection_dir
+
+        return _FlatCollection(flat_collection_dir(persist_dir, name), name)
+    from chromadb import PersistentClient
+
+    return _ChromaCollection(PersistentClient(path=persist_dir).get_collection(name))
+
+
+def open_collections(persist_dir: str, backend: str, base: str = BASE_COLLECTION) -> list:
+    """Collections de l'index (`base` et ses partitions) pour le backend donné."""
+    return [open_collection(persist_dir, backend, name) for name in collection_names(persist_dir, backend, base)]
+
+
+# ------------------------------------------------------------------
+# Disque et SQLite
+# ------------------------------------------------------------------
+
+def disk_usage(persist_dir: str) -> Dict[str, int]:
+    """Octets par élément de premier niveau du dossier de persistance."""
+    usage: Dict[str, int] = {}
+    root = Path(persist_dir)
+    for entry in sorted(root.iterdir()) if root.is_dir() else []:
+        if entry.is_file():
+            usage[entry.name] = entry.stat().st_size
+        else:
+            usage[entry.name + "/"] = sum(p.stat().st_size for p in entry.rglob("*") if p.is_file())
+    return usage
+
+
+def sqlite_files(persist_dir: str) -> List[Path]:
+    return sorted(p for p in Path(persist_dir).rglob("*") if p.is_file() and p.suffix in _SQLITE_SUFFIXES)
+
+
+def sqlite_free_bytes(path: Path) -> int:
+    """Octets occupés par des pages libres (récupérables par VACUUM)."""
+    conn = sqlite3.connect(str(path))
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return int(page_size) * int(free)
+    finally:
+        conn.close()
+
+
+def vacuum(path: Path) -> int:
+    """Compacte un fichier SQLite; retourne les octets gagnés."""
+    before = path.stat().st_size
+    conn = sqlite3.connect(str(path), timeout=30)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return before - path.stat().st_size
+
+
+def prune_records_table(persist_dir: str, missing_files: Iterable[str]) -> int:
+    """Retire de la table des enregistrements les lignes des fichiers disparus."""
+    missing = set(missing_files)
+    table = load_records_table(persist_dir)
+    if table is None or not missing:
+        return 0
+    rows = [r for r in table.rows() if r.get("file_path", "") not in missing]
+    removed = table.n_rows - len(rows)
+    if removed:
+        RecordsTable.from_rows(rows).save(Path(persist_dir) / TABLE_FILE)
+    return removed
+
+
+def _fmt_bytes(n: int) -> str:
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if abs(n) < 1024 or unit == "Go":
+            return f"{n:.0f} {unit}" if unit == "o" else f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n} o"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Santé et compaction du vectorstore")
+    ap.add_argument("--persist-dir", default="vectorstore", help="Dossier de persistance")
+    ap.add_argument("--collection", default=BASE_COLLECTION, help="Collection de base (partitions comprises)")
+    ap.add_argument("--backend", default=None, choices=["chroma", "flat"], help="Backend (défaut: configuration)")
+    ap.add_argument("--root", default=".", help="Dossier de référence des chemins `file_path` relatifs")
+    ap.add_argument("--fix", action="store_true", help="Supprimer orphelins et doublons, puis compacter")
+    ap.add_argument("--show", type=int, default=10, help="Nombre de fichiers disparus affichés")
+    args = ap.parse_args(argv)
+
+    if not os.path.isdir(args.persist_dir):
+        raise SystemExit(f"Dossier de persistance introuvable: {args.persist_dir}")
+    if args.backend is None:
+        from app.utils.config import load_config
+
+        args.backend = (load_config().get("vector_store", {}).get("backend") or "chroma").lower()
+
+    root = Path(args.root)
+
+    def file_exists(fp: str) -> bool:
+        p = Path(fp)
+        return p.exists() if p.is_absolute() else (root / p).exists()
+
+    usage = disk_usage(args.persist_dir)
+    size_before = sum(usage.values())
+    print(f"Dossier: {args.persist_dir} ({_fmt_bytes(size_before)}, backend {args.backend})")
+    for name, size in usage.items():
+        print(f"  {name:32s} {_fmt_bytes(size):>10s}")
+    for path in sqlite_files(args.persist_dir):
+        try:
+            free = sqlite_free_bytes(path)
+        except sqlite3.Error:
+            continue
+        if free:
+            print(f"  pages libres {path.relative_to(args.persist_dir)}: {_fmt_bytes(free)}")
+
+    collections = open_collections(args.persist_dir, args.backend, args.collection)
+    if not collections:
+        print("Aucune collection.")
+    dedup = DedupIndex(str(Path(args.persist_dir) / DEDUP_FILE)) if args.fix else None
+    search = open_search_index(args.persist_dir) if args.fix else None
+    missing_all = set()
+    totals = {"vectors": 0, "orphans": 0, "duplicates": 0}
+    try:
+        for coll in collections:
+            rep = analyze_rows(coll.rows(), file_exists)
+            missing_all.update(rep["missing_files"])
+            totals["vectors"] += rep["count"]
+            totals["orphans"] += len(rep["orphans"])
+            totals["duplicates"] += len(rep["duplicates"])
+            print(
+                f"\n[{coll.name}] vecteurs: {rep['count']} | orphelins: {len(rep['orphans'])}"
+                f" ({len(rep['missing_files'])} fichiers disparus) | doublons: {len(rep['duplicates'])}"
+                f" ({rep['duplicate_ratio']:.1%})"
+            )
+            for fp in rep["missing_files"][: args.show]:
+                print(f"  - disparu: {fp}")
+            if dedup is None:
+                continue
+            drop = rep["orphans"] + [d[0] for d in rep["duplicates"]]
+            if drop:
+                coll.delete(drop)
+                dedup.forget(coll.name, drop)
+                search.forget(coll.name, drop)
+                dedup.mark_duplicates(coll.name, rep["duplicates"])
+                print(f"  supprimés: {len(drop)}")
+    finally:
+        if dedup is not None:
+            dedup.close()
+            search.close()
+
+    print(
+        f"\nTotal: {totals['vectors']} vecteurs, {totals['orphans']} orphelins,"
+        f" {totals['duplicates']} doublons"
+    )
+    if not args.fix:
+        if totals["orphans"] or totals["duplicates"]:
+            print("Relancer avec --fix pour supprimer orphelins et doublons et compacter.")
+        return 0
+
+    pruned = prune_records_table(args.persist_dir, missing_all)
+    if pruned:
+        print(f"Table des enregistrements: {pruned} lignes retirées")
+    gained = 0
+    for path in sqlite_files(args.persist_dir):
+        try:
+            gained += vacuum(path)
+        except sqlite3.Error as e:
+            print(f"VACUUM impossible sur {path}: {e}")
+    size_after = sum(disk_usage(args.persist_dir).values())
+    print(f"Compaction SQLite: {_fmt_bytes(gained)} | dossier: {_fmt_bytes(size_before)} -> {_fmt_bytes(size_after)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+"""Préchauffage des caches au démarrage, à partir du journal des questions.
+
+Après un redémarrage, les premiers utilisateurs paient le chargement de
+l'index et des modèles Ollama et des réponses absentes des caches. Le
+préchauffage rejoue en arrière-plan les questions les plus fréquentes du
+journal local (`app.query_log`), avec les réglages par défaut de l'écran:
+
+1) chargement de l'index;
+2) recherche de chaque question (embedding de la requête et résultats mis
+   en cache, modèle d'embedding chargé);
+3) génération des réponses (modèle LLM chargé, cache des réponses), à la
+   priorité la plus basse de l'ordonnanceur (`PRIORITY_WARMUP`).
+
+Il s'arrête dès qu'une vraie question arrive (`note_traffic`, appelée par
+`app.rag_engine.ask_question`): une génération de préchauffage déjà
+commencée se termine, celles en attente passent après la question. Réglages:
+section `warmup` de la configuration.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from app.query_log import top_questions, warmup_settings
+
+logger = logging.getLogger(__name__)
+
+_TRAFFIC = threading.Event()
+_STARTED = threading.Lock()
+_THREAD: Optional[threading.Thread] = None
+
+
+def note_traffic() -> None:
+    """Signale une vraie question: le préchauffage en cours s'arrête."""
+    _TRAFFIC.set()
+
+
+def traffic_seen() -> bool:
+    return _TRAFFIC.is_set()
+
+
+def warm_up(
+    load_index: Callable[[], object],
+    questions: List[str],
+    persist_dir: Optional[str] = None,
+    answers: bool = True,
+    stop: Callable[[], bool] = traffic_seen,
+    **ask_kwargs,
+) -> dict:
+    """Rejoue `questions` (dans l'ordre) pour remplir les caches; retourne les compteurs.
+
+    `ask_kwargs`: réglages de `ask_question` (`top_k`, `model_name`,
+    `num_ctx`, `max_tokens`, `strict_context`, `expand_abbr`...), ceux des
+    vraies questions pour que les clés de cache coïncident. Compteurs:
+    `questions`, `retrieved`, `answered`, `failed`, `stopped`, `seconds`
+    (et `error` si l'index ne peut pas être chargé).
+    """
+    from app.llm_scheduler import PRIORITY_WARMUP
+    from app.rag_engine import ask_question, retrieve_nodes
+
+    stats = {"questions": len(questions), "retrieved": 0, "answered": 0, "failed": 0, "stopped": False}
+    t0 = time.perf_counter()
+    try:
+        if not questions or stop():
+            stats["stopped"] = bool(questions)
+            return stats
+        try:
+            index = load_index()
+        except Exception as e:
+            # Pas encore d'index: rien à préchauffer
+            stats["error"] = str(e)
+            return stats
+        for q in questions:
+            if stop():
+                stats["stopped"] = True
+                return stats
+            try:
+                retrieve_nodes(
+                    index,
+                    q,
+                    top_k=ask_kwargs.get("top_k", 4),
+                    strict_context=ask_kwargs.get("strict_context", True),
+                    expand_abbr=ask_kwargs.get("expand_abbr", True),
+                    persist_dir=persist_dir,
+                )
+                stats["retrieved"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.debug("Préchauffage (recherche) en échec pour %r: %s", q, e)
+        if not answers:
+            return stats
+        for q in questions:
+            if stop():
+                stats["stopped"] = True
+                return stats
+            try:
+                ask_question(index, q, persist_dir=persist_dir, priority=PRIORITY_WARMUP, **ask_kwargs)
+                stats["answered"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.debug("Préchauffage (réponse) en échec pour %r: %s", q, e)
+        return stats
+    finally:
+        stats["seconds"] = round(time.perf_counter() - t0, 2)
+
+
+def start_warmup(load_index: Callable[[], object], persist_dir: str, **ask_kwargs) -> Optional[threading.Thread]:
+    """Lance le préchauffage une seule fois par processus (thread en arrière-plan).
+
+    Retourne le thread, ou None si le préchauffage est désactivé, déjà lancé,
+    ou si le journal ne contient aucune question à rejouer.
+    """
+    global _THREAD
+    settings = warmup_settings()
+    if not settings.get("enabled", True) or not _STARTED.acquire(blocking=False):
+        return None
+    questions = top_questions(
+        persist_dir,
+        n=int(settings.get("top_n", 20)),
+        min_count=int(settings.get("min_count", 2)),
+        recent_days=int(settings.get("recent_days", 30)) or None,
+    )
+    if not questions:
+        return None
+
+    def run():
+        stats = warm_up(
+            load_index,
+            questions,
+            persist_dir=persist_dir,
+            answers=bool(settings.get("answers", True)),
+            **ask_kwargs,
+        )
+        logger.info("Préchauffage: %s", stats)
+
+    _THREAD = threading.Thread(target=run, name="warmup", daemon=True)
+    _THREAD.start()
+    return _THREAD
@@ -0,0 +1,41 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.batch_ask import question_id, read_done_ids, read_questions
+
+
+class TestBatchAsk(unittest.TestCase):
+    def test_read_questions_text_and_jsonl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "q.txt"
+            p.write_text(
+                "# audit\nDébit du PR de Garavet ?\n\n"
+                '{"id": "q2", "question": "Procédé de la STEP du Soulet ?"}\n',
+                encoding="utf-8",
+            )
+            items = read_questions(p)
+        self.assertEqual([i["id"] for i in items], [question_id("Débit du PR de Garavet ?"), "q2"])
+        self.assertEqual(items[1]["question"], "Procédé de la STEP du Soulet ?")
+
+    def test_resume_skips_done_and_truncated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "out.jsonl"
+            p.write_text(
+                json.dumps({"id": "a", "answer": "x"}) + "\n"
+                + json.dumps({"id": "b", "error": "timeout"}) + "\n"
+                + '{"id": "c", "answ',
+                encoding="utf-8",
+            )
+            self.assertEqual(read_done_ids(p), {"a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.utils.bench_hot_paths import BENCHMARKS, HEAVY_PACKAGES, FakeEmbedding, check_imports, compare, run_benchmarks
+
+
+class TestBenchHotPaths(unittest.TestCase):
+    def test_fake_embedding_is_deterministic(self):
+        model = FakeEmbedding(dim=32)
+        a = model.get_text_embedding("poste de relevage")
+        self.assertEqual(len(a), 32)
+        self.assertEqual(a, FakeEmbedding(dim=32).get_text_embedding("Poste de relevage"))
+        self.assertNotEqual(a, model.get_text_embedding("station d'épuration"))
+
+    def test_run_on_small_synthetic_corpus(self):
+        res = run_benchmarks(records=12, repeat=1, use_reducteur=False, embed_dim=16)
+        self.assertEqual(set(res["results"]), {f"synthetic/{name}" for name in BENCHMARKS})
+        for r in res["results"].values():
+            self.assertGreater(r["items"], 0)
+            self.assertGreaterEqual(r["us_per_item"], 0)
+        self.assertEqual(res["meta"]["records"], 12)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = {"results": {"synthetic/split": {"us_per_item": 100.0}, "synthetic/embed": {"us_per_item": 50.0}}}
+        current = {"results": {
+            "synthetic/split": {"us_per_item": 125.0},
+            "synthetic/embed": {"us_per_item": 55.0},
+            "reducteur/split": {"us_per_item": 10.0},
+        }}
+        rows = {r["bench"]: r for r in compare(current, baseline, threshold=0.2)}
+        self.assertEqual(set(rows), {"synthetic/split", "synthetic/embed"})
+        self.assertTrue(rows["synthetic/split"]["regression"])
+        self.assertFalse(rows["synthetic/embed"]["regression"])
+
+    def test_startup_module_stays_light(self):
+        res = check_imports({"app.metrics": 10_000, "app.indexer": 10_000}, repeat=1)
+        for module, r in res.items():
+            self.assertGreater(r["ms"], 0, module)
+            self.assertFalse(set(r["heavy"]) & set(HEAVY_PACKAGES), module)
+            self.assertTrue(r["ok"], module)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+from chromadb import PersistentClient
+
+from app.chunk_browser import collection_names, get_browser
+from app.flat_index import FlatIndex
+from app.flat_vector_store import flat_collection_dir
+
+
+class TestChunkBrowser(unittest.TestCase):
+    def test_filters_pages_and_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            coll = PersistentClient(path=tmp).get_or_create_collection("eau_docs")
+            files = ["data/A2I.json", "data/A2I - Copie.json", "data/fiche.pdf"]
+            ids = [f"n{i:02d}" for i in range(30)]
+            coll.add(
+                ids=ids,
+                embeddings=[[float(i), 1.0] for i in range(30)],
+                documents=[f"Chunk {i}" for i in range(30)],
+                metadatas=[{"file_path": files[i % 3], "json_path": f"$[{i // 3}]"} for i in range(30)],
+            )
+            browser = get_browser(tmp, "eau_docs")
+            self.assertEqual(browser.count(), 30)
+            self.assertEqual(browser.count(source="a2i"), 20)
+            self.assertEqual(browser.count(source="copie", json_path="$[1]"), 1)
+            self.assertEqual(browser.count(source="introuvable"), 0)
+
+            page = browser.page(5, 4, source="fiche")
+            self.assertEqual([r["id"] for r in page], browser.ids(source="fiche")[5:9])
+            self.assertTrue(all(r["source"] == "data/fiche.pdf" for r in page))
+
+            out = io.StringIO()
+            self.assertEqual(browser.export(out, "jsonl", json_path="$[2]"), 3)
+            rows = [json.loads(line) for line in out.getvalue().splitlines()]
+            self.assertEqual(sorted(r["id"] for r in rows), ["n06", "n07", "n08"])
+            out = io.StringIO()
+            browser.batch_size = 7
+            self.assertEqual(browser.export(out, "csv", fields=("id", "text")), 30)
+            self.assertEqual(len(list(csv.DictReader(io.StringIO(out.getvalue())))), 30)
+
+            # Une nouvelle indexation invalide les caches
+            coll.add(ids=["x"], embeddings=[[0.0, 0.0]], documents=["X"], metadatas=[{"file_path": "data/A2I.json"}])
+            self.assertEqual(browser.count(source="a2i"), 21)
+
+    def test_flat_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = flat_collection_dir(tmp, "eau_docs_poste_relevage")
+            idx = FlatIndex("float16")
+            files = ["data/A2I.json", "data/fiche.pdf"]
+            idx.add(
+                [f"n{i:02d}" for i in range(10)],
+                np.eye(10, 4),
+                [f"Chunk {i}" for i in range(10)],
+                [{"file_path": files[i % 2], "json_path": f"$[{i // 2}]"} for i in range(10)],
+            )
+            idx.save(path)
+            self.assertEqual(collection_names(tmp, backend="flat"), ["eau_docs_poste_relevage"])
+            browser = get_browser(tmp, "eau_docs_poste_relevage", backend="flat")
+            self.assertEqual(browser.count(), 10)
+            self.assertEqual(browser.count(source="a2i", json_path="$[1]"), 1)
+            self.assertEqual([r["id"] for r in browser.page(1, 2, source="fiche")], ["n03", "n05"])
+            self.assertEqual([r["text"] for r in browser.page(8, 5)], ["Chunk 8", "Chunk 9"])
+
+            # Une nouvelle indexation (autre processus) invalide les caches
+            idx.add(["x"], np.eye(1, 4), ["X"], [{"file_path": "data/A2I.json"}])
+            idx.save(path)
+            self.assertEqual(browser.count(source="a2i"), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import tempfile
+import unittest
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from chromadb import PersistentClient
+
+from app.chunk_browser import collection_names, get_browser
+from app.chunk_search import fts_query, open_search_index, sync_collection
+from app.inspect_chunks import main as inspect_main
+
+
+class TestChunkSearch(unittest.TestCase):
+    def test_fts_query_is_safe(self):
+        self.assertEqual(fts_query('PPV: 112917 "AND'), '"PPV" "112917" "AND"*')
+        self.assertEqual(fts_query(" - "), "")
+
+    def test_search_and_sync(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = open_search_index(tmp)
+            index.upsert("eau_docs", [
+                ("a", "data/A2I.json", "$[7]", "PPV : 112917\nSite : BUREAUX BRIVE DP"),
+                ("b", "data/Brive - PR Gare.pdf", "", "Pompage : Marque : Flygt, 2 pompes. Débit 40 m3/h"),
+                ("c", "data/Allassac - PR Bourg.pdf", "", "Pompage : Marque : KSB"),
+            ])
+            index.upsert("eau_docs_poste_relevage", [("b", "data/Brive - PR Gare.pdf", "", "Flygt")])
+            hits = index.search("flygt debit", "eau_docs")
+            self.assertEqual([h["id"] for h in hits], ["b"])
+            self.assertIn("[Débit]", hits[0]["snippet"])
+            self.assertEqual(index.count_matches("flyg"), 2)
+            self.assertEqual(index.count_matches("pompage", "eau_docs", source="allassac"), 1)
+            self.assertEqual(sorted(h["id"] for h in index.search("brive")), ["a", "b", "b"])
+            self.assertEqual(index.forget("eau_docs", ["b"]), 1)
+            self.assertEqual(index.count_matches("flygt", "eau_docs"), 0)
+
+            # Collection Chroma dont l'index plein texte n'est pas à jour
+            coll = PersistentClient(path=tmp).get_or_create_collection("eau_docs")
+            coll.add(ids=["x", "y"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["Dégrilleur", "Bâche"],
+                     metadatas=[{"file_path": "x.txt"}, {"file_path": "y.txt"}])
+            browser = get_browser(tmp, "eau_docs")
+            self.assertTrue(sync_collection(index, browser, "eau_docs"))
+            self.assertFalse(sync_collection(index, browser, "eau_docs"))
+            self.assertEqual([h["id"] for h in index.search("degrilleur", "eau_docs")], ["x"])
+            self.assertEqual(index.count("eau_docs_poste_relevage"), 1)
+            index.close()
+
+    def test_query_spans_partitions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            client = PersistentClient(path=tmp)
+            # Pas de collection de base: uniquement des partitions
+            for name, doc in (("eau_docs_poste_relevage", "Pompe Flygt"), ("eau_docs_station_epuration", "Clarificateur Flygt"),
+                              ("autre", "Flygt")):
+                client.get_or_create_collection(name).add(
+                    ids=[name], embeddings=[[1.0, 0.0]], documents=[doc], metadatas=[{"file_path": f"{name}.txt"}]
+                )
+            self.assertEqual(collection_names(tmp), ["eau_docs_poste_relevage", "eau_docs_station_epuration"])
+            out = io.StringIO()
+            with redirect_stdout(out):
+                inspect_main(["--persist-dir", tmp, "--query", "flygt"])
+            self.assertIn("Chunks trouves pour \"flygt\": 2", out.getvalue())
+            self.assertIn("[eau_docs_station_epuration]", out.getvalue())
+
+            index = open_search_index(tmp)
+            self.assertEqual(index.count_matches("flygt", ["eau_docs_poste_relevage"]), 1)
+            self.assertEqual(index.count_matches("flygt", []), 0)
+            index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
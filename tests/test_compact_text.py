@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core.schema import MetadataMode
+
+from app.indexer import embed_chunks
+from app.loader import load_documents
+from app.node_store import make_splitter, split_documents
+from app.text_normalize import GLOSSARY_ENTRIES_KEY, expand_abbreviations, glossary_entries, is_compact
+from app.utils.bench_compact_text import compare_corpus
+from app.utils.bench_hot_paths import FakeEmbedding
+
+
+class TestCompactText(unittest.TestCase):
+    def test_glossary_entries(self):
+        entries = glossary_entries("Le PR du Bourg et la STEP; R : poste principal")
+        self.assertEqual(entries["STEP"], "Station d'épuration")
+        self.assertEqual(entries["R"], "Poste de relevage")
+        self.assertEqual(glossary_entries("Rien à développer."), {})
+
+    def test_chunks_stay_compact_and_embed_expanded_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            text = "La STEP de Laval reçoit le PR du Bourg."
+            Path(tmp, "notes.txt").write_text(text, encoding="utf-8")
+            docs = load_documents(tmp)
+            self.assertEqual(len(docs), 1)
+            self.assertEqual(docs[0].text, text)
+            self.assertTrue(is_compact(docs[0].metadata))
+
+            nodes = split_documents(docs, make_splitter(256, 20))
+            node = nodes[0]
+            self.assertIn("STEP = Station d'épuration", node.metadata[GLOSSARY_ENTRIES_KEY])
+            llm = node.get_content(metadata_mode=MetadataMode.LLM)
+            embed_content = node.get_content(metadata_mode=MetadataMode.EMBED)
+            self.assertIn(GLOSSARY_ENTRIES_KEY, llm)
+            self.assertNotIn("Station d'épuration (STEP)", llm)
+            self.assertNotIn(GLOSSARY_ENTRIES_KEY, embed_content)
+
+            embed = FakeEmbedding(dim=8)
+            embed_chunks(nodes, embed)
+            self.assertEqual(node.embedding, embed.get_text_embedding(expand_abbreviations(embed_content)))
+
+    def test_compare_corpus_reports_reduction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                Path(tmp, f"Brive - STEP site{i}.txt").write_text(
+                    " ".join(["STEP", "PR", "RES", "boues", "débit"] * 12), encoding="utf-8"
+                )
+            report = compare_corpus(load_documents(tmp), make_splitter(256, 20), top_k=2)
+        total = report["total"]
+        self.assertEqual(total["documents"], 3)
+        self.assertLessEqual(total["compact"]["chunks"], total["expanded"]["chunks"])
+        self.assertLess(total["compact"]["llm_tokens"], total["expanded"]["llm_tokens"])
+        self.assertGreater(total["prompt_reduction"], 0)
+        self.assertIn("station_epuration", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.utils import config
+from app.utils.config import config_overrides, config_section, load_config
+
+
+class TestConfigSection(unittest.TestCase):
+    def test_read_once_and_copied(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "settings.yaml"
+            path.write_text("metrics:\n  max_bytes: 10\n", encoding="utf-8")
+            section = config_section("metrics", str(path))
+            self.assertEqual(section, {"enabled": True, "max_bytes": 10})
+
+            # Fichier modifié: la configuration du processus ne change pas
+            path.write_text("metrics:\n  max_bytes: 20\n", encoding="utf-8")
+            section["enabled"] = False
+            self.assertEqual(config_section("metrics", str(path)), {"enabled": True, "max_bytes": 10})
+            self.assertEqual(load_config(str(path))["metrics"]["max_bytes"], 10)
+
+            config._read_config.cache_clear()
+            self.assertEqual(config_section("metrics", str(path))["max_bytes"], 20)
+
+    def test_overrides_restored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / "settings.yaml")
+            with config_overrides("warmup", path, log_questions=False, extra=1):
+                self.assertFalse(config_section("warmup", path)["log_questions"])
+                self.assertEqual(config_section("warmup", path)["extra"], 1)
+            self.assertTrue(config_section("warmup", path)["log_questions"])
+            self.assertNotIn("extra", config_section("warmup", path))
+
+    def test_unreadable_config(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "settings.yaml"
+            path.write_text("metrics: [\n", encoding="utf-8")
+            self.assertEqual(config_section("metrics", str(path)), {})
+            self.assertEqual(config_section("absente", str(Path(tmp) / "aucun.yaml")), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core import Document
+from llama_index.core.schema import TextNode
+
+from app.dedup import DEDUP_FILE, DedupIndex, duplicate_canonicals, duplicate_sources
+from app.node_store import make_splitter, split_documents
+from app.utils.build_index import export_chunks
+
+LONG = " ".join(f"Le poste de relevage numéro {i} est équipé de deux pompes." for i in range(12))
+
+
+def _node(node_id, text, path):
+    return TextNode(id_=node_id, text=text, metadata={"file_path": path})
+
+
+class TestDedup(unittest.TestCase):
+    def test_exact_and_near_duplicates_are_skipped(self):
+        nodes = [
+            _node("a", "[Source: A2I.json | JSON path: $[7]]\nPPV : 112917\nSite : BUREAUX BRIVE DP", "A2I.json"),
+            _node("b", "[Source: A2I - Copie.json | JSON path: $[4]]\nPPV : 112917\nSite : BUREAUX BRIVE DP", "A2I - Copie.json"),
+            _node("c", "PPV : 112917\nSite : BUREAUX MALEMORT DP", "A2I.json"),
+            _node("d", LONG, "fiche1.pdf"),
+            _node("e", LONG.replace("est équipé", "est  équipé").replace("deux pompes.", "deux pompes", 1), "fiche2.pdf"),
+            _node("f", LONG.replace("deux", "trois", 1), "fiche3.pdf"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            index = DedupIndex(str(Path(tmp) / DEDUP_FILE))
+            stats = {}
+            kept = index.filter_nodes(nodes, "eau_docs", stats=stats)
+            self.assertEqual([n.node_id for n in kept], ["a", "c", "d", "f"])
+            self.assertEqual(stats, {"chunks": 6, "kept": 4, "exact": 1, "near": 1})
+
+            # Ré-indexation: mêmes décisions, sans nouvelle entrée
+            again = {}
+            index.filter_nodes(nodes, "eau_docs", stats=again)
+            self.assertEqual(again, stats)
+            # Collections indépendantes
+            self.assertEqual(len(index.filter_nodes(nodes[:2], "eau_docs_autre")), 1)
+            index.close()
+
+            self.assertEqual(duplicate_sources(tmp, ["a", "d", "c"]), {"a": ["A2I - Copie.json"], "d": ["fiche2.pdf"]})
+
+    def test_export_marks_skipped_duplicates(self):
+        docs = [
+            Document(text="PPV : 112917\nSite : BUREAUX BRIVE DP", metadata={"file_path": p}, id_=p)
+            for p in ("A2I.json", "A2I - Copie.json")
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            nodes = split_documents(docs, make_splitter(200, 20), tmp)
+            index = DedupIndex(str(Path(tmp) / DEDUP_FILE))
+            kept = index.filter_nodes(nodes, "eau_docs")
+            index.close()
+            self.assertEqual(duplicate_canonicals(tmp, [n.node_id for n in nodes]), {nodes[1].node_id: (kept[0].node_id, "exact")})
+
+            out = Path(tmp) / "chunks.jsonl"
+            self.assertEqual(export_chunks(docs, out, chunk_size=200, chunk_overlap=20, persist_dir=tmp), 2)
+            recs = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+            self.assertNotIn("duplicate_of", recs[0])
+            self.assertEqual((recs[1]["duplicate_of"], recs[1]["duplicate_kind"]), (recs[0]["id"], "exact"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.fiche_extract import coerce_value, extract_fields, fiche_record
+
+
+PR_TEXT = """
+Audit technique – Poste de relèvement
+Poste de relèvement De Garavet (Allassac)
+Date visite 18 février 2020
+Capacité du poste 26,3 m3/h (12,8 m3/h et 13,5 m3/h) Mise en route Non précisé
+Situation Localisation Poste situé en bordure de la RD9.
+Facilité d'accès Oui sur le domaine public, avec clôture et portail fermé par une chaine et un
+cadenas.
+Technique Nature de la cuve En polyester.
+Pompage 1+1 - Marque : XYLEM (ex Flygt)
+Ballon anti bélier Sans objet
+Mesure de débit Sans objet
+Télésurveillance Oui, SOFREL S530
+Conclusions
+Le PR de Garavet est en bon état apparent.
+
+
+Photo du PR
+"""
+
+
+class TestFicheExtract(unittest.TestCase):
+    def test_extract_fields(self):
+        fields = extract_fields(PR_TEXT, "poste_relevage")
+        self.assertEqual(fields["titre"], "De Garavet (Allassac)")
+        self.assertEqual(fields["Capacité du poste"], "26,3 m3/h (12,8 m3/h et 13,5 m3/h)")
+        self.assertEqual(fields["Mise en route"], "Non précisé")
+        self.assertEqual(fields["Localisation"], "Poste situé en bordure de la RD9.")
+        self.assertTrue(fields["Facilité d’accès"].endswith("par une chaine et un cadenas."))
+        self.assertEqual(fields["Conclusion"], "Le PR de Garavet est en bon état apparent.")
+
+    def test_coerce_value(self):
+        self.assertEqual(coerce_value("1+1 - Marque : XYLEM", "int"), 2)
+        self.assertEqual(coerce_value("350 EH", "int"), 350)
+        self.assertEqual(coerce_value("26,3 m3/h (12,8 m3/h et 13,5 m3/h)", "float", "m3/h"), 26.3)
+        self.assertIsNone(coerce_value("Sans objet", "float", "m3/h"))
+
+    def test_record_is_mapped_through_schema(self):
+        doc = fiche_record(PR_TEXT, "reducteur/Allassac - PR de Garavet.pdf")
+        meta = doc.metadata
+        self.assertEqual(meta["record_kind"], "fiche")
+        self.assertEqual(meta["canon_type"], "poste_relevage")
+        self.assertEqual(meta["canon_nombre_pompes"], 2)
+        self.assertEqual(meta["canon_type_pompe"], "XYLEM")
+        self.assertEqual(meta["canon_debit_m3h"], 26.3)
+        self.assertTrue(doc.text.startswith("[Source: Allassac - PR de Garavet.pdf | Fiche: poste_relevage]"))
+        self.assertIn("Sans objet : Ballon anti bélier, Mesure de débit", doc.text)
+        self.assertIn("canon_line", doc.excluded_embed_metadata_keys)
+        # Nom de fichier hors gabarit: pas d'enregistrement
+        self.assertIsNone(fiche_record(PR_TEXT, "reducteur/dumont.pdf"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from app.flat_index import FlatIndex
+
+
+def _exact_top(vecs, q, k, rows=None):
+    rows = np.arange(len(vecs)) if rows is None else np.asarray(rows)
+    sims = (vecs[rows] @ q) / (np.linalg.norm(vecs[rows], axis=1) * np.linalg.norm(q))
+    return [int(rows[i]) for i in np.argsort(-sims)[:k]]
+
+
+class TestFlatIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vecs = rng.standard_normal((500, 32)).astype(np.float32)
+        self.ids = [f"n{i}" for i in range(500)]
+        self.metas = [{"commune": f"C{i % 5}", "asset_class": "step" if i % 2 else "pr"} for i in range(500)]
+        self.query = self.vecs[42] + rng.normal(0, 0.05, 32).astype(np.float32)
+
+    def _index(self, dtype):
+        idx = FlatIndex(dtype=dtype)
+        idx.add(self.ids, self.vecs, texts=[f"t{i}" for i in range(500)], metadatas=self.metas)
+        return idx
+
+    def test_search_matches_exact_cosine(self):
+        for dtype in ("float16", "int8"):
+            hits = self._index(dtype).search(self.query, top_k=5)
+            self.assertEqual(hits[0][0], 42)
+            self.assertEqual([r for r, _ in hits][:3], _exact_top(self.vecs, self.query, 3))
+            scores = [s for _, s in hits]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_filters(self):
+        idx = self._index("float16")
+        hits = idx.search(self.query, top_k=4, filters=[("commune", "C1"), ("asset_class", "step")])
+        rows = [i for i, m in enumerate(self.metas) if m["commune"] == "C1" and m["asset_class"] == "step"]
+        self.assertEqual([r for r, _ in hits], _exact_top(self.vecs, self.query, 4, rows))
+        self.assertEqual(idx.search(self.query, top_k=4, filters=[("commune", "inconnue")]), [])
+
+    def test_save_load_roundtrip_and_delete(self):
+        idx = self._index("int8")
+        with tempfile.TemporaryDirectory() as tmp:
+            idx.save(tmp)
+            loaded = FlatIndex.load(tmp)
+            self.assertEqual(loaded.dtype, "int8")
+            self.assertEqual(len(loaded), 500)
+            self.assertEqual(loaded.search(self.query, 3), idx.search(self.query, 3))
+            self.assertEqual(loaded.delete_where("commune", "C2"), 100)
+            self.assertNotIn(42, [r for r, _ in loaded.search(self.query, 10)])
+            loaded.add(["n42"], self.vecs[42:43], texts=["t42"], metadatas=[self.metas[42]])
+            loaded.save(tmp)
+            again = FlatIndex.load(tmp)
+            self.assertEqual(len(again), 401)
+            self.assertEqual(again.ids[again.search(self.query, 1)[0][0]], "n42")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import app.text_normalize as text_normalize
+from app.glossary_rules import check_rules, compile_glossary, validate_mapping, validate_rules
+
+
+class TestGlossaryRules(unittest.TestCase):
+    def test_validate_reports_each_rule(self):
+        reports = validate_rules([
+            {"pattern": r"\bSt\.?\b", "replacement": "Saint", "flags": ["I"]},
+            {"pattern": r"(\bR", "replacement": "x"},
+            {"pattern": r"\bR\b", "replacement": r"\2"},
+            {"pattern": r"\bR\b", "replacement": "x", "flags": ["Z"]},
+            {"pattern": r"(\w+\s?)+$", "replacement": "x"},
+            {"replacement": "x"},
+        ])
+        self.assertEqual([bool(r["errors"]) for r in reports], [False, True, True, True, False, True])
+        self.assertIsNotNone(reports[0]["compiled"])
+        self.assertIn("imbriqués", " ".join(reports[4]["warnings"]))
+        self.assertTrue(validate_rules({"pattern": "x"})[0]["errors"])
+        self.assertTrue(validate_mapping({"STEP": ""})["errors"])
+        self.assertTrue(validate_mapping({"STEP": "a", "step": "b"})["warnings"])
+
+    def test_catastrophic_rule_is_interrupted(self):
+        settings = {"sample_size": 2, "rule_warn_us": 1e6, "rule_max_ms": 1e4, "rule_timeout_s": 1.0}
+        raw = [
+            {"pattern": r"(a+)+b", "replacement": "x"},
+            {"pattern": r"\bSte\b", "replacement": "Sainte"},
+        ]
+        report = check_rules(raw, ["a" * 40, "Ste Marie"], settings)
+        self.assertFalse(report["ok"])
+        self.assertEqual([r["status"] for r in report["rules"]], ["timeout", "ok"])
+        self.assertEqual(report["rules"][1]["cost"]["changed"], 1)
+
+    def test_compiled_artifact_loads_same_glossary(self):
+        expected = text_normalize.glossary_snapshot()
+        raw = json.loads(text_normalize.REGEX_FILE.read_text(encoding="utf-8"))
+        mapping = json.loads(text_normalize.ABBR_FILE.read_text(encoding="utf-8"))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "glossaire.compiled.pickle"
+            compile_glossary(mapping, raw, path)
+            with mock.patch.object(text_normalize, "COMPILED_FILE", path):
+                text_normalize.reload_glossary()
+                self.assertIsNotNone(text_normalize._load_compiled())
+                self.assertEqual(text_normalize.glossary_snapshot(), expected)
+        text_normalize.reload_glossary()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+from app.flat_index import FlatIndex
+from app.flat_vector_store import flat_collection_dir
+from app.glossary_sync import glossary_diff, load_history, record_glossary, renormalize, sync_glossary
+from app.text_normalize import (
+    COMPACT_TEXT,
+    GLOSSARY_ENTRIES_KEY,
+    GLOSSARY_TEXT_KEY,
+    GLOSSARY_VERSION_KEY,
+    expand_abbreviations,
+    expand_mapping,
+    glossary_snapshot,
+)
+from app.utils.bench_hot_paths import FakeEmbedding
+
+
+class TestGlossarySync(unittest.TestCase):
+    def test_renormalize_matches_fresh_expansion(self):
+        old = {"mapping": {"STEP": "Station d'épuration", "PR": "Poste de relevage", "RES": "Réservoir"}, "rules": []}
+        new = {"mapping": {"STEP": "Station de traitement", "RES": "Réservoir", "DO": "Déversoir d'orage"}, "rules": []}
+        diff = glossary_diff(old, new)
+        self.assertEqual(diff, {"added": ["DO"], "changed": ["STEP"], "removed": ["PR"], "rules_changed": False})
+        raw = "La step de Brive, le PR Garavet et le RES ; DO en amont."
+        stored = expand_mapping(raw, old["mapping"])
+        self.assertEqual(renormalize(stored, old["mapping"], new["mapping"], diff), expand_mapping(raw, new["mapping"]))
+
+    def test_sync_reembeds_only_affected_chunks(self):
+        current = glossary_snapshot()
+        self.assertIn("STEP", current["mapping"])
+        old_map = {k: v for k, v in current["mapping"].items() if k != "STEP"}
+        old = {"version": "ancienne", "mapping": old_map, "rules": current["rules"]}
+        embed = FakeEmbedding(dim=8)
+
+        def row(cid, text, version):
+            meta = {"file_path": "data/a.txt"}
+            if version:
+                meta[GLOSSARY_VERSION_KEY] = version
+            node = TextNode(id_=cid, text=text, metadata=meta, excluded_embed_metadata_keys=[GLOSSARY_VERSION_KEY])
+            return cid, embed.get_text_embedding(text), text, node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+
+        rows = [
+            row("a", "La STEP de Brive déborde.", "ancienne"),
+            row("b", "Rien à développer ici.", "ancienne"),
+            row("c", "La STEP sans version.", None),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = flat_collection_dir(tmp, "eau_docs")
+            index = FlatIndex()
+            index.add([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+            index.save(path)
+            record_glossary(tmp, old)
+
+            dry = sync_glossary(tmp, embed_model=embed, backend="flat", dry_run=True)
+            self.assertEqual((dry["reembedded"], dry["restamped"], dry["unversioned"]), (1, 1, 1))
+
+            stats = sync_glossary(tmp, embed_model=embed, backend="flat")
+            self.assertEqual((stats["reembedded"], stats["restamped"], stats["unversioned"]), (1, 1, 1))
+            self.assertIn(current["version"], load_history(tmp))
+
+            index = FlatIndex.load(path)
+            by_id = {cid: (text, meta) for cid, text, meta in zip(index.ids, index.texts, index.metadatas)}
+            self.assertIn(f"{current['mapping']['STEP']} (STEP)", by_id["a"][0])
+            self.assertEqual(by_id["b"][0], "Rien à développer ici.")
+            self.assertEqual(by_id["c"][0], "La STEP sans version.")
+            for cid in ("a", "b"):
+                self.assertEqual(by_id[cid][1][GLOSSARY_VERSION_KEY], current["version"])
+                self.assertEqual(json.loads(by_id[cid][1]["_node_content"])["metadata"][GLOSSARY_VERSION_KEY], current["version"])
+            self.assertNotIn(GLOSSARY_VERSION_KEY, by_id["c"][1])
+            hits = index.search(embed.get_text_embedding(by_id["a"][0]), top_k=1)
+            self.assertEqual(index.ids[hits[0][0]], "a")
+
+            again = sync_glossary(tmp, embed_model=embed, backend="flat")
+            self.assertEqual((again["current"], again["reembedded"], again["restamped"]), (2, 0, 0))
+
+    def test_sync_compact_chunks_keep_text_and_follow_rules(self):
+        current = glossary_snapshot()
+        # Ancienne version: sans STEP et avec d'autres règles regex
+        old_map = {k: v for k, v in current["mapping"].items() if k != "STEP"}
+        old = {"version": "ancienne", "mapping": old_map, "rules": [[r"\bBv\b", 0, "Boulevard"]]}
+        embed = FakeEmbedding(dim=8)
+        keys = [GLOSSARY_VERSION_KEY, GLOSSARY_TEXT_KEY]
+
+        def row(cid, text):
+            meta = {"file_path": "data/a.txt", GLOSSARY_VERSION_KEY: "ancienne", GLOSSARY_TEXT_KEY: COMPACT_TEXT}
+            node = TextNode(id_=cid, text=text, metadata=meta, excluded_embed_metadata_keys=list(keys), excluded_llm_metadata_keys=list(keys))
+            return cid, embed.get_text_embedding(text), text, node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+
+        rows = [row("a", "La STEP de Brive déborde."), row("b", "Rien à développer ici."), row("c", "Le Bv Victor Hugo.")]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = flat_collection_dir(tmp, "eau_docs")
+            index = FlatIndex()
+            index.add([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], [r[3] for r in rows])
+            index.save(path)
+            record_glossary(tmp, old)
+
+            stats = sync_glossary(tmp, embed_model=embed, backend="flat")
+            # Règles modifiées: pas de réindexation complète pour les chunks compacts
+            self.assertEqual((stats["reembedded"], stats["restamped"], stats["rules_changed"]), (2, 1, 0))
+
+            index = FlatIndex.load(path)
+            by_id = {cid: (text, meta) for cid, text, meta in zip(index.ids, index.texts, index.metadatas)}
+            self.assertEqual([by_id[c][0] for c in "abc"], [r[2] for r in rows])
+            self.assertIn(f"STEP = {current['mapping']['STEP']}", by_id["a"][1][GLOSSARY_ENTRIES_KEY])
+            self.assertNotIn(GLOSSARY_ENTRIES_KEY, by_id["b"][1])
+            # Embedding du texte développé (métadonnées embarquées comprises)
+            node = json.loads(by_id["a"][1]["_node_content"])
+            self.assertEqual(node["metadata"][GLOSSARY_VERSION_KEY], current["version"])
+            self.assertIn(GLOSSARY_ENTRIES_KEY, node["metadata"])
+            expected = embed.get_text_embedding(expand_abbreviations("file_path: data/a.txt\n\nLa STEP de Brive déborde."))
+            hits = index.search(expected, top_k=1)
+            self.assertEqual(index.ids[hits[0][0]], "a")
+            self.assertGreater(hits[0][1], 0.999)
+
+
+if __name__ == "__main__":
+    unittest.main()
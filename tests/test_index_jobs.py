@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.index_jobs import (
+    CHECKPOINT_FILE,
+    STATE_FILE,
+    active_job,
+    file_signature,
+    list_data_files,
+    pending_files,
+    progress,
+    read_checkpoint,
+    read_state,
+)
+
+
+class TestIndexJobs(unittest.TestCase):
+    def test_resume_skips_checkpointed_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            data, job = Path(tmp) / "data", Path(tmp) / "vs" / "jobs" / "20250101-000000"
+            (data / "sub").mkdir(parents=True)
+            job.mkdir(parents=True)
+            for name in ("a.json", "b.pdf", "sub/c.txt"):
+                (data / name).write_text(name, encoding="utf-8")
+            files = list_data_files(str(data))
+            self.assertEqual([p.name for p in files], ["a.json", "b.pdf", "c.txt"])
+            self.assertEqual([p.name for p in list_data_files(str(data), [".PDF"])], ["b.pdf"])
+
+            a, b = files[0], files[1]
+            lines = [{"file": str(a), **file_signature(a), "docs": 3}, {"file": str(b), **file_signature(b)}]
+            text = "".join(json.dumps(r) + "\n" for r in lines) + '{"file": "tronq'
+            (job / CHECKPOINT_FILE).write_text(text, encoding="utf-8")
+            done = read_checkpoint(job)
+            self.assertEqual(sorted(done), sorted([str(a), str(b)]))
+
+            # b.pdf modifié depuis le point de reprise: réindexé
+            b.write_text("b modifié", encoding="utf-8")
+            os.utime(b, (time.time() + 10, time.time() + 10))
+            self.assertEqual([p.name for p in pending_files(files, done)], ["b.pdf", "c.txt"])
+
+    def test_stale_running_job_is_interrupted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            job = Path(tmp) / "jobs" / "20250101-000000"
+            job.mkdir(parents=True)
+            state = {"job_id": job.name, "status": "running", "heartbeat": time.time()}
+            (job / STATE_FILE).write_text(json.dumps(state), encoding="utf-8")
+            self.assertEqual(active_job(tmp), job)
+            state["heartbeat"] -= 120
+            (job / STATE_FILE).write_text(json.dumps(state), encoding="utf-8")
+            self.assertEqual(read_state(job)["status"], "interrupted")
+            self.assertIsNone(active_job(tmp))
+
+    def test_progress_eta_on_remaining_bytes(self):
+        state = {
+            "run_started_at": 100.0, "vectors": 250, "run_vectors_start": 50,
+            "bytes_total": 4000, "bytes_done": 2000, "run_bytes_start": 1000,
+        }
+        p = progress(state, now=110.0)
+        self.assertEqual(p["vectors_per_sec"], 20.0)
+        self.assertAlmostEqual(p["eta_sec"], 20.0)
+        self.assertIsNone(progress({"run_started_at": 100.0}, now=101.0)["eta_sec"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core.schema import Document, TextNode
+
+from app.chunk_search import open_search_index
+from app.indexer import IndexSidecars
+from app.records_table import load_records_table
+from app.site_metadata import load_gazetteer
+
+
+def _batch(i):
+    meta = {"file_path": "data/prm.json", "json_path": f"$[{i}]", "commune": "Allassac", "site": f"Site {i}"}
+    return [TextNode(id_=f"n{i}", text=f"Chunk {i}", metadata=meta)], [Document(text=f"Chunk {i}", metadata=meta)]
+
+
+class TestIndexSidecars(unittest.TestCase):
+    def test_written_once_per_flush(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sidecars = IndexSidecars(tmp)
+            with mock.patch("app.indexer.update_records_table") as update:
+                for i in range(3):
+                    sidecars.add("eau_docs", *_batch(i))
+                update.assert_not_called()
+                sidecars.flush()
+                update.assert_called_once()
+                self.assertEqual(len(update.call_args[0][1]), 3)
+                sidecars.flush()
+                update.assert_called_once()
+
+    def test_tables_after_flush(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sidecars = IndexSidecars(tmp)
+            for i in range(2):
+                sidecars.add("eau_docs", *_batch(i))
+            sidecars.flush()
+            self.assertEqual(load_gazetteer(tmp), {"Allassac": ["Site 0", "Site 1"]})
+            self.assertEqual(load_records_table(tmp).n_rows, 2)
+            index = open_search_index(tmp)
+            try:
+                self.assertEqual(sorted(index.node_ids("eau_docs")), ["n0", "n1"])
+            finally:
+                index.close()
+
+    def test_errors_are_logged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sidecars = IndexSidecars(tmp)
+            sidecars.add("eau_docs", *_batch(0))
+            with mock.patch("app.indexer.update_gazetteer", side_effect=OSError("disque plein")):
+                with self.assertLogs("app.indexer", level="ERROR") as logs:
+                    sidecars.flush()
+            self.assertIn("sites", logs.output[0])
+            self.assertEqual(load_records_table(tmp).n_rows, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
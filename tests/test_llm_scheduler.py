@@ -0,0 +1,153 @@
+import threading
+import time
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.llm_scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    LLMScheduler,
+    SchedulerFullError,
+)
+
+
+def _p95(values):
+    vals = sorted(values)
+    return vals[min(len(vals) - 1, int(round(0.95 * (len(vals) - 1))))]
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def test_concurrency_limit(self):
+        sch = LLMScheduler(max_concurrency=2, max_queue=50, poll_interval=0.01)
+        lock = threading.Lock()
+        state = {"cur": 0, "peak": 0}
+
+        def work():
+            with lock:
+                state["cur"] += 1
+                state["peak"] = max(state["peak"], state["cur"])
+            time.sleep(0.01)
+            with lock:
+                state["cur"] -= 1
+
+        threads = [threading.Thread(target=sch.run, args=(work,)) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(state["peak"], 2)
+        self.assertEqual(sch.stats()["active"], 0)
+
+    def test_priority_then_fifo(self):
+        sch = LLMScheduler(max_concurrency=1, max_queue=10, poll_interval=0.01)
+        order = []
+        gate = threading.Event()
+        blocker = threading.Thread(target=sch.run, args=(gate.wait,))
+        blocker.start()
+        time.sleep(0.02)
+        threads = []
+        for name, prio in [("b1", PRIORITY_BATCH), ("i1", PRIORITY_INTERACTIVE), ("b2", PRIORITY_BATCH), ("i2", PRIORITY_INTERACTIVE)]:
+            t = threading.Thread(target=sch.run, args=(order.append, name), kwargs={"priority": prio})
+            t.start()
+            threads.append(t)
+            time.sleep(0.02)
+        gate.set()
+        for t in [blocker, *threads]:
+            t.join()
+        self.assertEqual(order, ["i1", "i2", "b1", "b2"])
+
+    def test_queue_position_and_rejection(self):
+        sch = LLMScheduler(max_concurrency=1, max_queue=1, poll_interval=0.01)
+        gate = threading.Event()
+        positions = []
+        blocker = threading.Thread(target=sch.run, args=(gate.wait,))
+        blocker.start()
+        time.sleep(0.02)
+        waiter = threading.Thread(target=sch.run, args=(lambda: None,), kwargs={"on_wait": positions.append})
+        waiter.start()
+        time.sleep(0.05)
+        with self.assertRaises(SchedulerFullError):
+            sch.run(lambda: None)
+        gate.set()
+        blocker.join()
+        waiter.join()
+        self.assertEqual(positions, [0])
+
+    def test_timeout_leaves_queue(self):
+        sch = LLMScheduler(max_concurrency=1, max_queue=5, poll_interval=0.01)
+        gate = threading.Event()
+        blocker = threading.Thread(target=sch.run, args=(gate.wait,))
+        blocker.start()
+        time.sleep(0.02)
+        with self.assertRaises(TimeoutError):
+            sch.run(lambda: None, timeout=0.05)
+        self.assertEqual(sch.stats()["queued"], 0)
+        gate.set()
+        blocker.join()
+
+    def test_interrupted_wait_leaves_queue(self):
+        class Rerun(BaseException):
+            pass
+
+        def on_wait(pos):
+            raise Rerun()
+
+        sch = LLMScheduler(max_concurrency=1, max_queue=5, poll_interval=0.01)
+        gate = threading.Event()
+        blocker = threading.Thread(target=sch.run, args=(gate.wait,))
+        blocker.start()
+        time.sleep(0.02)
+        with self.assertRaises(Rerun):
+            sch.run(lambda: None, on_wait=on_wait)
+        self.assertEqual(sch.stats()["queued"], 0)
+        gate.set()
+        blocker.join()
+        t0 = time.monotonic()
+        with sch.slot(timeout=1.0):
+            pass
+        self.assertLess(time.monotonic() - t0, 0.1)
+
+    def test_load_interactive_p95_stable(self):
+        """Charge simulée: 40 requêtes de lot + 20 interactives sur 2 créneaux.
+
+        Les requêtes interactives doublent la file de lot: leur p95 reste
+        proche de quelques temps de service, indépendamment de l'arriéré.
+        """
+        service = 0.01
+        sch = LLMScheduler(max_concurrency=2, max_queue=100, poll_interval=0.005)
+        lat = {PRIORITY_INTERACTIVE: [], PRIORITY_BATCH: []}
+        lock = threading.Lock()
+
+        def client(prio):
+            t0 = time.perf_counter()
+            sch.run(time.sleep, service, priority=prio)
+            with lock:
+                lat[prio].append(time.perf_counter() - t0)
+
+        threads = [threading.Thread(target=client, args=(PRIORITY_BATCH,)) for _ in range(40)]
+        for t in threads:
+            t.start()
+        time.sleep(0.02)
+        for _ in range(20):
+            t = threading.Thread(target=client, args=(PRIORITY_INTERACTIVE,))
+            t.start()
+            threads.append(t)
+            time.sleep(service)
+        for t in threads:
+            t.join()
+
+        p95_inter = _p95(lat[PRIORITY_INTERACTIVE])
+        p95_batch = _p95(lat[PRIORITY_BATCH])
+        self.assertEqual(len(lat[PRIORITY_INTERACTIVE]), 20)
+        self.assertLess(p95_inter, p95_batch)
+        self.assertLess(p95_inter, 10 * service)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import tempfile
+import time
+import unittest
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.schema import TextNode
+from ollama import Client
+
+from app.flat_vector_store import FlatVectorStore, flat_collection_dir
+from app.llm_scheduler import configure_scheduler, get_scheduler
+from app.metrics import read_metrics
+from app.query_log import LOG_FILE, warmup_settings
+from app.utils.bench_hot_paths import FakeEmbedding, fake_vector
+from app.utils.load_test import OllamaStub, run_queries
+
+
+class CountingEmbedding(FakeEmbedding):
+    queries: int = 0
+
+    def _get_query_embedding(self, query: str):
+        self.queries += 1
+        return fake_vector(query, self.dim)
+
+
+class TestOllamaStub(unittest.TestCase):
+    def test_chat_embed_and_show_through_ollama_client(self):
+        with OllamaStub(latency_ms=0, token_rate=1000, prompt_rate=1e6, embed_ms=0, embed_dim=8, context_length=4096) as stub:
+            client = Client(host=stub.url)
+            resp = client.chat(
+                model="mistral",
+                messages=[{"role": "user", "content": "x" * 400}],
+                options={"num_ctx": 50, "num_predict": 7},
+            )
+            self.assertEqual(resp["eval_count"], 7)
+            self.assertEqual(resp["prompt_eval_count"], 50)  # tronqué à num_ctx
+            self.assertEqual(len(resp["message"]["content"].split()), 7)
+            emb = client.embed(model="nomic-embed-text", input=["poste de relevage", "station"])
+            self.assertEqual(len(emb["embeddings"]), 2)
+            self.assertEqual(len(emb["embeddings"][0]), 8)
+            self.assertEqual(client.show("mistral").modelinfo["stub.context_length"], 4096)
+            stats = stub.stats()
+            self.assertEqual(stats["POST /api/chat"], 1)
+            self.assertEqual(stats["embedded_texts"], 2)
+
+    def test_parallel_slots_serialize_generations(self):
+        with OllamaStub(latency_ms=100, token_rate=1e6, prompt_rate=1e6, parallel=1) as stub:
+            client = Client(host=stub.url)
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                list(pool.map(lambda _: client.chat(model="m", messages=[{"role": "user", "content": "q"}]), range(3)))
+            self.assertGreaterEqual(time.perf_counter() - t0, 0.3)
+            self.assertGreater(stub.stats()["server_wait_s"], 0.1)
+
+
+class TestRunQueries(unittest.TestCase):
+    def test_each_run_reaches_the_server(self):
+        embed = CountingEmbedding(dim=16)
+        with tempfile.TemporaryDirectory() as tmp, OllamaStub(latency_ms=0, token_rate=1e6, prompt_rate=1e6) as stub:
+            store = FlatVectorStore(str(flat_collection_dir(tmp, "eau_docs")))
+            nodes = [TextNode(id_=f"n{i}", text=t) for i, t in enumerate(["pompe de relevage", "bâche", "vanne"])]
+            index = VectorStoreIndex(nodes=nodes, storage_context=StorageContext.from_defaults(vector_store=store), embed_model=embed)
+            store.persist()
+            questions = ["état de la pompe", "niveau de la bâche"]
+            for run in (1, 2):
+                res = run_queries(
+                    index, stub.url, questions, users=1, per_user=2, top_k=2, num_ctx=1024, max_tokens=8, persist_dir=tmp
+                )
+                self.assertEqual(res["answered"], 2)
+                # Pas de réponse ni d'embedding servis par le cache d'une mesure précédente
+                self.assertEqual(stub.stats()["POST /api/chat"], 2 * run)
+                self.assertEqual(embed.queries, 2 * run)
+            # Chemin de l'interface (métriques), sans alimenter le journal des questions
+            self.assertEqual(len(read_metrics(tmp, "query")), 4)
+            self.assertFalse((Path(tmp) / LOG_FILE).exists())
+            self.assertTrue(warmup_settings().get("log_questions", True))
+
+
+class TestConfigureScheduler(unittest.TestCase):
+    def test_replaces_process_scheduler(self):
+        before = get_scheduler()
+        try:
+            sch = configure_scheduler(max_concurrency=3)
+            self.assertIs(get_scheduler(), sch)
+            self.assertEqual(sch.max_concurrency, 3)
+            self.assertEqual(sch.max_queue, before.max_queue)
+        finally:
+            configure_scheduler(max_concurrency=before.max_concurrency, max_queue=before.max_queue)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import functools
+import tempfile
+import threading
+import time
+import unittest
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import metrics
+from app.metrics import METRICS_FILE, Timings, append_metrics, bind, count, current, percentiles, read_metrics, recording, span
+
+
+class TestMetrics(unittest.TestCase):
+    def test_spans_and_counts_only_inside_recording(self):
+        with span("load"):
+            count("searches")
+        self.assertIsNone(current())
+        with recording() as rec:
+            with span("load"):
+                time.sleep(0.01)
+            with span("load"):
+                pass
+            count("searches", 2)
+        self.assertGreaterEqual(rec.spans["load"], 0.01)
+        self.assertEqual(rec.counts, {"searches": 2})
+
+    def test_bind_carries_recorder_into_threads(self):
+        def work(_):
+            with span("retrieve"):
+                count("searches")
+            return threading.get_ident()
+
+        with recording() as rec, ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(bind(work), range(6)))
+        self.assertEqual(rec.counts["searches"], 6)
+        self.assertIn("retrieve", rec.spans)
+
+    def test_append_read_and_rotation(self):
+        rec = Timings()
+        rec.add("generate", 1.5)
+        rec.count("prompt_tokens", 120)
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = {"enabled": True, "max_bytes": 400}
+            with mock.patch.object(metrics, "_metrics_config", return_value=cfg):
+                for _ in range(5):
+                    append_metrics(tmp, "query", rec, model="mistral")
+                append_metrics(tmp, "index", rec)
+            self.assertTrue((Path(tmp) / (METRICS_FILE + ".1")).exists())
+            self.assertLessEqual((Path(tmp) / METRICS_FILE).stat().st_size, 400)
+            queries = read_metrics(tmp, "query")
+            self.assertTrue(queries)
+            self.assertEqual(queries[-1]["spans"], {"generate": 1.5})
+            self.assertEqual(queries[-1]["counts"], {"prompt_tokens": 120})
+            self.assertEqual(len(read_metrics(tmp, "index")), 1)
+
+            with mock.patch.object(metrics, "_metrics_config", return_value={"enabled": False}):
+                append_metrics(tmp, "index", rec)
+            self.assertEqual(len(read_metrics(tmp, "index")), 1)
+
+    def test_config_read_once(self):
+        rec = Timings()
+        rec.add("generate", 1.0)
+        read = mock.Mock(return_value={"metrics": {"enabled": True}})
+        with tempfile.TemporaryDirectory() as tmp, mock.patch(
+            "app.utils.config._read_config", functools.lru_cache(maxsize=None)(read)
+        ):
+            for _ in range(3):
+                append_metrics(tmp, "query", rec)
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual(len(read_metrics(tmp, "query")), 3)
+
+    def test_percentiles_per_stage(self):
+        records = [{"spans": {"retrieve": float(i), "generate": 10.0}} for i in range(1, 101)]
+        stats = percentiles(records)
+        self.assertEqual(stats["retrieve"]["n"], 100)
+        self.assertAlmostEqual(stats["retrieve"]["p50"], 50.5)
+        self.assertAlmostEqual(stats["retrieve"]["p95"], 95.05)
+        self.assertEqual(stats["generate"]["p95"], 10.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
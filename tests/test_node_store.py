@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core.schema import Document
+
+from app.node_store import make_splitter, split_documents, splitter_key
+
+
+def _docs():
+    long_text = " ".join(f"Phrase {i} sur le poste de relevage." for i in range(200))
+    return [
+        Document(text=long_text, metadata={"file_path": "a.txt"}),
+        Document(text="Fiche courte.", metadata={"file_path": "b.txt"}),
+    ]
+
+
+class TestNodeStore(unittest.TestCase):
+    def test_split_once_and_reuse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = {}
+            first = split_documents(_docs(), make_splitter(200, 20), tmp, stats=stats)
+            self.assertEqual(stats, {"reused": 0, "split": 2})
+            self.assertGreater(len(first), 2)
+
+            # Nouveau chargement: nouveaux identifiants de Document, même contenu
+            docs = _docs()
+            second = split_documents(docs, make_splitter(200, 20), tmp, stats=stats)
+            self.assertEqual(stats, {"reused": 2, "split": 0})
+            self.assertEqual([n.node_id for n in second], [n.node_id for n in first])
+            self.assertEqual([n.get_content() for n in second], [n.get_content() for n in first])
+            self.assertEqual(second[-1].ref_doc_id, docs[1].doc_id)
+
+    def test_splitter_params_and_content_are_part_of_the_key(self):
+        self.assertEqual(splitter_key(make_splitter(200, 20)), splitter_key(make_splitter(200, 20)))
+        self.assertNotEqual(splitter_key(make_splitter(200, 20)), splitter_key(make_splitter(300, 20)))
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = {}
+            split_documents(_docs(), make_splitter(200, 20), tmp)
+            split_documents(_docs(), make_splitter(300, 20), tmp, stats=stats)
+            self.assertEqual(stats["split"], 2)
+            changed = _docs()
+            changed[1] = Document(text="Fiche courte modifiée.", metadata={"file_path": "b.txt"})
+            split_documents(changed, make_splitter(200, 20), tmp, stats=stats)
+            self.assertEqual(stats, {"reused": 1, "split": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
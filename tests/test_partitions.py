@@ -0,0 +1,51 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.partitions import (
+    GENERIC,
+    PartitionedIndex,
+    classify_document,
+    collection_name,
+    partition_of_collection,
+    route_query,
+)
+
+
+class TestPartitions(unittest.TestCase):
+    def test_classify_from_filename_type(self):
+        self.assertEqual(classify_document("", {"asset_type": "STEP"}), "station_epuration")
+        self.assertEqual(classify_document("", {"asset_type": "R"}), "poste_relevage")
+        self.assertEqual(classify_document("", {"asset_type": "DO"}), GENERIC)
+
+    def test_classify_from_keywords(self):
+        txt = "Station d'épuration (STEP) en boues activées, poste de relevage en tête."
+        self.assertEqual(classify_document(txt), "station_epuration")
+        self.assertEqual(classify_document("Pompe de relevage n°2 en défaut"), "poste_relevage")
+        self.assertEqual(classify_document("Compte rendu de réunion"), GENERIC)
+
+    def test_route_query(self):
+        self.assertEqual(route_query("Quel procédé pour la STEP de Loubignac ?"), ["station_epuration"])
+        self.assertEqual(route_query("Débit du PR de Garavet"), ["poste_relevage"])
+        self.assertIsNone(route_query("Code PPV 12345"))
+        self.assertIsNone(route_query("Le PR alimente-t-il la STEP ?"))
+
+    def test_collection_names(self):
+        self.assertEqual(collection_name(GENERIC), "eau_docs")
+        self.assertEqual(collection_name("station_epuration"), "eau_docs_station_epuration")
+        self.assertEqual(partition_of_collection("eau_docs_station_epuration"), "station_epuration")
+        self.assertIsNone(partition_of_collection("autre"))
+
+    def test_select_falls_back_to_all(self):
+        pi = PartitionedIndex({"station_epuration": 1, GENERIC: 2})
+        self.assertEqual(pi.select(["station_epuration"]), {"station_epuration": 1})
+        self.assertEqual(len(pi.select(["poste_relevage"])), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
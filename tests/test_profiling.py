@@ -0,0 +1,53 @@
+import time
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.metrics import recording, span
+from app.profiling import RunProfiler
+
+
+class TestRunProfiler(unittest.TestCase):
+    def test_stages_are_attributed_to_files(self):
+        with RunProfiler() as prof, recording(prof):
+            with prof.file("data/a.json"):
+                with span("load"):
+                    time.sleep(0.02)
+                with span("embed"):
+                    sum(i * i for i in range(200_000))
+            with prof.file("data/b.pdf"), span("load"):
+                pass
+            with prof.file("data/a.json"), span("embed"):
+                pass
+        self.assertEqual(prof.files["data/a.json"]["calls"], 2)
+        self.assertEqual(prof.file_stages["data/a.json"]["embed"]["calls"], 2)
+        self.assertGreaterEqual(prof.file_stages["data/a.json"]["load"]["wall_s"], 0.02)
+        self.assertGreater(prof.file_stages["data/a.json"]["embed"]["cpu_s"], 0)
+        self.assertEqual(prof.stages["load"]["calls"], 2)
+        self.assertGreater(prof.files["data/a.json"]["rss_peak_mb"], 0)
+        # Les spans restent disponibles comme pour un Timings ordinaire
+        self.assertIn("embed", prof.as_dict()["spans"])
+        report = prof.report(top=1)
+        self.assertIn("a.json", report)
+        self.assertNotIn("b.pdf", report.split("Fichiers les plus lents")[1].split("Fichiers les plus gourmands")[0])
+
+    def test_tracemalloc_peak_survives_nested_stages(self):
+        with RunProfiler(trace_memory=True) as prof, recording(prof):
+            with prof.file("gros.json"):
+                with span("load"):
+                    blob = bytearray(8_000_000)
+                    del blob
+                with span("split"):
+                    pass
+        self.assertGreater(prof.file_stages["gros.json"]["load"]["py_peak_mb"], 7.5)
+        self.assertLess(prof.file_stages["gros.json"]["split"]["py_peak_mb"], 1.0)
+        self.assertGreater(prof.files["gros.json"]["py_peak_mb"], 7.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.loader import load_documents, load_record_mappings
+from app.metrics import Timings
+from app.records_table import (
+    answer_aggregate,
+    derive_record_type,
+    load_records_table,
+    parse_aggregate_query,
+    update_records_table,
+)
+from app.site_metadata import load_gazetteer, update_gazetteer
+from app.text_normalize import GLOSSARY_VERSION_KEY, glossary_version
+from app.utils.build_index import collect_documents
+
+
+def _meta(i, localite, metier, agence="AG_BRIVE"):
+    return {
+        "file_path": "data/prm.json",
+        "json_path": f"$[{i}]",
+        "Nom Site PPV": f"Site {i}",
+        "CodePPV": str(1000 + i),
+        "Localite": localite,
+        "canon_localite": localite,
+        "Metier": metier,
+        "Agence": agence,
+    }
+
+
+class TestRecordsTable(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        metas = [
+            _meta(0, "BRIVE-LA-GAILLARDE", "ASS_RELEVEMENT"),
+            _meta(1, "BRIVE", "ASS_RELEVEMENT"),
+            _meta(2, "ALLASSAC", "ASS_RELEVEMENT"),
+            _meta(3, "ALLASSAC", "ASS_EPURATION", agence="AG_TULLE"),
+            {"file_path": "doc.pdf", "page_label": "1"},  # sans json_path: ignoré
+        ]
+        update_records_table(self.tmp.name, metas)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_derive_type(self):
+        self.assertEqual(derive_record_type({"Metier": "ASS_RELEVEMENT"}), "poste_relevage")
+        self.assertEqual(derive_record_type({"TYPE": "STEP des Rivières"}), "station_epuration")
+        self.assertEqual(derive_record_type({"TYPE": "Réservoir"}), "")
+
+    def test_table_built_from_json_records_only(self):
+        table = load_records_table(self.tmp.name)
+        self.assertEqual(table.n_rows, 4)
+
+    def test_count_with_type_and_commune(self):
+        answer, sources = answer_aggregate("Combien de postes de relevage à Brive ?", self.tmp.name)
+        self.assertTrue(answer.startswith("2 enregistrement(s)"))
+        self.assertEqual(sorted(sources), ["data/prm.json#$[0]", "data/prm.json#$[1]"])
+
+        answer, sources = answer_aggregate("nombre de STEP à Allassac", self.tmp.name)
+        self.assertTrue(answer.startswith("1 enregistrement(s)"))
+        self.assertEqual(sources, ["data/prm.json#$[3]"])
+
+    def test_list_by_agence(self):
+        answer, sources = answer_aggregate("liste des PPV de l'agence TULLE", self.tmp.name)
+        self.assertIn("Site 3 (PPV 1003)", answer)
+        self.assertEqual(len(sources), 1)
+
+    def test_non_aggregate_questions(self):
+        table = load_records_table(self.tmp.name)
+        self.assertIsNone(parse_aggregate_query("Quelle est la capacité de la STEP d'Allassac ?", table))
+        self.assertIsNone(parse_aggregate_query("Combien de temps dure le lavage à Brive ?", table))
+
+    def test_questions_left_to_rag(self):
+        update_gazetteer(self.tmp.name, [
+            {"commune": "Allassac", "site": "Garavet"},
+            {"commune": "Cublac", "site": "Loubignac"},
+            {"commune": "Brive"},
+        ])
+        table, gazetteer = load_records_table(self.tmp.name), load_gazetteer(self.tmp.name)
+        for q in (
+            "nombre de pompes au PR de Garavet ?",
+            "Quels sont les équipements du PR de Garavet ?",
+            "combien de pompes à la STEP de Loubignac",
+            # Site cité mais absent de la table: ne pas compter tous les PR
+            "Combien de postes de relevage à Garavet ?",
+        ):
+            self.assertIsNone(parse_aggregate_query(q, table, gazetteer), q)
+            self.assertIsNone(answer_aggregate(q, self.tmp.name), q)
+        answer, _ = answer_aggregate("Combien y a-t-il de PR à Brive ?", self.tmp.name)
+        self.assertTrue(answer.startswith("2 enregistrement(s)"))
+
+
+class TestRecordsFromLoader(unittest.TestCase):
+    def test_json_records_reach_the_table(self):
+        # Chemin de l'interface (index_jobs -> load_documents): un document par enregistrement
+        records = [
+            {"CodePPV": 1000 + i, "Nom Site PPV": f"R SITE {i}", "Localite": loc, "Metier": "ASS_RELEVEMENT"}
+            for i, loc in enumerate(["ALLASSAC", "ALLASSAC", "USSAC"])
+        ]
+        with tempfile.TemporaryDirectory() as data, tempfile.TemporaryDirectory() as persist:
+            Path(data, "prm.json").write_text(json.dumps(records), encoding="utf-8")
+            Path(data, "notes.txt").write_text("Consignes d'exploitation.", encoding="utf-8")
+            docs = load_documents(data)
+            paths = sorted(d.metadata.get("json_path", "") for d in docs)
+            self.assertEqual(paths, ["", "$[0]", "$[1]", "$[2]"])
+            rec = next(d for d in docs if d.metadata.get("json_path") == "$[0]")
+            self.assertEqual(rec.metadata["canon_localite"], "ALLASSAC")
+            self.assertTrue(rec.text.startswith("canon line : "))
+
+            self.assertEqual(update_records_table(persist, (d.metadata for d in docs)), 3)
+            answer, sources = answer_aggregate("Combien de postes de relevage à Allassac ?", persist)
+            self.assertTrue(answer.startswith("2 enregistrement(s)"))
+
+    def test_build_index_uses_the_same_documents(self):
+        # Ligne de commande (build_index): mêmes documents, glossaire et exclusions compris
+        records = [{"CodePPV": 1, "Nom Site PPV": "R SITE", "Localite": "ALLASSAC"}]
+        with tempfile.TemporaryDirectory() as data:
+            Path(data, "prm.json").write_text(json.dumps(records), encoding="utf-8")
+            (doc,) = collect_documents(Path(data), load_record_mappings(), Timings())
+            (ref,) = load_documents(data)
+        self.assertEqual(doc.text, ref.text)
+        self.assertEqual(doc.metadata, ref.metadata)
+        self.assertEqual(doc.metadata[GLOSSARY_VERSION_KEY], glossary_version())
+        for keys in (doc.excluded_embed_metadata_keys, doc.excluded_llm_metadata_keys):
+            self.assertIn("canon_localite", keys)
+            self.assertIn(GLOSSARY_VERSION_KEY, keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.schema import TextNode
+
+from app.flat_vector_store import FlatVectorStore, flat_collection_dir
+from app.metrics import Timings, recording
+from app.rag_engine import retrieve_nodes
+from app.retrieval_cache import RetrievalCache, get_retrieval_cache, store_generation
+from app.utils.bench_hot_paths import FakeEmbedding, fake_vector
+
+
+class CountingEmbedding(FakeEmbedding):
+    queries: int = 0
+
+    def _get_query_embedding(self, query: str):
+        self.queries += 1
+        return fake_vector(query, self.dim)
+
+
+def _index(persist_dir: str, embed, texts):
+    store = FlatVectorStore(str(flat_collection_dir(persist_dir, "eau_docs")))
+    nodes = [TextNode(id_=f"n{i}", text=t, metadata={"CodePPV": str(100 + i)}) for i, t in enumerate(texts)]
+    index = VectorStoreIndex(nodes=nodes, storage_context=StorageContext.from_defaults(vector_store=store), embed_model=embed)
+    store.persist()
+    return index, store
+
+
+class TestRetrievalCache(unittest.TestCase):
+    def setUp(self):
+        get_retrieval_cache().clear()
+
+    def test_lru_bounds(self):
+        cache = RetrievalCache(max_queries=2, max_results=1)
+        for t in ("a", "b", "c"):
+            cache.put_vector("m", t, [1.0])
+        self.assertIsNone(cache.vector("m", "a"))
+        self.assertEqual(cache.vector("m", "c"), [1.0])
+        cache.put_results(("k1",), [("n1", 0.5)])
+        cache.put_results(("k2",), [("n2", 0.4)])
+        self.assertIsNone(cache.results(("k1",)))
+        self.assertEqual(cache.results(("k2",)), [("n2", 0.4)])
+
+    def test_repeated_question_skips_embedding_and_search(self):
+        embed = CountingEmbedding(dim=16)
+        with tempfile.TemporaryDirectory() as tmp:
+            index, store = _index(tmp, embed, ["pompe de relevage", "bâche de stockage", "clarificateur"])
+            _, first = retrieve_nodes(index, "état de la pompe", top_k=2, strict_context=False, persist_dir=tmp)
+            self.assertEqual(embed.queries, 1)
+
+            rec = Timings()
+            with recording(rec):
+                _, again = retrieve_nodes(index, "état de la pompe", top_k=2, strict_context=True, persist_dir=tmp)
+            self.assertEqual(embed.queries, 1)
+            self.assertNotIn("searches", rec.counts)
+            self.assertEqual(rec.counts["retrieval_cache_hits"], 1)
+            self.assertEqual([(n.node.node_id, n.score) for n in again], [(n.node.node_id, n.score) for n in first])
+            self.assertEqual(again[0].node.get_content(), first[0].node.get_content())
+
+            # Nouveau top_k: nouvelle recherche, embedding réutilisé
+            rec = Timings()
+            with recording(rec):
+                retrieve_nodes(index, "état de la pompe", top_k=3, strict_context=False, persist_dir=tmp)
+            self.assertEqual((embed.queries, rec.counts["searches"]), (1, 1))
+
+            # Stockage modifié: génération différente, recherche relancée
+            before = store_generation(tmp)
+            node = TextNode(id_="n9", text="pompe neuve", embedding=fake_vector("pompe neuve", 16))
+            store.add([node])
+            store.persist()
+            self.assertNotEqual(store_generation(tmp), before)
+            rec = Timings()
+            with recording(rec):
+                retrieve_nodes(index, "état de la pompe", top_k=2, strict_context=False, persist_dir=tmp)
+            self.assertEqual((embed.queries, rec.counts["searches"]), (1, 1))
+
+    def test_filtered_question_embeds_once(self):
+        embed = CountingEmbedding(dim=16)
+        with tempfile.TemporaryDirectory() as tmp:
+            index, _ = _index(tmp, embed, ["pompe de relevage", "bâche de stockage"])
+            # Code PPV absent de l'index: recherche filtrée vide puis repli non filtré
+            rec = Timings()
+            with recording(rec):
+                _, nodes = retrieve_nodes(index, "débit du PPV 999999", top_k=2, strict_context=False, persist_dir=tmp)
+            self.assertTrue(nodes)
+            self.assertEqual(embed.queries, 1)
+            self.assertEqual(rec.counts["searches"], 2)
+
+    def test_flat_store_get_nodes(self):
+        embed = CountingEmbedding(dim=16)
+        with tempfile.TemporaryDirectory() as tmp:
+            _, store = _index(tmp, embed, ["pompe", "bâche"])
+            nodes = store.get_nodes(node_ids=["n1", "absent", "n0"])
+            self.assertEqual([n.node_id for n in nodes], ["n1", "n0"])
+            self.assertEqual(nodes[1].get_content(), "pompe")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.loader import load_documents
+from app.site_metadata import (
+    load_gazetteer,
+    match_site_entities,
+    match_site_filters,
+    parse_site_filename,
+    record_site_metadata,
+    site_directory,
+    update_gazetteer,
+)
+
+
+class TestParseSiteFilename(unittest.TestCase):
+    def test_pr_and_fiche_step(self):
+        self.assertEqual(
+            parse_site_filename("reducteur/Allassac - PR de Garavet.pdf"),
+            {"commune": "Allassac", "asset_type": "PR", "site": "Garavet"},
+        )
+        self.assertEqual(
+            parse_site_filename("Cublac - Fiche STEP de Loubignac.pdf"),
+            {"commune": "Cublac", "asset_type": "STEP", "site": "Loubignac"},
+        )
+
+    def test_saint_and_composed_communes(self):
+        meta = parse_site_filename("St Robert - R de l'Atelier Municipal.pdf")
+        self.assertEqual(meta["commune"], "Saint Robert")
+        self.assertEqual(meta["asset_type"], "R")
+        self.assertEqual(parse_site_filename("Jugeals-Nazareth- Fiche STEP.pdf"), {"commune": "Jugeals-Nazareth", "asset_type": "STEP"})
+        self.assertEqual(parse_site_filename("Turenne  - DO du Bourg.pdf")["asset_type"], "DO")
+
+    def test_unrelated_names(self):
+        self.assertEqual(parse_site_filename("Cours Traitement des eaux.pdf"), {})
+        self.assertEqual(parse_site_filename("prm.json"), {})
+
+
+class TestMatchSiteFilters(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        names = [
+            "Allassac - PR de Garavet.pdf",
+            "Allassac - PR du Verdier Bas.pdf",
+            "Varetz - PR du Bourg.pdf",
+            "Noailles - PR du Bourg.pdf",
+            "Larche - PR de Barbazan.pdf",
+            "St Pantaléon de Larche - PR du Stade.pdf",
+            "St Viance - PR de la Croix.pdf",
+            "Ste Féréole - PR de la Croix de Louradour.pdf",
+        ]
+        update_gazetteer(self.tmp.name, [parse_site_filename(n) for n in names])
+        self.gaz = load_gazetteer(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unique_site_implies_commune(self):
+        self.assertEqual(
+            match_site_filters("Quel est le débit du PR de Garavet ?", self.gaz),
+            {"commune": "Allassac", "site": "Garavet"},
+        )
+
+    def test_ambiguous_site_needs_commune(self):
+        self.assertEqual(match_site_filters("PR du Bourg ?", self.gaz), {})
+        self.assertEqual(match_site_filters("PR du Bourg à Varetz", self.gaz), {"commune": "Varetz", "site": "Bourg"})
+
+    def test_longest_names_win(self):
+        self.assertEqual(match_site_filters("pompes à St Pantaléon de Larche", self.gaz), {"commune": "Saint Pantaléon de Larche"})
+        self.assertEqual(
+            match_site_filters("PR de la Croix de Louradour", self.gaz),
+            {"commune": "Sainte Féréole", "site": "Croix de Louradour"},
+        )
+
+    def test_several_communes_no_filter(self):
+        self.assertEqual(match_site_filters("Allassac et Varetz", self.gaz), {})
+
+    def test_entities_in_question_order(self):
+        self.assertEqual(
+            match_site_entities("compare les débits des PR de Garavet et Verdier Bas", self.gaz),
+            [{"commune": "Allassac", "site": "Garavet"}, {"commune": "Allassac", "site": "Verdier Bas"}],
+        )
+        self.assertEqual(
+            match_site_entities("PR du Bourg à Varetz et à Noailles", self.gaz),
+            [{"commune": "Varetz", "site": "Bourg"}, {"commune": "Noailles", "site": "Bourg"}],
+        )
+
+
+class TestRecordSiteMetadata(unittest.TestCase):
+    directory = site_directory(["data/Allassac - PR de Garavet.pdf", "data/Varetz - PR du Bourg.pdf", "data/prm.json"])
+
+    def test_directory_from_filenames(self):
+        self.assertEqual(self.directory, {"Allassac": ["Garavet"], "Varetz": ["Bourg"]})
+
+    def test_place_fields(self):
+        self.assertEqual(
+            record_site_metadata({"canon_site_nom": "R DE GARAVET ALLASSAC"}, self.directory),
+            {"commune": "Allassac", "site": "Garavet"},
+        )
+        self.assertEqual(
+            record_site_metadata({"canon_localite": "VARETZ", "canon_site_nom": "RES LA COTE"}, self.directory),
+            {"commune": "Varetz"},
+        )
+        self.assertEqual(record_site_metadata({"canon_localite": "USSAC"}, self.directory), {})
+
+    def test_loader_json_records(self):
+        # Enregistrements JSON: mêmes valeurs commune/site que la fiche du dossier
+        records = [{"PPV": 1, "Site": "R DE GARAVET ALLASSAC"}, {"PPV": 2, "Site": "AEP BLAGOUR"}]
+        with tempfile.TemporaryDirectory() as data:
+            Path(data, "Allassac - PR de Garavet.txt").write_text("Fiche PR.", encoding="utf-8")
+            Path(data, "A2I.json").write_text(json.dumps(records), encoding="utf-8")
+            docs = load_documents(data, input_files=[str(Path(data, "A2I.json"))])
+        self.assertEqual([(d.metadata.get("commune"), d.metadata.get("site")) for d in docs], [("Allassac", "Garavet"), (None, None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
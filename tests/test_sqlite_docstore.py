@@ -0,0 +1,59 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core.schema import TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from app.sqlite_docstore import DOCSTORE_FILE, LEGACY_DOCSTORE_FILE, SQLiteKVStore, open_docstore
+
+
+class TestSQLiteDocstore(unittest.TestCase):
+    def test_kvstore_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            kv = SQLiteKVStore(str(Path(tmp) / "kv.sqlite"))
+            kv.put_all([("a", {"x": 1}), ("b", {"y": "é"})], collection="c1")
+            kv.put("a", {"x": 2}, collection="c1")
+            self.assertEqual(kv.get("a", collection="c1"), {"x": 2})
+            self.assertIsNone(kv.get("a", collection="c2"))
+            self.assertEqual(kv.get_all("c1"), {"a": {"x": 2}, "b": {"y": "é"}})
+            self.assertTrue(kv.delete("b", collection="c1"))
+            self.assertEqual(kv.count("c1"), 1)
+            kv.close()
+
+    def test_nodes_and_hashes_persist_without_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = open_docstore(tmp)
+            store.add_documents([TextNode(text="Pompe n°1", id_="n1")])
+            store.set_document_hash("doc1", "h1")
+            store.persist(str(Path(tmp) / LEGACY_DOCSTORE_FILE))
+            self.assertFalse((Path(tmp) / LEGACY_DOCSTORE_FILE).exists())
+
+            reopened = open_docstore(tmp)
+            self.assertEqual(reopened.get_node("n1").get_content(), "Pompe n°1")
+            self.assertEqual(reopened.get_document_hash("doc1"), "h1")
+
+    def test_legacy_json_docstore_is_migrated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy = SimpleDocumentStore()
+            legacy.add_documents([TextNode(text="Bâche de relevage", id_="n7")])
+            legacy.set_document_hash("doc7", "h7")
+            legacy.persist(str(Path(tmp) / LEGACY_DOCSTORE_FILE))
+            self.assertIn("docstore/data", json.loads((Path(tmp) / LEGACY_DOCSTORE_FILE).read_text()))
+
+            store = open_docstore(tmp)
+            self.assertTrue((Path(tmp) / DOCSTORE_FILE).exists())
+            self.assertFalse((Path(tmp) / LEGACY_DOCSTORE_FILE).exists())
+            self.assertEqual(store.get_node("n7").get_content(), "Bâche de relevage")
+            self.assertEqual(store.get_document_hash("doc7"), "h7")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import tempfile
+import unittest
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from app.dedup import duplicate_sources
+from app.flat_index import FlatIndex
+from app.flat_vector_store import flat_collection_dir
+from app.records_table import load_records_table, update_records_table
+from app.vectorstore_health import analyze_rows, main
+
+
+class TestVectorstoreHealth(unittest.TestCase):
+    def test_analyze_rows(self):
+        rows = [
+            ("a", {"file_path": "x.json"}, "[Source: x.json | JSON path: $[0]]\nPPV : 1"),
+            ("b", {"file_path": "y.json"}, "[Source: y.json | JSON path: $[0]]\nPPV : 1"),
+            ("c", {"file_path": "gone.pdf"}, "Pompe"),
+            ("d", {}, "Sans source"),
+        ]
+        rep = analyze_rows(rows, lambda fp: fp != "gone.pdf")
+        self.assertEqual(rep["count"], 4)
+        self.assertEqual(rep["orphans"], ["c"])
+        self.assertEqual(rep["missing_files"], ["gone.pdf"])
+        self.assertEqual([d[:2] for d in rep["duplicates"]], [("b", "a")])
+
+    def test_fix_on_flat_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root, store = Path(tmp) / "root", Path(tmp) / "vs"
+            (root / "data").mkdir(parents=True)
+            (root / "data" / "a.txt").write_text("x", encoding="utf-8")
+            idx = FlatIndex("float16")
+            paths = ["data/a.txt", "data/a.txt", "data/gone.txt"]
+            idx.add(["n1", "n2", "n3"], np.eye(3, 8), ["Bâche", "bâche ", "Pompe"], [{"file_path": p} for p in paths])
+            idx.save(flat_collection_dir(str(store), "eau_docs"))
+            update_records_table(str(store), [{"file_path": "data/gone.txt", "json_path": "$[0]", "NOM": "X"}])
+
+            args = ["--persist-dir", str(store), "--backend", "flat", "--root", str(root), "--fix"]
+            with redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(main(args), 0)
+            self.assertIn("orphelins: 1", out.getvalue())
+            self.assertEqual(FlatIndex.load(flat_collection_dir(str(store), "eau_docs")).ids, ["n1"])
+            self.assertEqual(duplicate_sources(str(store), ["n1"]), {"n1": ["data/a.txt"]})
+            self.assertEqual(load_records_table(str(store)).n_rows, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
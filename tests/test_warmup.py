@@ -0,0 +1,89 @@
+import json
+import tempfile
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure project root on sys.path when running directly
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.schema import TextNode
+
+from app.flat_vector_store import FlatVectorStore, flat_collection_dir
+from app.metrics import Timings, recording
+from app.query_log import LOG_FILE, load_log, normalize_question, record_question, top_questions
+from app.rag_engine import ask_question
+from app.retrieval_cache import get_retrieval_cache
+from app.utils.bench_hot_paths import FakeEmbedding
+from app.utils.load_test import OllamaStub
+from app.warmup import warm_up
+
+
+class TestQueryLog(unittest.TestCase):
+    def test_record_and_top_questions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for q in ["Débit du PR  du Bourg ?", "Débit du PR du Bourg ?", " débit du PR du Bourg ? ", "Niveau de la bâche ?"]:
+                self.assertTrue(record_question(tmp, q))
+            for q in ["Niveau de la bâche ?", "Niveau de la bâche ?"]:
+                record_question(tmp, q)
+            self.assertFalse(record_question(tmp, "Rappeler jean.dupont@example.fr"))
+            self.assertFalse(record_question(tmp, "Appeler le 06 12 34 56 78 pour la STEP"))
+            log = load_log(tmp)
+            self.assertEqual(log[normalize_question("Débit du PR du Bourg ?")]["count"], 2)
+            self.assertNotIn("Rappeler jean.dupont@example.fr", json.dumps(log))
+            self.assertEqual(top_questions(tmp, n=5), ["Niveau de la bâche ?", "Débit du PR du Bourg ?"])
+            self.assertEqual(top_questions(tmp, n=5, min_count=3), ["Niveau de la bâche ?"])
+
+            record_question(tmp, "Question rare", max_entries=2)
+            self.assertNotIn("Question rare", load_log(tmp))
+            self.assertTrue((Path(tmp) / LOG_FILE).exists())
+
+
+class TestWarmUp(unittest.TestCase):
+    def setUp(self):
+        get_retrieval_cache().clear()
+
+    def test_warm_up_fills_retrieval_and_answer_caches(self):
+        embed = FakeEmbedding(dim=16)
+        with tempfile.TemporaryDirectory() as tmp, OllamaStub(latency_ms=0, token_rate=1e6, prompt_rate=1e6) as stub:
+            store = FlatVectorStore(str(flat_collection_dir(tmp, "eau_docs")))
+            nodes = [TextNode(id_=f"n{i}", text=t) for i, t in enumerate(["pompe de relevage", "bâche de stockage", "vanne"])]
+            index = VectorStoreIndex(nodes=nodes, storage_context=StorageContext.from_defaults(vector_store=store), embed_model=embed)
+            store.persist()
+            settings = dict(top_k=2, model_name="mistral", base_url=stub.url, num_ctx=1024, max_tokens=8, strict_context=False)
+            questions = ["état de la pompe", "niveau de la bâche", "vanne fermée"]
+
+            calls = []
+            stats = warm_up(lambda: calls.append(1) or index, questions, persist_dir=tmp, stop=lambda: False, **settings)
+            self.assertEqual((stats["retrieved"], stats["answered"], stats["failed"], stats["stopped"]), (3, 3, 0, False))
+            self.assertEqual(len(calls), 1)
+            chats = stub.stats()["POST /api/chat"]
+            self.assertEqual(chats, 3)
+            self.assertEqual(load_log(tmp), {})  # le préchauffage n'alimente pas le journal
+
+            # Vraie question identique: ni embedding, ni recherche, ni LLM
+            rec = Timings()
+            with recording(rec):
+                answer, _ = ask_question(index, "état  de la pompe", persist_dir=tmp, **settings)
+            self.assertTrue(answer)
+            self.assertEqual(stub.stats()["POST /api/chat"], chats)
+            self.assertEqual(rec.counts.get("answer_cache_hits"), 1)
+            self.assertNotIn("searches", rec.counts)
+            self.assertEqual(load_log(tmp)["état de la pompe"]["count"], 1)
+
+            # Autre longueur de réponse: nouvelle génération sur les passages en cache
+            ask_question(index, "état de la pompe", persist_dir=tmp, **{**settings, "max_tokens": 16})
+            self.assertEqual(stub.stats()["POST /api/chat"], chats + 1)
+
+    def test_warm_up_stops_on_traffic(self):
+        seen = iter([False, False, True])
+        stats = warm_up(lambda: object(), ["a", "b"], stop=lambda: next(seen, True))
+        self.assertTrue(stats["stopped"])
+        self.assertEqual(stats["answered"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()